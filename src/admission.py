@@ -0,0 +1,189 @@
+# src/admission.py
+
+"""
+Control de admisión de turnos.
+
+Protege la latencia de cola cuando llegan ráfagas: cada usuario tiene un token
+bucket (ritmo sostenido más ráfaga), hay un máximo global de turnos en curso y
+los que no caben esperan en una cola FIFO acotada con fecha límite. Un turno se
+rechaza en cuanto se sabe que no podrá empezar a tiempo (cola llena, o espera
+estimada mayor que su plazo) en lugar de consumir su plazo esperando.
+"""
+
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from threading import Event, Lock
+from typing import Deque, Dict, Iterator, Optional
+
+from src.config import config
+from .metrics import metrics
+from .rag.logging_config import logger
+
+# Número máximo de buckets de usuario que se conservan (los más antiguos se descartan).
+MAX_TRACKED_USERS = 10000
+
+# Peso de la última muestra en la media móvil del tiempo de servicio.
+SERVICE_TIME_ALPHA = 0.2
+
+_REASONS = {
+    "rate_limited": "límite de solicitudes por usuario superado",
+    "queue_full": "cola de espera llena",
+    "deadline": "no hay capacidad para atender la solicitud a tiempo",
+}
+
+
+class AdmissionRejected(RuntimeError):
+    """Turno rechazado por el control de admisión."""
+
+    def __init__(self, reason: str, retry_after: float = 0.0):
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(f"Servicio ocupado: {_REASONS[reason]}. "
+                         f"Intenta de nuevo en {max(retry_after, 0.1):.1f} s")
+
+
+class TokenBucket:
+    """Token bucket: `rate` tokens por segundo con capacidad `burst`."""
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def try_acquire(self, now: Optional[float] = None) -> float:
+        """Consume un token. Retorna 0 si lo había o los segundos hasta el siguiente."""
+        now = time.monotonic() if now is None else now
+        # `now` puede ser anterior a la creación del bucket (se toma al entrar en admit).
+        self.tokens = min(self.burst, self.tokens + max(0.0, now - self.updated) * self.rate)
+        self.updated = max(self.updated, now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def refund(self) -> None:
+        """Devuelve el token de un turno que no llegó a atenderse."""
+        self.tokens = min(self.burst, self.tokens + 1)
+
+
+class AdmissionController:
+    """
+    Limita los turnos en curso y el ritmo de cada usuario.
+
+    Args:
+        max_in_flight: Turnos procesándose a la vez (0 = sin límite).
+        queue_size: Turnos que pueden esperar un hueco; el resto se rechaza.
+        queue_timeout: Plazo por defecto (segundos) para empezar un turno.
+        user_rate: Turnos por segundo sostenidos por usuario (0 = sin límite).
+        user_burst: Turnos seguidos que un usuario puede enviar sin esperar.
+    """
+    def __init__(self, max_in_flight: int = 8, queue_size: int = 32, queue_timeout: float = 30.0,
+                 user_rate: float = 0.0, user_burst: float = 5.0):
+        self.max_in_flight = max_in_flight
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.user_rate = user_rate
+        self.user_burst = max(1.0, user_burst)
+        self.lock = Lock()
+        self.in_flight = 0
+        self.waiters: Deque[Event] = deque()
+        self.buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.service_time = 0.0
+
+    @classmethod
+    def from_config(cls, cfg=config) -> "AdmissionController":
+        return cls(max_in_flight=cfg.ADMISSION_MAX_IN_FLIGHT, queue_size=cfg.ADMISSION_QUEUE_SIZE,
+                   queue_timeout=cfg.ADMISSION_QUEUE_TIMEOUT, user_rate=cfg.USER_RATE_LIMIT,
+                   user_burst=cfg.USER_RATE_BURST)
+
+    @contextmanager
+    def admit(self, user_id: str, timeout: Optional[float] = None) -> Iterator[None]:
+        """
+        Context manager que reserva un hueco para el turno de `user_id`.
+
+        Raises:
+            AdmissionRejected: Si el usuario superó su ritmo, la cola está llena o
+                el turno no puede empezar antes de `timeout` segundos.
+        """
+        start = time.monotonic()
+        self._acquire(user_id, start, self.queue_timeout if timeout is None else timeout)
+        waited = time.monotonic() - start
+        metrics.observe("chatbot_admission_wait_seconds", waited)
+        try:
+            yield
+        finally:
+            self._release(time.monotonic() - start - waited)
+
+    def _acquire(self, user_id: str, now: float, timeout: float) -> None:
+        bucket = None
+        with self.lock:
+            if self.user_rate > 0:
+                bucket = self._bucket(user_id)
+                retry_after = bucket.try_acquire(now)
+                if retry_after:
+                    self._shed("rate_limited", retry_after)
+            if not self.max_in_flight or (self.in_flight < self.max_in_flight and not self.waiters):
+                self.in_flight += 1
+                metrics.set_gauge("chatbot_admission_in_flight", self.in_flight)
+                return
+            # Los rechazos por capacidad no son culpa del usuario: se le
+            # devuelve el token para que su reintento no acabe en rate_limited.
+            if len(self.waiters) >= self.queue_size:
+                self._shed("queue_full", self._estimated_wait(len(self.waiters)), bucket)
+            # Rechazo temprano: con el tiempo de servicio medio, este turno no
+            # tendría hueco antes de su plazo.
+            estimated = self._estimated_wait(len(self.waiters) + 1)
+            if self.service_time and estimated > timeout:
+                self._shed("deadline", estimated, bucket)
+            waiter = Event()
+            self.waiters.append(waiter)
+            metrics.set_gauge("chatbot_admission_queue_depth", len(self.waiters))
+
+        if waiter.wait(timeout):
+            return
+        with self.lock:
+            # El hueco pudo concederse justo al vencer el plazo.
+            if waiter.is_set():
+                return
+            self.waiters.remove(waiter)
+            metrics.set_gauge("chatbot_admission_queue_depth", len(self.waiters))
+            self._shed("deadline", self._estimated_wait(len(self.waiters)), bucket)
+
+    def _release(self, service_time: float) -> None:
+        with self.lock:
+            self.service_time = (service_time if not self.service_time else
+                                 SERVICE_TIME_ALPHA * service_time + (1 - SERVICE_TIME_ALPHA) * self.service_time)
+            if self.waiters:
+                # El hueco pasa directamente al primero de la cola.
+                self.waiters.popleft().set()
+                metrics.set_gauge("chatbot_admission_queue_depth", len(self.waiters))
+            else:
+                self.in_flight -= 1
+                metrics.set_gauge("chatbot_admission_in_flight", self.in_flight)
+
+    def _estimated_wait(self, position: int) -> float:
+        """Espera estimada para la posición `position` de la cola (1 = la primera)."""
+        if not self.max_in_flight:
+            return 0.0
+        return position * self.service_time / self.max_in_flight
+
+    def _bucket(self, user_id: str) -> TokenBucket:
+        bucket = self.buckets.get(user_id)
+        if bucket is None:
+            bucket = self.buckets[user_id] = TokenBucket(self.user_rate, self.user_burst)
+            if len(self.buckets) > MAX_TRACKED_USERS:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(user_id)
+        return bucket
+
+    @staticmethod
+    def _shed(reason: str, retry_after: float, bucket: Optional[TokenBucket] = None) -> None:
+        if bucket is not None:
+            bucket.refund()
+        metrics.inc("chatbot_admission_shed_total", reason=reason)
+        logger.warning("Turno rechazado por control de admisión: %s", reason)
+        raise AdmissionRejected(reason, retry_after)
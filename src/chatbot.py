@@ -1,15 +1,22 @@
 # src/chatbot.py
 
 import logging
+import threading
+from contextlib import nullcontext
 from typing import List, Optional
 
 from .rag.logging_config import logger
-from .constants import MESSAGES
+from .constants import MESSAGES, CHATBOT_STATES
 from src.config import GlobalConfig as Config
 from .rag.chat_history import ChatHistory
 from .rag.retriever import RAGRetriever, BaseRetriever
 from .langgraph_service import LangGraphService
+from .model_router import ModelRouter
 from .document_service import DocumentService
+from .profiling import profiler
+from .metrics import metrics
+from .warmup import WarmupRunner
+from .admission import AdmissionController, AdmissionRejected
 
 config = Config()
 logger = logging.getLogger(__name__)
@@ -18,7 +25,8 @@ class Chatbot:
     """
     Chatbot principal. Orquesta los servicios de LangGraph y Documentos.
     """
-    def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None, retriever: Optional[BaseRetriever] = None):
+    def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None, retriever: Optional[BaseRetriever] = None,
+                 user_manager=None):
         """
         Inicializa el chatbot con configuración flexible
         """
@@ -37,43 +45,137 @@ class Chatbot:
             self.chat_history = None
             self.document_service = None
         
+        # El clasificador del router reutiliza los embeddings (y su caché) del retriever.
+        router = None
+        if config.ROUTING_ENABLED:
+            router = ModelRouter.from_config(config, getattr(self.rag_retriever, "embeddings", None))
+        
         self.langgraph_service = LangGraphService(
             api_key=self.api_key, 
             model=self.model, 
             chat_history=self.chat_history, 
-            retriever=self.rag_retriever.get_retriever() if self.rag_retriever else None
+            retriever=self.rag_retriever.get_retriever() if self.rag_retriever else None,
+            # Con un gestor de usuarios, cada conversación solo busca en los
+            # documentos de su usuario y tenant.
+            owner_resolver=user_manager.obtener_propietario if user_manager else None,
+            router=router
         )
+
+        # Control de admisión: limita los turnos en curso y el ritmo de cada usuario.
+        self.admission = AdmissionController.from_config(config) if config.ADMISSION_ENABLED else None
+
+        # Estado del chatbot (claves de CHATBOT_STATES): INIT durante el
+        # calentamiento, READY/PROCESSING después y ERROR si el calentamiento falla.
+        self._warmup_state = "INIT"
+        self._ready = threading.Event()
+        self._in_flight = 0
+        self._state_lock = threading.Lock()
+        metrics.set_gauge("chatbot_ready", 0)
+        if config.WARMUP_ENABLED:
+            threading.Thread(target=self.warm_up, name="warmup", daemon=True).start()
+        else:
+            self._set_warmup_state("READY")
+
+    @property
+    def state(self) -> str:
+        """Estado actual: INIT, READY, PROCESSING (hay peticiones en curso) o ERROR."""
+        with self._state_lock:
+            if self._warmup_state == "READY" and self._in_flight:
+                return "PROCESSING"
+            return self._warmup_state
+
+    @property
+    def state_description(self) -> str:
+        return CHATBOT_STATES[self.state]
+
+    def _set_warmup_state(self, state: str) -> None:
+        with self._state_lock:
+            self._warmup_state = state
+        metrics.set_gauge("chatbot_ready", 1 if state == "READY" else 0)
+        if state != "INIT":
+            self._ready.set()
+
+    def warm_up(self) -> None:
+        """
+        Ejecuta las operaciones de una consulta (embedding, búsqueda y prompt)
+        para que la primera petición real no pague la inicialización perezosa.
+        """
+        try:
+            with metrics.span("warmup"):
+                WarmupRunner(self.rag_retriever, self.langgraph_service).run()
+            self._set_warmup_state("READY")
+        except Exception as e:
+            logger.error("Error en el calentamiento: %s", e, exc_info=True)
+            self._set_warmup_state("ERROR")
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        """
+        Bloquea hasta que termina el calentamiento (o vence `timeout`).
+
+        Retorna True si el chatbot está listo para recibir tráfico.
+        """
+        self._ready.wait(timeout)
+        return self.state in ("READY", "PROCESSING")
         
-    def send_message(self, message: str, user_id: str = "default") -> str:
+    @profiler.profile("send_message")
+    def send_message(self, message: str, user_id: str = "default", timeout: Optional[float] = None) -> str:
         """
         Envía un mensaje al chatbot y retorna la respuesta.
+
+        `timeout` es el plazo (segundos) para que el turno empiece a procesarse;
+        por defecto ADMISSION_QUEUE_TIMEOUT. Si el control de admisión lo rechaza
+        se retorna un error indicando cuándo reintentar.
         """
+        with self._state_lock:
+            self._in_flight += 1
         try:
-            # CORRECCIÓN: Llamamos al método correcto del servicio.
-            return self.langgraph_service.send_message(message, user_id)
+            admission = self.admission.admit(user_id, timeout) if self.admission else nullcontext()
+            with admission:
+                # CORRECCIÓN: Llamamos al método correcto del servicio.
+                return self.langgraph_service.send_message(message, user_id)
+        except AdmissionRejected as e:
+            return MESSAGES["ERROR"].format(error=str(e))
         except (ValueError, RuntimeError) as e:
-            logger.error(f"Error de valor o ejecución: {str(e)}", exc_info=True)
+            logger.error("Error de valor o ejecución: %s", e, exc_info=True)
             return MESSAGES["ERROR"].format(error=str(e))
         except Exception as e:
-            logger.error(f"Error inesperado procesando mensaje: {str(e)}", exc_info=True)
+            logger.error("Error inesperado procesando mensaje: %s", e, exc_info=True)
             return MESSAGES["ERROR"].format(error=str(e))
+        finally:
+            with self._state_lock:
+                self._in_flight -= 1
 
-    def add_documents(self, documents: List[str]) -> str:
+    def add_documents(self, documents: List[str], owner: Optional[str] = None, tenant: Optional[str] = None) -> str:
         """
-        Agrega documentos al sistema RAG.
+        Agrega documentos al sistema RAG, opcionalmente privados de un usuario/tenant.
         """
         if not self.document_service:
             return "El sistema RAG no está habilitado"
             
         try:
-            return self.document_service.add_documents(documents)
+            return self.document_service.add_documents(documents, owner=owner, tenant=tenant)
         except (FileNotFoundError, ValueError) as e:
-            logger.error(f"Error de archivo o valor: {str(e)}", exc_info=True)
+            logger.error("Error de archivo o valor: %s", e, exc_info=True)
             return MESSAGES["ERROR"].format(error=str(e))
         except Exception as e:
-            logger.error(f"Error inesperado agregando documentos: {str(e)}", exc_info=True)
+            logger.error("Error inesperado agregando documentos: %s", e, exc_info=True)
             return MESSAGES["ERROR"].format(error=str(e))
 
+    def list_documents(self, owner: Optional[str] = None, tenant: Optional[str] = None) -> List[dict]:
+        """
+        Documentos visibles para el usuario (los suyos y los compartidos del
+        tenant) con sus estadísticas (chunks, bytes, tokens, fecha de ingesta).
+        """
+        if not self.document_service:
+            return []
+        return self.document_service.list_visible_documents(owner=owner, tenant=tenant)
+
+    def delete_document(self, source: str, owner: Optional[str] = None, tenant: Optional[str] = None) -> str:
+        """Elimina un documento del usuario (o uno compartido, sin usuario) del sistema RAG."""
+        if not self.document_service:
+            return "El sistema RAG no está habilitado"
+        return self.document_service.delete_document(source, owner=owner, tenant=tenant)
+
     def clear_documents(self) -> str:
         """Elimina todos los documentos del sistema RAG."""
         if not self.document_service:
@@ -82,8 +184,8 @@ class Chatbot:
         try:
             return self.document_service.clear_documents()
         except RuntimeError as e:
-            logger.error(f"Error de ejecución limpiando documentos: {str(e)}", exc_info=True)
+            logger.error("Error de ejecución limpiando documentos: %s", e, exc_info=True)
             return MESSAGES["ERROR"].format(error=str(e))
         except Exception as e:
-            logger.error(f"Error inesperado limpiando documentos: {str(e)}", exc_info=True)
+            logger.error("Error inesperado limpiando documentos: %s", e, exc_info=True)
             return MESSAGES["ERROR"].format(error=str(e))
\ No newline at end of file
@@ -17,23 +17,121 @@ class GlobalConfig(BaseSettings):
     # Esto soluciona el 'ValidationError'.
     # =============================================================================
     ANTHROPIC_MODEL: str = os.getenv("ANTHROPIC_MODEL", "claude-3-haiku-20240307")
+    # Máximo de tokens de salida de cada respuesta (sin enrutado de modelos)
+    LLM_MAX_TOKENS: int = int(os.getenv("LLM_MAX_TOKENS", "512"))
+    # Marca el prefijo estable del prompt (sistema, resumen, contexto, historial) para prompt caching
+    PROMPT_CACHE_ENABLED: bool = os.getenv("PROMPT_CACHE_ENABLED", "true").lower() == "true"
     
+    # Configuración de enrutado de modelos: cada turno va al modelo rápido o al
+    # grande según la longitud de la consulta, si la búsqueda encontró contexto,
+    # la profundidad de la conversación y un clasificador sobre el embedding de
+    # la consulta (ejemplos en ROUTING_EXAMPLES_PATH, JSON {"fast": [...], "large": [...]})
+    ROUTING_ENABLED: bool = os.getenv("ROUTING_ENABLED", "false").lower() == "true"
+    ROUTING_FAST_MODEL: str = os.getenv("ROUTING_FAST_MODEL", "claude-3-haiku-20240307")
+    ROUTING_FAST_MAX_TOKENS: int = int(os.getenv("ROUTING_FAST_MAX_TOKENS", "256"))
+    ROUTING_LARGE_MODEL: str = os.getenv("ROUTING_LARGE_MODEL", "claude-3-5-sonnet-20241022")
+    ROUTING_LARGE_MAX_TOKENS: int = int(os.getenv("ROUTING_LARGE_MAX_TOKENS", "1024"))
+    ROUTING_LONG_QUERY_TOKENS: int = int(os.getenv("ROUTING_LONG_QUERY_TOKENS", "40"))
+    ROUTING_DEEP_CONVERSATION: int = int(os.getenv("ROUTING_DEEP_CONVERSATION", "12"))
+    ROUTING_THRESHOLD: float = float(os.getenv("ROUTING_THRESHOLD", "1.5"))
+    ROUTING_EXAMPLES_PATH: str = os.getenv("ROUTING_EXAMPLES_PATH", "")
+
     # Configuración de RAG
     RAG_ENABLED: bool = os.getenv("RAG_ENABLED", "true").lower() == "true"
     RAG_CHUNK_SIZE: int = int(os.getenv("RAG_CHUNK_SIZE", "1000"))
     RAG_CHUNK_OVERLAP: int = int(os.getenv("RAG_CHUNK_OVERLAP", "200"))
     
+    # Aislamiento de documentos por usuario y tenant: la búsqueda se filtra por
+    # los metadatos owner/tenant del propietario del historial_id
+    RAG_SCOPING_ENABLED: bool = os.getenv("RAG_SCOPING_ENABLED", "true").lower() == "true"
+    DEFAULT_TENANT: str = os.getenv("DEFAULT_TENANT", "default")
+
     # Configuración de ChromaDB
     CHROMA_PERSIST_DIRECTORY: str = os.getenv("CHROMA_PERSIST_DIRECTORY", "./chroma_db")
     CHROMA_COLLECTION_NAME: str = os.getenv("CHROMA_COLLECTION_NAME", "chatbot_docs")
     
+    # Configuración del índice HNSW de Chroma. El espacio (l2, cosine o ip), M y
+    # construction_ef solo se aplican al crear una colección; search_ef se aplica
+    # también a las existentes. `python -m src.tools.tune_hnsw` mide recall y
+    # latencia sobre una muestra y recomienda valores
+    HNSW_SPACE: str = os.getenv("HNSW_SPACE", "l2")
+    HNSW_M: int = int(os.getenv("HNSW_M", "16"))
+    HNSW_CONSTRUCTION_EF: int = int(os.getenv("HNSW_CONSTRUCTION_EF", "100"))
+    HNSW_SEARCH_EF: int = int(os.getenv("HNSW_SEARCH_EF", "100"))
+    # Documentos recuperados por búsqueda y relevancia mínima (0-1; 0 = sin umbral)
+    RAG_TOP_K: int = int(os.getenv("RAG_TOP_K", "4"))
+    RAG_SCORE_THRESHOLD: float = float(os.getenv("RAG_SCORE_THRESHOLD", "0"))
+
+    # Configuración de shards: VECTOR_SHARDS colecciones, cada una con su propio
+    # SQLite e índice HNSW. Los chunks se reparten por hash de su id o por
+    # documento (VECTOR_SHARD_ROUTING=hash|source). Las búsquedas consultan los
+    # shards en paralelo y responden sin los que tarden más de
+    # VECTOR_SHARD_TIMEOUT segundos. VECTOR_SHARD_WORKERS = 0 usa 4 hilos por shard
+    # para escrituras y lecturas; las búsquedas tienen su propio pool y un shard
+    # con VECTOR_SHARD_MAX_INFLIGHT búsquedas sin terminar se omite.
+    VECTOR_SHARDS: int = int(os.getenv("VECTOR_SHARDS", "1"))
+    VECTOR_SHARD_ROUTING: str = os.getenv("VECTOR_SHARD_ROUTING", "hash")
+    VECTOR_SHARD_TIMEOUT: float = float(os.getenv("VECTOR_SHARD_TIMEOUT", "2.0"))
+    VECTOR_SHARD_WORKERS: int = int(os.getenv("VECTOR_SHARD_WORKERS", "0"))
+    VECTOR_SHARD_MAX_INFLIGHT: int = int(os.getenv("VECTOR_SHARD_MAX_INFLIGHT", "4"))
+
+    # Catálogo de documentos (source -> chunks, bytes, tokens) en SQLite; vacío
+    # = catalog.db dentro de CHROMA_PERSIST_DIRECTORY
+    DOCUMENT_CATALOG_PATH: str = os.getenv("DOCUMENT_CATALOG_PATH", "")
+    # Deduplicación de chunks en la ingesta: se descartan duplicados exactos y
+    # casi duplicados (SimHash a distancia de Hamming <= DEDUP_MAX_DISTANCE)
+    # antes de calcular sus embeddings
+    DEDUP_ENABLED: bool = os.getenv("DEDUP_ENABLED", "true").lower() == "true"
+    DEDUP_MAX_DISTANCE: int = int(os.getenv("DEDUP_MAX_DISTANCE", "3"))
+
+    # Índice de búsqueda: chroma, o mmap (segmentos inmutables en MMAP_INDEX_DIR
+    # compartidos por todos los workers a través de la caché de páginas)
+    VECTOR_INDEX_BACKEND: str = os.getenv("VECTOR_INDEX_BACKEND", "chroma")
+    MMAP_INDEX_DIR: str = os.getenv("MMAP_INDEX_DIR", "./vector_index")
+    MMAP_INDEX_REFRESH_SECONDS: float = float(os.getenv("MMAP_INDEX_REFRESH_SECONDS", "2"))
+    MMAP_INDEX_MAX_SEGMENTS: int = int(os.getenv("MMAP_INDEX_MAX_SEGMENTS", "8"))
+
+    # Snapshots del índice: cuantización de los vectores exportados (none, float16
+    # o int8) y snapshot que se importa al arrancar si la colección está vacía.
+    SNAPSHOT_QUANTIZATION: str = os.getenv("SNAPSHOT_QUANTIZATION", "none")
+    SNAPSHOT_RESTORE_PATH: str = os.getenv("SNAPSHOT_RESTORE_PATH", "")
+    SNAPSHOT_IMPORT_BATCH_SIZE: int = int(os.getenv("SNAPSHOT_IMPORT_BATCH_SIZE", "5000"))
+
     # Configuración de embeddings
     EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "BAAI/bge-small-en-v1.5")
+    # Backend de inferencia: torch (fp32), onnx u openvino. EMBEDDING_QUANTIZE aplica
+    # cuantización dinámica int8 (torch u onnx). Los modelos exportados se guardan
+    # en EMBEDDING_ARTIFACTS_DIR para no repetir la exportación.
+    EMBEDDING_BACKEND: str = os.getenv("EMBEDDING_BACKEND", "torch")
+    EMBEDDING_QUANTIZE: bool = os.getenv("EMBEDDING_QUANTIZE", "false").lower() == "true"
+    EMBEDDING_THREADS: int = int(os.getenv("EMBEDDING_THREADS", "0"))  # 0 = por defecto
+    EMBEDDING_INTEROP_THREADS: int = int(os.getenv("EMBEDDING_INTEROP_THREADS", "0"))
+    EMBEDDING_ARTIFACTS_DIR: str = os.getenv("EMBEDDING_ARTIFACTS_DIR", "./models")
     
     # Configuración de chunking
     MAX_CHUNK_SIZE: int = int(os.getenv("MAX_CHUNK_SIZE", "1000"))
     CHUNK_OVERLAP: int = int(os.getenv("CHUNK_OVERLAP", "200"))
+    # Chunking por tokens: objetivo y solapamiento en tokens. CHUNK_TOKENIZER puede ser
+    # "approximate" (longitud / 4) o el nombre de un tokenizador de Hugging Face.
+    CHUNK_TOKENS: int = int(os.getenv("CHUNK_TOKENS", "256"))
+    CHUNK_OVERLAP_TOKENS: int = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+    CHUNK_TOKENIZER: str = os.getenv("CHUNK_TOKENIZER", "approximate")
+    # Presupuesto de tokens para el contexto recuperado que se incluye en el prompt
+    CONTEXT_MAX_TOKENS: int = int(os.getenv("CONTEXT_MAX_TOKENS", "1500"))
     
+    # Configuración de ingesta en streaming
+    INGEST_BATCH_SIZE: int = int(os.getenv("INGEST_BATCH_SIZE", "64"))
+    INGEST_TEXT_BLOCK_CHARS: int = int(os.getenv("INGEST_TEXT_BLOCK_CHARS", "1048576"))
+    INGEST_PDF_WORKERS: int = int(os.getenv("INGEST_PDF_WORKERS", "0"))  # 0 o 1 = sin paralelismo
+    INGEST_PDF_PAGES_PER_TASK: int = int(os.getenv("INGEST_PDF_PAGES_PER_TASK", "16"))
+    # Ingesta en segundo plano: `upload` encola un trabajo que atiende un pool
+    # de INGEST_JOB_WORKERS hilos. El estado se guarda en SQLite (INGEST_JOBS_PATH;
+    # vacío = ingest_jobs.db dentro de CHROMA_PERSIST_DIRECTORY) y los trabajos
+    # pendientes se reanudan al arrancar
+    INGEST_JOBS_ENABLED: bool = os.getenv("INGEST_JOBS_ENABLED", "true").lower() == "true"
+    INGEST_JOB_WORKERS: int = int(os.getenv("INGEST_JOB_WORKERS", "1"))
+    INGEST_JOBS_PATH: str = os.getenv("INGEST_JOBS_PATH", "")
+
     # Configuración de documentos
     DOCUMENTS_DIR: str = os.getenv("DOCUMENTS_DIR", "./documents")
     ALLOWED_FILE_TYPES: str = os.getenv("ALLOWED_FILE_TYPES", "pdf,docx,txt")
@@ -45,11 +143,51 @@ class GlobalConfig(BaseSettings):
     # Configuración de memoria
     MEMORY_TYPE: str = os.getenv("MEMORY_TYPE", "in_memory")  # in_memory o persistent
     MEMORY_PERSIST_DIR: str = os.getenv("MEMORY_PERSIST_DIR", "./chat_memory")
+
+    # Configuración de calentamiento: al arrancar se ejecutan en segundo plano un
+    # embedding, una búsqueda y la construcción de un prompt; el chatbot pasa de
+    # INIT a READY al terminar. WARMUP_TIMEOUT es la espera máxima de la CLI.
+    WARMUP_ENABLED: bool = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+    WARMUP_TIMEOUT: float = float(os.getenv("WARMUP_TIMEOUT", "120"))
+
+    # Configuración de control de admisión: máximo de turnos en curso, cola de
+    # espera acotada con plazo (segundos) y token bucket por usuario
+    # (USER_RATE_LIMIT turnos/s sostenidos, 0 = sin límite; USER_RATE_BURST de ráfaga)
+    ADMISSION_ENABLED: bool = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+    ADMISSION_MAX_IN_FLIGHT: int = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "8"))
+    ADMISSION_QUEUE_SIZE: int = int(os.getenv("ADMISSION_QUEUE_SIZE", "32"))
+    ADMISSION_QUEUE_TIMEOUT: float = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "30"))
+    USER_RATE_LIMIT: float = float(os.getenv("USER_RATE_LIMIT", "0.5"))
+    USER_RATE_BURST: float = float(os.getenv("USER_RATE_BURST", "5"))
+
+    # Búsqueda y recorte del historial en paralelo en cada turno. Con un solo
+    # núcleo el paralelismo no compensa el relevo del GIL entre hilos
+    GRAPH_PARALLEL_ENABLED: bool = os.getenv("GRAPH_PARALLEL_ENABLED", "true").lower() == "true"
+
+    # Configuración de resumen de conversaciones largas
+    SUMMARY_ENABLED: bool = os.getenv("SUMMARY_ENABLED", "true").lower() == "true"
+    SUMMARY_ASYNC: bool = os.getenv("SUMMARY_ASYNC", "true").lower() == "true"
+    SUMMARY_TRIGGER_MESSAGES: int = int(os.getenv("SUMMARY_TRIGGER_MESSAGES", "20"))
+    SUMMARY_KEEP_MESSAGES: int = int(os.getenv("SUMMARY_KEEP_MESSAGES", "6"))
     
     # Configuración de logging
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
     LOG_FILE: str = os.getenv("LOG_FILE", "chatbot.log")
-    
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "text")  # text o json
+    LOG_QUEUE_SIZE: int = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+    # Máximo de registros por segundo para cada mensaje repetido bajo WARNING (0 = sin límite)
+    LOG_RATE_LIMIT: int = int(os.getenv("LOG_RATE_LIMIT", "50"))
+
+    # Configuración de métricas
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    METRICS_EXPORT_FILE: str = os.getenv("METRICS_EXPORT_FILE", "")
+
+    # Configuración de perfilado (CPU con cProfile y memoria con tracemalloc)
+    PROFILING_ENABLED: bool = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+    PROFILING_SAMPLE_RATE: float = float(os.getenv("PROFILING_SAMPLE_RATE", "1.0"))
+    PROFILING_OUTPUT_DIR: str = os.getenv("PROFILING_OUTPUT_DIR", "./profiles")
+    PROFILING_MEMORY: bool = os.getenv("PROFILING_MEMORY", "true").lower() == "true"
+
     model_config = ConfigDict(
         env_file=".env",
         env_file_encoding="utf-8"
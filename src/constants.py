@@ -31,6 +31,11 @@ MESSAGES = {
     "ERROR": "Error: {error}",
     "DOCUMENT_UPLOADED": "Documento {document} cargado exitosamente",
     "DOCUMENTS_CLEARED": "Documentos limpiados exitosamente",
+    "DOCUMENT_DELETED": "Documento {document} eliminado exitosamente",
+    "DOCUMENT_NOT_FOUND": "Documento {document} no encontrado",
+    "INGEST_JOB_QUEUED": "Documento {document} en cola de ingesta (trabajo {job_id})",
+    "INGEST_JOB_CANCELLED": "Trabajo {job_id} cancelado",
+    "INGEST_JOB_NOT_FOUND": "Trabajo {job_id} no encontrado o ya terminado",
     "USER_REGISTERED": "Usuario {} registrado exitosamente",
     "USER_NOT_FOUND": "Usuario {} no encontrado"
 }
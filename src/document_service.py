@@ -3,6 +3,7 @@
 from src.config import GlobalConfig as Config
 from .constants import MESSAGES
 from .rag.logging_config import logger
+from .profiling import profiler
 
 # =============================================================================
 # CAMBIO: Se importa el objeto 'config' para que esté disponible en todo el archivo.
@@ -13,23 +14,99 @@ from src.config import config
 class DocumentService:
     """
     Servicio para la gestión de documentos en el sistema RAG.
+
+    Con un IngestJobManager (`jobs`), `submit_document` encola la ingesta y
+    retorna al instante; `add_documents` sigue siendo síncrono.
     """
-    def __init__(self, rag_retriever):
+    def __init__(self, rag_retriever, jobs=None):
         self.rag_retriever = rag_retriever
+        self.jobs = jobs
 
-    def add_documents(self, documents):
+    @profiler.profile("add_documents")
+    def add_documents(self, documents, owner=None, tenant=None):
+        """
+        Agrega documentos. Con `owner` solo ese usuario (y su tenant) los verá
+        en la búsqueda; sin él son compartidos dentro del tenant.
+        """
         if not config.RAG_ENABLED:
             return "El sistema RAG no está habilitado"
         try:
             # Aquí asumimos que RAGRetriever se encarga de la lógica de carga de documentos
-            self.rag_retriever.add_documents(documents)
+            scope = {k: v for k, v in (("owner", owner), ("tenant", tenant)) if v is not None}
+            self.rag_retriever.add_documents(documents, **scope)
             # El mensaje de éxito debe ser genérico o basarse en la respuesta del retriever
-            return MESSAGES["DOCUMENT_UPLOADED"].format("los documentos solicitados")
+            return MESSAGES["DOCUMENT_UPLOADED"].format(document="los documentos solicitados")
+        except (FileNotFoundError, ValueError) as e:
+            logger.error("Error de archivo o valor agregando documentos: %s", e, exc_info=True)
+            return MESSAGES["ERROR"].format(error=str(e))
+        except Exception as e:
+            logger.error("Error inesperado agregando documentos: %s", e, exc_info=True)
+            return MESSAGES["ERROR"].format(error=str(e))
+
+    def add_document(self, document, owner=None, tenant=None):
+        """Agrega un único documento (ruta de archivo o Document)."""
+        return self.add_documents([document], owner=owner, tenant=tenant)
+
+    def submit_document(self, path, owner=None, tenant=None):
+        """
+        Encola la ingesta de un archivo en segundo plano. Retorna el mensaje
+        con el id del trabajo; sin cola de trabajos, lo ingiere en el momento.
+        """
+        if not config.RAG_ENABLED:
+            return "El sistema RAG no está habilitado"
+        if self.jobs is None:
+            return self.add_document(path, owner=owner, tenant=tenant)
+        try:
+            job_id = self.jobs.submit(path, owner=owner, tenant=tenant)
+            return MESSAGES["INGEST_JOB_QUEUED"].format(document=path, job_id=job_id)
         except (FileNotFoundError, ValueError) as e:
-            logger.error(f"Error de archivo o valor agregando documentos: {str(e)}", exc_info=True)
+            logger.error("Error de archivo o valor encolando %s: %s", path, e)
             return MESSAGES["ERROR"].format(error=str(e))
+
+    def job_status(self, job_id):
+        """Estado de un trabajo de ingesta (None si no existe)."""
+        return self.jobs.status(job_id) if self.jobs else None
+
+    def list_jobs(self, limit=20):
+        return self.jobs.list_jobs(limit) if self.jobs else []
+
+    def cancel_job(self, job_id):
+        if self.jobs is None or not self.jobs.cancel(job_id):
+            return MESSAGES["INGEST_JOB_NOT_FOUND"].format(job_id=job_id)
+        return MESSAGES["INGEST_JOB_CANCELLED"].format(job_id=job_id)
+
+    def list_documents(self, owner=None, tenant=None, limit=None, offset=0, include_shared=False):
+        """
+        Retorna los documentos cargados (source, owner, tenant, chunk_count,
+        bytes, tokens, ingested), leídos del catálogo. Con `include_shared` se
+        añaden los compartidos del tenant a los de `owner`.
+        """
+        if not config.RAG_ENABLED:
+            return []
+        return self.rag_retriever.list_documents(owner=owner, tenant=tenant, limit=limit, offset=offset,
+                                                 include_shared=include_shared)
+
+    def list_visible_documents(self, owner=None, tenant=None):
+        """
+        Documentos que ve un usuario: los suyos y los compartidos de su tenant.
+        Sin usuario (conversación temporal), los compartidos del tenant por defecto.
+        """
+        return self.list_documents(owner=owner or "", tenant=tenant or config.DEFAULT_TENANT, include_shared=True)
+
+    def delete_document(self, source, owner=None, tenant=None):
+        """
+        Elimina un documento y sus chunks del sistema RAG. Solo se borra el
+        documento del propietario y tenant indicados (sin ellos, el compartido
+        del tenant por defecto), no las copias de otros usuarios.
+        """
+        if not config.RAG_ENABLED:
+            return "El sistema RAG no está habilitado"
+        try:
+            if not self.rag_retriever.delete_document(source, owner=owner, tenant=tenant):
+                return MESSAGES["DOCUMENT_NOT_FOUND"].format(document=source)
+            return MESSAGES["DOCUMENT_DELETED"].format(document=source)
         except Exception as e:
-            logger.error(f"Error inesperado agregando documentos: {str(e)}", exc_info=True)
+            logger.error("Error eliminando el documento %s: %s", source, e, exc_info=True)
             return MESSAGES["ERROR"].format(error=str(e))
 
     def clear_documents(self):
@@ -39,8 +116,8 @@ class DocumentService:
             self.rag_retriever.clear_documents()
             return MESSAGES["DOCUMENTS_CLEARED"]
         except RuntimeError as e:
-            logger.error(f"Error de ejecución limpiando documentos: {str(e)}", exc_info=True)
+            logger.error("Error de ejecución limpiando documentos: %s", e, exc_info=True)
             return MESSAGES["ERROR"].format(error=str(e))
         except Exception as e:
-            logger.error(f"Error inesperado limpiando documentos: {str(e)}", exc_info=True)
+            logger.error("Error inesperado limpiando documentos: %s", e, exc_info=True)
             return MESSAGES["ERROR"].format(error=str(e))
\ No newline at end of file
@@ -0,0 +1,342 @@
+# src/ingest_jobs.py
+
+import os
+import math
+import time
+import uuid
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from .rag.logging_config import logger
+from .metrics import metrics
+
+JOB_STATES = ("queued", "running", "done", "failed", "cancelled")
+FINAL_STATES = ("done", "failed", "cancelled")
+
+_JOB_COLUMNS = ("id", "path", "owner", "tenant", "state", "chunks_done", "chunks_added", "chunks_total",
+                "estimated", "resumed_from", "error", "cancel_requested", "created", "started", "finished",
+                "new_document")
+
+
+class IngestCancelled(Exception):
+    """Se lanza desde el callback de progreso para detener una ingesta cancelada."""
+
+
+def estimate_chunks(path: str, chunk_tokens: int, overlap_tokens: int) -> Optional[int]:
+    """
+    Estimación del número de chunks de un archivo de texto a partir de su
+    tamaño (unos 4 caracteres por token). Para otros formatos el total solo se
+    conoce al terminar.
+    """
+    if os.path.splitext(path)[1].lower() not in (".txt", ".md"):
+        return None
+    per_chunk = max(1, (chunk_tokens - overlap_tokens) * 4)
+    return max(1, math.ceil(os.path.getsize(path) / per_chunk))
+
+
+class IngestJobStore:
+    """
+    Estado de los trabajos de ingesta, persistido en SQLite (modo WAL).
+
+    Guarda el progreso de cada trabajo tras cada lote, de modo que tras un
+    reinicio los trabajos pendientes se reanudan desde el último lote insertado.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, path TEXT NOT NULL, owner TEXT, tenant TEXT, state TEXT NOT NULL, "
+            "chunks_done INTEGER NOT NULL DEFAULT 0, chunks_added INTEGER NOT NULL DEFAULT 0, "
+            "chunks_total INTEGER, estimated INTEGER NOT NULL DEFAULT 0, "
+            "resumed_from INTEGER NOT NULL DEFAULT 0, error TEXT, "
+            "cancel_requested INTEGER NOT NULL DEFAULT 0, created REAL NOT NULL, started REAL, finished REAL, "
+            "new_document INTEGER NOT NULL DEFAULT 0)"
+        )
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(jobs)")}
+        if "new_document" not in columns:
+            self.conn.execute("ALTER TABLE jobs ADD COLUMN new_document INTEGER NOT NULL DEFAULT 0")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs (state, created)")
+
+    @contextmanager
+    def _transaction(self):
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def create(self, path: str, owner: Optional[str], tenant: Optional[str],
+               chunks_total: Optional[int] = None, new_document: bool = False) -> str:
+        """`new_document` indica que el documento no estaba cargado al encolar el trabajo."""
+        job_id = uuid.uuid4().hex[:12]
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, path, owner, tenant, state, chunks_total, estimated, created, new_document) "
+                "VALUES (?, ?, ?, ?, 'queued', ?, ?, ?, ?)",
+                (job_id, path, owner, tenant, chunks_total, int(chunks_total is not None), time.time(),
+                 int(new_document))
+            )
+        return job_id
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._transaction() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def transition(self, job_id: str, from_state: str, to_state: str, **fields: Any) -> bool:
+        """Cambia el estado solo si el trabajo sigue en `from_state`. Retorna si se cambió."""
+        fields = {"state": to_state, **fields}
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._transaction() as conn:
+            cursor = conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ? AND state = ?",
+                                  (*fields.values(), job_id, from_state))
+        return cursor.rowcount == 1
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            row = self.conn.execute(f"SELECT {', '.join(_JOB_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(zip(_JOB_COLUMNS, row)) if row else None
+
+    def list(self, limit: int = 20, states: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Trabajos más recientes primero (o los de `states`, más antiguos primero)."""
+        query = f"SELECT {', '.join(_JOB_COLUMNS)} FROM jobs"
+        params: List[Any] = []
+        if states:
+            query += f" WHERE state IN ({', '.join('?' for _ in states)}) ORDER BY created"
+            params.extend(states)
+        else:
+            query += " ORDER BY created DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+        return [dict(zip(_JOB_COLUMNS, row)) for row in rows]
+
+    def recover(self) -> List[str]:
+        """
+        Devuelve a la cola los trabajos que quedaron en curso (el proceso se
+        detuvo a mitad) y retorna los ids pendientes en orden de llegada. Los
+        que tenían la cancelación pedida también vuelven a la cola: el worker
+        los cancela y retira lo que llegaron a ingerir.
+        """
+        with self._transaction() as conn:
+            conn.execute("UPDATE jobs SET state = 'queued' WHERE state = 'running'")
+        return [job["id"] for job in self.list(limit=None, states=["queued"])]
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
+
+
+class IngestJobManager:
+    """
+    Cola de trabajos de ingesta atendida por un pool acotado de hilos.
+
+    `submit` valida el archivo, registra el trabajo y retorna su id al
+    instante; un worker llama a `RAGRetriever.ingest_file` con un callback que
+    guarda el progreso tras cada lote y detiene la ingesta si el trabajo se
+    cancela. Si un trabajo cancelado o fallido cargaba un documento nuevo, sus
+    chunks ya insertados se eliminan con `delete_document`, para que la
+    búsqueda y `list_docs` no muestren un documento a medias; si el documento
+    ya existía (una nueva subida de la misma ruta) se conserva lo insertado.
+    Al arrancar se reanudan los trabajos pendientes, saltando los chunks que
+    ya se habían insertado.
+    """
+    def __init__(self, retriever, store: IngestJobStore, workers: int = 1,
+                 chunk_tokens: int = 256, overlap_tokens: int = 32):
+        self.retriever = retriever
+        self.store = store
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._cancelled = set()
+        self._changed = threading.Condition()
+        for job_id in store.recover():
+            logger.info("Trabajo de ingesta %s pendiente: se reanuda", job_id)
+            self._queue.put(job_id)
+        self._update_gauge()
+        self._threads = [
+            threading.Thread(target=self._work, name=f"ingest-{i}", daemon=True) for i in range(max(1, workers))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    @classmethod
+    def from_config(cls, config, retriever) -> "IngestJobManager":
+        path = config.INGEST_JOBS_PATH or os.path.join(config.CHROMA_PERSIST_DIRECTORY, "ingest_jobs.db")
+        return cls(retriever, IngestJobStore(path), workers=config.INGEST_JOB_WORKERS,
+                   chunk_tokens=config.CHUNK_TOKENS, overlap_tokens=config.CHUNK_OVERLAP_TOKENS)
+
+    def submit(self, path: str, owner: Optional[str] = None, tenant: Optional[str] = None) -> str:
+        """
+        Encola la ingesta de un archivo y retorna el id del trabajo.
+
+        Raises:
+            FileNotFoundError, ValueError: Si el archivo no existe o no es de un tipo soportado.
+        """
+        self.retriever.document_loader.validate_path(path)
+        job_id = self.store.create(path, owner, tenant,
+                                   estimate_chunks(path, self.chunk_tokens, self.overlap_tokens),
+                                   new_document=not self.retriever.has_document(path, owner, tenant))
+        self._queue.put(job_id)
+        self._update_gauge()
+        logger.info("Trabajo de ingesta %s en cola: %s", job_id, path)
+        return job_id
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Estado del trabajo con su progreso (0-1) y ritmo en chunks/s."""
+        job = self.store.get(job_id)
+        return self._describe(job) if job else None
+
+    def list_jobs(self, limit: int = 20) -> List[Dict[str, Any]]:
+        return [self._describe(job) for job in self.store.list(limit=limit)]
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancela un trabajo en cola o en curso; uno en curso se detiene al
+        terminar el lote actual. Si el trabajo cargaba un documento nuevo, lo
+        que llegó a insertar se elimina (ver la clase). Retorna False si no
+        existe o ya terminó.
+        """
+        job = self.store.get(job_id)
+        if job is None or job["state"] in FINAL_STATES:
+            return False
+        with self._changed:
+            self._cancelled.add(job_id)
+        self.store.update(job_id, cancel_requested=1)
+        # Si un worker ya lo tomó, se detiene en el callback de progreso.
+        if self.store.transition(job_id, "queued", "cancelled", finished=time.time()):
+            # Un trabajo reanudado puede haber insertado lotes antes del reinicio.
+            if job["chunks_done"]:
+                self._discard_partial(job)
+            self._finished(job_id, "cancelled")
+        return True
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Bloquea hasta que el trabajo termina (o vence `timeout`) y retorna su estado."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._changed:
+            while True:
+                job = self.status(job_id)
+                if job is None or job["state"] in FINAL_STATES:
+                    return job
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return job
+                self._changed.wait(remaining)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Detiene los workers; los trabajos en cola se reanudan en el próximo arranque."""
+        for _ in self._threads:
+            self._queue.put(None)
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def _describe(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        job = dict(job)
+        total = job["chunks_total"]
+        job["progress"] = 1.0 if job["state"] == "done" else (
+            min(job["chunks_done"] / total, 1.0) if total else None)
+        end = job["finished"] or time.time()
+        elapsed = end - job["started"] if job["started"] else 0.0
+        job["throughput"] = (job["chunks_done"] - job["resumed_from"]) / elapsed if elapsed > 0 else 0.0
+        return job
+
+    def _work(self) -> None:
+        while True:
+            job_id = self._queue.get()
+            if job_id is None:
+                return
+            try:
+                self._run(job_id)
+            except Exception as e:
+                logger.error("Error inesperado en el trabajo de ingesta %s: %s", job_id, e, exc_info=True)
+            finally:
+                self._update_gauge()
+
+    def _run(self, job_id: str) -> None:
+        job = self.store.get(job_id)
+        if job is None:
+            return
+        skip = job["chunks_done"]
+        if job["cancel_requested"]:
+            # Cancelado mientras el proceso estaba detenido.
+            if self.store.transition(job_id, "queued", "cancelled", finished=time.time()):
+                self._discard_partial(job)
+                self._finished(job_id, "cancelled")
+            return
+        if not self.store.transition(job_id, "queued", "running", started=time.time(), resumed_from=skip):
+            return
+        self._notify()
+        estimated_total = job["chunks_total"] if job["estimated"] else None
+
+        def progress(processed: int, added: int) -> None:
+            fields: Dict[str, Any] = {"chunks_done": processed, "chunks_added": job["chunks_added"] + added}
+            if estimated_total is not None and processed > estimated_total:
+                fields["chunks_total"] = processed
+            self.store.update(job_id, **fields)
+            self._notify()
+            with self._changed:
+                if job_id in self._cancelled:
+                    raise IngestCancelled(job_id)
+
+        try:
+            with metrics.span("ingest_job"):
+                self.retriever.ingest_file(job["path"], owner=job["owner"], tenant=job["tenant"],
+                                           skip=skip, progress=progress)
+        except IngestCancelled:
+            logger.info("Trabajo de ingesta %s cancelado", job_id)
+            self._discard_partial(job)
+            self._finish(job_id, "cancelled")
+            return
+        except Exception as e:
+            logger.error("Trabajo de ingesta %s fallido: %s", job_id, e, exc_info=True)
+            self._discard_partial(job)
+            self._finish(job_id, "failed", error=str(e))
+            return
+        done = self.store.get(job_id)["chunks_done"]
+        self._finish(job_id, "done", chunks_total=done, estimated=0)
+
+    def _discard_partial(self, job: Dict[str, Any]) -> None:
+        """Elimina lo que insertó un trabajo que no terminó, si el documento era nuevo."""
+        if not job["new_document"]:
+            return
+        try:
+            removed = self.retriever.delete_document(job["path"], job["owner"], job["tenant"])
+            if removed:
+                logger.info("Trabajo de ingesta %s: eliminados %s chunks del documento parcial", job["id"], removed)
+        except Exception as e:
+            logger.error("No se pudo retirar el documento parcial del trabajo %s: %s", job["id"], e, exc_info=True)
+
+    def _finish(self, job_id: str, state: str, **fields: Any) -> None:
+        self.store.transition(job_id, "running", state, finished=time.time(), **fields)
+        self._finished(job_id, state)
+
+    def _finished(self, job_id: str, state: str) -> None:
+        with self._changed:
+            self._cancelled.discard(job_id)
+        metrics.inc("chatbot_ingest_jobs_total", state=state)
+        self._notify()
+
+    def _notify(self) -> None:
+        with self._changed:
+            self._changed.notify_all()
+
+    def _update_gauge(self) -> None:
+        metrics.set_gauge("chatbot_ingest_jobs_queued", self._queue.qsize())
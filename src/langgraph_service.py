@@ -1,79 +1,283 @@
 # src/langgraph_service.py
 
-from langchain_core.messages import HumanMessage
-# =============================================================================
-# CAMBIO: Se importa ChatAnthropic desde 'langchain_community' para eliminar la advertencia.
-# =============================================================================
-from langchain_community.chat_models import ChatAnthropic
-from langgraph.graph import StateGraph, END
+from typing import Annotated, Callable, List, Optional, Tuple, TypedDict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage, HumanMessage, RemoveMessage
+# ChatAnthropic de langchain_anthropic usa la API de Messages, que admite bloques
+# con cache_control y reporta los tokens leídos/escritos en la caché de prompts.
+from langchain_anthropic import ChatAnthropic
+from langgraph.graph import StateGraph, START, END
+from langgraph.graph.message import add_messages
+from langgraph.channels.ephemeral_value import EphemeralValue
 from langgraph.checkpoint.memory import MemorySaver
-from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.messages import trim_messages
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables import RunnableConfig
 from .constants import MESSAGES
 from src.config import config
 from .rag.logging_config import logger
+from .metrics import metrics
+from .summarizer import ConversationSummarizer
+from .prompt_builder import PromptBuilder
+from .rag.retriever import scope_filter
+from .model_router import ModelRouter
+import time
+
+
+class ConversationState(TypedDict, total=False):
+    """
+    Estado de cada hilo de conversación.
+
+    `messages` acumula los turnos (add_messages agrega y permite eliminar por id)
+    y `summary` guarda el resumen de los turnos ya plegados. El resto son
+    valores intermedios del turno que pasan de los nodos retrieve e history al
+    nodo generate: los documentos recuperados (`context`) y el historial
+    recortado (`trimmed`). Son efímeros, se vacían en el paso siguiente y no
+    llegan a ningún checkpoint, de modo que el estado guardado solo crece con
+    el diálogo.
+    """
+    messages: Annotated[list, add_messages]
+    summary: str
+    context: Annotated[List[Document], EphemeralValue(list)]
+    trimmed: Annotated[list, EphemeralValue(list)]
+
+
+class TimedMemorySaver(MemorySaver):
+    """
+    MemorySaver que registra la duración de las lecturas y escrituras de checkpoints.
+    """
+    def get_tuple(self, config):
+        with metrics.span("checkpoint_read"):
+            return super().get_tuple(config)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        with metrics.span("checkpoint_write"):
+            return super().put(config, checkpoint, metadata, new_versions)
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        with metrics.span("checkpoint_write"):
+            return super().put_writes(config, writes, task_id, task_path)
+
+
+class LLMTimingCallback(BaseCallbackHandler):
+    """
+    Callback que mide el tiempo hasta el primer token de una llamada al LLM.
+    Solo se dispara cuando el modelo se invoca en modo streaming.
+    """
+    def __init__(self, **labels):
+        self.start = time.perf_counter()
+        self.first_token_at = None
+        self.labels = labels
+
+    def on_llm_new_token(self, token, **kwargs):
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+            metrics.record_stage("llm_ttft", self.first_token_at - self.start, **self.labels)
+
+
+def record_token_usage(response) -> None:
+    """
+    Registra en las métricas el uso de tokens reportado por el LLM, incluidos
+    los tokens leídos de (cache_read) y escritos en (cache_write) la caché de prompts.
+    """
+    usage = getattr(response, "usage_metadata", None)
+    if not isinstance(usage, dict):
+        return
+    for kind in ("input_tokens", "output_tokens"):
+        if usage.get(kind):
+            metrics.inc("chatbot_llm_tokens_total", usage[kind], type=kind[:-len("_tokens")])
+    details = usage.get("input_token_details") or {}
+    if details.get("cache_read"):
+        metrics.inc("chatbot_llm_tokens_total", details["cache_read"], type="cache_read")
+    if details.get("cache_creation"):
+        metrics.inc("chatbot_llm_tokens_total", details["cache_creation"], type="cache_write")
 
 class LangGraphService:
     """
     Servicio que encapsula la configuración y ejecución de LangGraph.
     """
-    def __init__(self, api_key, model, chat_history, retriever):
+    def __init__(self, api_key, model, chat_history, retriever,
+                 owner_resolver: Optional[Callable[[str], Optional[Tuple[str, Optional[str]]]]] = None,
+                 router: Optional[ModelRouter] = None):
         self.api_key = api_key
         self.model = model
+        # Con un router cada turno elige el modelo rápido o el grande; sin él
+        # todos los turnos van a `model`.
+        self.router = router
+        self._tier_llms = {}
         self.chat_history = chat_history
         self.retriever = retriever
+        # Resuelve historial_id -> (usuario, tenant) para limitar la búsqueda a
+        # los documentos visibles por ese usuario.
+        self.owner_resolver = owner_resolver
+        self.scoping_enabled = config.RAG_SCOPING_ENABLED
+        self.parallel_nodes = config.GRAPH_PARALLEL_ENABLED
+        self.summary_enabled = config.SUMMARY_ENABLED
+        self.summary_async = config.SUMMARY_ASYNC
+        self._summary_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="summary")
+        self._compacting = set()
+        self._compacting_lock = Lock()
         self._setup_langgraph()
 
     def _setup_langgraph(self):
         try:
-            self.llm = ChatAnthropic(
-                anthropic_api_key=self.api_key,
-                model_name=self.model,
-                max_tokens=512
+            self.llm = self._create_llm(self.model, config.LLM_MAX_TOKENS)
+            # Los clientes de cada nivel se crean aquí y no en su primer turno,
+            # para que el calentamiento también los prepare.
+            for tier in (self.router.tiers if self.router is not None else ()):
+                self._llm_for(tier)
+            self.prompt_builder = PromptBuilder(
+                cache_enabled=config.PROMPT_CACHE_ENABLED,
+                context_max_tokens=config.CONTEXT_MAX_TOKENS
+            )
+            self.summarizer = ConversationSummarizer(
+                self.llm,
+                trigger_messages=config.SUMMARY_TRIGGER_MESSAGES,
+                keep_messages=config.SUMMARY_KEEP_MESSAGES
             )
-            self.prompt_template = ChatPromptTemplate.from_messages([
-                ("system", """Eres un asistente amigable y servicial. Responde de manera concisa y clara. Si hay contexto relevante, úsalo para dar respuestas más precisas, de lo contrario, responde con tu conocimiento general.""")
-            ])
+            # El conteo aproximado es local: contar con el LLM supondría una
+            # llamada a la API por cada iteración del recorte.
             self.trimmer = trim_messages(
-                max_tokens=1000, strategy="last", token_counter=self.llm,
-                include_system=True, allow_partial=False
+                max_tokens=1000, strategy="last", token_counter=count_tokens_approximately,
+                include_system=True, allow_partial=False, start_on="human"
             )
             
-            workflow = StateGraph(dict)
-
-            def call_model(state: dict):
-                messages = state.get("messages", [])
-                
-                # Lógica RAG (si está habilitado y hay un retriever)
-                if self.retriever and messages:
-                    query = messages[-1].content
-                    context_docs = self.retriever.invoke(query)
-                    if context_docs:
-                        context_str = "\n".join([doc.page_content for doc in context_docs])
-                        context_msg = f"Contexto relevante:\n{context_str}"
-                        # Insertamos el contexto al principio, después del mensaje de sistema si existe
-                        messages.insert(-1, HumanMessage(content=context_msg))
-
-                trimmed_messages = self.trimmer.invoke(messages)
-                prompt = self.prompt_template.invoke({"messages": trimmed_messages})
-                response = self.llm.invoke(prompt)
-                
-                return {"messages": [response]} # Solo devolvemos la nueva respuesta
-
-            workflow.add_node("model", call_model)
-            workflow.set_entry_point("model")
-            workflow.set_finish_point("model")
-
-            self.memory = MemorySaver()
+            # Grafo de cada turno:
+            #
+            #   START ─┬─ retrieve ─┬─ generate ── END
+            #          └─ history ──┘
+            #
+            # La búsqueda (embedding de la consulta y consulta al índice) y el
+            # recorte del historial son independientes y se ejecutan en paralelo
+            # en el mismo paso; generate espera a ambos. Con
+            # GRAPH_PARALLEL_ENABLED=false se encadenan history -> retrieve ->
+            # generate, y retrieve reenvía el historial recortado (los canales
+            # efímeros solo duran un paso). retrieve se omite si no hay
+            # retriever o el llamador ya aporta el contexto. Montar el prompt y
+            # elegir el modelo se hace al inicio de generate y no en un nodo
+            # propio: cada paso del grafo añade el coste de actualizar los
+            # canales del estado, mayor que el de montar el prompt.
+            workflow = StateGraph(ConversationState)
+            workflow.add_node("retrieve", self._timed_node("retrieve", self._retrieve))
+            workflow.add_node("history", self._timed_node("history", self._history))
+            workflow.add_node("generate", self._timed_node("generate", self._generate))
+            if self.parallel_nodes:
+                workflow.add_conditional_edges(START, self._start_nodes, ["retrieve", "history"])
+                workflow.add_edge("history", "generate")
+            else:
+                workflow.add_edge(START, "history")
+                workflow.add_conditional_edges("history", self._after_history, ["retrieve", "generate"])
+            workflow.add_edge("retrieve", "generate")
+            workflow.add_edge("generate", END)
+
+            self.memory = TimedMemorySaver()
             self.app = workflow.compile(checkpointer=self.memory)
         except Exception as e:
-            logger.error(f"Error inesperado configurando LangChain: {str(e)}", exc_info=True)
+            logger.error("Error inesperado configurando LangChain: %s", e, exc_info=True)
             raise
 
-    def send_message(self, message: str, historial_id: str = "default"):
+    @staticmethod
+    def _timed_node(name: str, node: Callable) -> Callable:
+        """Envuelve un nodo del grafo para registrar su duración en la etapa `node`."""
+        def timed(state: ConversationState, config: RunnableConfig):
+            with metrics.span("node", node=name):
+                return node(state, config)
+        return timed
+
+    def _needs_search(self, state: ConversationState, config: RunnableConfig) -> bool:
+        # Contexto ya recuperado por el llamador (p. ej. el modo batch, que
+        # agrupa embeddings y búsquedas de muchas preguntas).
+        provided = config.get("configurable", {}).get("context_docs") is not None
+        return self.retriever is not None and bool(state.get("messages")) and not provided
+
+    def _start_nodes(self, state: ConversationState, config: RunnableConfig) -> List[str]:
+        """Nodos del primer paso en modo paralelo: history y, si hay que buscar, retrieve."""
+        return ["retrieve", "history"] if self._needs_search(state, config) else ["history"]
+
+    def _after_history(self, state: ConversationState, config: RunnableConfig) -> str:
+        """Siguiente nodo tras history en modo secuencial."""
+        return "retrieve" if self._needs_search(state, config) else "generate"
+
+    def _retrieve(self, state: ConversationState, config: RunnableConfig):
+        query = state["messages"][-1].content
+        search_kwargs = {}
+        scope = config.get("configurable", {}).get("scope")
+        if scope is not None:
+            # El filtro se aplica dentro de la búsqueda: nunca se
+            # recuperan chunks de otros usuarios o tenants.
+            search_kwargs["filter"] = scope_filter(*scope)
+        with metrics.span("search"):
+            context_docs = self.retriever.invoke(query, **search_kwargs)
+        if self.parallel_nodes:
+            return {"context": context_docs or []}
+        return {"context": context_docs or [], "trimmed": state.get("trimmed", [])}
+
+    def _history(self, state: ConversationState, config: RunnableConfig):
+        with metrics.span("trim"):
+            return {"trimmed": self.trimmer.invoke(state.get("messages", []))}
+
+    def _generate(self, state: ConversationState, config: RunnableConfig):
+        messages = state.get("messages", [])
+        context_docs = state.get("context") or config.get("configurable", {}).get("context_docs") or []
+        with metrics.span("prompt"):
+            # El contexto se añade a la pregunta del prompt, no a los mensajes del hilo.
+            prompt = self.prompt_builder.build(
+                state.get("trimmed", []), summary=state.get("summary"), context_docs=context_docs
+            )
+        llm, labels = self.llm, {}
+        if self.router is not None and messages:
+            with metrics.span("route"):
+                decision = self.router.route(messages[-1].content, context_docs, len(messages))
+            llm, labels = self._llm_for(decision.tier), {"tier": decision.tier.name}
+        with metrics.span("llm_total", **labels):
+            response = llm.invoke(prompt, config={"callbacks": [LLMTimingCallback(**labels)]})
+        record_token_usage(response)
+        return {"messages": [response]}  # Solo devolvemos la nueva respuesta
+
+    def _create_llm(self, model: str, max_tokens: int):
+        return ChatAnthropic(
+            anthropic_api_key=self.api_key,
+            model=model,
+            max_tokens=max_tokens,
+            # En streaming los callbacks reciben cada token, lo que permite
+            # medir el tiempo hasta el primer token; invoke sigue devolviendo
+            # el mensaje completo.
+            streaming=True
+        )
+
+    def replace_llm(self, llm) -> None:
+        """
+        Usa `llm` para todas las llamadas: el modelo por defecto, cada nivel del
+        enrutado y el resumen (p. ej. el LLM simulado de las pruebas de carga).
+        """
+        self.llm = llm
+        self.summarizer.llm = llm
+        # Los clientes de los niveles ya existen: se crean al configurar el grafo.
+        for name in self._tier_llms:
+            self._tier_llms[name] = llm
+
+    def llm_clients(self) -> List[ChatAnthropic]:
+        """El LLM por defecto y el de cada nivel de modelo del enrutado."""
+        return [self.llm, *self._tier_llms.values()]
+
+    def _llm_for(self, tier):
+        """Cliente del nivel de modelo, creado la primera vez que se usa."""
+        llm = self._tier_llms.get(tier.name)
+        if llm is None:
+            llm = self._tier_llms.setdefault(tier.name, self._create_llm(tier.model, tier.max_tokens))
+        return llm
+
+    def send_message(self, message: str, historial_id: str = "default",
+                     context_docs: Optional[List[Document]] = None):
         """
         Envía un mensaje al chatbot y retorna la respuesta.
         Ahora usa un diccionario 'configurable' para la memoria.
+
+        Si se pasa `context_docs`, se usan como contexto en lugar de buscar en
+        el retriever.
         """
         try:
             # =============================================================================
@@ -81,20 +285,105 @@ class LangGraphService:
             # la memoria por conversación. Usamos tu sugerencia 'historial_id'.
             # Esto soluciona el error "Checkpointer requires...".
             # =============================================================================
-            config = {"configurable": {"thread_id": historial_id}}
+            config = {"configurable": {"thread_id": historial_id, "scope": self.resolve_scope(historial_id),
+                                       "context_docs": context_docs}}
             state = {"messages": [HumanMessage(content=message)]}
             
-            response_stream = self.app.stream(state, config=config)
-            final_response = None
-            for chunk in response_stream:
-                if "model" in chunk:
-                    final_response = chunk["model"]["messages"][-1]
+            with metrics.span("turn"):
+                # Solo se guarda el checkpoint final del turno: los intermedios
+                # contendrían el contexto recuperado.
+                response_stream = self.app.stream(state, config=config, checkpoint_during=False)
+                final_response = None
+                for chunk in response_stream:
+                    if "generate" in chunk:
+                        final_response = chunk["generate"]["messages"][-1]
+            metrics.inc("chatbot_turns_total")
+            if final_response and self.summary_enabled:
+                self._schedule_compaction(historial_id)
 
             return final_response.content if final_response else "No se pudo obtener una respuesta."
 
         except (ValueError, RuntimeError) as e:
-            logger.error(f"Error de valor o ejecución procesando mensaje: {str(e)}", exc_info=True)
+            logger.error("Error de valor o ejecución procesando mensaje: %s", e, exc_info=True)
+            return MESSAGES["ERROR"].format(error=str(e))
+        except Exception as e:
+            logger.error("Error inesperado procesando mensaje: %s", e, exc_info=True)
             return MESSAGES["ERROR"].format(error=str(e))
+
+    def restore_history(self, historial_id: str, turns: List[Tuple[str, str]]) -> bool:
+        """
+        Carga en un hilo vacío los turnos (pregunta, respuesta) de una
+        conversación anterior, como si se hubieran respondido en este proceso.
+        Retorna False si el hilo ya tenía mensajes (no se toca).
+        """
+        thread_config = {"configurable": {"thread_id": historial_id}}
+        if not turns or self.app.get_state(thread_config).values.get("messages"):
+            return False
+        messages = []
+        for question, answer in turns:
+            messages += [HumanMessage(content=question), AIMessage(content=answer)]
+        self.app.update_state(thread_config, {"messages": messages}, as_node="generate")
+        if self.summary_enabled:
+            self._schedule_compaction(historial_id)
+        return True
+
+    def resolve_scope(self, historial_id: Optional[str]) -> Optional[Tuple[Optional[str], Optional[str]]]:
+        """
+        Retorna (usuario, tenant) para filtrar la búsqueda, o None si no se filtra.
+
+        Sin resolver de propietarios no hay aislamiento. Con él, un historial sin
+        dueño registrado (conversación temporal) solo ve los documentos
+        compartidos del tenant por defecto.
+        """
+        if not self.scoping_enabled or self.owner_resolver is None:
+            return None
+        owner = self.owner_resolver(historial_id) if historial_id else None
+        return owner if owner else (None, None)
+
+    def _schedule_compaction(self, historial_id: str) -> None:
+        """
+        Lanza la compactación del hilo tras la respuesta, en segundo plano si
+        SUMMARY_ASYNC está activo. Nunca hay dos compactaciones del mismo hilo a la vez.
+        """
+        with self._compacting_lock:
+            if historial_id in self._compacting:
+                return
+            self._compacting.add(historial_id)
+        if self.summary_async:
+            self._summary_executor.submit(self.compact_history, historial_id)
+        else:
+            self.compact_history(historial_id)
+
+    def compact_history(self, historial_id: str) -> bool:
+        """
+        Pliega los turnos antiguos del hilo en su resumen acumulativo.
+
+        Returns:
+            True si el hilo se compactó, False si no superaba el umbral.
+        """
+        thread_config = {"configurable": {"thread_id": historial_id}}
+        try:
+            values = self.app.get_state(thread_config).values
+            messages = values.get("messages", [])
+            if not self.summarizer.should_compact(messages):
+                return False
+            to_fold, _ = self.summarizer.split(messages)
+            if not to_fold:
+                return False
+            with metrics.span("summarize"):
+                summary = self.summarizer.summarize(values.get("summary", ""), to_fold)
+            # RemoveMessage elimina por id, así que los turnos que hayan llegado
+            # mientras se resumía se conservan.
+            self.app.update_state(
+                thread_config,
+                {"summary": summary, "messages": [RemoveMessage(id=msg.id) for msg in to_fold]},
+                as_node="generate"
+            )
+            logger.info("Hilo %s compactado: %s mensajes plegados en el resumen", historial_id, len(to_fold))
+            return True
         except Exception as e:
-            logger.error(f"Error inesperado procesando mensaje: {str(e)}", exc_info=True)
-            return MESSAGES["ERROR"].format(error=str(e))
\ No newline at end of file
+            logger.error("Error compactando el historial %s: %s", historial_id, e, exc_info=True)
+            return False
+        finally:
+            with self._compacting_lock:
+                self._compacting.discard(historial_id)
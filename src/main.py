@@ -7,8 +7,10 @@ from src.chatbot import Chatbot
 from src.rag.document_loader import DocumentLoader
 import re
 import json
+import time
 from src.user_manager import GestorUsuarios
 from src.services import ServiceContainer
+from src.metrics import metrics
 
 
 class ChatSession:
@@ -23,12 +25,24 @@ class ChatSession:
         self.historial = []
 
 
+def _ambito(gestor, session):
+    """(owner, tenant) de la sesión: los del usuario activo o (None, None) en una conversación temporal."""
+    propietario = gestor.obtener_propietario(session.user_id) if session.user_id else None
+    return propietario if propietario else (None, None)
+
+
 def main():
     services = ServiceContainer()
     gestor = services.user_manager
     chatbot = services.chatbot
     document_loader = services.document_service
     session = ChatSession()
+
+    # No se aceptan mensajes hasta que termina el calentamiento, para que la
+    # primera consulta tenga la misma latencia que las siguientes.
+    print("Preparando el chatbot...")
+    if not chatbot.wait_until_ready(services.config.WARMUP_TIMEOUT):
+        print(f"Aviso: el calentamiento no terminó correctamente (estado: {chatbot.state_description})")
     
     print("Bienvenido al chatbot!")
     print("Comandos disponibles:")
@@ -36,9 +50,13 @@ def main():
     print("  - usuarios: Ver lista de usuarios registrados")
     print("  - historial <nombre>: Cambiar a la conversación de un usuario")
     print("  - new: Iniciar una conversación temporal")
-    print("  - upload <archivo>: Subir un documento")
+    print("  - upload <archivo>: Subir un documento (se ingiere en segundo plano)")
+    print("  - jobs: Ver el progreso de las subidas")
+    print("  - cancel_job <id>: Cancelar una subida")
     print("  - list_docs: Listar documentos cargados")
+    print("  - delete_doc <archivo>: Eliminar un documento cargado")
     print("  - clear_docs: Limpiar documentos")
+    print("  - stats [prometheus]: Ver métricas de latencia y contadores")
     print("  - exit: Salir del chatbot")
     print("\nEscribe tu mensaje o comando:")
 
@@ -95,8 +113,10 @@ def main():
             try:
                 archivo = user_input[7:].strip()
                 if archivo:
-                    document_loader.add_document(archivo)
-                    print(f"Documento {archivo} cargado exitosamente")
+                    # Con un usuario activo el documento es privado de ese usuario;
+                    # en una conversación temporal se comparte con todo el tenant.
+                    owner, tenant = _ambito(gestor, session)
+                    print(document_loader.submit_document(archivo, owner=owner, tenant=tenant))
                 else:
                     print("Por favor, proporciona un archivo")
             except FileNotFoundError:
@@ -107,19 +127,50 @@ def main():
                 print(f"Error al cargar documento: {str(e)}")
             continue
         
+        elif user_input.lower() == 'jobs':
+            trabajos = document_loader.list_jobs()
+            if trabajos:
+                for job in trabajos:
+                    total = f"/{job['chunks_total']}{'~' if job['estimated'] else ''}" if job["chunks_total"] else ""
+                    linea = (f"- {job['id']} {job['path']}: {job['state']}, {job['chunks_done']}{total} chunks, "
+                             f"{job['throughput']:.1f} chunks/s")
+                    if job["error"]:
+                        linea += f" ({job['error']})"
+                    print(linea)
+            else:
+                print("No hay trabajos de ingesta")
+            continue
+        
+        elif user_input.lower().startswith('cancel_job '):
+            print(document_loader.cancel_job(user_input[11:].strip()))
+            continue
+        
         elif user_input.lower() == 'list_docs':
             try:
-                docs = document_loader.list_documents()
+                docs = document_loader.list_visible_documents(*_ambito(gestor, session))
                 if docs:
                     print("Documentos cargados:")
                     for doc in docs:
-                        print(f"- {doc}")
+                        ingerido = time.strftime("%Y-%m-%d %H:%M", time.localtime(doc["ingested"]))
+                        compartido = "" if doc["owner"] else " (compartido)"
+                        print(f"- {doc['source']}{compartido}: {doc['chunk_count']} chunks, {doc['bytes'] / 1024:.1f} KB, "
+                              f"{doc['tokens']} tokens, {doc['duplicate_chunks']} duplicados, "
+                              f"cargado {ingerido}")
                 else:
                     print("No hay documentos cargados")
             except Exception as e:
                 print(f"Error al listar documentos: {str(e)}")
             continue
         
+        elif user_input.lower().startswith('delete_doc '):
+            archivo = user_input[11:].strip()
+            if archivo:
+                owner, tenant = _ambito(gestor, session)
+                print(document_loader.delete_document(archivo, owner=owner, tenant=tenant))
+            else:
+                print("Por favor, proporciona un archivo")
+            continue
+        
         elif user_input.lower() == 'clear_docs':
             try:
                 document_loader.clear_documents()
@@ -128,6 +179,16 @@ def main():
                 print(f"Error al limpiar documentos: {str(e)}")
             continue
         
+        elif user_input.lower() == 'stats' or user_input.lower().startswith('stats '):
+            formato = user_input[5:].strip().lower()
+            if formato == 'prometheus':
+                print(metrics.render_prometheus())
+            else:
+                print(metrics.format_summary())
+            if services.config.METRICS_EXPORT_FILE:
+                metrics.write_prometheus(services.config.METRICS_EXPORT_FILE)
+            continue
+        
         # Enviar mensaje al chatbot con el historial actual
         response = chatbot.send_message(user_input, user_id=session.user_id)
         session.add_message(("user", user_input))
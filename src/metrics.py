@@ -0,0 +1,309 @@
+# src/metrics.py
+
+"""
+Métricas de latencia y contadores del chatbot.
+
+Registra spans de tiempo por etapa (embed, search, trim, prompt, llm,
+checkpoint, ingesta) y contadores (aciertos de caché, uso de tokens) en un
+registro en memoria que se exporta en el formato de texto de Prometheus.
+Cuando las métricas están deshabilitadas todas las operaciones son no-ops.
+"""
+
+import functools
+import os
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import nullcontext
+from threading import Lock
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from src.config import config
+
+# Límites (en segundos) de los buckets de los histogramas de latencia.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Número de muestras recientes que se guardan por serie para calcular percentiles.
+RESERVOIR_SIZE = 1024
+
+STAGE_METRIC = "chatbot_stage_duration_seconds"
+
+METRIC_HELP = {
+    STAGE_METRIC: "Duración de cada etapa del pipeline en segundos.",
+    "chatbot_cache_hits_total": "Aciertos de caché por tipo de caché.",
+    "chatbot_cache_misses_total": "Fallos de caché por tipo de caché.",
+    "chatbot_llm_tokens_total": "Tokens consumidos por el LLM por tipo.",
+    "chatbot_turns_total": "Turnos de conversación procesados.",
+    "chatbot_route_total": "Turnos enrutados a cada nivel de modelo (fast o large).",
+    "chatbot_ingested_chunks_total": "Chunks agregados al vector store.",
+    "chatbot_ingest_jobs_total": "Trabajos de ingesta terminados por estado final.",
+    "chatbot_ingest_jobs_queued": "Trabajos de ingesta en cola.",
+    "chatbot_dedup_chunks_total": "Chunks descartados en la ingesta por duplicados (exact o near).",
+    "chatbot_ready": "1 si el chatbot terminó el calentamiento y está listo.",
+    "chatbot_admission_in_flight": "Turnos en curso admitidos por el control de admisión.",
+    "chatbot_admission_queue_depth": "Turnos esperando un hueco en la cola de admisión.",
+    "chatbot_admission_wait_seconds": "Tiempo de espera en la cola de admisión en segundos.",
+    "chatbot_admission_shed_total": "Turnos rechazados por el control de admisión por motivo.",
+}
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+_NOOP_SPAN = nullcontext()
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _format_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Histogram:
+    """Histograma acumulativo con buckets fijos y un reservorio de muestras recientes."""
+    __slots__ = ("buckets", "counts", "sum", "count", "samples")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.samples: Deque[float] = deque(maxlen=RESERVOIR_SIZE)
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.samples.append(value)
+
+    def percentile(self, q: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))
+        return ordered[index]
+
+
+class _Span:
+    """Context manager que mide la duración de una etapa."""
+    __slots__ = ("registry", "labels", "start")
+
+    def __init__(self, registry: "MetricsRegistry", labels: Dict[str, Any]):
+        self.registry = registry
+        self.labels = labels
+        self.start = 0.0
+
+    def __enter__(self) -> "_Span":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.registry.observe(STAGE_METRIC, time.perf_counter() - self.start, **self.labels)
+
+
+class MetricsRegistry:
+    """
+    Registro thread-safe de contadores, gauges e histogramas.
+    """
+    def __init__(self, enabled: bool = True, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.buckets = buckets
+        self.lock = Lock()
+        self.counters: Dict[str, Dict[LabelKey, float]] = {}
+        self.gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self.histograms: Dict[str, Dict[LabelKey, _Histogram]] = {}
+
+    def inc(self, name: str, value: float = 1, **labels: Any) -> None:
+        """Incrementa un contador."""
+        if not self.enabled:
+            return
+        key = _label_key(labels)
+        with self.lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels: Any) -> None:
+        """Fija el valor de un gauge."""
+        if not self.enabled:
+            return
+        with self.lock:
+            self.gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        """Registra una observación en un histograma."""
+        if not self.enabled:
+            return
+        key = _label_key(labels)
+        with self.lock:
+            series = self.histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = _Histogram(self.buckets)
+            histogram.observe(value)
+
+    def record_stage(self, stage: str, seconds: float, **labels: Any) -> None:
+        """Registra la duración de una etapa medida externamente."""
+        self.observe(STAGE_METRIC, seconds, stage=stage, **labels)
+
+    def span(self, stage: str, **labels: Any):
+        """
+        Retorna un context manager que mide la duración de la etapa indicada.
+
+        Ejemplo:
+            with metrics.span("search"):
+                docs = retriever.invoke(query)
+        """
+        if not self.enabled:
+            return _NOOP_SPAN
+        labels["stage"] = stage
+        return _Span(self, labels)
+
+    def timed(self, stage: str) -> Callable:
+        """Decorador que mide cada llamada a la función como una etapa."""
+        def decorator(func: Callable) -> Callable:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self.span(stage):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def stage_summary(self, stage: str) -> Dict[str, float]:
+        """
+        Resumen de una etapa sumando todas sus series (por ejemplo, `llm_ttft`
+        de todos los niveles de modelo), con el mismo formato que `snapshot`.
+        """
+        with self.lock:
+            series = [h for key, h in self.histograms.get(STAGE_METRIC, {}).items()
+                      if ("stage", stage) in key]
+            merged = _Histogram(self.buckets)
+            merged.samples = deque((v for h in series for v in h.samples), maxlen=None)
+            merged.count = sum(h.count for h in series)
+            merged.sum = sum(h.sum for h in series)
+        if not merged.count:
+            return {}
+        return {
+            "count": merged.count,
+            "mean_ms": merged.sum / merged.count * 1000,
+            "p50_ms": merged.percentile(0.50) * 1000,
+            "p95_ms": merged.percentile(0.95) * 1000,
+            "p99_ms": merged.percentile(0.99) * 1000,
+        }
+
+    def reset(self) -> None:
+        """Elimina todas las series registradas."""
+        with self.lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.histograms.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Retorna una copia de las métricas como diccionarios simples.
+
+        Las etapas incluyen número de muestras, media y percentiles en milisegundos.
+        """
+        with self.lock:
+            counters = {
+                name: {_format_labels(key): value for key, value in series.items()}
+                for name, series in self.counters.items()
+            }
+            gauges = {
+                name: {_format_labels(key): value for key, value in series.items()}
+                for name, series in self.gauges.items()
+            }
+            histograms = {}
+            for name, series in self.histograms.items():
+                histograms[name] = {
+                    _format_labels(key): {
+                        "count": h.count,
+                        "mean_ms": (h.sum / h.count) * 1000 if h.count else 0.0,
+                        "p50_ms": h.percentile(0.50) * 1000,
+                        "p95_ms": h.percentile(0.95) * 1000,
+                        "p99_ms": h.percentile(0.99) * 1000,
+                    }
+                    for key, h in series.items()
+                }
+        return {"counters": counters, "gauges": gauges, "histograms": histograms}
+
+    def render_prometheus(self) -> str:
+        """Serializa las métricas en el formato de texto de Prometheus (v0.0.4)."""
+        lines: List[str] = []
+        with self.lock:
+            for name in sorted(self.counters):
+                lines.append(f"# HELP {name} {METRIC_HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} counter")
+                for key, value in sorted(self.counters[name].items()):
+                    lines.append(f"{name}{_format_labels(key)} {_format_number(value)}")
+            for name in sorted(self.gauges):
+                lines.append(f"# HELP {name} {METRIC_HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} gauge")
+                for key, value in sorted(self.gauges[name].items()):
+                    lines.append(f"{name}{_format_labels(key)} {_format_number(value)}")
+            for name in sorted(self.histograms):
+                lines.append(f"# HELP {name} {METRIC_HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, h in sorted(self.histograms[name].items()):
+                    cumulative = 0
+                    for bound, count in zip(h.buckets + (float("inf"),), h.counts):
+                        cumulative += count
+                        le = ("le", _format_number(bound))
+                        lines.append(f"{name}_bucket{_format_labels(key, le)} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {_format_number(h.sum)}")
+                    lines.append(f"{name}_count{_format_labels(key)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str) -> None:
+        """
+        Escribe las métricas en un archivo de texto de forma atómica, compatible
+        con el textfile collector de node_exporter.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp_path, path)
+
+    def format_summary(self) -> str:
+        """Retorna un resumen legible de las métricas para la CLI."""
+        data = self.snapshot()
+        stages = data["histograms"].get(STAGE_METRIC, {})
+        if not stages and not data["counters"]:
+            return "No hay métricas registradas"
+        lines = []
+        if stages:
+            lines.append(f"{'Etapa':<40} {'n':>7} {'media':>10} {'p50':>10} {'p95':>10} {'p99':>10}")
+            for labels, s in sorted(stages.items()):
+                lines.append(
+                    f"{labels:<40} {s['count']:>7} {s['mean_ms']:>8.1f}ms "
+                    f"{s['p50_ms']:>8.1f}ms {s['p95_ms']:>8.1f}ms {s['p99_ms']:>8.1f}ms"
+                )
+        for name, series in sorted(data["counters"].items()):
+            for labels, value in sorted(series.items()):
+                lines.append(f"{name}{labels} = {_format_number(value)}")
+        for name, series in sorted(data["gauges"].items()):
+            for labels, value in sorted(series.items()):
+                lines.append(f"{name}{labels} = {_format_number(value)}")
+        return "\n".join(lines)
+
+
+metrics = MetricsRegistry(enabled=config.METRICS_ENABLED)
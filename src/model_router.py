@@ -0,0 +1,159 @@
+# src/model_router.py
+
+import json
+import math
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.messages.utils import count_tokens_approximately
+
+from .rag.logging_config import logger
+from .metrics import metrics
+
+# Ejemplos iniciales del clasificador: consultas que el modelo rápido resuelve
+# bien y consultas que requieren razonar o sintetizar varias fuentes.
+DEFAULT_EXAMPLES: Dict[str, List[str]] = {
+    "fast": [
+        "hola", "gracias", "¿qué hora es?", "¿cómo te llamas?", "vale, perfecto",
+        "¿qué significa esta sigla?", "dime la fecha del documento", "¿quién es el autor?",
+        "resume en una frase", "¿cuál es el horario de atención?",
+    ],
+    "large": [
+        "compara las dos propuestas y explica sus ventajas e inconvenientes",
+        "analiza paso a paso por qué falla este proceso y propone una solución",
+        "redacta un informe detallado a partir de los documentos cargados",
+        "¿qué implicaciones tiene este cambio de política para los distintos equipos?",
+        "explica el razonamiento detrás de la arquitectura y sus alternativas",
+        "escribe el código para migrar los datos y justifica cada decisión",
+        "evalúa los riesgos del contrato y prioriza las cláusulas a negociar",
+        "sintetiza las conclusiones de todas las secciones y señala las contradicciones",
+    ],
+}
+
+
+@dataclass
+class ModelTier:
+    """Nivel de modelo: nombre lógico, modelo de Anthropic y presupuesto de salida."""
+    name: str
+    model: str
+    max_tokens: int
+
+
+@dataclass
+class RouteDecision:
+    tier: ModelTier
+    score: float
+    signals: Dict[str, float] = field(default_factory=dict)
+
+
+class QueryClassifier:
+    """
+    Clasificador de centroides sobre el embedding de la consulta.
+
+    Calcula el centroide de los ejemplos de cada clase ("fast" y "large") y
+    retorna la probabilidad de que la consulta requiera el modelo grande según
+    a cuál de los dos está más cerca (similitud coseno). Los embeddings de la
+    consulta salen de la caché, porque la búsqueda ya los calculó.
+    """
+    def __init__(self, embeddings, examples: Optional[Dict[str, List[str]]] = None, temperature: float = 0.05):
+        self.embeddings = embeddings
+        self.examples = examples or DEFAULT_EXAMPLES
+        self.temperature = temperature
+        self._centroids: Optional[Dict[str, np.ndarray]] = None
+        self._lock = Lock()
+
+    @classmethod
+    def from_file(cls, embeddings, path: str) -> "QueryClassifier":
+        """Carga los ejemplos de un JSON {"fast": [...], "large": [...]}."""
+        with open(path, encoding="utf-8") as f:
+            return cls(embeddings, examples=json.load(f))
+
+    def _normalize(self, vectors) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+    def centroids(self) -> Dict[str, np.ndarray]:
+        with self._lock:
+            if self._centroids is None:
+                self._centroids = {
+                    label: self._normalize(self._normalize(self.embeddings.embed_documents(texts)).mean(axis=0))
+                    for label, texts in self.examples.items()
+                }
+        return self._centroids
+
+    def probability(self, query: str) -> float:
+        """Probabilidad (0-1) de que la consulta sea de la clase "large"."""
+        centroids = self.centroids()
+        vector = self._normalize(self.embeddings.embed_query(query))
+        margin = float(vector @ centroids["large"] - vector @ centroids["fast"])
+        return 1.0 / (1.0 + math.exp(-margin / self.temperature))
+
+
+class ModelRouter:
+    """
+    Elige el nivel de modelo y el presupuesto de salida de cada turno.
+
+    Suma señales baratas, cada una entre 0 y su peso:
+
+    - `length`: longitud de la consulta en tokens, relativa a `long_query_tokens` (peso 1).
+    - `retrieval`: la búsqueda devolvió contexto que hay que sintetizar (peso 0.5).
+    - `depth`: la conversación tiene al menos `deep_conversation` mensajes (peso 0.5).
+    - `classifier`: probabilidad de "large" según el clasificador de embeddings (peso 1).
+
+    Si la suma alcanza `threshold` el turno va al modelo grande; si no, al rápido.
+    """
+    def __init__(self, fast: ModelTier, large: ModelTier, classifier: Optional[QueryClassifier] = None,
+                 long_query_tokens: int = 40, deep_conversation: int = 12, threshold: float = 1.5):
+        self.fast = fast
+        self.large = large
+        self.classifier = classifier
+        self.long_query_tokens = long_query_tokens
+        self.deep_conversation = deep_conversation
+        self.threshold = threshold
+
+    @classmethod
+    def from_config(cls, config, embeddings=None) -> "ModelRouter":
+        classifier = None
+        if embeddings is not None:
+            classifier = (QueryClassifier.from_file(embeddings, config.ROUTING_EXAMPLES_PATH)
+                          if config.ROUTING_EXAMPLES_PATH else QueryClassifier(embeddings))
+        return cls(
+            fast=ModelTier("fast", config.ROUTING_FAST_MODEL, config.ROUTING_FAST_MAX_TOKENS),
+            large=ModelTier("large", config.ROUTING_LARGE_MODEL, config.ROUTING_LARGE_MAX_TOKENS),
+            classifier=classifier,
+            long_query_tokens=config.ROUTING_LONG_QUERY_TOKENS,
+            deep_conversation=config.ROUTING_DEEP_CONVERSATION,
+            threshold=config.ROUTING_THRESHOLD
+        )
+
+    @property
+    def tiers(self) -> Sequence[ModelTier]:
+        return (self.fast, self.large)
+
+    def route(self, query: str, context_docs: Optional[List[Document]] = None, depth: int = 0) -> RouteDecision:
+        """
+        Args:
+            query: Último mensaje del usuario.
+            context_docs: Documentos recuperados para el turno.
+            depth: Número de mensajes de la conversación, incluido el actual.
+        """
+        signals = {
+            "length": min(count_tokens_approximately([("human", query)]) / self.long_query_tokens, 1.0),
+            "retrieval": 0.5 if context_docs else 0.0,
+            "depth": 0.5 if depth >= self.deep_conversation else 0.0,
+        }
+        if self.classifier is not None:
+            try:
+                signals["classifier"] = self.classifier.probability(query)
+            except Exception as e:
+                # Sin clasificador se decide solo con las demás señales.
+                logger.warning("Error en el clasificador de enrutado: %s", e)
+        score = sum(signals.values())
+        tier = self.large if score >= self.threshold else self.fast
+        metrics.inc("chatbot_route_total", tier=tier.name)
+        logger.info("Enrutado: %s (%s, max_tokens=%s) puntuación=%.2f %s", tier.name, tier.model,
+                    tier.max_tokens, score, {k: round(v, 2) for k, v in signals.items()})
+        return RouteDecision(tier, score, signals)
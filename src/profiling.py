@@ -0,0 +1,126 @@
+# src/profiling.py
+
+"""
+Perfilado opcional de CPU y memoria por petición.
+
+Cuando PROFILING_ENABLED está activo, las funciones decoradas con
+`profiler.profile(nombre)` se ejecutan bajo cProfile y tracemalloc para una
+fracción de las peticiones (PROFILING_SAMPLE_RATE) y cada petición perfilada
+deja sus artefactos en PROFILING_OUTPUT_DIR:
+
+- `<nombre>-<timestamp>-<pid>-<n>.prof`: estadísticas de cProfile (pstats/snakeviz).
+- `<nombre>-<timestamp>-<pid>-<n>.txt`: resumen con las funciones más costosas
+  y, si el perfilado de memoria está activo, las líneas que más memoria asignaron.
+"""
+
+import cProfile
+import functools
+import io
+import itertools
+import os
+import pstats
+import random
+import time
+import tracemalloc
+from threading import Lock
+from typing import Callable, Optional
+
+from src.config import config
+from .rag.logging_config import logger
+
+# Número de entradas que se incluyen en los resúmenes de texto.
+TOP_ENTRIES = 30
+
+
+class RequestProfiler:
+    """
+    Perfilador por petición con muestreo configurable.
+
+    cProfile no admite varios perfiladores activos a la vez, así que solo se
+    perfila una petición simultánea; las demás se ejecutan sin perfilar.
+    """
+    def __init__(self, enabled: bool = False, sample_rate: float = 1.0,
+                 output_dir: str = "./profiles", memory: bool = True):
+        self.enabled = enabled
+        self.sample_rate = max(0.0, min(1.0, sample_rate))
+        self.output_dir = output_dir
+        self.memory = memory
+        self.lock = Lock()
+        self.counter = itertools.count(1)
+
+    def profile(self, name: str) -> Callable:
+        """Decorador que perfila las llamadas muestreadas a la función."""
+        def decorator(func: Callable) -> Callable:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled or random.random() >= self.sample_rate:
+                    return func(*args, **kwargs)
+                if not self.lock.acquire(blocking=False):
+                    return func(*args, **kwargs)
+                try:
+                    return self._run_profiled(name, func, args, kwargs)
+                finally:
+                    self.lock.release()
+            return wrapper
+        return decorator
+
+    def _run_profiled(self, name: str, func: Callable, args, kwargs):
+        started_tracing = False
+        before = None
+        if self.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            tracemalloc.reset_peak()
+            before = tracemalloc.take_snapshot()
+
+        cpu_profiler = cProfile.Profile()
+        start = time.perf_counter()
+        cpu_profiler.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            cpu_profiler.disable()
+            elapsed = time.perf_counter() - start
+            after = tracemalloc.take_snapshot() if self.memory else None
+            peak = tracemalloc.get_traced_memory()[1] if self.memory else None
+            if started_tracing:
+                tracemalloc.stop()
+            try:
+                self._write_artifacts(name, cpu_profiler, elapsed, before, after, peak)
+            except Exception as e:
+                logger.error("Error escribiendo el perfil de %s: %s", name, e, exc_info=True)
+
+    def _write_artifacts(self, name: str, cpu_profiler: cProfile.Profile, elapsed: float,
+                         before: Optional[tracemalloc.Snapshot],
+                         after: Optional[tracemalloc.Snapshot],
+                         peak: Optional[int]) -> str:
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        base = os.path.join(self.output_dir, f"{name}-{stamp}-{os.getpid()}-{next(self.counter)}")
+        cpu_profiler.dump_stats(f"{base}.prof")
+
+        report = io.StringIO()
+        report.write(f"# {name}: {elapsed * 1000:.1f} ms\n\n")
+        stats = pstats.Stats(cpu_profiler, stream=report)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(TOP_ENTRIES)
+
+        if before is not None and after is not None:
+            report.write(f"\n# Memoria: pico {peak / 1024:.1f} KiB\n")
+            filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+            diff = after.filter_traces(filters).compare_to(before.filter_traces(filters), "lineno")
+            for entry in diff[:TOP_ENTRIES]:
+                report.write(f"{entry}\n")
+
+        with open(f"{base}.txt", "w", encoding="utf-8") as f:
+            f.write(report.getvalue())
+        logger.info("Perfil de %s escrito en %s.prof (%.1f ms)", name, base, elapsed * 1000)
+        return base
+
+
+profiler = RequestProfiler(
+    enabled=config.PROFILING_ENABLED,
+    sample_rate=config.PROFILING_SAMPLE_RATE,
+    output_dir=config.PROFILING_OUTPUT_DIR,
+    memory=config.PROFILING_MEMORY,
+)
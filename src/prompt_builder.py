@@ -0,0 +1,149 @@
+# src/prompt_builder.py
+
+import hashlib
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain_core.documents import Document
+from langchain_core.messages import BaseMessage, SystemMessage
+
+from .rag.chunker import approximate_token_counter
+
+SYSTEM_PROMPT = (
+    "Eres un asistente amigable y servicial. Responde de manera concisa y clara. "
+    "Si hay contexto relevante, úsalo para dar respuestas más precisas, de lo "
+    "contrario, responde con tu conocimiento general."
+)
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+# Anthropic admite como máximo 4 puntos de caché por petición.
+MAX_CACHE_BREAKPOINTS = 4
+
+# Prefijos con contexto recordados para detectar cuándo se repiten.
+CONTEXT_REUSE_ENTRIES = 1024
+
+
+def _text_block(text: str, cacheable: bool) -> Dict[str, Any]:
+    block: Dict[str, Any] = {"type": "text", "text": text}
+    if cacheable:
+        block["cache_control"] = dict(CACHE_CONTROL)
+    return block
+
+
+def _blocks(content: Any) -> List[Dict[str, Any]]:
+    if isinstance(content, str):
+        return [_text_block(content, False)]
+    return [dict(b) if isinstance(b, dict) else {"type": "text", "text": b} for b in content]
+
+
+def _with_cache_breakpoint(message: BaseMessage) -> BaseMessage:
+    """Retorna una copia del mensaje con cache_control en su último bloque de texto."""
+    blocks = _blocks(message.content)
+    if not blocks:
+        return message
+    blocks[-1]["cache_control"] = dict(CACHE_CONTROL)
+    return message.model_copy(update={"content": blocks})
+
+
+def select_context(docs: Sequence[Document], max_tokens: Optional[int]) -> List[Document]:
+    """
+    Selecciona, en orden de ranking, los documentos que caben en el presupuesto.
+
+    Usa el `token_count` precalculado en los metadatos de cada chunk, de modo
+    que empaquetar el contexto es una suma; solo se estima para documentos sin él.
+    """
+    if max_tokens is None:
+        return list(docs)
+    selected, total = [], 0
+    for doc in docs:
+        tokens = doc.metadata.get("token_count")
+        if tokens is None:
+            tokens = approximate_token_counter([doc.page_content])[0]
+        if total + tokens > max_tokens:
+            continue
+        selected.append(doc)
+        total += tokens
+    return selected
+
+
+def format_context(docs: Sequence[Document]) -> str:
+    """
+    Serializa los documentos recuperados de forma determinista.
+
+    Los chunks se ordenan por origen y contenido para que el mismo conjunto de
+    documentos produzca siempre el mismo texto, aunque el ranking cambie, y
+    así pueda reutilizarse el prefijo cacheado.
+    """
+    ordered = sorted(
+        docs,
+        key=lambda d: (str(d.metadata.get("source", "")), d.metadata.get("page", 0) or 0, d.page_content)
+    )
+    return "Contexto relevante:\n" + "\n".join(doc.page_content for doc in ordered)
+
+
+class PromptBuilder:
+    """
+    Construye el prompt de cada turno ordenado de lo más estable a lo más volátil
+    y marcado para el prompt caching de Anthropic:
+
+    1. Prompt de sistema fijo (cacheado).
+    2. Resumen de la conversación, que solo cambia al compactar (cacheado).
+    3. Historial de la conversación, con punto de caché en el último mensaje
+       anterior a la pregunta actual.
+    4. Contexto recuperado, serializado de forma determinista, junto a la
+       pregunta actual. Cambia en cada turno, así que solo se marca cuando el
+       mismo prefijo con el mismo contexto ya se envió antes (reintentos,
+       preguntas en lote sobre los mismos documentos).
+    5. Pregunta actual (sin cachear).
+    """
+    def __init__(self, system_prompt: str = SYSTEM_PROMPT, cache_enabled: bool = True,
+                 context_max_tokens: Optional[int] = None):
+        self.system_prompt = system_prompt
+        self.cache_enabled = cache_enabled
+        self.context_max_tokens = context_max_tokens
+        self._seen_contexts: "OrderedDict[str, None]" = OrderedDict()
+        self._seen_lock = Lock()
+
+    def _context_reused(self, prefix: Sequence[Any], context: str) -> bool:
+        """Indica si ya se construyó un prompt con este prefijo y este contexto."""
+        digest = hashlib.sha256()
+        for part in list(prefix) + [context]:
+            digest.update(repr(part).encode("utf-8"))
+            digest.update(b"\0")
+        key = digest.hexdigest()
+        with self._seen_lock:
+            if key in self._seen_contexts:
+                self._seen_contexts.move_to_end(key)
+                return True
+            self._seen_contexts[key] = None
+            if len(self._seen_contexts) > CONTEXT_REUSE_ENTRIES:
+                self._seen_contexts.popitem(last=False)
+        return False
+
+    def build(self, messages: Sequence[BaseMessage], summary: Optional[str] = None,
+              context_docs: Optional[Sequence[Document]] = None) -> List[BaseMessage]:
+        cache = self.cache_enabled
+        system_blocks = [_text_block(self.system_prompt, cache)]
+        if summary:
+            system_blocks.append(_text_block(f"Resumen de la conversación anterior:\n{summary}", cache))
+        breakpoints = len(system_blocks) if cache else 0
+
+        history = list(messages)
+        if cache and len(history) > 1 and breakpoints < MAX_CACHE_BREAKPOINTS:
+            history[-2] = _with_cache_breakpoint(history[-2])
+            breakpoints += 1
+
+        context_docs = select_context(context_docs or [], self.context_max_tokens)
+        if context_docs and history:
+            context = format_context(context_docs)
+            cacheable = (cache and breakpoints < MAX_CACHE_BREAKPOINTS and
+                         self._context_reused([summary] + [m.content for m in history[:-1]], context))
+            question = history[-1]
+            history[-1] = question.model_copy(
+                update={"content": [_text_block(context, cacheable)] + _blocks(question.content)}
+            )
+        elif context_docs:
+            system_blocks.append(_text_block(format_context(context_docs), False))
+        return [SystemMessage(content=system_blocks)] + history
@@ -13,16 +13,24 @@ Components:
 
 from .document_loader import DocumentLoader
 from .embeddings import EmbeddingGenerator
+from .embedding_backends import EmbeddingBackendLoader
 from .vector_store import VectorStore
 # CAMBIO: Importamos las clases correctas del archivo retriever.py
 from .retriever import RAGRetriever, BaseRetriever
 from .chat_history import ChatHistory
+from .history_store import HistoryStore, InMemoryHistoryStore, SQLiteHistoryStore
+from .mmap_index import MmapVectorIndex
 
 __all__ = [
     'DocumentLoader',
     'EmbeddingGenerator',
+    'EmbeddingBackendLoader',
     'VectorStore',
     'RAGRetriever',     # CAMBIO: Exportamos el nombre correcto de la clase
     'BaseRetriever',    # CAMBIO: También exportamos la clase base para que esté disponible
-    'ChatHistory'
+    'ChatHistory',
+    'HistoryStore',
+    'InMemoryHistoryStore',
+    'SQLiteHistoryStore',
+    'MmapVectorIndex'
 ]
\ No newline at end of file
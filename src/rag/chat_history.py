@@ -1,23 +1,28 @@
 # src/rag/chat_history.py
 
 import logging
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Optional
 
 from langchain_anthropic import ChatAnthropic
-from langchain_community.chat_message_histories import ChatMessageHistory
-from langchain_core.messages import HumanMessage, AIMessage
 
 from .logging_config import logger
+from .history_store import HistoryStore, create_history_store
 from src.config import GlobalConfig as Config
 
+DEFAULT_CONVERSATION = "default"
+
 
 class ChatHistory:
     """
     Sistema de historial de chat integrado con LangChain.
-    Su única responsabilidad es gestionar el historial de mensajes de una conversación.
+    Su única responsabilidad es gestionar el historial de mensajes de cada conversación.
+
+    Los mensajes se guardan en un HistoryStore append-only (en RAM o en SQLite
+    según MEMORY_TYPE) y se leen por páginas, de modo que leer los últimos turnos
+    no depende de la longitud de la conversación.
     """
     
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, store: Optional[HistoryStore] = None):
         """
         Inicializa el sistema de historial.
         """
@@ -32,53 +37,64 @@ class ChatHistory:
             model=config.ANTHROPIC_MODEL,
             anthropic_api_key=config.ANTHROPIC_API_KEY
         )
-        self.history = ChatMessageHistory()
-        logger.info("Sistema de historial de chat inicializado")
+        self.store = store or create_history_store(config)
+        logger.info("Sistema de historial de chat inicializado (%s)", type(self.store).__name__)
         
-    def add_human_message(self, content: str, metadata: Dict[str, Any] = None) -> None:
+    def add_human_message(self, content: str, metadata: Dict[str, Any] = None,
+                          conversation_id: str = DEFAULT_CONVERSATION) -> int:
         """
-        Agrega un mensaje humano al historial.
+        Agrega un mensaje humano al historial y retorna su número de secuencia.
         """
         try:
-            message = HumanMessage(content=content, additional_kwargs=metadata or {})
-            self.history.add_message(message)
-            logger.info("Mensaje humano agregado al historial")
+            seq = self.store.append(conversation_id, "human", content, metadata)
+            logger.debug("Mensaje humano agregado al historial")
+            return seq
         except Exception as e:
-            logger.error(f"Error agregando mensaje humano: {str(e)}")
+            logger.error("Error agregando mensaje humano: %s", e)
             raise
             
-    def add_ai_message(self, content: str, metadata: Dict[str, Any] = None) -> None:
+    def add_ai_message(self, content: str, metadata: Dict[str, Any] = None,
+                       conversation_id: str = DEFAULT_CONVERSATION) -> int:
         """
-        Agrega un mensaje AI al historial.
+        Agrega un mensaje AI al historial y retorna su número de secuencia.
         """
         try:
-            message = AIMessage(content=content, additional_kwargs=metadata or {})
-            self.history.add_message(message)
-            logger.info("Mensaje AI agregado al historial")
+            seq = self.store.append(conversation_id, "ai", content, metadata)
+            logger.debug("Mensaje AI agregado al historial")
+            return seq
         except Exception as e:
-            logger.error(f"Error agregando mensaje AI: {str(e)}")
+            logger.error("Error agregando mensaje AI: %s", e)
             raise
             
-    def get_messages(self) -> List[Dict[str, Any]]:
-        """Retorna el historial de mensajes como lista de diccionarios."""
+    def get_messages(self, conversation_id: str = DEFAULT_CONVERSATION, limit: Optional[int] = None,
+                     before: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Retorna mensajes del historial como lista de diccionarios en orden cronológico.
+
+        Args:
+            conversation_id: Conversación a leer.
+            limit: Número máximo de mensajes (los más recientes). None para todos.
+            before: Si se indica, solo mensajes con `seq` menor (página anterior).
+        """
         try:
-            return [
-                {
-                    "role": msg.type,
-                    "content": msg.content,
-                    "metadata": msg.additional_kwargs
-                }
-                for msg in self.history.messages
-            ]
+            return self.store.get_messages(conversation_id, limit=limit, before=before)
         except Exception as e:
-            logger.error(f"Error obteniendo mensajes: {str(e)}")
+            logger.error("Error obteniendo mensajes: %s", e)
             raise
             
-    def clear_history(self) -> None:
-        """Limpia el historial de chat."""
+    def iter_messages(self, conversation_id: str = DEFAULT_CONVERSATION, page_size: int = 100,
+                      reverse: bool = False) -> Iterator[Dict[str, Any]]:
+        """Recorre la conversación de forma perezosa, una página cada vez."""
+        return self.store.iter_messages(conversation_id, page_size=page_size, reverse=reverse)
+
+    def count_messages(self, conversation_id: str = DEFAULT_CONVERSATION) -> int:
+        return self.store.count(conversation_id)
+
+    def clear_history(self, conversation_id: Optional[str] = None) -> None:
+        """Limpia el historial de una conversación, o de todas si no se indica ninguna."""
         try:
-            self.history.clear()
+            self.store.clear(conversation_id)
             logger.info("Historial limpiado")
         except Exception as e:
-            logger.error(f"Error limpiando historial: {str(e)}")
+            logger.error("Error limpiando historial: %s", e)
             raise
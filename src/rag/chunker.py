@@ -0,0 +1,176 @@
+# src/rag/chunker.py
+
+import re
+import hashlib
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from .logging_config import logger
+
+# Caracteres por token usados por el contador aproximado (el mismo criterio que
+# count_tokens_approximately de LangChain).
+CHARS_PER_TOKEN = 4.0
+
+_HEADING_RE = re.compile(r"^\s{0,3}#{1,6}\s+\S")
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+_SENTENCE_RE = re.compile(r"(?<=[.!?…:;])\s+")
+
+TokenCounter = Callable[[List[str]], List[int]]
+
+
+def approximate_token_counter(texts: List[str]) -> List[int]:
+    """Cuenta tokens aproximados (longitud / 4) sin cargar ningún tokenizador."""
+    return [max(1, int(round(len(text) / CHARS_PER_TOKEN))) for text in texts]
+
+
+def load_token_counter(tokenizer_name: str) -> TokenCounter:
+    """
+    Retorna un contador de tokens por lotes.
+
+    Con "approximate" se usa el contador aproximado; con el nombre de un
+    tokenizador de Hugging Face (por ejemplo el del modelo de embeddings) se usa
+    su tokenizador rápido. Si no puede cargarse, se recurre al aproximado.
+    """
+    if not tokenizer_name or tokenizer_name == "approximate":
+        return approximate_token_counter
+    try:
+        from tokenizers import Tokenizer
+        tokenizer = Tokenizer.from_pretrained(tokenizer_name)
+        tokenizer.no_truncation()
+
+        def count(texts: List[str]) -> List[int]:
+            if not texts:
+                return []
+            return [len(enc.ids) for enc in tokenizer.encode_batch(texts, add_special_tokens=False)]
+        return count
+    except Exception as e:
+        logger.warning("No se pudo cargar el tokenizador %s, se usa el conteo aproximado: %s", tokenizer_name, e)
+        return approximate_token_counter
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class TokenChunker:
+    """
+    Divide documentos en chunks con un objetivo de tokens respetando la estructura.
+
+    El texto se descompone en unidades (encabezados, párrafos y, si un párrafo
+    no cabe, frases o ventanas de palabras) y las unidades se empaquetan de forma
+    voraz hasta `chunk_tokens`. Un encabezado siempre abre un chunk nuevo. El
+    solapamiento se hace con unidades completas del final del chunk anterior.
+
+    Cada chunk guarda en sus metadatos `token_count`, `content_hash` y, si lo
+    hay, el encabezado de su sección (`section`), de modo que el empaquetado de
+    contexto posterior es una suma de metadatos.
+    """
+    def __init__(self, chunk_tokens: int = 256, overlap_tokens: int = 32,
+                 token_counter: Optional[TokenCounter] = None):
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = min(overlap_tokens, chunk_tokens // 2)
+        self.count_tokens = token_counter or approximate_token_counter
+
+    def split_documents(self, documents: Iterable[Document]) -> List[Document]:
+        """Divide todos los documentos (por ejemplo, todas las páginas de un PDF) en una pasada."""
+        return list(self.iter_chunks(documents))
+
+    def iter_chunks(self, documents: Iterable[Document]) -> Iterator[Document]:
+        """
+        Versión perezosa de split_documents: emite cada chunk en cuanto se
+        completa. Los chunks pueden abarcar páginas consecutivas de una misma fuente.
+        """
+        current: List[Tuple[str, int, Dict]] = []
+        current_tokens = 0
+        section: Optional[str] = None
+        source = object()
+
+        for doc in documents:
+            if doc.metadata.get("source") != source:
+                if current:
+                    yield self._make_chunk(current, current_tokens, section)
+                current, current_tokens, section = [], 0, None
+                source = doc.metadata.get("source")
+
+            for text, tokens, is_heading in self._units(doc.page_content):
+                if is_heading:
+                    if current:
+                        yield self._make_chunk(current, current_tokens, section)
+                    current, current_tokens = [], 0
+                    section = text.strip().lstrip("#").strip()
+                elif current and current_tokens + tokens > self.chunk_tokens:
+                    yield self._make_chunk(current, current_tokens, section)
+                    current = self._overlap(current)
+                    current_tokens = sum(t for _, t, _ in current)
+                    if current_tokens + tokens > self.chunk_tokens:
+                        current, current_tokens = [], 0
+                current.append((text, tokens, doc.metadata))
+                current_tokens += tokens
+
+        if current:
+            yield self._make_chunk(current, current_tokens, section)
+
+    def _units(self, text: str) -> Iterator[Tuple[str, int, bool]]:
+        """Descompone el texto en unidades (texto, tokens, es_encabezado) que caben en un chunk."""
+        paragraphs = []
+        for block in _PARAGRAPH_RE.split(text):
+            # Un encabezado Markdown es una unidad propia aunque no esté separado por una línea en blanco.
+            lines = block.split("\n")
+            buffer: List[str] = []
+            for line in lines:
+                if _HEADING_RE.match(line):
+                    if buffer:
+                        paragraphs.append(("\n".join(buffer), False))
+                        buffer = []
+                    paragraphs.append((line, True))
+                else:
+                    buffer.append(line)
+            if buffer:
+                paragraphs.append(("\n".join(buffer), False))
+        paragraphs = [(p.strip(), h) for p, h in paragraphs if p.strip()]
+        if not paragraphs:
+            return
+
+        counts = self.count_tokens([p for p, _ in paragraphs])
+        for (paragraph, is_heading), tokens in zip(paragraphs, counts):
+            if tokens <= self.chunk_tokens or is_heading:
+                yield paragraph, tokens, is_heading
+            else:
+                yield from self._split_long(paragraph)
+
+    def _split_long(self, paragraph: str) -> Iterator[Tuple[str, int, bool]]:
+        sentences = [s for s in _SENTENCE_RE.split(paragraph) if s.strip()]
+        counts = self.count_tokens(sentences)
+        for sentence, tokens in zip(sentences, counts):
+            if tokens <= self.chunk_tokens:
+                yield sentence, tokens, False
+                continue
+            # Frase más larga que un chunk: ventanas de palabras de tamaño proporcional.
+            words = sentence.split()
+            per_window = max(1, int(len(words) * self.chunk_tokens / tokens))
+            windows = [" ".join(words[i:i + per_window]) for i in range(0, len(words), per_window)]
+            for window, window_tokens in zip(windows, self.count_tokens(windows)):
+                yield window, window_tokens, False
+
+    def _overlap(self, units: List[Tuple[str, int, Dict]]) -> List[Tuple[str, int, Dict]]:
+        carried: List[Tuple[str, int, Dict]] = []
+        tokens = 0
+        for unit in reversed(units):
+            if tokens + unit[1] > self.overlap_tokens:
+                break
+            carried.insert(0, unit)
+            tokens += unit[1]
+        return carried
+
+    def _make_chunk(self, units: List[Tuple[str, int, Dict]], tokens: int, section: Optional[str]) -> Document:
+        text = "\n\n".join(u[0] for u in units)
+        metadata = dict(units[0][2])
+        last_page = units[-1][2].get("page")
+        if last_page is not None and last_page != metadata.get("page"):
+            metadata["page_end"] = last_page
+        if section:
+            metadata["section"] = section
+        metadata["token_count"] = tokens
+        metadata["content_hash"] = content_hash(text)
+        return Document(page_content=text, metadata=metadata)
@@ -0,0 +1,159 @@
+# src/rag/dedup.py
+
+import re
+import hashlib
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from langchain_core.documents import Document
+
+from .chunker import content_hash
+from .logging_config import logger
+
+SIGNATURE_BITS = 64
+# Por debajo de este número de shingles la SimHash no es fiable: solo se
+# detectan duplicados exactos.
+MIN_SHINGLES = 8
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+_BIT_SHIFTS = np.arange(SIGNATURE_BITS, dtype=np.uint64)
+
+
+def shingles(text: str, size: int = 3) -> List[str]:
+    """Shingles de `size` palabras del texto normalizado (minúsculas, sin puntuación)."""
+    words = _WORD.findall(text.lower())
+    if len(words) < size:
+        return [" ".join(words)] if words else []
+    return [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+
+
+def simhash(text: str, size: int = 3) -> Optional[int]:
+    """
+    SimHash de 64 bits sobre los shingles del texto, o None si el texto es
+    demasiado corto. Textos casi iguales difieren en pocos bits.
+    """
+    features = shingles(text, size)
+    if len(features) < MIN_SHINGLES:
+        return None
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(f.encode("utf-8"), digest_size=8).digest(), "little") for f in features],
+        dtype=np.uint64
+    )
+    bits = ((hashes[:, None] >> _BIT_SHIFTS) & np.uint64(1)).astype(np.int32)
+    weights = bits.sum(axis=0) * 2 - len(features)
+    return sum(1 << int(i) for i in np.flatnonzero(weights > 0))
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def bands(signature: int, count: int) -> List[int]:
+    """
+    Divide la firma en `count` bandas. Dos firmas a distancia menor que `count`
+    coinciden al menos en una banda (principio del palomar), así que basta con
+    buscar candidatos por banda.
+    """
+    width = SIGNATURE_BITS // count
+    mask = (1 << width) - 1
+    return [(signature >> (i * width)) & mask for i in range(count)]
+
+
+@dataclass
+class ChunkSignature:
+    content_hash: str
+    simhash: Optional[int]
+    bands: List[int] = field(default_factory=list)
+
+
+@dataclass
+class DedupResult:
+    """
+    Resultado de deduplicar un lote.
+
+    `dropped` son los chunks descartados y `duplicates` su copia canónica: un
+    id ya almacenado (str) o la posición de un chunk conservado del mismo lote
+    (int).
+    """
+    kept: List[Document] = field(default_factory=list)
+    signatures: List[ChunkSignature] = field(default_factory=list)
+    dropped: List[Document] = field(default_factory=list)
+    duplicates: List[Union[str, int]] = field(default_factory=list)
+    exact: int = 0
+    near: int = 0
+
+    def resolve(self, kept_ids: Sequence[str]) -> List[str]:
+        """Ids canónicos de los duplicados, una vez insertados los chunks conservados."""
+        return [kept_ids[d] if isinstance(d, int) else d for d in self.duplicates]
+
+
+class ChunkDeduplicator:
+    """
+    Detecta chunks duplicados exactos (SHA-256 del texto) y casi duplicados
+    (SimHash a distancia de Hamming <= `max_distance`) antes de calcular sus
+    embeddings.
+
+    Las firmas de los chunks ya almacenados se consultan en el catálogo de
+    documentos mediante un índice LSH por bandas. Solo se consideran copias
+    canónicas del mismo tenant y del mismo propietario (o compartidas si el
+    chunk nuevo lo es): todos los documentos que referencian un chunk tienen
+    el ámbito de sus metadatos, que siguen siendo correctos aunque se borre
+    el documento que lo aportó.
+    """
+    def __init__(self, catalog, max_distance: int = 3, shingle_size: int = 3):
+        self.catalog = catalog
+        self.max_distance = max_distance
+        self.band_count = max_distance + 1
+        self.shingle_size = shingle_size
+
+    def signature(self, text: str) -> ChunkSignature:
+        signature = simhash(text, self.shingle_size)
+        return ChunkSignature(content_hash(text), signature,
+                              bands(signature, self.band_count) if signature is not None else [])
+
+    def filter(self, chunks: Sequence[Document]) -> DedupResult:
+        result = DedupResult()
+        # Firmas de los chunks conservados en este lote, para detectar duplicados internos.
+        batch_hashes: Dict[Tuple[str, str, str], int] = {}
+        batch_bands: Dict[Tuple[str, str, int, int], List[int]] = {}
+        for chunk in chunks:
+            tenant = chunk.metadata.get("tenant", "")
+            owner = chunk.metadata.get("owner", "")
+            signature = self.signature(chunk.page_content)
+            canonical, kind = self._find(signature, tenant, owner, result, batch_hashes, batch_bands)
+            if canonical is not None:
+                result.dropped.append(chunk)
+                result.duplicates.append(canonical)
+                setattr(result, kind, getattr(result, kind) + 1)
+                continue
+            position = len(result.kept)
+            result.kept.append(chunk)
+            result.signatures.append(signature)
+            batch_hashes[(tenant, owner, signature.content_hash)] = position
+            if signature.simhash is not None:
+                for band, value in enumerate(signature.bands):
+                    batch_bands.setdefault((tenant, owner, band, value), []).append(position)
+        if result.duplicates:
+            logger.debug("Deduplicación: %s exactos y %s casi duplicados de %s chunks",
+                         result.exact, result.near, len(chunks))
+        return result
+
+    def _find(self, signature: ChunkSignature, tenant: str, owner: str, result: DedupResult,
+              batch_hashes, batch_bands) -> Tuple[Optional[Union[str, int]], str]:
+        position = batch_hashes.get((tenant, owner, signature.content_hash))
+        if position is not None:
+            return position, "exact"
+        stored = self.catalog.find_by_hash(signature.content_hash, tenant, owner)
+        if stored is not None:
+            return stored, "exact"
+        if signature.simhash is None:
+            return None, ""
+        for band, value in enumerate(signature.bands):
+            for position in batch_bands.get((tenant, owner, band, value), []):
+                if hamming(signature.simhash, result.signatures[position].simhash) <= self.max_distance:
+                    return position, "near"
+        for chunk_id, candidate in self.catalog.find_by_bands(signature.bands, tenant, owner):
+            if hamming(signature.simhash, candidate) <= self.max_distance:
+                return chunk_id, "near"
+        return None, ""
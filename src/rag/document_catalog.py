@@ -0,0 +1,371 @@
+# src/rag/document_catalog.py
+
+import os
+import time
+import sqlite3
+from contextlib import contextmanager
+from threading import Lock
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+from .logging_config import logger
+
+_DOCUMENT_COLUMNS = ("source", "owner", "tenant", "doc_type", "chunk_count", "duplicate_chunks",
+                     "bytes", "tokens", "ingested")
+
+
+def _to_signed(value: int) -> int:
+    """SQLite guarda enteros de 64 bits con signo."""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _to_unsigned(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+class DocumentCatalog:
+    """
+    Catálogo de documentos ingeridos, persistido en SQLite (modo WAL).
+
+    Por cada documento guarda sus ids de chunk, el número de chunks, los bytes
+    de texto, los tokens y la fecha de ingesta. Un documento se identifica por
+    (tenant, owner, source): dos usuarios pueden cargar la misma ruta sin
+    pisarse. Listar documentos o borrar uno consulta solo sus filas, sin
+    recorrer la colección de Chroma.
+
+    También guarda las firmas de deduplicación de cada chunk (hash exacto y
+    bandas de la SimHash). Un chunk descartado por duplicado se registra como
+    referencia del documento a la copia canónica, de modo que un chunk puede
+    pertenecer a varios documentos y solo se borra con el último de ellos.
+
+    El catálogo se actualiza en la misma operación que el vector store, cada
+    cambio en una transacción: tras insertar los chunks en una ingesta y tras
+    eliminarlos en un borrado. Si falla el vector store el catálogo no cambia y
+    el borrado puede reintentarse.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.lock = Lock()
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._migrate_scope()
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "source TEXT NOT NULL, owner TEXT NOT NULL DEFAULT '', tenant TEXT NOT NULL DEFAULT '', "
+            "doc_type TEXT NOT NULL DEFAULT '', chunk_count INTEGER NOT NULL, "
+            "duplicate_chunks INTEGER NOT NULL DEFAULT 0, bytes INTEGER NOT NULL, "
+            "tokens INTEGER NOT NULL, ingested REAL NOT NULL, PRIMARY KEY (tenant, owner, source))"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "tenant TEXT NOT NULL, owner TEXT NOT NULL, source TEXT NOT NULL, chunk_id TEXT NOT NULL, "
+            "PRIMARY KEY (tenant, owner, source, chunk_id)) WITHOUT ROWID"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_id ON chunks (chunk_id)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS signatures ("
+            "chunk_id TEXT PRIMARY KEY, content_hash TEXT NOT NULL, simhash INTEGER, "
+            "tenant TEXT NOT NULL, owner TEXT NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_signatures_hash ON signatures (content_hash, tenant)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS signature_bands ("
+            "band INTEGER NOT NULL, value INTEGER NOT NULL, chunk_id TEXT NOT NULL, "
+            "PRIMARY KEY (band, value, chunk_id)) WITHOUT ROWID"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_signature_bands_chunk ON signature_bands (chunk_id)")
+
+    def _migrate_scope(self) -> None:
+        """
+        Los catálogos anteriores usaban `source` como clave de los documentos y
+        de sus chunks. Se copian a las tablas con clave (tenant, owner, source).
+        """
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(chunks)")}
+        if not columns or "tenant" in columns:
+            return
+        document_columns = {row[1] for row in self.conn.execute("PRAGMA table_info(documents)")}
+        duplicates = "duplicate_chunks" if "duplicate_chunks" in document_columns else "0"
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.execute("ALTER TABLE documents RENAME TO documents_v1")
+            self.conn.execute("ALTER TABLE chunks RENAME TO chunks_v1")
+            self.conn.execute("DROP INDEX IF EXISTS idx_documents_scope")
+            self.conn.execute("DROP INDEX IF EXISTS idx_chunks_id")
+            self.conn.execute(
+                "CREATE TABLE documents ("
+                "source TEXT NOT NULL, owner TEXT NOT NULL DEFAULT '', tenant TEXT NOT NULL DEFAULT '', "
+                "doc_type TEXT NOT NULL DEFAULT '', chunk_count INTEGER NOT NULL, "
+                "duplicate_chunks INTEGER NOT NULL DEFAULT 0, bytes INTEGER NOT NULL, "
+                "tokens INTEGER NOT NULL, ingested REAL NOT NULL, PRIMARY KEY (tenant, owner, source))"
+            )
+            self.conn.execute(
+                "CREATE TABLE chunks ("
+                "tenant TEXT NOT NULL, owner TEXT NOT NULL, source TEXT NOT NULL, chunk_id TEXT NOT NULL, "
+                "PRIMARY KEY (tenant, owner, source, chunk_id)) WITHOUT ROWID"
+            )
+            self.conn.execute(
+                f"INSERT INTO documents SELECT source, owner, tenant, doc_type, chunk_count, {duplicates}, "
+                "bytes, tokens, ingested FROM documents_v1"
+            )
+            self.conn.execute(
+                "INSERT OR IGNORE INTO chunks SELECT d.tenant, d.owner, c.source, c.chunk_id "
+                "FROM chunks_v1 c JOIN documents_v1 d ON d.source = c.source"
+            )
+            self.conn.execute("DROP TABLE chunks_v1")
+            self.conn.execute("DROP TABLE documents_v1")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+        logger.info("Catálogo de documentos migrado a claves (tenant, owner, source)")
+
+    @staticmethod
+    def _scope(source: str, owner: Optional[str], tenant: Optional[str],
+               alias: str = "") -> Tuple[str, List[Any]]:
+        """Condición SQL de los documentos `source` del ámbito indicado (None: cualquiera)."""
+        conditions, params = [f"{alias}source = ?"], [source]
+        if tenant is not None:
+            conditions.append(f"{alias}tenant = ?")
+            params.append(tenant)
+        if owner is not None:
+            conditions.append(f"{alias}owner = ?")
+            params.append(owner)
+        return " AND ".join(conditions), params
+
+    @contextmanager
+    def _transaction(self):
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def record(self, source: str, ids: List[str], chunks: Iterable[Document], signatures: Sequence = (),
+               duplicate_ids: Sequence[str] = ()) -> None:
+        """
+        Registra los chunks `ids` de un documento, con sus firmas de
+        deduplicación si se indican, y las referencias `duplicate_ids` a copias
+        canónicas de los chunks descartados por duplicados. `chunks` contiene
+        el texto de unos y otros (para bytes y tokens); su metadata `owner` y
+        `tenant` identifica el documento junto con `source`. Si el documento ya
+        estaba en el catálogo (se ingirió de nuevo) se acumulan los chunks.
+        """
+        if not ids and not duplicate_ids:
+            return
+        size = tokens = 0
+        metadata: Dict[str, Any] = {}
+        for chunk in chunks:
+            size += len(chunk.page_content.encode("utf-8"))
+            tokens += int(chunk.metadata.get("token_count") or 0)
+            metadata = chunk.metadata
+        owner, tenant = metadata.get("owner", ""), metadata.get("tenant", "")
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO documents (source, owner, tenant, doc_type, chunk_count, duplicate_chunks, "
+                "bytes, tokens, ingested) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (tenant, owner, source) DO UPDATE SET "
+                "chunk_count = chunk_count + excluded.chunk_count, "
+                "duplicate_chunks = duplicate_chunks + excluded.duplicate_chunks, bytes = bytes + excluded.bytes, "
+                "tokens = tokens + excluded.tokens, ingested = excluded.ingested",
+                (source, owner, tenant, metadata.get("doc_type", ""), len(ids), len(duplicate_ids),
+                 size, tokens, time.time())
+            )
+            conn.executemany("INSERT OR IGNORE INTO chunks (tenant, owner, source, chunk_id) VALUES (?, ?, ?, ?)",
+                             [(tenant, owner, source, chunk_id) for chunk_id in list(ids) + list(duplicate_ids)])
+            for chunk_id, signature in zip(ids, signatures):
+                conn.execute(
+                    "INSERT OR REPLACE INTO signatures (chunk_id, content_hash, simhash, tenant, owner) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (chunk_id, signature.content_hash,
+                     _to_signed(signature.simhash) if signature.simhash is not None else None, tenant, owner)
+                )
+                conn.executemany("INSERT OR IGNORE INTO signature_bands (band, value, chunk_id) VALUES (?, ?, ?)",
+                                 [(band, value, chunk_id) for band, value in enumerate(signature.bands)])
+
+    def find_by_hash(self, content_hash: str, tenant: str, owner: str) -> Optional[str]:
+        """Chunk almacenado con el mismo texto, de `owner` en `tenant`."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT chunk_id FROM signatures WHERE content_hash = ? AND tenant = ? AND owner = ? LIMIT 1",
+                (content_hash, tenant, owner)
+            ).fetchone()
+        return row[0] if row else None
+
+    def find_by_bands(self, bands: Sequence[int], tenant: str, owner: str) -> List[Tuple[str, int]]:
+        """Candidatos (chunk_id, simhash) de `owner` en `tenant` que comparten alguna banda."""
+        if not bands:
+            return []
+        clauses = " OR ".join("(b.band = ? AND b.value = ?)" for _ in bands)
+        params: List[Any] = [v for pair in enumerate(bands) for v in pair]
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT DISTINCT s.chunk_id, s.simhash FROM signature_bands b "
+                f"JOIN signatures s ON s.chunk_id = b.chunk_id WHERE ({clauses}) "
+                "AND s.tenant = ? AND s.owner = ? AND s.simhash IS NOT NULL",
+                params + [tenant, owner]
+            ).fetchall()
+        return [(chunk_id, _to_unsigned(value)) for chunk_id, value in rows]
+
+    def list_documents(self, owner: Optional[str] = None, tenant: Optional[str] = None,
+                       limit: Optional[int] = None, offset: int = 0,
+                       include_shared: bool = False) -> List[Dict[str, Any]]:
+        """
+        Documentos del catálogo ordenados por `source`, opcionalmente filtrados
+        por tenant y propietario. Con `include_shared` se incluyen también los
+        documentos compartidos (sin propietario) del tenant.
+        """
+        query = f"SELECT {', '.join(_DOCUMENT_COLUMNS)} FROM documents"
+        conditions, params = [], []
+        if tenant is not None:
+            conditions.append("tenant = ?")
+            params.append(tenant)
+        if owner is not None:
+            conditions.append("owner IN (?, '')" if include_shared else "owner = ?")
+            params.append(owner)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY source, tenant, owner LIMIT ? OFFSET ?"
+        params.extend([-1 if limit is None else limit, offset])
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+        return [dict(zip(_DOCUMENT_COLUMNS, row)) for row in rows]
+
+    def get(self, source: str, owner: Optional[str] = None,
+            tenant: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        condition, params = self._scope(source, owner, tenant)
+        with self.lock:
+            row = self.conn.execute(
+                f"SELECT {', '.join(_DOCUMENT_COLUMNS)} FROM documents WHERE {condition} "
+                "ORDER BY tenant, owner LIMIT 1", params
+            ).fetchone()
+        return dict(zip(_DOCUMENT_COLUMNS, row)) if row else None
+
+    def chunk_ids(self, source: str, owner: Optional[str] = None, tenant: Optional[str] = None) -> List[str]:
+        """Chunks de los documentos `source` del ámbito (owner/tenant None: cualquiera)."""
+        condition, params = self._scope(source, owner, tenant)
+        with self.lock:
+            rows = self.conn.execute(f"SELECT DISTINCT chunk_id FROM chunks WHERE {condition}", params).fetchall()
+        return [row[0] for row in rows]
+
+    def known_chunk_ids(self, source: str, owner: str, tenant: str, ids: Sequence[str]) -> set:
+        """Cuáles de `ids` ya están registrados para el documento."""
+        if not ids:
+            return set()
+        condition, params = self._scope(source, owner, tenant)
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT chunk_id FROM chunks WHERE {condition} AND chunk_id IN ({', '.join('?' for _ in ids)})",
+                params + list(ids)
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def _exclusive(self, conn, source: str, owner: Optional[str], tenant: Optional[str]) -> List[str]:
+        inner, inner_params = self._scope(source, owner, tenant, "c.")
+        other, other_params = self._scope(source, owner, tenant, "o.")
+        return [row[0] for row in conn.execute(
+            f"SELECT DISTINCT c.chunk_id FROM chunks c WHERE {inner} AND NOT EXISTS ("
+            f"SELECT 1 FROM chunks o WHERE o.chunk_id = c.chunk_id AND NOT ({other}))",
+            inner_params + other_params
+        )]
+
+    def _successors(self, conn, source: str, owner: Optional[str],
+                    tenant: Optional[str]) -> Dict[str, Tuple[str, str, str]]:
+        inner, inner_params = self._scope(source, owner, tenant, "c.")
+        other, other_params = self._scope(source, owner, tenant, "o.")
+        successors: Dict[str, Tuple[str, str, str]] = {}
+        # Se prefiere un documento compartido, que ve todo el tenant.
+        for chunk_id, *key in conn.execute(
+            f"SELECT c.chunk_id, o.tenant, o.owner, o.source FROM chunks c JOIN chunks o "
+            f"ON o.chunk_id = c.chunk_id AND NOT ({other}) WHERE {inner} "
+            "ORDER BY o.owner != '', o.tenant, o.owner, o.source",
+            other_params + inner_params
+        ):
+            successors.setdefault(chunk_id, tuple(key))
+        return successors
+
+    def shared_chunk_successors(self, source: str, owner: Optional[str] = None,
+                                tenant: Optional[str] = None) -> Dict[str, Tuple[str, str, str]]:
+        """
+        Chunks del documento que otros documentos también referencian, con el
+        (tenant, owner, source) de uno de ellos: el que hereda la copia
+        canónica cuando se borra el documento.
+        """
+        with self.lock:
+            return self._successors(self.conn, source, owner, tenant)
+
+    def exclusive_chunk_ids(self, source: str, owner: Optional[str] = None,
+                            tenant: Optional[str] = None) -> List[str]:
+        """Chunks del documento que ningún otro documento referencia."""
+        with self.lock:
+            return self._exclusive(self.conn, source, owner, tenant)
+
+    def remove(self, source: str, owner: Optional[str] = None, tenant: Optional[str] = None) -> None:
+        """
+        Elimina el documento, sus referencias y las firmas de los chunks que
+        quedan sin documento. Las firmas de los chunks que siguen referenciados
+        pasan al ámbito del documento que los hereda.
+        """
+        condition, params = self._scope(source, owner, tenant)
+        with self._transaction() as conn:
+            orphans = self._exclusive(conn, source, owner, tenant)
+            conn.executemany("UPDATE signatures SET tenant = ?, owner = ? WHERE chunk_id = ?",
+                             [(key[0], key[1], chunk_id)
+                              for chunk_id, key in self._successors(conn, source, owner, tenant).items()])
+            conn.execute(f"DELETE FROM chunks WHERE {condition}", params)
+            conn.execute(f"DELETE FROM documents WHERE {condition}", params)
+            conn.executemany("DELETE FROM signatures WHERE chunk_id = ?", [(i,) for i in orphans])
+            conn.executemany("DELETE FROM signature_bands WHERE chunk_id = ?", [(i,) for i in orphans])
+
+    def totals(self) -> Dict[str, int]:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(chunk_count), 0), COALESCE(SUM(duplicate_chunks), 0), "
+                "COALESCE(SUM(bytes), 0), COALESCE(SUM(tokens), 0) FROM documents"
+            ).fetchone()
+        return dict(zip(("documents", "chunks", "duplicate_chunks", "bytes", "tokens"), row))
+
+    def clear(self) -> None:
+        with self._transaction() as conn:
+            for table in ("chunks", "documents", "signatures", "signature_bands"):
+                conn.execute(f"DELETE FROM {table}")
+
+    def rebuild(self, collection, page_size: int = 1000, signer: Optional[Callable[[str], Any]] = None) -> int:
+        """
+        Reconstruye el catálogo a partir de una colección de Chroma (recorrido
+        completo). Se usa una sola vez para colecciones creadas antes del
+        catálogo o restauradas desde un snapshot. Con `signer` (texto -> firma)
+        se calculan también las firmas de deduplicación. Retorna el número de
+        documentos.
+        """
+        groups: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+        offset = 0
+        while True:
+            page = collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                break
+            for chunk_id, text, metadata in zip(page["ids"], page["documents"], page["metadatas"]):
+                metadata = metadata or {}
+                key = (metadata.get("tenant", ""), metadata.get("owner", ""), metadata.get("source", ""))
+                group = groups.setdefault(key, {"ids": [], "chunks": []})
+                group["ids"].append(chunk_id)
+                group["chunks"].append(Document(page_content=text or "", metadata=metadata))
+            offset += len(page["ids"])
+        self.clear()
+        for (_, _, source), group in groups.items():
+            signatures = [signer(chunk.page_content) for chunk in group["chunks"]] if signer else ()
+            self.record(source, group["ids"], group["chunks"], signatures)
+        logger.info("Catálogo de documentos reconstruido: %s documentos", len(groups))
+        return len(groups)
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
@@ -1,5 +1,7 @@
 from pathlib import Path
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Iterator, Tuple
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import logging
 from langchain_community.document_loaders import (
     PyPDFLoader,
@@ -11,9 +13,17 @@ from langchain.schema import Document
 import os
 
 from .logging_config import logger
+from .chunker import TokenChunker, load_token_counter
 from ..config import GlobalConfig
 
 
+def _extract_pdf_pages(file_path: str, start: int, end: int) -> List[Tuple[int, str]]:
+    """Extrae el texto de las páginas [start, end) de un PDF (se ejecuta en un proceso worker)."""
+    from pypdf import PdfReader
+    reader = PdfReader(file_path)
+    return [(i, reader.pages[i].extract_text() or "") for i in range(start, end)]
+
+
 class DocumentLoader:
     """
     Sistema de carga y procesamiento de documentos para RAG.
@@ -30,9 +40,12 @@ class DocumentLoader:
             config: Configuración del sistema
         """
         self.config = config
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=config.MAX_CHUNK_SIZE,
-            chunk_overlap=config.CHUNK_OVERLAP
+        # Los chunks se miden en tokens, la misma unidad que usan el trimmer y el
+        # presupuesto de contexto.
+        self.chunker = TokenChunker(
+            chunk_tokens=config.CHUNK_TOKENS,
+            overlap_tokens=config.CHUNK_OVERLAP_TOKENS,
+            token_counter=load_token_counter(config.CHUNK_TOKENIZER)
         )
         self.supported_types = {
             '.pdf': PyPDFLoader,
@@ -56,19 +69,8 @@ class DocumentLoader:
             ValueError: Si el tipo de archivo no es soportado
         """
         try:
-            file_path = Path(file_path)
-            # Validación de path traversal
-            if '..' in file_path.parts or file_path.is_absolute():
-                raise ValueError("Ruta de archivo no permitida por seguridad.")
-            if not file_path.exists():
-                raise FileNotFoundError(f"Archivo no encontrado: {file_path}")
-            file_extension = file_path.suffix.lower()
-            if file_extension not in self.supported_types:
-                raise ValueError(f"Tipo de archivo no soportado: {file_extension}")
-            # Validar contra la configuración de tipos permitidos
-            if hasattr(self.config, 'ALLOWED_FILE_TYPES') and file_extension[1:] not in self.config.ALLOWED_FILE_TYPES:
-                raise ValueError(f"Tipo de archivo no permitido por configuración: {file_extension}")
-            loader_class = self.supported_types[file_extension]
+            file_path = self.validate_path(file_path)
+            loader_class = self.supported_types[file_path.suffix.lower()]
             loader = loader_class(str(file_path))
             
             # Cargar el documento
@@ -77,16 +79,127 @@ class DocumentLoader:
             # Dividir en chunks
             chunks = self.split_into_chunks(documents)
             
-            logger.info(f"Cargado y procesado {file_path.name}")
+            logger.info("Cargado y procesado %s", file_path.name)
             return chunks
             
         except Exception as e:
-            logger.error(f"Error al cargar documento {file_path}: {str(e)}")
+            logger.error("Error al cargar documento %s: %s", file_path, e)
             raise
             
+    def validate_path(self, file_path: str) -> Path:
+        """
+        Valida la ruta y el tipo de un archivo a ingerir.
+        
+        Raises:
+            ValueError: Si la ruta no está permitida o el tipo no es soportado
+            FileNotFoundError: Si el archivo no existe
+        """
+        file_path = Path(file_path)
+        # Validación de path traversal
+        if '..' in file_path.parts or file_path.is_absolute():
+            raise ValueError("Ruta de archivo no permitida por seguridad.")
+        if not file_path.exists():
+            raise FileNotFoundError(f"Archivo no encontrado: {file_path}")
+        file_extension = file_path.suffix.lower()
+        if file_extension not in self.supported_types:
+            raise ValueError(f"Tipo de archivo no soportado: {file_extension}")
+        # Validar contra la configuración de tipos permitidos
+        if hasattr(self.config, 'ALLOWED_FILE_TYPES') and file_extension[1:] not in self.config.ALLOWED_FILE_TYPES:
+            raise ValueError(f"Tipo de archivo no permitido por configuración: {file_extension}")
+        return file_path
+
+    def iter_documents(self, file_path: str) -> Iterator[Document]:
+        """
+        Lee un archivo de forma perezosa, página a página o bloque a bloque.
+        
+        Los archivos de texto se leen en bloques de INGEST_TEXT_BLOCK_CHARS
+        cortados en un límite de párrafo; los PDF se leen página a página, en
+        paralelo por rangos de páginas si INGEST_PDF_WORKERS > 1; el resto usa
+        el lazy_load del loader de LangChain.
+        """
+        file_path = self.validate_path(file_path)
+        file_extension = file_path.suffix.lower()
+        if file_extension in ('.txt', '.md'):
+            yield from self._iter_text_blocks(file_path)
+        elif file_extension == '.pdf' and self.config.INGEST_PDF_WORKERS > 1:
+            yield from self._iter_pdf_pages_parallel(file_path)
+        else:
+            loader = self.supported_types[file_extension](str(file_path))
+            yield from loader.lazy_load()
+
+    def iter_chunk_batches(self, file_path: str, batch_size: Optional[int] = None) -> Iterator[List[Document]]:
+        """
+        Carga un documento en modo streaming y emite sus chunks en lotes acotados.
+        
+        Solo se mantienen en memoria el bloque o página actual y un lote de
+        chunks, de modo que el pico de memoria no depende del tamaño del archivo.
+        
+        Args:
+            file_path: Ruta al archivo a cargar
+            batch_size: Chunks por lote (por defecto INGEST_BATCH_SIZE)
+        """
+        batch_size = batch_size or self.config.INGEST_BATCH_SIZE
+        batch: List[Document] = []
+        total = 0
+        for chunk in self.chunker.iter_chunks(self.iter_documents(file_path)):
+            batch.append(chunk)
+            if len(batch) >= batch_size:
+                total += len(batch)
+                yield batch
+                batch = []
+        if batch:
+            total += len(batch)
+            yield batch
+        logger.info("Procesado en streaming %s: %s chunks", Path(file_path).name, total)
+
+    def _iter_text_blocks(self, file_path: Path) -> Iterator[Document]:
+        block_chars = self.config.INGEST_TEXT_BLOCK_CHARS
+        pending = ""
+        with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+            while True:
+                data = f.read(max(1, block_chars - len(pending)))
+                if not data:
+                    break
+                text = pending + data
+                # Se corta en el último límite de párrafo (o de línea) para no partir frases.
+                cut = text.rfind("\n\n")
+                if cut <= 0:
+                    cut = text.rfind("\n")
+                if cut <= 0:
+                    cut = len(text)
+                pending = text[cut:]
+                yield Document(page_content=text[:cut], metadata={"source": str(file_path)})
+        if pending.strip():
+            yield Document(page_content=pending, metadata={"source": str(file_path)})
+
+    def _iter_pdf_pages_parallel(self, file_path: Path) -> Iterator[Document]:
+        from pypdf import PdfReader
+        total_pages = len(PdfReader(str(file_path)).pages)
+        step = self.config.INGEST_PDF_PAGES_PER_TASK
+        workers = self.config.INGEST_PDF_WORKERS
+        ranges = iter([(start, min(start + step, total_pages)) for start in range(0, total_pages, step)])
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # Ventana acotada de rangos en vuelo: las páginas se emiten en orden
+            # sin acumular el documento completo en memoria.
+            in_flight = deque()
+            for start, end in ranges:
+                in_flight.append(executor.submit(_extract_pdf_pages, str(file_path), start, end))
+                if len(in_flight) >= workers * 2:
+                    yield from self._pdf_pages_to_documents(file_path, in_flight.popleft().result())
+            while in_flight:
+                yield from self._pdf_pages_to_documents(file_path, in_flight.popleft().result())
+
+    @staticmethod
+    def _pdf_pages_to_documents(file_path: Path, pages: List[Tuple[int, str]]) -> Iterator[Document]:
+        for page, text in pages:
+            yield Document(page_content=text, metadata={"source": str(file_path), "page": page})
+
     def split_into_chunks(self, documents: List[Document]) -> List[Document]:
         """
-        Divide documentos en chunks usando el text splitter configurado.
+        Divide documentos en chunks usando el chunker por tokens.
+        
+        Todas las páginas se procesan en una sola pasada y cada chunk lleva en
+        sus metadatos `token_count` y `content_hash`.
         
         Args:
             documents: Lista de documentos a dividir
@@ -95,17 +208,12 @@ class DocumentLoader:
             Lista de documentos divididos en chunks
         """
         try:
-            chunks = []
-            for doc in documents:
-                # Dividir el documento en chunks
-                doc_chunks = self.text_splitter.split_documents([doc])
-                chunks.extend(doc_chunks)
-                
-            logger.info(f"Dividido documento en {len(chunks)} chunks")
+            chunks = self.chunker.split_documents(documents)
+            logger.info("Dividido documento en %s chunks", len(chunks))
             return chunks
             
         except Exception as e:
-            logger.error(f"Error al dividir documento en chunks: {str(e)}")
+            logger.error("Error al dividir documento en chunks: %s", e)
             raise
             
     def load_multiple_documents(self, file_paths: List[str]) -> List[Document]:
@@ -124,7 +232,7 @@ class DocumentLoader:
                 chunks = self.load_document(file_path)
                 all_chunks.extend(chunks)
             except Exception as e:
-                logger.error(f"Error al procesar {file_path}: {str(e)}")
+                logger.error("Error al procesar %s: %s", file_path, e)
                 continue
                 
         return all_chunks
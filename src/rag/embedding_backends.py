@@ -0,0 +1,191 @@
+# src/rag/embedding_backends.py
+
+import platform
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+from .logging_config import logger
+
+# Backends de inferencia soportados. "torch" es el modelo original en fp32.
+BACKENDS = ("torch", "onnx", "openvino")
+
+# Archivo del modelo ONNX cuantizado que genera sentence-transformers para cada
+# configuración de cuantización dinámica.
+ONNX_QINT8_FILE = "onnx/model_qint8_{quantization}.onnx"
+
+
+def _cpu_quantization_target() -> str:
+    """Elige la configuración de cuantización int8 de ONNX Runtime para esta CPU."""
+    machine = platform.machine().lower()
+    if machine in ("arm64", "aarch64"):
+        return "arm64"
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8") as f:
+            flags = f.read()
+    except OSError:
+        return "avx2"
+    if "avx512_vnni" in flags:
+        return "avx512_vnni"
+    if "avx512" in flags:
+        return "avx512"
+    return "avx2"
+
+
+def configure_torch_threads(threads: int, interop_threads: int) -> None:
+    """Fija los hilos intra-op e inter-op de PyTorch (0 = valor por defecto)."""
+    import torch
+    if threads > 0:
+        torch.set_num_threads(threads)
+    if interop_threads > 0:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError:
+            # Solo puede fijarse antes del primer trabajo en paralelo del proceso.
+            logger.warning("No se pudo fijar los hilos inter-op de PyTorch: ya hay trabajo en paralelo")
+
+
+def artifact_path(artifacts_dir: str, model_name: str, backend: str) -> Path:
+    """Directorio local donde se guarda el modelo exportado para un backend."""
+    return Path(artifacts_dir) / f"{model_name.replace('/', '__')}-{backend}"
+
+
+class EmbeddingBackendLoader:
+    """
+    Carga el modelo de embeddings con el backend de inferencia configurado.
+
+    - torch: PyTorch fp32; con quantize=True se aplica cuantización dinámica int8
+      a las capas lineales (se hace al cargar, no requiere artefactos).
+    - onnx: ONNX Runtime; con quantize=True, cuantización dinámica int8 para la
+      CPU detectada.
+    - openvino: OpenVINO fp32.
+
+    Los modelos exportados (y cuantizados) se guardan en `artifacts_dir`, de modo
+    que la exportación solo se hace la primera vez. Si falta la dependencia de un
+    backend o la exportación falla, se recurre a PyTorch fp32.
+    """
+    def __init__(self, model_name: str, backend: str = "torch", quantize: bool = False,
+                 threads: int = 0, interop_threads: int = 0, artifacts_dir: str = "./models"):
+        if backend not in BACKENDS:
+            raise ValueError(f"Backend de embeddings no soportado: {backend}")
+        self.model_name = model_name
+        self.backend = backend
+        self.quantize = quantize
+        self.threads = threads
+        self.interop_threads = interop_threads
+        self.artifacts_dir = artifacts_dir
+        # Backend realmente cargado (distinto de `name` si hubo que recurrir a PyTorch).
+        self.loaded_backend: Optional[str] = None
+
+    @classmethod
+    def from_config(cls, config) -> "EmbeddingBackendLoader":
+        return cls(
+            model_name=config.EMBEDDING_MODEL,
+            backend=config.EMBEDDING_BACKEND,
+            quantize=config.EMBEDDING_QUANTIZE,
+            threads=config.EMBEDDING_THREADS,
+            interop_threads=config.EMBEDDING_INTEROP_THREADS,
+            artifacts_dir=config.EMBEDDING_ARTIFACTS_DIR,
+        )
+
+    @property
+    def name(self) -> str:
+        return f"{self.backend}-int8" if self.quantize else self.backend
+
+    def load(self) -> SentenceTransformer:
+        configure_torch_threads(self.threads, self.interop_threads)
+        self.loaded_backend = self.name
+        if self.backend == "torch":
+            return self._load_torch()
+        try:
+            if self.backend == "onnx":
+                return self._load_onnx()
+            return self._load_openvino()
+        except Exception as e:
+            logger.warning("No se pudo cargar el backend %s, se usa PyTorch fp32: %s", self.name, e)
+            self.loaded_backend = "torch"
+            return SentenceTransformer(self.model_name)
+
+    def _load_torch(self) -> SentenceTransformer:
+        model = SentenceTransformer(self.model_name, device="cpu")
+        if self.quantize:
+            import torch
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return model
+
+    def _onnx_model_kwargs(self) -> Dict[str, Any]:
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        if self.threads > 0:
+            options.intra_op_num_threads = self.threads
+        if self.interop_threads > 0:
+            options.inter_op_num_threads = self.interop_threads
+            options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+        return {"provider": "CPUExecutionProvider", "session_options": options}
+
+    def _load_onnx(self) -> SentenceTransformer:
+        path = artifact_path(self.artifacts_dir, self.model_name, "onnx")
+        if not (path / "onnx" / "model.onnx").exists():
+            logger.info("Exportando %s a ONNX en %s", self.model_name, path)
+            SentenceTransformer(self.model_name, backend="onnx").save(str(path))
+
+        model_kwargs = self._onnx_model_kwargs()
+        if self.quantize:
+            target = _cpu_quantization_target()
+            file_name = ONNX_QINT8_FILE.format(quantization=target)
+            if not (path / file_name).exists():
+                from sentence_transformers.backend import export_dynamic_quantized_onnx_model
+                logger.info("Cuantizando %s a int8 (%s)", self.model_name, target)
+                export_dynamic_quantized_onnx_model(
+                    SentenceTransformer(str(path), backend="onnx"), target, str(path)
+                )
+            model_kwargs["file_name"] = file_name
+        return SentenceTransformer(str(path), backend="onnx", model_kwargs=model_kwargs)
+
+    def _load_openvino(self) -> SentenceTransformer:
+        if self.quantize:
+            # La cuantización int8 de OpenVINO es estática y requiere un conjunto de calibración.
+            logger.warning("La cuantización int8 no está disponible con OpenVINO; se usa fp32")
+        path = artifact_path(self.artifacts_dir, self.model_name, "openvino")
+        if not (path / "openvino" / "openvino_model.xml").exists():
+            logger.info("Exportando %s a OpenVINO en %s", self.model_name, path)
+            SentenceTransformer(self.model_name, backend="openvino").save(str(path))
+        model_kwargs: Dict[str, Any] = {}
+        if self.threads > 0:
+            model_kwargs["ov_config"] = {"INFERENCE_NUM_THREADS": str(self.threads)}
+        return SentenceTransformer(str(path), backend="openvino", model_kwargs=model_kwargs)
+
+
+def embedding_parity(reference: np.ndarray, candidate: np.ndarray) -> Dict[str, float]:
+    """
+    Compara los embeddings de un backend con los de referencia (fp32).
+
+    Retorna la similitud coseno mínima y media entre pares y el error absoluto
+    máximo. Una similitud mínima por debajo de ~0.99 indica que el backend
+    cambia el ranking de la búsqueda de forma apreciable.
+    """
+    reference = np.asarray(reference, dtype=np.float32)
+    candidate = np.asarray(candidate, dtype=np.float32)
+    if reference.shape != candidate.shape:
+        raise ValueError(f"Dimensiones distintas: {reference.shape} != {candidate.shape}")
+    norms = np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1)
+    cosine = np.sum(reference * candidate, axis=1) / np.maximum(norms, 1e-12)
+    return {
+        "min_cosine": float(cosine.min()),
+        "mean_cosine": float(cosine.mean()),
+        "max_abs_diff": float(np.abs(reference - candidate).max()),
+    }
+
+
+def sample_texts(n: int, words: int = 40, seed: int = 0) -> List[str]:
+    """Genera textos sintéticos reproducibles para medir el rendimiento."""
+    vocabulary = (
+        "el sistema procesa documentos y responde preguntas sobre políticas seguridad "
+        "manual usuario datos modelo búsqueda vector contexto respuesta servicio red "
+        "configuración acceso permisos archivo informe cliente soporte proceso"
+    ).split()
+    rng = np.random.default_rng(seed)
+    return [" ".join(rng.choice(vocabulary, size=words)) for _ in range(n)]
+
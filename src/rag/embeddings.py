@@ -5,11 +5,14 @@ import logging
 import numpy as np
 from typing import List, Dict, Optional, Any
 from sentence_transformers import SentenceTransformer
+from langchain_core.embeddings import Embeddings
 from functools import lru_cache
 from threading import Lock
 
 from .logging_config import logger
 from src.config import GlobalConfig as Config
+from src.metrics import metrics
+from .embedding_backends import EmbeddingBackendLoader, configure_torch_threads
 
 
 class EmbeddingCache:
@@ -42,15 +45,23 @@ class EmbeddingCache:
             self.cache.clear()
             self.size = 0
 
-class EmbeddingGenerator:
+class EmbeddingGenerator(Embeddings):
     """
     Generador de embeddings usando sentence-transformers.
+    Implementa la interfaz Embeddings de LangChain para que Chroma use la caché
+    y las métricas de este generador.
     """
     def __init__(self, config: Config):
         self.config = config
-        self.model = SentenceTransformer(config.EMBEDDING_MODEL)
+        loader = EmbeddingBackendLoader.from_config(config)
+        if loader.name == "torch":
+            configure_torch_threads(config.EMBEDDING_THREADS, config.EMBEDDING_INTEROP_THREADS)
+            self.model = SentenceTransformer(config.EMBEDDING_MODEL)
+        else:
+            self.model = loader.load()
         self.cache = EmbeddingCache(config.CACHE_MAX_SIZE)
-        logger.info(f"Inicializado EmbeddingGenerator con modelo {config.EMBEDDING_MODEL}")
+        logger.info("Inicializado EmbeddingGenerator con modelo %s (backend %s)", config.EMBEDDING_MODEL,
+                    loader.loaded_backend or loader.name)
         
     # =============================================================================
     # CAMBIO: Se añade el método 'get_model' que faltaba.
@@ -67,7 +78,7 @@ class EmbeddingGenerator:
             self.cache.add(text, embedding)
             return embedding
         except Exception as e:
-            logger.error(f"Error generando embedding: {str(e)}")
+            logger.error("Error generando embedding: %s", e)
             raise
             
     def generate_embeddings(self, texts: List[str]) -> List[np.ndarray]:
@@ -81,9 +92,35 @@ class EmbeddingGenerator:
                 self.cache.add(text, embedding)
             return embeddings
         except Exception as e:
-            logger.error(f"Error generando embeddings: {str(e)}")
+            logger.error("Error generando embeddings: %s", e)
             raise
             
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Genera embeddings para documentos (interfaz Embeddings de LangChain)."""
+        with metrics.span("embed", kind="documents"):
+            embeddings = self.generate_embeddings(texts)
+        return np.asarray(embeddings, dtype=np.float32).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        """Genera el embedding de una consulta, usando la caché si está habilitada."""
+        if self.config.CACHE_ENABLED:
+            cached = self.cache.get(text)
+            if cached is not None:
+                metrics.inc("chatbot_cache_hits_total", cache="embedding")
+                return cached.tolist()
+            metrics.inc("chatbot_cache_misses_total", cache="embedding")
+        try:
+            with metrics.span("embed", kind="query"):
+                embedding = np.ravel(np.asarray(
+                    self.model.encode(text, show_progress_bar=False), dtype=np.float32
+                ))
+            if self.config.CACHE_ENABLED:
+                self.cache.add(text, embedding)
+            return embedding.tolist()
+        except Exception as e:
+            logger.error("Error generando embedding de consulta: %s", e)
+            raise
+
     def clear_cache(self) -> None:
         self.cache.clear()
         logger.info("Caché de embeddings limpiada")
@@ -96,5 +133,5 @@ class EmbeddingGenerator:
             _ = self.model.encode("test")
             return True
         except Exception as e:
-            logger.error(f"Error al verificar el modelo: {str(e)}")
+            logger.error("Error al verificar el modelo: %s", e)
             return False
\ No newline at end of file
@@ -0,0 +1,209 @@
+# src/rag/history_store.py
+
+import os
+import json
+import time
+import sqlite3
+from abc import ABC, abstractmethod
+from threading import Lock
+from typing import Any, Dict, Iterator, List, Optional
+
+
+class HistoryStore(ABC):
+    """
+    Almacén de mensajes append-only por conversación.
+
+    Cada mensaje recibe un número de secuencia creciente dentro de su
+    conversación (`seq`), que sirve de cursor para la lectura paginada.
+    """
+
+    @abstractmethod
+    def append(self, conversation_id: str, role: str, content: str,
+               metadata: Optional[Dict[str, Any]] = None) -> int:
+        """Agrega un mensaje y retorna su número de secuencia."""
+
+    @abstractmethod
+    def get_messages(self, conversation_id: str, limit: Optional[int] = None,
+                     before: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Retorna los `limit` mensajes más recientes anteriores a `before`
+        (o los más recientes de la conversación), en orden cronológico.
+        """
+
+    @abstractmethod
+    def count(self, conversation_id: str) -> int:
+        """Número de mensajes de la conversación."""
+
+    @abstractmethod
+    def clear(self, conversation_id: Optional[str] = None) -> None:
+        """Elimina una conversación, o todas si no se indica ninguna."""
+
+    def iter_messages(self, conversation_id: str, page_size: int = 100,
+                      reverse: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        Recorre la conversación cargando una página cada vez.
+
+        Con reverse=True se recorre desde el mensaje más reciente hacia atrás.
+        """
+        if reverse:
+            before = None
+            while True:
+                page = self.get_messages(conversation_id, limit=page_size, before=before)
+                if not page:
+                    return
+                yield from reversed(page)
+                before = page[0]["seq"]
+        else:
+            after = 0
+            while True:
+                page = self._get_after(conversation_id, after, page_size)
+                if not page:
+                    return
+                yield from page
+                after = page[-1]["seq"]
+
+    @abstractmethod
+    def _get_after(self, conversation_id: str, after: int, limit: int) -> List[Dict[str, Any]]:
+        """Retorna hasta `limit` mensajes con seq mayor que `after`, en orden cronológico."""
+
+
+class InMemoryHistoryStore(HistoryStore):
+    """Almacén en RAM. Los números de secuencia coinciden con la posición + 1."""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.conversations: Dict[str, List[Dict[str, Any]]] = {}
+
+    def append(self, conversation_id, role, content, metadata=None):
+        with self.lock:
+            messages = self.conversations.setdefault(conversation_id, [])
+            seq = len(messages) + 1
+            messages.append({
+                "seq": seq, "role": role, "content": content,
+                "metadata": metadata or {}, "created": time.time()
+            })
+            return seq
+
+    def get_messages(self, conversation_id, limit=None, before=None):
+        with self.lock:
+            messages = self.conversations.get(conversation_id, [])
+            end = len(messages) if before is None else max(0, min(before - 1, len(messages)))
+            start = 0 if limit is None else max(0, end - limit)
+            return [dict(m) for m in messages[start:end]]
+
+    def _get_after(self, conversation_id, after, limit):
+        with self.lock:
+            messages = self.conversations.get(conversation_id, [])
+            return [dict(m) for m in messages[after:after + limit]]
+
+    def count(self, conversation_id):
+        with self.lock:
+            return len(self.conversations.get(conversation_id, []))
+
+    def clear(self, conversation_id=None):
+        with self.lock:
+            if conversation_id is None:
+                self.conversations.clear()
+            else:
+                self.conversations.pop(conversation_id, None)
+
+
+class SQLiteHistoryStore(HistoryStore):
+    """
+    Almacén persistente en SQLite (modo WAL).
+
+    La tabla está agrupada por (conversation_id, seq), de modo que agregar un
+    mensaje o leer los últimos N de una conversación cuesta lo mismo con 10 que
+    con 10.000 mensajes.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.lock = Lock()
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            "conversation_id TEXT NOT NULL, seq INTEGER NOT NULL, role TEXT NOT NULL, "
+            "content TEXT NOT NULL, metadata TEXT, created REAL NOT NULL, "
+            "PRIMARY KEY (conversation_id, seq)) WITHOUT ROWID"
+        )
+
+    def append(self, conversation_id, role, content, metadata=None):
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                seq = self.conn.execute(
+                    "SELECT COALESCE(MAX(seq), 0) + 1 FROM messages WHERE conversation_id = ?",
+                    (conversation_id,)
+                ).fetchone()[0]
+                self.conn.execute(
+                    "INSERT INTO messages (conversation_id, seq, role, content, metadata, created) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (conversation_id, seq, role, content,
+                     json.dumps(metadata or {}, ensure_ascii=False), time.time())
+                )
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+            return seq
+
+    def get_messages(self, conversation_id, limit=None, before=None):
+        query = "SELECT seq, role, content, metadata, created FROM messages WHERE conversation_id = ?"
+        params: List[Any] = [conversation_id]
+        if before is not None:
+            query += " AND seq < ?"
+            params.append(before)
+        query += " ORDER BY seq DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+        return [self._to_dict(row) for row in reversed(rows)]
+
+    def _get_after(self, conversation_id, after, limit):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT seq, role, content, metadata, created FROM messages "
+                "WHERE conversation_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+                (conversation_id, after, limit)
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def count(self, conversation_id):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM messages WHERE conversation_id = ?", (conversation_id,)
+            ).fetchone()[0]
+
+    def clear(self, conversation_id=None):
+        with self.lock:
+            if conversation_id is None:
+                self.conn.execute("DELETE FROM messages")
+            else:
+                self.conn.execute("DELETE FROM messages WHERE conversation_id = ?", (conversation_id,))
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
+
+    @staticmethod
+    def _to_dict(row) -> Dict[str, Any]:
+        seq, role, content, metadata, created = row
+        return {
+            "seq": seq, "role": role, "content": content,
+            "metadata": json.loads(metadata) if metadata else {}, "created": created
+        }
+
+
+def create_history_store(config) -> HistoryStore:
+    """Crea el almacén según MEMORY_TYPE (in_memory o persistent)."""
+    if config.MEMORY_TYPE == "persistent":
+        return SQLiteHistoryStore(os.path.join(config.MEMORY_PERSIST_DIR, "chat_history.db"))
+    return InMemoryHistoryStore()
@@ -1,28 +1,149 @@
 import os
+import copy
+import json
+import time
+import queue
+import atexit
 import logging
-from logging.handlers import RotatingFileHandler
+from threading import Lock
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 from ..config import config
 
+
+class JsonFormatter(logging.Formatter):
+    """Formatea cada registro como una línea JSON (logging estructurado)."""
+
+    def format(self, record):
+        payload = {
+            "timestamp": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "module": record.module,
+            "line": record.lineno,
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload["exc_info"] = record.exc_text
+        if record.stack_info:
+            payload["stack_info"] = self.formatStack(record.stack_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Limita los registros repetidos por debajo de WARNING.
+
+    Cada plantilla de mensaje (logger, nivel y texto sin formatear) puede emitir
+    como máximo `max_per_interval` registros por intervalo; el resto se descarta
+    y el primer registro del siguiente intervalo indica cuántos se suprimieron.
+    """
+
+    def __init__(self, max_per_interval: int, interval: float = 1.0):
+        super().__init__()
+        self.max_per_interval = max_per_interval
+        self.interval = interval
+        self.lock = Lock()
+        self.windows = {}  # {clave: [inicio_ventana, emitidos, suprimidos]}
+
+    def filter(self, record):
+        if self.max_per_interval <= 0 or record.levelno >= logging.WARNING:
+            return True
+        key = (record.name, record.levelno, record.msg)
+        now = time.monotonic()
+        with self.lock:
+            window = self.windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window else 0
+                self.windows[key] = [now, 1, 0]
+                if suppressed:
+                    record.msg = f"{record.msg} [{suppressed} mensajes similares suprimidos]"
+                return True
+            if window[1] < self.max_per_interval:
+                window[1] += 1
+                return True
+            window[2] += 1
+            return False
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    QueueHandler que nunca bloquea el hilo de la petición.
+
+    Solo resuelve el mensaje y el traceback antes de encolar; el formateo final
+    y la escritura ocurren en el hilo del QueueListener. Si la cola está llena
+    el registro se descarta y se contabiliza en `dropped`.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _build_formatter():
+    if config.LOG_FORMAT.lower() == "json":
+        return JsonFormatter()
+    return logging.Formatter(
+        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+
+# QueueListener que escribe los registros en segundo plano.
+listener = None
+
+
 def setup_logger():
-    """Configura el logger global para toda la aplicación."""
-    logs_dir = config.LOG_FILE
-    os.makedirs(os.path.dirname(logs_dir), exist_ok=True)
+    """
+    Configura el logger global para toda la aplicación.
+
+    Los registros se encolan desde el hilo que los emite y un QueueListener en
+    segundo plano los escribe en el archivo rotativo y en la consola.
+    """
+    global listener
     logger = logging.getLogger('chatbot')
     logger.setLevel(config.LOG_LEVEL.upper())
+    if logger.handlers:
+        return logger
+
+    logs_dir = os.path.dirname(config.LOG_FILE)
+    if logs_dir:
+        os.makedirs(logs_dir, exist_ok=True)
     handler = RotatingFileHandler(
-        logs_dir,
+        config.LOG_FILE,
         maxBytes=1024 * 1024 * 5,  # 5MB
         backupCount=5
     )
     console_handler = logging.StreamHandler()
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
+    formatter = _build_formatter()
     handler.setFormatter(formatter)
     console_handler.setFormatter(formatter)
-    if not logger.hasHandlers():
-        logger.addHandler(handler)
-        logger.addHandler(console_handler)
+
+    queue_handler = NonBlockingQueueHandler(queue.Queue(maxsize=config.LOG_QUEUE_SIZE))
+    queue_handler.addFilter(RateLimitFilter(config.LOG_RATE_LIMIT))
+    listener = QueueListener(
+        queue_handler.queue, handler, console_handler, respect_handler_level=True
+    )
+    listener.start()
+    # Al salir se vacía la cola para no perder los últimos registros.
+    atexit.register(listener.stop)
+
+    logger.addHandler(queue_handler)
     return logger
 
 logger = setup_logger()
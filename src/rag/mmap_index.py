@@ -0,0 +1,456 @@
+# src/rag/mmap_index.py
+
+import os
+import json
+import time
+import uuid
+import shutil
+from threading import Lock
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever as LangChainBaseRetriever
+
+from .logging_config import logger
+from .sharding import relevance_score_fn
+from .snapshot import decode_strings, encode_strings, iter_collection
+
+MANIFEST_FILE = "MANIFEST.json"
+SEGMENTS_DIR = "segments"
+_COLUMNS = ("ids", "texts", "metadatas")
+# Metadatos que se guardan además como columnas codificadas, para filtrar por
+# alcance con una máscara vectorizada en lugar de decodificar cada JSON.
+SCOPE_COLUMNS = ("owner", "tenant")
+# Fracción de filas eliminadas (marcadas en el manifiesto) a partir de la cual
+# se compacta el índice para liberar su espacio.
+MAX_DELETED_RATIO = 0.25
+
+
+def matches_filter(metadata: Dict[str, Any], where: Optional[Dict[str, Any]]) -> bool:
+    """Evalúa un filtro de metadatos con la sintaxis de Chroma ($and, $or, $eq, $ne, $in, $nin)."""
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, c) for c in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_filter(metadata, c) for c in condition):
+                return False
+        else:
+            value = metadata.get(key)
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            for op, operand in condition.items():
+                if op == "$eq" and value != operand:
+                    return False
+                if op == "$ne" and value == operand:
+                    return False
+                if op == "$in" and value not in operand:
+                    return False
+                if op == "$nin" and value in operand:
+                    return False
+    return True
+
+
+def chroma_distance(similarity: float, space: str) -> float:
+    """
+    Distancia que daría Chroma en el espacio `space` entre dos vectores
+    unitarios con similitud coseno `similarity` (l2 es la distancia al cuadrado).
+    """
+    return 2.0 - 2.0 * similarity if space == "l2" else 1.0 - similarity
+
+
+def encode_codes(values: Sequence[Any]) -> Tuple[np.ndarray, List[str]]:
+    """
+    Columna de textos como códigos int32 más el vocabulario de valores
+    distintos. Los valores ausentes o que no son texto tienen el código -1.
+    """
+    vocabulary: Dict[str, int] = {}
+    codes = np.fromiter((vocabulary.setdefault(v, len(vocabulary)) if isinstance(v, str) else -1 for v in values),
+                        dtype=np.int32, count=len(values))
+    return codes, list(vocabulary)
+
+
+class _Segment:
+    """Segmento inmutable abierto con mmap: las páginas se comparten entre procesos."""
+
+    def __init__(self, path: str):
+        self.name = os.path.basename(path)
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self.columns = {
+            column: (np.load(os.path.join(path, f"{column}.npy"), mmap_mode="r"),
+                     np.load(os.path.join(path, f"{column}_offsets.npy"), mmap_mode="r"))
+            for column in _COLUMNS
+        }
+        # Columna -> (códigos por fila, {valor: código}).
+        self.scope: Dict[str, Tuple[np.ndarray, Dict[str, int]]] = {}
+        self._rows: Optional[Dict[str, int]] = None
+        if os.path.exists(os.path.join(path, f"{SCOPE_COLUMNS[0]}_codes.npy")):
+            for column in SCOPE_COLUMNS:
+                values = decode_strings(np.load(os.path.join(path, f"{column}_values.npy")),
+                                        np.load(os.path.join(path, f"{column}_values_offsets.npy")))
+                self.scope[column] = (np.load(os.path.join(path, f"{column}_codes.npy"), mmap_mode="r"),
+                                      {value: code for code, value in enumerate(values)})
+        else:
+            # Segmentos anteriores a las columnas de alcance: se calculan una vez al abrirlos.
+            metadatas = [json.loads(m) for m in decode_strings(np.asarray(self.columns["metadatas"][0]),
+                                                                np.asarray(self.columns["metadatas"][1]))]
+            for column in SCOPE_COLUMNS:
+                codes, values = encode_codes([m.get(column) for m in metadatas])
+                self.scope[column] = (codes, {value: code for code, value in enumerate(values)})
+
+    def mask(self, where: Optional[Dict[str, Any]]) -> Tuple[np.ndarray, bool]:
+        """
+        Máscara de las filas que pueden cumplir el filtro, evaluando con las
+        columnas de alcance las condiciones sobre owner y tenant. Retorna
+        (máscara, exacta): si el filtro usa otros metadatos la máscara es una
+        cota superior y las filas se comprueban después con matches_filter.
+        """
+        everything = np.ones(len(self), dtype=bool)
+        if not where:
+            return everything, True
+        mask, exact = everything, True
+        for key, condition in where.items():
+            if key in ("$and", "$or"):
+                parts = [self.mask(c) for c in condition]
+                if key == "$and":
+                    for part, part_exact in parts:
+                        mask = mask & part
+                        exact = exact and part_exact
+                elif all(part_exact for _, part_exact in parts):
+                    mask = mask & np.logical_or.reduce([part for part, _ in parts]) if parts else mask
+                else:
+                    exact = False
+                continue
+            if key not in self.scope:
+                exact = False
+                continue
+            codes, vocabulary = self.scope[key]
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            for op, operand in condition.items():
+                operands = operand if op in ("$in", "$nin") else [operand]
+                if op not in ("$eq", "$ne", "$in", "$nin") or not all(isinstance(v, str) for v in operands):
+                    exact = False
+                    continue
+                selected = np.isin(codes, [vocabulary[v] for v in operands if v in vocabulary])
+                mask = mask & (~selected if op in ("$ne", "$nin") else selected)
+        return mask, exact
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    def alive(self, deleted: Sequence[str]) -> Optional[np.ndarray]:
+        """Máscara de las filas cuyo id no está en `deleted` (None si no hay ninguno)."""
+        if not deleted:
+            return None
+        if self._rows is None:
+            ids = decode_strings(np.asarray(self.columns["ids"][0]), np.asarray(self.columns["ids"][1]))
+            self._rows = {chunk_id: i for i, chunk_id in enumerate(ids)}
+        rows = [self._rows[chunk_id] for chunk_id in deleted if chunk_id in self._rows]
+        if not rows:
+            return None
+        mask = np.ones(len(self), dtype=bool)
+        mask[rows] = False
+        return mask
+
+    def value(self, column: str, i: int) -> str:
+        blob, offsets = self.columns[column]
+        return bytes(blob[offsets[i]:offsets[i + 1]]).decode("utf-8")
+
+    def document(self, i: int) -> Document:
+        metadata = json.loads(self.value("metadatas", i))
+        return Document(page_content=self.value("texts", i), metadata=metadata,
+                        id=self.value("ids", i))
+
+
+class MmapVectorIndex:
+    """
+    Índice vectorial de solo lectura en segmentos inmutables con mmap.
+
+    Cada segmento es un directorio de archivos .npy (vectores normalizados y
+    columnas de ids, textos y metadatos) que los procesos abren con mmap: el
+    índice vive una sola vez en la caché de páginas del sistema operativo y cada
+    worker adicional solo añade sus estructuras de Python.
+
+    Las actualizaciones se publican como segmentos nuevos. El segmento se escribe
+    en un directorio temporal que luego se renombra, y después se reemplaza el
+    manifiesto (MANIFEST.json) con os.replace, que es atómico. Los lectores
+    releen el manifiesto cada `refresh_interval` segundos y, si cambió la
+    generación, cambian de conjunto de segmentos de una vez, sin ver nunca un
+    estado intermedio.
+
+    Eliminar chunks no reescribe los segmentos: el manifiesto guarda sus ids
+    junto con el número de segmentos publicados hasta entonces, y los lectores
+    excluyen esas filas con una máscara. La compactación descarta las filas
+    eliminadas y vacía la lista.
+
+    Se asume un único proceso escritor (el que ingiere documentos).
+    """
+    def __init__(self, directory: str, refresh_interval: float = 2.0, max_segments: int = 8):
+        self.directory = directory
+        self.refresh_interval = refresh_interval
+        self.max_segments = max_segments
+        self.lock = Lock()
+        self._segments: Tuple[_Segment, ...] = ()
+        # Filas vivas de cada segmento (None: ninguna eliminada); se reemplaza
+        # junto con _segments en una sola asignación.
+        self._view: Tuple[Tuple[_Segment, ...], Tuple[Optional[np.ndarray], ...]] = ((), ())
+        self._generation: Optional[int] = None
+        self._last_check = 0.0
+        os.makedirs(os.path.join(directory, SEGMENTS_DIR), exist_ok=True)
+        self.refresh(force=True)
+
+    # ------------------------------------------------------------------ lectura
+
+    @property
+    def segments(self) -> Tuple[_Segment, ...]:
+        return self.view()[0]
+
+    def view(self) -> Tuple[Tuple[_Segment, ...], Tuple[Optional[np.ndarray], ...]]:
+        """Segmentos de la generación actual y la máscara de filas vivas de cada uno."""
+        if time.monotonic() - self._last_check >= self.refresh_interval:
+            self.refresh()
+        return self._view
+
+    def read_manifest(self) -> Dict[str, Any]:
+        try:
+            with open(os.path.join(self.directory, MANIFEST_FILE), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"generation": 0, "segments": [], "deleted": {}}
+
+    def refresh(self, force: bool = False) -> bool:
+        """Abre los segmentos del manifiesto si cambió. Retorna True si hubo cambio."""
+        with self.lock:
+            self._last_check = time.monotonic()
+            manifest = self.read_manifest()
+            if not force and manifest["generation"] == self._generation:
+                return False
+            opened = {segment.name: segment for segment in self._segments}
+            try:
+                segments = tuple(
+                    opened.get(name) or _Segment(os.path.join(self.directory, SEGMENTS_DIR, name))
+                    for name in manifest["segments"]
+                )
+            except FileNotFoundError:
+                # Una compactación reemplazó el manifiesto mientras se leía: se reintenta después.
+                return False
+            self._segments = segments
+            self._view = (segments, self._alive_masks(segments, manifest.get("deleted", {})))
+            self._generation = manifest["generation"]
+        logger.info("Índice mmap en generación %s (%s segmentos)", manifest["generation"], len(segments))
+        return True
+
+    @staticmethod
+    def _alive_masks(segments: Sequence[_Segment], deleted: Dict[str, int]) -> Tuple[Optional[np.ndarray], ...]:
+        # Cada id eliminado afecta a los segmentos publicados antes de su
+        # eliminación; una copia publicada después sigue viva.
+        return tuple(segment.alive([chunk_id for chunk_id, before in deleted.items() if position < before])
+                     for position, segment in enumerate(segments))
+
+    def count(self) -> int:
+        segments, alive = self.view()
+        return sum(len(segment) if mask is None else int(mask.sum()) for segment, mask in zip(segments, alive))
+
+    def search(self, query_vector: Sequence[float], k: int = 4,
+               where: Optional[Dict[str, Any]] = None) -> List[Tuple[Document, float]]:
+        """Búsqueda exacta por similitud coseno sobre todos los segmentos."""
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        results: List[Tuple[float, _Segment, int]] = []
+        for segment, alive in zip(*self.view()):
+            if not len(segment):
+                continue
+            scores = segment.vectors @ query
+            for i in self._top_indices(segment, scores, k, where, alive):
+                results.append((float(scores[i]), segment, int(i)))
+        results.sort(key=lambda r: r[0], reverse=True)
+        # Un chunk republicado (al reanudar una ingesta) puede estar en dos segmentos.
+        found, seen = [], set()
+        for score, segment, i in results:
+            chunk_id = segment.value("ids", i)
+            if chunk_id in seen:
+                continue
+            seen.add(chunk_id)
+            found.append((segment.document(i), score))
+            if len(found) == k:
+                break
+        return found
+
+    @staticmethod
+    def _top_indices(segment: _Segment, scores: np.ndarray, k: int,
+                     where: Optional[Dict[str, Any]], alive: Optional[np.ndarray] = None) -> List[int]:
+        if where is None and alive is None:
+            top = np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+            return list(top)
+        # El filtro de alcance se aplica con una máscara sobre las columnas
+        # codificadas antes de seleccionar los k mejores, junto con la de las
+        # filas eliminadas.
+        mask, exact = segment.mask(where)
+        if alive is not None:
+            mask = mask & alive
+        candidates = np.flatnonzero(mask)
+        if not len(candidates):
+            return []
+        if exact:
+            top = np.argpartition(-scores[candidates], min(k, len(candidates)) - 1)[:k]
+            return [int(i) for i in candidates[top]]
+        # Con condiciones sobre otros metadatos se recorren los candidatos en
+        # orden de similitud y solo se decodifican los necesarios.
+        selected = []
+        for i in candidates[np.argsort(-scores[candidates])]:
+            if matches_filter(json.loads(segment.value("metadatas", int(i))), where):
+                selected.append(int(i))
+                if len(selected) == k:
+                    break
+        return selected
+
+    # ---------------------------------------------------------------- escritura
+
+    def publish(self, ids: Sequence[str], texts: Sequence[str], metadatas: Sequence[Optional[Dict[str, Any]]],
+                vectors: np.ndarray, deleted: Sequence[str] = ()) -> Optional[str]:
+        """
+        Publica un segmento nuevo y lo agrega al manifiesto. Retorna su nombre.
+
+        Los ids de `deleted` se eliminan de los segmentos anteriores en la misma
+        escritura del manifiesto, de modo que un chunk reemplazado nunca se ve
+        dos veces ni desaparece entre medias.
+        """
+        if not len(ids) and not len(deleted):
+            return None
+        name = self._write_segment(ids, texts, metadatas, vectors) if len(ids) else None
+        manifest = self.read_manifest()
+        segments = manifest["segments"] + ([name] if name else [])
+        tombstones = {**manifest.get("deleted", {}), **{chunk_id: len(manifest["segments"]) for chunk_id in deleted}}
+        self._write_manifest(segments, manifest["generation"] + 1, tombstones)
+        if len(segments) > self.max_segments or len(tombstones) > MAX_DELETED_RATIO * max(self.count(), 1):
+            self.compact()
+        return name
+
+    def delete(self, ids: Sequence[str]) -> None:
+        """Elimina chunks del índice sin reescribir segmentos (ver `publish`)."""
+        self.publish([], [], [], np.empty((0, 0), dtype=np.float32), deleted=ids)
+
+    def publish_from_collection(self, collection, ids: Optional[Sequence[str]] = None,
+                                page_size: int = 1000, deleted: Sequence[str] = ()) -> Optional[str]:
+        """
+        Publica como segmento los registros indicados de una colección de Chroma
+        (o todos), eliminando a la vez los ids de `deleted`.
+        """
+        rows: Dict[str, List[Any]] = {"ids": [], "documents": [], "metadatas": [], "embeddings": []}
+        if ids is None:
+            pages = iter_collection(collection, page_size)
+        else:
+            pages = (collection.get(ids=list(ids[i:i + page_size]),
+                                    include=["embeddings", "documents", "metadatas"])
+                     for i in range(0, len(ids), page_size))
+        for page in pages:
+            for key in rows:
+                rows[key].extend(page[key])
+        return self.publish(rows["ids"], rows["documents"], rows["metadatas"],
+                            np.asarray(rows["embeddings"], dtype=np.float32), deleted=deleted)
+
+    def compact(self) -> Optional[str]:
+        """Fusiona todos los segmentos en uno, sin las filas eliminadas, y elimina los anteriores."""
+        manifest = self.read_manifest()
+        deleted = manifest.get("deleted", {})
+        old = [_Segment(os.path.join(self.directory, SEGMENTS_DIR, name)) for name in manifest["segments"]]
+        if len(old) <= 1 and not deleted:
+            return None
+        ids, texts, metadatas, vectors = [], [], [], []
+        for segment, alive in zip(old, self._alive_masks(old, deleted)):
+            rows = np.arange(len(segment)) if alive is None else np.flatnonzero(alive)
+            for column, target in zip(_COLUMNS, (ids, texts, metadatas)):
+                values = decode_strings(np.asarray(segment.columns[column][0]), np.asarray(segment.columns[column][1]))
+                target.extend(values[i] for i in rows)
+            vectors.append(np.asarray(segment.vectors)[rows])
+        vectors = np.concatenate(vectors) if vectors else np.empty((0, 0), dtype=np.float32)
+        # De los chunks publicados varias veces se conserva la copia más reciente.
+        latest = {chunk_id: i for i, chunk_id in enumerate(ids)}
+        if len(latest) < len(ids):
+            rows = sorted(latest.values())
+            ids, texts, metadatas = [ids[i] for i in rows], [texts[i] for i in rows], [metadatas[i] for i in rows]
+            vectors = vectors[rows]
+        name = None
+        if ids:
+            name = self._write_segment(ids, texts, [json.loads(m) for m in metadatas], vectors, normalized=True)
+        self._write_manifest([name] if name else [], manifest["generation"] + 1)
+        # Los lectores que aún tengan abiertos los segmentos antiguos siguen
+        # funcionando: los archivos eliminados persisten mientras estén mapeados.
+        for segment in old:
+            shutil.rmtree(os.path.join(self.directory, SEGMENTS_DIR, segment.name), ignore_errors=True)
+        logger.info("Índice mmap compactado: %s segmentos -> 1 (%s vectores)", len(old), len(ids))
+        return name
+
+    def clear(self) -> None:
+        """Publica un manifiesto vacío y elimina los segmentos."""
+        manifest = self.read_manifest()
+        self._write_manifest([], manifest["generation"] + 1)
+        for name in manifest["segments"]:
+            shutil.rmtree(os.path.join(self.directory, SEGMENTS_DIR, name), ignore_errors=True)
+
+    def _write_segment(self, ids, texts, metadatas, vectors: np.ndarray, normalized: bool = False) -> str:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not normalized:
+            vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        columns = {
+            "ids": list(ids),
+            "texts": [t or "" for t in texts],
+            "metadatas": [json.dumps(m or {}, ensure_ascii=False, sort_keys=True) for m in metadatas],
+        }
+        name = f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+        segments_dir = os.path.join(self.directory, SEGMENTS_DIR)
+        tmp_dir = os.path.join(segments_dir, f".tmp-{name}")
+        os.makedirs(tmp_dir)
+        np.save(os.path.join(tmp_dir, "vectors.npy"), vectors)
+        for column, values in columns.items():
+            blob, offsets = encode_strings(values)
+            np.save(os.path.join(tmp_dir, f"{column}.npy"), blob)
+            np.save(os.path.join(tmp_dir, f"{column}_offsets.npy"), offsets)
+        for column in SCOPE_COLUMNS:
+            codes, values = encode_codes([(m or {}).get(column) for m in metadatas])
+            blob, offsets = encode_strings(values)
+            np.save(os.path.join(tmp_dir, f"{column}_codes.npy"), codes)
+            np.save(os.path.join(tmp_dir, f"{column}_values.npy"), blob)
+            np.save(os.path.join(tmp_dir, f"{column}_values_offsets.npy"), offsets)
+        os.rename(tmp_dir, os.path.join(segments_dir, name))
+        return name
+
+    def _write_manifest(self, segments: List[str], generation: int,
+                        deleted: Optional[Dict[str, int]] = None) -> None:
+        path = os.path.join(self.directory, MANIFEST_FILE)
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"generation": generation, "segments": segments, "deleted": deleted or {}}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        self.refresh(force=True)
+
+
+class MmapIndexRetriever(LangChainBaseRetriever):
+    """
+    Retriever de LangChain sobre MmapVectorIndex; admite `filter` como el de
+    Chroma. Con `score_threshold` descarta los documentos de relevancia menor,
+    calculada como en Chroma para el espacio HNSW `space`: la similitud coseno
+    se pasa a la distancia de ese espacio y a la misma función de relevancia,
+    de modo que un umbral filtra igual con y sin el índice mmap (con
+    embeddings normalizados).
+    """
+    index: Any
+    embeddings: Any
+    k: int = 4
+    score_threshold: Optional[float] = None
+    space: str = "l2"
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun,
+                                filter: Optional[Dict[str, Any]] = None) -> List[Document]:
+        vector = self.embeddings.embed_query(query)
+        relevance = relevance_score_fn(self.space)
+        return [doc for doc, score in self.index.search(vector, k=self.k, where=filter)
+                if self.score_threshold is None
+                or relevance(chroma_distance(score, self.space)) >= self.score_threshold]
@@ -1,15 +1,63 @@
 # src/rag/retriever.py
 
+import os
+import uuid
 import logging
-from typing import List, Dict, Any
+from pathlib import Path
+import numpy as np
+from typing import Callable, List, Dict, Any, Tuple, Union, Optional
 from langchain_core.documents import Document
 from abc import ABC, abstractmethod
 from langchain_core.vectorstores import VectorStore as LangChainVectorStore
 
 from .logging_config import logger
-from src.config import GlobalConfig as Config
+from src.config import GlobalConfig as Config, config as global_config
 from .embeddings import EmbeddingGenerator
 from .vector_store import VectorStore
+from .document_loader import DocumentLoader
+from .mmap_index import MmapVectorIndex, MmapIndexRetriever
+from .sharding import ShardedRetriever
+from .document_catalog import DocumentCatalog
+from .dedup import ChunkDeduplicator
+from .chunker import content_hash
+from src.metrics import metrics
+
+
+def scope_metadata(source: str, owner: Optional[str] = None, tenant: Optional[str] = None) -> Dict[str, str]:
+    """
+    Metadatos de propiedad que se adjuntan a cada chunk en la ingesta.
+
+    Chroma no admite valores nulos en los metadatos, así que un documento sin
+    propietario se guarda con owner="" y es compartido por todo el tenant.
+    """
+    return {
+        "owner": owner or "",
+        "tenant": tenant or global_config.DEFAULT_TENANT,
+        "doc_type": Path(str(source)).suffix.lower().lstrip(".") if source else "",
+    }
+
+
+def chunk_id(source: str, scope: Dict[str, str], position: int, text: str) -> str:
+    """
+    Id determinista de un chunk de un archivo: el mismo documento, posición y
+    texto producen siempre el mismo id, de modo que reintentar un lote ya
+    insertado sobrescribe los chunks en lugar de duplicarlos.
+    """
+    key = "\0".join((scope["tenant"], scope["owner"], str(source), str(position), content_hash(text)))
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, key))
+
+
+def scope_filter(owner: Optional[str] = None, tenant: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Filtro de metadatos para Chroma: documentos del tenant que pertenecen al
+    usuario o que son compartidos (owner vacío).
+    """
+    owners = [owner, ""] if owner else [""]
+    return {"$and": [
+        {"tenant": tenant or global_config.DEFAULT_TENANT},
+        {"owner": {"$in": owners}},
+    ]}
+
 
 class BaseRetriever(ABC):
     @abstractmethod
@@ -37,44 +85,288 @@ class RAGRetriever(BaseRetriever):
     def __init__(self, config: Config):
         self.config = config
         self.embeddings = EmbeddingGenerator(config)
-        # =============================================================================
-        # NOTA: Esta línea, que antes fallaba, ahora funcionará porque hemos
-        # corregido el __init__ de VectorStore para que acepte el modelo.
-        # =============================================================================
-        self.vector_store_manager = VectorStore(config, self.embeddings.get_model())
+        # El generador implementa la interfaz Embeddings de LangChain, de modo que
+        # las búsquedas de Chroma pasan por su caché y quedan instrumentadas.
+        self.vector_store_manager = VectorStore(config, self.embeddings)
+        self.document_loader = DocumentLoader(config)
+        # En modo mmap las búsquedas se sirven desde segmentos inmutables
+        # compartidos entre procesos; Chroma sigue siendo el almacén de escritura.
+        self.mmap_index = None
+        if config.VECTOR_INDEX_BACKEND == "mmap":
+            self.mmap_index = MmapVectorIndex(
+                config.MMAP_INDEX_DIR,
+                refresh_interval=config.MMAP_INDEX_REFRESH_SECONDS,
+                max_segments=config.MMAP_INDEX_MAX_SEGMENTS
+            )
+        
+        self.catalog = DocumentCatalog(
+            config.DOCUMENT_CATALOG_PATH or os.path.join(config.CHROMA_PERSIST_DIRECTORY, "catalog.db")
+        )
+        self.deduplicator = None
+        if config.DEDUP_ENABLED:
+            self.deduplicator = ChunkDeduplicator(self.catalog, max_distance=config.DEDUP_MAX_DISTANCE)
+        collection = self.vector_store_manager.collection
+        # Colecciones anteriores al catálogo o restauradas desde un snapshot.
+        if not self.catalog.totals()["documents"] and collection.count():
+            self.catalog.rebuild(collection, signer=self.deduplicator.signature if self.deduplicator else None)
         
         if not self.embeddings.check_model():
             raise RuntimeError("Error al inicializar el modelo de embeddings")
             
         logger.info("RAGRetriever inicializado y listo")
         
-    def add_documents(self, documents: List[Document]) -> None:
+    def add_documents(self, documents: List[Union[str, Document]], owner: Optional[str] = None,
+                      tenant: Optional[str] = None) -> None:
+        """
+        Agrega documentos al sistema. Acepta Documents ya procesados o rutas de
+        archivo, que se ingieren en streaming con ingest_file.
+
+        Args:
+            documents: Documents o rutas de archivo.
+            owner: Usuario propietario; sin él, el documento es compartido en el tenant.
+            tenant: Tenant al que pertenece el documento (por defecto DEFAULT_TENANT).
+        """
         try:
-            self.vector_store_manager.add_documents(documents)
-            logger.info(f"Agregados {len(documents)} documentos al sistema")
+            paths = [d for d in documents if isinstance(d, str)]
+            docs = [d for d in documents if not isinstance(d, str)]
+            for path in paths:
+                self.ingest_file(path, owner=owner, tenant=tenant)
+            for doc in docs:
+                doc.metadata.update(scope_metadata(doc.metadata.get("source", ""), owner, tenant))
+            if docs:
+                ids: List[str] = []
+                with metrics.span("ingest"):
+                    by_source: Dict[str, List[Document]] = {}
+                    for doc in docs:
+                        by_source.setdefault(doc.metadata.get("source", ""), []).append(doc)
+                    for source, group in by_source.items():
+                        ids.extend(self._store_batch(source, group)[0])
+                    self._publish_segment(ids)
+                logger.info("Agregados %s documentos al sistema (%s duplicados)", len(ids), len(docs) - len(ids))
         except Exception as e:
-            logger.error(f"Error agregando documentos: {str(e)}", exc_info=True)
+            logger.error("Error agregando documentos: %s", e, exc_info=True)
             raise
 
+    def ingest_file(self, file_path: str, owner: Optional[str] = None, tenant: Optional[str] = None,
+                    skip: int = 0, progress: Optional[Callable[[int, int], None]] = None) -> int:
+        """
+        Ingiere un archivo en streaming: los chunks se generan de forma perezosa y
+        se insertan en lotes de INGEST_BATCH_SIZE, sin cargar el archivo completo.
+
+        Los chunks reciben ids deterministas (chunk_id). Los que el catálogo ya
+        tiene para este documento, porque un intento anterior los insertó sin
+        llegar a guardar el progreso, no se vuelven a insertar.
+
+        Args:
+            skip: Chunks iniciales que se omiten (ya insertados por una ingesta
+                interrumpida del mismo archivo).
+            progress: Se llama tras cada lote con (chunks procesados, incluidos
+                los omitidos; chunks agregados). Si lanza una excepción la
+                ingesta se detiene y los lotes ya insertados se conservan.
+        
+        Returns:
+            Número de chunks agregados.
+        """
+        source = str(file_path)
+        ids: List[str] = []
+        duplicates = 0
+        processed = 0
+        stored = 0
+        with metrics.span("ingest"):
+            scope = scope_metadata(file_path, owner, tenant)
+            try:
+                for batch in self.document_loader.iter_chunk_batches(file_path):
+                    if processed < skip:
+                        omitted = min(len(batch), skip - processed)
+                        processed += omitted
+                        batch = batch[omitted:]
+                        if not batch:
+                            continue
+                    for position, chunk in enumerate(batch, start=processed):
+                        chunk.metadata.update(scope)
+                        chunk.id = chunk_id(source, scope, position, chunk.page_content)
+                    known = self.catalog.known_chunk_ids(source, scope["owner"], scope["tenant"],
+                                                         [chunk.id for chunk in batch])
+                    pending = [chunk for chunk in batch if chunk.id not in known]
+                    batch_ids, batch_duplicates = self._store_batch(source, pending) if pending else ([], 0)
+                    ids.extend(batch_ids)
+                    stored += len(known)
+                    duplicates += batch_duplicates
+                    processed += len(batch)
+                    if progress is not None:
+                        progress(processed, len(ids) + stored)
+            finally:
+                if skip or stored:
+                    # Al reanudar, los chunks de intentos anteriores pueden no
+                    # haberse publicado: se publica el documento completo.
+                    self._publish_segment(self.catalog.chunk_ids(source, scope["owner"], scope["tenant"]))
+                else:
+                    # Un segmento por archivo: los workers ven el archivo completo o nada
+                    # (o, si la ingesta se interrumpe, los lotes ya insertados).
+                    self._publish_segment(ids)
+        total = len(ids) + duplicates
+        logger.info("Ingerido %s: %s chunks, %s ya insertados, %s duplicados descartados (ratio %.2f)",
+                    file_path, len(ids), stored, duplicates, duplicates / total if total else 0.0)
+        return len(ids) + stored
+
+    def _store_batch(self, source: str, batch: List[Document]) -> Tuple[List[str], int]:
+        """
+        Deduplica un lote de chunks de `source`, calcula los embeddings solo de
+        los que se conservan y los registra en el catálogo junto con las
+        referencias a las copias canónicas. Retorna (ids agregados, duplicados).
+        """
+        if self.deduplicator is None:
+            ids = self.vector_store_manager.add_documents(batch)
+            self.catalog.record(source, ids, batch)
+            return ids, 0
+        with metrics.span("dedup"):
+            result = self.deduplicator.filter(batch)
+        ids = self.vector_store_manager.add_documents(result.kept) if result.kept else []
+        # Solo se guardan los contadores y las firmas de cada lote, no los chunks.
+        self.catalog.record(source, ids, result.kept + result.dropped, result.signatures, result.resolve(ids))
+        if result.exact:
+            metrics.inc("chatbot_dedup_chunks_total", result.exact, kind="exact")
+        if result.near:
+            metrics.inc("chatbot_dedup_chunks_total", result.near, kind="near")
+        return ids, len(result.duplicates)
+
+    def _publish_segment(self, ids: List[str]) -> None:
+        if self.mmap_index is not None and ids:
+            self.mmap_index.publish_from_collection(self.vector_store_manager.collection, ids)
+
+    def search_batch(self, queries: List[str], k: int = 4,
+                     where: Optional[Dict[str, Any]] = None) -> List[List[Document]]:
+        """
+        Busca los `k` documentos más similares a cada consulta.
+
+        Calcula los embeddings de todas las consultas en una sola pasada del
+        modelo y hace una única búsqueda en Chroma (o en el índice mmap), en
+        lugar de una por consulta como el retriever de LangChain.
+        """
+        if not queries:
+            return []
+        with metrics.span("embed", kind="query_batch"):
+            vectors = np.asarray(self.embeddings.generate_embeddings(list(queries)), dtype=np.float32)
+        with metrics.span("search", kind="batch"):
+            if self.mmap_index is not None:
+                return [[doc for doc, _ in self.mmap_index.search(v, k=k, where=where)] for v in vectors]
+            collection = self.vector_store_manager.collection
+            result = collection.query(query_embeddings=vectors.tolist(), n_results=k, where=where,
+                                      include=["documents", "metadatas"])
+        return [
+            [Document(page_content=text or "", metadata=meta or {}, id=doc_id)
+             for doc_id, text, meta in zip(ids, texts, metas)]
+            for ids, texts, metas in zip(result["ids"], result["documents"], result["metadatas"])
+        ]
+
     def get_retriever(self) -> LangChainVectorStore:
+        """
+        Retriever de los RAG_TOP_K documentos más similares. Con
+        RAG_SCORE_THRESHOLD > 0 descarta los de relevancia (0-1) menor.
+        """
+        k = self.config.RAG_TOP_K
+        threshold = self.config.RAG_SCORE_THRESHOLD or None
         try:
+            if self.mmap_index is not None:
+                return MmapIndexRetriever(index=self.mmap_index, embeddings=self.embeddings, k=k,
+                                          score_threshold=threshold, space=self.config.HNSW_SPACE)
             chroma_instance = self.vector_store_manager.get_chroma_instance()
-            return chroma_instance.as_retriever()
+            if self.vector_store_manager.sharded:
+                # La relevancia se calcula como en Chroma, según el espacio del índice.
+                return ShardedRetriever(collection=self.vector_store_manager.collection, embeddings=self.embeddings,
+                                        k=k, score_threshold=threshold,
+                                        relevance_score_fn=chroma_instance._select_relevance_score_fn())
+            if threshold is None:
+                return chroma_instance.as_retriever(search_kwargs={"k": k})
+            return chroma_instance.as_retriever(search_type="similarity_score_threshold",
+                                                search_kwargs={"k": k, "score_threshold": threshold})
+        except Exception as e:
+            logger.error("Error al crear el retriever: %s", e, exc_info=True)
+            raise
+
+    def list_documents(self, owner: Optional[str] = None, tenant: Optional[str] = None,
+                       limit: Optional[int] = None, offset: int = 0,
+                       include_shared: bool = False) -> List[Dict[str, Any]]:
+        """
+        Documentos cargados con sus chunks, bytes, tokens y fecha de ingesta
+        (desde el catálogo). Con `include_shared`, los del usuario más los
+        compartidos del tenant.
+        """
+        return self.catalog.list_documents(owner=owner, tenant=tenant, limit=limit, offset=offset,
+                                           include_shared=include_shared)
+
+    def has_document(self, source: str, owner: Optional[str] = None, tenant: Optional[str] = None) -> bool:
+        """Si el documento (ruta, propietario y tenant, como en la ingesta) está en el catálogo."""
+        scope = scope_metadata(source, owner, tenant)
+        return self.catalog.get(str(source), scope["owner"], scope["tenant"]) is not None
+
+    def delete_document(self, source: str, owner: Optional[str] = None, tenant: Optional[str] = None) -> int:
+        """
+        Elimina los chunks de un documento, identificado como en la ingesta por
+        la ruta, el propietario y el tenant. Retorna el número de chunks
+        eliminados (0 si el documento no estaba cargado).
+        """
+        scope = scope_metadata(source, owner, tenant)
+        owner, tenant = scope["owner"], scope["tenant"]
+        ids = self.catalog.chunk_ids(source, owner, tenant)
+        if not ids:
+            return 0
+        try:
+            # Los chunks que otro documento también referencia (copias canónicas
+            # de sus duplicados) se conservan.
+            exclusive = self.catalog.exclusive_chunk_ids(source, owner, tenant)
+            self.vector_store_manager.delete(exclusive)
+            inherited = self._reassign_shared_chunks(source, owner, tenant)
+            self.catalog.remove(source, owner, tenant)
+            if self.mmap_index is not None and (exclusive or inherited):
+                # Los segmentos son inmutables: los chunks eliminados se marcan
+                # en el manifiesto y los heredados se republican con sus nuevos
+                # metadatos, todo en una sola escritura.
+                self.mmap_index.publish_from_collection(self.vector_store_manager.collection, inherited,
+                                                        deleted=exclusive + inherited)
+            logger.info("Documento %s eliminado (%s chunks)", source, len(ids))
+            return len(ids)
         except Exception as e:
-            logger.error(f"Error al crear el retriever: {e}", exc_info=True)
+            logger.error("Error eliminando el documento %s: %s", source, e, exc_info=True)
             raise
 
+    def _reassign_shared_chunks(self, source: str, owner: str, tenant: str) -> List[str]:
+        """
+        Las copias canónicas que aportó el documento y que otros documentos
+        referencian pasan a los metadatos (source, owner, tenant) de uno de
+        ellos, para que la búsqueda no cite un documento eliminado. Retorna los
+        ids de los chunks actualizados.
+        """
+        successors = self.catalog.shared_chunk_successors(source, owner, tenant)
+        if not successors:
+            return []
+        current = self.vector_store_manager.collection.get(ids=list(successors), include=["metadatas"])
+        ids, metadatas = [], []
+        for chunk_id, metadata in zip(current["ids"], current["metadatas"]):
+            metadata = dict(metadata or {})
+            if (metadata.get("source"), metadata.get("owner", ""), metadata.get("tenant")) != (source, owner, tenant):
+                continue
+            new_tenant, new_owner, new_source = successors[chunk_id]
+            metadata.update(scope_metadata(new_source, new_owner, new_tenant), source=new_source)
+            ids.append(chunk_id)
+            metadatas.append(metadata)
+        self.vector_store_manager.update_metadata(ids, metadatas)
+        return ids
+
     def clear_documents(self) -> None:
         try:
             self.vector_store_manager.clear_collection()
+            self.catalog.clear()
+            if self.mmap_index is not None:
+                self.mmap_index.clear()
             logger.info("Colección de documentos limpiada")
         except Exception as e:
-            logger.error(f"Error limpiando documentos: {str(e)}", exc_info=True)
+            logger.error("Error limpiando documentos: %s", e, exc_info=True)
             raise
             
     def get_stats(self) -> Dict[str, Any]:
         try:
-            return self.vector_store_manager.get_collection_stats()
+            return {**self.vector_store_manager.get_collection_stats(), "catalog": self.catalog.totals()}
         except Exception as e:
-            logger.error(f"Error obteniendo estadísticas: {str(e)}", exc_info=True)
+            logger.error("Error obteniendo estadísticas: %s", e, exc_info=True)
             raise
\ No newline at end of file
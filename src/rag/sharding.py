@@ -0,0 +1,270 @@
+# src/rag/sharding.py
+
+import time
+import zlib
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever as LangChainBaseRetriever
+from langchain_core.vectorstores import VectorStore as LangChainVectorStore
+
+from .logging_config import logger
+from src.metrics import metrics
+
+ROUTINGS = ("hash", "source")
+
+
+def relevance_score_fn(space: str) -> Callable[[float], float]:
+    """
+    Relevancia (0-1) a partir de la distancia de Chroma en el espacio HNSW
+    `space`, con las mismas funciones que langchain_chroma (l2 es el espacio
+    por defecto de Chroma).
+    """
+    functions = {
+        "l2": LangChainVectorStore._euclidean_relevance_score_fn,
+        "cosine": LangChainVectorStore._cosine_relevance_score_fn,
+        "ip": LangChainVectorStore._max_inner_product_relevance_score_fn,
+    }
+    if space not in functions:
+        raise ValueError(f"Espacio HNSW no soportado: {space}")
+    return functions[space]
+
+
+def shard_index(key: str, count: int) -> int:
+    """Shard de una clave (estable entre procesos, a diferencia de hash())."""
+    return zlib.crc32(key.encode("utf-8")) % count if count > 1 else 0
+
+
+def shard_key(routing: str, chunk_id: str, metadata: Optional[Dict[str, Any]]) -> str:
+    """
+    Clave de reparto de un chunk: su id (`hash`, reparto uniforme) o su
+    documento (`source`, todos los chunks de un documento en el mismo shard).
+    """
+    if routing == "source":
+        return (metadata or {}).get("source", "")
+    return chunk_id
+
+
+class ShardedCollection:
+    """
+    Varias colecciones de Chroma vistas como una sola.
+
+    Implementa la parte de la API de colección de chromadb que usa el
+    proyecto (get, count, add/upsert, update, delete y query), de modo que snapshots,
+    índice mmap y catálogo funcionan igual con uno o con N shards.
+
+    Las escrituras se reparten entre los `write_count` primeros shards según
+    `routing`. Las lecturas y los borrados van a todas las colecciones,
+    incluidas las que sobran tras reducir el número de shards y aún no se han
+    rebalanceado. Las búsquedas se lanzan en paralelo y se fusionan por
+    distancia; un shard que supera `timeout` segundos o falla se omite y se
+    retornan resultados parciales.
+
+    Cancelar una búsqueda que superó el plazo no detiene su hilo, así que las
+    búsquedas usan su propio pool, con `max_inflight` hilos por shard: un shard
+    que ya tiene `max_inflight` búsquedas sin terminar se omite (resultado
+    parcial) en lugar de ocupar hilos que necesitan los demás shards.
+    """
+    def __init__(self, collections: Sequence[Any], write_count: Optional[int] = None, routing: str = "hash",
+                 timeout: float = 2.0, executor: Optional[ThreadPoolExecutor] = None, max_inflight: int = 4):
+        if routing not in ROUTINGS:
+            raise ValueError(f"Reparto de shards no soportado: {routing}")
+        self.collections = list(collections)
+        self.write_count = write_count or len(self.collections)
+        self.routing = routing
+        self.timeout = timeout
+        self.executor = executor or ThreadPoolExecutor(max_workers=4 * len(self.collections),
+                                                       thread_name_prefix="shard")
+        self.max_inflight = max_inflight
+        self.query_executor = ThreadPoolExecutor(max_workers=max_inflight * len(self.collections),
+                                                 thread_name_prefix="shard-query")
+        self._inflight = [0] * len(self.collections)
+        self._inflight_lock = Lock()
+
+    def shard_for(self, chunk_id: str, metadata: Optional[Dict[str, Any]]) -> int:
+        return shard_index(shard_key(self.routing, chunk_id, metadata), self.write_count)
+
+    def _map(self, fn: Callable[[Any], Any], shards: Optional[Sequence[int]] = None) -> List[Any]:
+        """Ejecuta `fn` en paralelo sobre los shards y propaga el primer error."""
+        shards = range(len(self.collections)) if shards is None else shards
+        futures = [self.executor.submit(fn, self.collections[i]) for i in shards]
+        return [future.result() for future in futures]
+
+    # ------------------------------------------------------------- escritura
+
+    def upsert(self, ids: Sequence[str], embeddings=None, documents=None, metadatas=None) -> None:
+        groups: Dict[int, List[int]] = {}
+        for i, chunk_id in enumerate(ids):
+            groups.setdefault(self.shard_for(chunk_id, metadatas[i] if metadatas is not None else None), []).append(i)
+
+        def write(shard: int) -> None:
+            rows = groups[shard]
+            self.collections[shard].upsert(
+                ids=[ids[i] for i in rows],
+                embeddings=[embeddings[i] for i in rows] if embeddings is not None else None,
+                documents=[documents[i] for i in rows] if documents is not None else None,
+                metadatas=[metadatas[i] for i in rows] if metadatas is not None else None,
+            )
+
+        futures = [self.executor.submit(write, shard) for shard in groups]
+        for future in futures:
+            future.result()
+
+    # Los ids son únicos por chunk, así que agregar equivale a upsert.
+    add = upsert
+
+    def update(self, ids: Sequence[str], metadatas: Sequence[Dict[str, Any]]) -> None:
+        """Actualiza los metadatos de los chunks en el shard donde esté cada uno."""
+        rows = {chunk_id: metadata for chunk_id, metadata in zip(ids, metadatas)}
+
+        def write(collection) -> None:
+            present = collection.get(ids=list(rows), include=[])["ids"]
+            if present:
+                collection.update(ids=present, metadatas=[rows[chunk_id] for chunk_id in present])
+
+        self._map(write)
+
+    def delete(self, ids: Sequence[str]) -> None:
+        # Se borra en todos los shards: un chunk puede estar fuera de su shard
+        # durante un rebalanceo o tras cambiar el reparto.
+        self._map(lambda collection: collection.delete(ids=list(ids)))
+
+    # --------------------------------------------------------------- lectura
+
+    @property
+    def space(self) -> str:
+        """Espacio HNSW de las colecciones (todas se crean con el mismo)."""
+        return (self.collections[0].metadata or {}).get("hnsw:space", "l2") if self.collections else "l2"
+
+    def count(self) -> int:
+        return sum(self.counts())
+
+    def counts(self) -> List[int]:
+        return self._map(lambda collection: collection.count())
+
+    def get(self, ids: Optional[Sequence[str]] = None, where: Optional[Dict[str, Any]] = None,
+            limit: Optional[int] = None, offset: Optional[int] = None,
+            include: Sequence[str] = ("documents", "metadatas")) -> Dict[str, Any]:
+        """
+        Con `ids` consulta todos los shards; con limit/offset pagina los shards
+        en orden. Con `where`, el tamaño de cada shard para paginar se cuenta
+        con el mismo filtro.
+        """
+        include = list(include)
+        result: Dict[str, List[Any]] = {"ids": [], **{key: [] for key in include}}
+        if ids is not None:
+            pages = self._map(lambda collection: collection.get(ids=list(ids), where=where, include=include))
+        else:
+            pages = []
+            skip, remaining = offset or 0, limit
+            for collection in self.collections:
+                if remaining is not None and remaining <= 0:
+                    break
+                size = collection.count() if where is None else len(collection.get(where=where, include=[])["ids"])
+                if skip >= size:
+                    skip -= size
+                    continue
+                page = collection.get(where=where, limit=remaining, offset=skip, include=include)
+                skip = 0
+                if remaining is not None:
+                    remaining -= len(page["ids"])
+                pages.append(page)
+        for page in pages:
+            result["ids"].extend(page["ids"])
+            for key in include:
+                values = page.get(key)
+                result[key].extend(values if values is not None else [None] * len(page["ids"]))
+        return result
+
+    def query(self, query_embeddings: Sequence[Sequence[float]], n_results: int = 4,
+              where: Optional[Dict[str, Any]] = None,
+              include: Sequence[str] = ("documents", "metadatas", "distances")) -> Dict[str, Any]:
+        """
+        Busca en todos los shards en paralelo y fusiona los `n_results` más
+        cercanos de cada consulta. Retorna el mismo formato que chromadb.
+        """
+        include = list(include)
+        fields = [key for key in include if key != "distances"]
+        started = time.perf_counter()
+
+        def search(shard: int) -> Dict[str, Any]:
+            try:
+                result = self.collections[shard].query(query_embeddings=query_embeddings, n_results=n_results,
+                                                       where=where, include=fields + ["distances"])
+            finally:
+                with self._inflight_lock:
+                    self._inflight[shard] -= 1
+            metrics.record_stage("shard_query", time.perf_counter() - started, shard=str(shard))
+            return result
+
+        futures = {}
+        for i in range(len(self.collections)):
+            with self._inflight_lock:
+                busy = self._inflight[i] >= self.max_inflight
+                if not busy:
+                    self._inflight[i] += 1
+            if busy:
+                metrics.inc("chatbot_shard_failures_total", shard=str(i), reason="busy")
+                logger.warning("El shard %s tiene %s búsquedas sin terminar; se omite", i, self.max_inflight)
+                continue
+            futures[self.query_executor.submit(search, i)] = i
+        done, pending = wait(futures, timeout=self.timeout) if futures else (set(), set())
+        results = []
+        for future in pending:
+            future.cancel()
+            metrics.inc("chatbot_shard_failures_total", shard=str(futures[future]), reason="timeout")
+            logger.warning("El shard %s no respondió en %.2fs; resultados parciales", futures[future], self.timeout)
+        for future in done:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                metrics.inc("chatbot_shard_failures_total", shard=str(futures[future]), reason="error")
+                logger.warning("Error buscando en el shard %s: %s", futures[future], e)
+        if not results:
+            raise TimeoutError("Ningún shard respondió a la búsqueda")
+
+        merged: Dict[str, List[List[Any]]] = {"ids": [], **{key: [] for key in include}}
+        for q in range(len(query_embeddings)):
+            best: Dict[str, tuple] = {}
+            for result in results:
+                for j, chunk_id in enumerate(result["ids"][q]):
+                    distance = result["distances"][q][j]
+                    # Durante un rebalanceo un chunk puede estar en dos shards.
+                    if chunk_id not in best or distance < best[chunk_id][0]:
+                        best[chunk_id] = (distance, result, j)
+            top = sorted(best.items(), key=lambda item: item[1][0])[:n_results]
+            merged["ids"].append([chunk_id for chunk_id, _ in top])
+            for key in include:
+                merged[key].append([
+                    distance if key == "distances" else result[key][q][j]
+                    for _, (distance, result, j) in top
+                ])
+        return merged
+
+
+class ShardedRetriever(LangChainBaseRetriever):
+    """
+    Retriever de LangChain sobre ShardedCollection; admite `filter` como el de
+    Chroma. Con `score_threshold` descarta los documentos cuya relevancia
+    (`relevance_score_fn` aplicada a la distancia) es menor; por defecto, la
+    función de Chroma para el espacio de la colección.
+    """
+    collection: Any
+    embeddings: Any
+    k: int = 4
+    score_threshold: Optional[float] = None
+    relevance_score_fn: Optional[Callable[[float], float]] = None
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun,
+                                filter: Optional[Dict[str, Any]] = None) -> List[Document]:
+        vector = self.embeddings.embed_query(query)
+        result = self.collection.query(query_embeddings=[vector], n_results=self.k, where=filter,
+                                       include=["documents", "metadatas", "distances"])
+        relevance = self.relevance_score_fn or relevance_score_fn(getattr(self.collection, "space", "l2"))
+        return [Document(page_content=text or "", metadata=meta or {}, id=doc_id)
+                for doc_id, text, meta, distance in zip(result["ids"][0], result["documents"][0],
+                                                        result["metadatas"][0], result["distances"][0])
+                if self.score_threshold is None or relevance(distance) >= self.score_threshold]
@@ -0,0 +1,196 @@
+# src/rag/snapshot.py
+
+import os
+import json
+import time
+import hashlib
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .logging_config import logger
+
+SNAPSHOT_FORMAT = "chatbot-vector-snapshot"
+SNAPSHOT_VERSION = 1
+QUANTIZATIONS = ("none", "float16", "int8")
+
+
+def encode_strings(values: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Columna de textos como un bloque UTF-8 más offsets (sin pickle)."""
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def decode_strings(blob: np.ndarray, offsets: np.ndarray) -> List[str]:
+    """Inversa de encode_strings."""
+    data = blob.tobytes()
+    return [data[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+
+
+def quantize_vectors(vectors: np.ndarray, quantization: str) -> Dict[str, np.ndarray]:
+    """
+    Cuantiza los vectores para el snapshot.
+
+    - none: float32 sin pérdida.
+    - float16: la mitad de tamaño; el error es despreciable para la similitud coseno.
+    - int8: una cuarta parte, con una escala simétrica por vector.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if quantization == "none":
+        return {"vectors": vectors}
+    if quantization == "float16":
+        return {"vectors": vectors.astype(np.float16)}
+    if quantization == "int8":
+        if vectors.size == 0:
+            return {"vectors": vectors.astype(np.int8), "scales": np.zeros(len(vectors), dtype=np.float32)}
+        scales = np.abs(vectors).max(axis=1, keepdims=True) / 127.0
+        scales[scales == 0] = 1.0
+        return {
+            "vectors": np.round(vectors / scales).astype(np.int8),
+            "scales": scales.astype(np.float32).ravel(),
+        }
+    raise ValueError(f"Cuantización no soportada: {quantization}")
+
+
+def dequantize_vectors(arrays: Dict[str, np.ndarray], quantization: str) -> np.ndarray:
+    vectors = arrays["vectors"].astype(np.float32)
+    if quantization == "int8":
+        vectors *= arrays["scales"][:, None]
+    return vectors
+
+
+def _checksum(array: np.ndarray) -> str:
+    return hashlib.sha256(np.ascontiguousarray(array).tobytes()).hexdigest()
+
+
+def iter_collection(collection, page_size: int) -> Iterator[Dict[str, Any]]:
+    """Recorre una colección de Chroma por páginas, con vectores, textos y metadatos."""
+    offset = 0
+    while True:
+        page = collection.get(include=["embeddings", "documents", "metadatas"],
+                              limit=page_size, offset=offset)
+        if not page["ids"]:
+            return
+        yield page
+        offset += len(page["ids"])
+
+
+def export_snapshot(collection, path: str, quantization: str = "none",
+                    embedding_model: Optional[str] = None, page_size: int = 1000,
+                    compress: bool = False) -> Dict[str, Any]:
+    """
+    Exporta una colección de Chroma a un snapshot .npz versionado.
+
+    El snapshot contiene ids, textos, metadatos (JSON) y vectores en columnas,
+    y un manifiesto con la versión del formato, el modelo de embeddings y el
+    SHA-256 de cada columna. Se escribe en un archivo temporal y se renombra, de
+    modo que nunca queda un snapshot a medias.
+
+    Args:
+        collection: Colección de chromadb (`Chroma._collection`).
+        path: Archivo de destino (.npz).
+        quantization: none, float16 o int8.
+        embedding_model: Modelo con el que se calcularon los vectores.
+        page_size: Registros leídos de la colección por página.
+        compress: Comprime el archivo (más pequeño, export más lento).
+
+    Returns:
+        El manifiesto escrito.
+    """
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Cuantización no soportada: {quantization}")
+    ids: List[str] = []
+    texts: List[str] = []
+    metadatas: List[str] = []
+    vector_pages: List[np.ndarray] = []
+    for page in iter_collection(collection, page_size):
+        ids.extend(page["ids"])
+        texts.extend(doc or "" for doc in page["documents"])
+        metadatas.extend(json.dumps(meta or {}, ensure_ascii=False, sort_keys=True) for meta in page["metadatas"])
+        vector_pages.append(np.asarray(page["embeddings"], dtype=np.float32))
+    vectors = np.concatenate(vector_pages) if vector_pages else np.zeros((0, 0), dtype=np.float32)
+
+    arrays: Dict[str, np.ndarray] = {}
+    arrays["ids"], arrays["ids_offsets"] = encode_strings(ids)
+    arrays["texts"], arrays["texts_offsets"] = encode_strings(texts)
+    arrays["metadatas"], arrays["metadatas_offsets"] = encode_strings(metadatas)
+    arrays.update(quantize_vectors(vectors, quantization))
+
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "version": SNAPSHOT_VERSION,
+        "count": len(ids),
+        "dimension": int(vectors.shape[1]) if vectors.ndim == 2 and len(ids) else 0,
+        "quantization": quantization,
+        "embedding_model": embedding_model,
+        "created": time.time(),
+        "checksums": {name: _checksum(array) for name, array in arrays.items()},
+    }
+    arrays["manifest"] = np.frombuffer(json.dumps(manifest).encode("utf-8"), dtype=np.uint8)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp.npz"
+    (np.savez_compressed if compress else np.savez)(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+    logger.info("Snapshot exportado en %s: %s vectores (%s)", path, len(ids), quantization)
+    return manifest
+
+
+def read_snapshot(path: str, expected_model: Optional[str] = None) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+    """
+    Lee y valida un snapshot: formato, versión, checksums y modelo de embeddings.
+
+    Raises:
+        ValueError: Si el snapshot no es válido, está corrupto o se calculó con
+            otro modelo de embeddings.
+    """
+    with np.load(path, allow_pickle=False) as data:
+        arrays = {name: data[name] for name in data.files}
+    if "manifest" not in arrays:
+        raise ValueError(f"{path} no es un snapshot de vectores")
+    manifest = json.loads(arrays.pop("manifest").tobytes().decode("utf-8"))
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"{path} no es un snapshot de vectores")
+    if manifest.get("version", 0) > SNAPSHOT_VERSION:
+        raise ValueError(f"Versión de snapshot no soportada: {manifest.get('version')}")
+    for name, expected in manifest["checksums"].items():
+        if name not in arrays or _checksum(arrays[name]) != expected:
+            raise ValueError(f"Checksum inválido en la columna '{name}' de {path}")
+    model = manifest.get("embedding_model")
+    if expected_model and model and model != expected_model:
+        raise ValueError(f"El snapshot se generó con {model}, pero el modelo configurado es {expected_model}")
+    return manifest, arrays
+
+
+def import_snapshot(collection, path: str, expected_model: Optional[str] = None,
+                    batch_size: int = 5000) -> int:
+    """
+    Carga un snapshot en una colección de Chroma con inserciones masivas.
+
+    Los vectores se insertan tal cual (sin calcular embeddings) en lotes
+    grandes. Sobre una colección con datos se usa upsert, así que importar dos
+    veces el mismo snapshot es idempotente.
+
+    Returns:
+        Número de registros importados.
+    """
+    manifest, arrays = read_snapshot(path, expected_model)
+    ids = decode_strings(arrays["ids"], arrays["ids_offsets"])
+    texts = decode_strings(arrays["texts"], arrays["texts_offsets"])
+    metadatas = [json.loads(m) or None for m in decode_strings(arrays["metadatas"], arrays["metadatas_offsets"])]
+    vectors = dequantize_vectors(arrays, manifest["quantization"])
+
+    # Chroma limita el tamaño de cada inserción.
+    max_batch = getattr(getattr(collection, "_client", None), "get_max_batch_size", lambda: batch_size)()
+    batch_size = max(1, min(batch_size, max_batch))
+    # En una colección vacía (el caso de un nodo nuevo) add evita comprobar ids existentes.
+    insert = collection.add if collection.count() == 0 else collection.upsert
+    for start in range(0, len(ids), batch_size):
+        end = start + batch_size
+        insert(ids=ids[start:end], embeddings=vectors[start:end],
+               documents=texts[start:end], metadatas=metadatas[start:end])
+    logger.info("Snapshot importado desde %s: %s vectores", path, len(ids))
+    return len(ids)
@@ -1,22 +1,40 @@
 # src/rag/vector_store.py
 
 import os
+import re
+import uuid
+import shutil
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Optional, Any
 # CAMBIO: Se importa la clase de documentos de LangChain para la coherencia
 from langchain_core.documents import Document
 
 from .logging_config import logger
 from src.config import GlobalConfig as Config
+from src.metrics import metrics
+from .snapshot import export_snapshot, import_snapshot
+from .sharding import ShardedCollection
 
 # CAMBIO: Se importa Chroma de la nueva librería para usarlo como clase principal
 from langchain_chroma import Chroma
 
+_SHARD_DIR = re.compile(r"^shard-(\d+)$")
+
+
+def shard_directory(persist_directory: str, shard: int) -> str:
+    """El shard 0 es la colección original; los demás van en subdirectorios propios."""
+    return persist_directory if shard == 0 else os.path.join(persist_directory, f"shard-{shard}")
+
 
 class VectorStore:
     """
     Sistema de almacenamiento vectorial usando ChromaDB, integrado con LangChain.
     Esta clase ahora actúa como un wrapper delgado alrededor de la clase Chroma de LangChain.
+
+    Con VECTOR_SHARDS > 1 el corpus se reparte entre varias colecciones, cada
+    una en su directorio (con su propio SQLite e índice HNSW), y `collection`
+    es una ShardedCollection que las presenta como una sola.
     """
     
     def __init__(self, config: Config, embedding_function: Any):
@@ -32,28 +50,133 @@ class VectorStore:
         
         # Se inicializa la instancia de Chroma con toda la configuración necesaria.
         # Esta clase maneja la persistencia y la creación de la colección automáticamente.
-        self.db = Chroma(
-            collection_name=config.CHROMA_COLLECTION_NAME,
+        self.db = self._open_shard(0)
+        self.shard_count = max(1, config.VECTOR_SHARDS)
+        self.shards = [self.db] + [self._open_shard(i) for i in range(1, self.shard_count)]
+        self.shard_ids = list(range(self.shard_count))
+        # Shards que sobran tras reducir VECTOR_SHARDS: se siguen consultando
+        # (no reciben escrituras) hasta que se rebalancea.
+        for shard in self.existing_shards():
+            if shard >= self.shard_count:
+                logger.warning("El shard %s está fuera de VECTOR_SHARDS=%s; ejecuta el rebalanceo",
+                               shard, self.shard_count)
+                self.shards.append(self._open_shard(shard))
+                self.shard_ids.append(shard)
+        self.collection = self.db._collection
+        if len(self.shards) > 1:
+            self.collection = ShardedCollection(
+                [shard._collection for shard in self.shards], write_count=self.shard_count,
+                routing=config.VECTOR_SHARD_ROUTING, timeout=config.VECTOR_SHARD_TIMEOUT,
+                executor=ThreadPoolExecutor(max_workers=config.VECTOR_SHARD_WORKERS or 4 * len(self.shards),
+                                            thread_name_prefix="shard"),
+                max_inflight=config.VECTOR_SHARD_MAX_INFLIGHT
+            )
+        logger.info("VectorStore inicializado con ChromaDB en %s (%s shards)",
+                    config.CHROMA_PERSIST_DIRECTORY, len(self.shards))
+        # Un nodo nuevo arranca desde el snapshot en lugar de recalcular los embeddings.
+        if config.SNAPSHOT_RESTORE_PATH and os.path.exists(config.SNAPSHOT_RESTORE_PATH) \
+                and self.collection.count() == 0:
+            self.import_snapshot(config.SNAPSHOT_RESTORE_PATH)
+
+    def _open_shard(self, shard: int) -> Chroma:
+        db = Chroma(
+            collection_name=self.config.CHROMA_COLLECTION_NAME,
             embedding_function=self.embedding_function,
-            persist_directory=config.CHROMA_PERSIST_DIRECTORY,
+            persist_directory=shard_directory(self.config.CHROMA_PERSIST_DIRECTORY, shard),
+            collection_metadata=self.hnsw_metadata(),
         )
-        logger.info(f"VectorStore inicializado con ChromaDB en {config.CHROMA_PERSIST_DIRECTORY}")
+        self._apply_hnsw_config(db._collection, shard)
+        return db
+
+    def hnsw_metadata(self) -> Dict[str, Any]:
+        """Parámetros HNSW de GlobalConfig en el formato de metadatos de colección de Chroma."""
+        return {
+            "hnsw:space": self.config.HNSW_SPACE,
+            "hnsw:M": self.config.HNSW_M,
+            "hnsw:construction_ef": self.config.HNSW_CONSTRUCTION_EF,
+            "hnsw:search_ef": self.config.HNSW_SEARCH_EF,
+        }
+
+    def _apply_hnsw_config(self, collection, shard: int) -> None:
+        """
+        Actualiza search_ef de una colección existente. Los parámetros de
+        construcción no se pueden cambiar: si difieren solo se avisa (hay que
+        exportar un snapshot e importarlo en una colección nueva).
+        """
+        hnsw = (getattr(collection, "configuration", None) or {}).get("hnsw") or {}
+        if not hnsw:
+            return
+        if hnsw.get("ef_search") != self.config.HNSW_SEARCH_EF:
+            collection.modify(configuration={"hnsw": {"ef_search": self.config.HNSW_SEARCH_EF}})
+        built = (hnsw.get("space"), hnsw.get("max_neighbors"), hnsw.get("ef_construction"))
+        wanted = (self.config.HNSW_SPACE, self.config.HNSW_M, self.config.HNSW_CONSTRUCTION_EF)
+        if built != wanted:
+            logger.warning("El shard %s se creó con space=%s, M=%s, construction_ef=%s; la configuración "
+                           "(%s, %s, %s) solo se aplica a colecciones nuevas", shard, *built, *wanted)
+
+    def existing_shards(self) -> List[int]:
+        """Shards adicionales (> 0) presentes en disco."""
+        directory = self.config.CHROMA_PERSIST_DIRECTORY
+        if not os.path.isdir(directory):
+            return []
+        return sorted(int(m.group(1)) for m in map(_SHARD_DIR.match, os.listdir(directory)) if m)
+
+    @property
+    def sharded(self) -> bool:
+        return isinstance(self.collection, ShardedCollection)
         
-    def add_documents(self, documents: List[Document]) -> None:
+    def add_documents(self, documents: List[Document]) -> List[str]:
         """
         Agrega documentos al vector store.
         
         Args:
             documents: Lista de documentos en formato LangChain.
+
+        Returns:
+            Los ids asignados en la colección.
         """
         try:
             # La clase Chroma de LangChain maneja la adición directamente.
-            self.db.add_documents(documents)
-            logger.info(f"Agregados {len(documents)} documentos al vector store")
+            with metrics.span("vector_add"):
+                if self.sharded:
+                    ids = self._add_sharded(documents)
+                else:
+                    ids = self.db.add_documents(documents)
+            metrics.inc("chatbot_ingested_chunks_total", len(documents))
+            logger.info("Agregados %s documentos al vector store", len(documents))
+            return ids
         except Exception as e:
-            logger.error(f"Error agregando documentos: {str(e)}", exc_info=True)
+            logger.error("Error agregando documentos: %s", e, exc_info=True)
             raise
             
+    def _add_sharded(self, documents: List[Document]) -> List[str]:
+        """Calcula los embeddings en una pasada y escribe cada shard en paralelo."""
+        ids = [doc.id or str(uuid.uuid4()) for doc in documents]
+        texts = [doc.page_content for doc in documents]
+        self.collection.upsert(ids=ids, embeddings=self.embedding_function.embed_documents(texts),
+                               documents=texts, metadatas=[doc.metadata or None for doc in documents])
+        return ids
+
+    def delete(self, ids: List[str]) -> None:
+        """Elimina de la colección los chunks indicados."""
+        if not ids:
+            return
+        try:
+            with metrics.span("vector_delete"):
+                self.collection.delete(ids=ids)
+            logger.info("Eliminados %s chunks del vector store", len(ids))
+        except Exception as e:
+            logger.error("Error eliminando documentos: %s", e, exc_info=True)
+            raise
+
+    def update_metadata(self, ids: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        """Reemplaza los metadatos de los chunks indicados (sin recalcular embeddings)."""
+        if not ids:
+            return
+        with metrics.span("vector_update"):
+            self.collection.update(ids=ids, metadatas=metadatas)
+        logger.info("Actualizados los metadatos de %s chunks", len(ids))
+
     def get_chroma_instance(self) -> Chroma:
         """Retorna la instancia de la base de datos Chroma para usarla como retriever."""
         return self.db
@@ -63,27 +186,97 @@ class VectorStore:
         Elimina todos los documentos de la colección.
         """
         try:
-            # Obtenemos todos los IDs de la colección actual para borrarlos.
-            collection_data = self.db.get()
-            if collection_data and collection_data['ids']:
-                self.db.delete(ids=collection_data['ids'])
-                logger.info("Colección limpiada (todos los vectores eliminados).")
-            else:
-                logger.info("La colección ya estaba vacía.")
+            # Obtenemos todos los IDs de cada shard para borrarlos.
+            for shard in self.shards:
+                collection_data = shard.get()
+                if collection_data and collection_data['ids']:
+                    shard.delete(ids=collection_data['ids'])
+            logger.info("Colección limpiada (todos los vectores eliminados).")
         except Exception as e:
-            logger.error(f"Error limpiando colección: {str(e)}", exc_info=True)
+            logger.error("Error limpiando colección: %s", e, exc_info=True)
             raise
             
     def get_collection_stats(self) -> Dict[str, Any]:
         """Retorna estadísticas sobre la colección."""
         try:
             # El método _collection.count() nos da el número de items.
-            count = self.db._collection.count()
+            counts = [shard._collection.count() for shard in self.shards]
             return {
-                "num_documents": count,
+                "num_documents": sum(counts),
                 "collection_name": self.config.CHROMA_COLLECTION_NAME,
-                "persist_directory": self.config.CHROMA_PERSIST_DIRECTORY
+                "persist_directory": self.config.CHROMA_PERSIST_DIRECTORY,
+                "shards": dict(zip(self.shard_ids, counts))
             }
         except Exception as e:
-            logger.error(f"Error obteniendo estadísticas: {str(e)}", exc_info=True)
-            raise
\ No newline at end of file
+            logger.error("Error obteniendo estadísticas: %s", e, exc_info=True)
+            raise
+
+    def export_snapshot(self, path: str, quantization: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Exporta la colección a un snapshot .npz (ids, textos, metadatos y vectores).
+
+        Args:
+            path: Archivo de destino.
+            quantization: none, float16 o int8 (por defecto SNAPSHOT_QUANTIZATION).
+        """
+        return export_snapshot(
+            self.collection, path,
+            quantization=quantization or self.config.SNAPSHOT_QUANTIZATION,
+            embedding_model=self.config.EMBEDDING_MODEL
+        )
+
+    def import_snapshot(self, path: str) -> int:
+        """Carga un snapshot en la colección sin recalcular embeddings."""
+        with metrics.span("snapshot_import"):
+            count = import_snapshot(self.collection, path, expected_model=self.config.EMBEDDING_MODEL,
+                                    batch_size=self.config.SNAPSHOT_IMPORT_BATCH_SIZE)
+        metrics.inc("chatbot_ingested_chunks_total", count)
+        return count
+
+    def rebalance(self, page_size: int = 1000, dry_run: bool = False) -> Dict[str, Any]:
+        """
+        Mueve cada chunk al shard que le corresponde con VECTOR_SHARDS y el
+        reparto actuales, sin recalcular embeddings, y elimina los shards que
+        quedan fuera. Cada lote se escribe en el destino antes de borrarse del
+        origen, así que una interrupción nunca pierde chunks (las búsquedas
+        descartan los repetidos).
+
+        Returns:
+            Chunks movidos por shard de origen y shards eliminados.
+        """
+        if not self.sharded:
+            return {"moved": {}, "removed": []}
+        moved: Dict[int, int] = {}
+        for position, shard in enumerate(self.shards):
+            collection = shard._collection
+            misplaced: List[str] = []
+            offset = 0
+            while True:
+                page = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+                if not page["ids"]:
+                    break
+                misplaced.extend(chunk_id for chunk_id, metadata in zip(page["ids"], page["metadatas"])
+                                 if self.collection.shard_for(chunk_id, metadata) != position)
+                offset += len(page["ids"])
+            moved[self.shard_ids[position]] = len(misplaced)
+            if dry_run:
+                continue
+            for start in range(0, len(misplaced), page_size):
+                batch = collection.get(ids=misplaced[start:start + page_size],
+                                       include=["embeddings", "documents", "metadatas"])
+                self.collection.upsert(ids=batch["ids"], embeddings=batch["embeddings"],
+                                       documents=batch["documents"], metadatas=batch["metadatas"])
+                collection.delete(ids=batch["ids"])
+            logger.info("Shard %s: %s chunks movidos", self.shard_ids[position], len(misplaced))
+        removed = [shard for shard in self.shard_ids if shard >= self.shard_count]
+        if not dry_run and removed:
+            for shard in removed:
+                self.shards[self.shard_ids.index(shard)].delete_collection()
+                shutil.rmtree(shard_directory(self.config.CHROMA_PERSIST_DIRECTORY, shard), ignore_errors=True)
+            keep = [i for i, shard in enumerate(self.shard_ids) if shard < self.shard_count]
+            self.shards = [self.shards[i] for i in keep]
+            self.shard_ids = [self.shard_ids[i] for i in keep]
+            self.collection.collections = [self.collection.collections[i] for i in keep]
+            if len(self.shards) == 1:
+                self.collection = self.db._collection
+        return {"moved": moved, "removed": removed}
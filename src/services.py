@@ -2,7 +2,9 @@
 
 from .chatbot import Chatbot
 from .langgraph_service import LangGraphService
+from .model_router import ModelRouter
 from .document_service import DocumentService
+from .ingest_jobs import IngestJobManager
 from .user_manager import GestorUsuarios
 from .rag.retriever import RAGRetriever
 from .rag.chat_history import ChatHistory
@@ -16,12 +18,16 @@ class ServiceContainer:
         if self.config.RAG_ENABLED:
             self.rag_retriever = RAGRetriever(self.config)
             self.chat_history = ChatHistory(self.config)
-            self.document_service = DocumentService(self.rag_retriever)
+            # Las subidas se ingieren en segundo plano sin bloquear la conversación.
+            self.ingest_jobs = (IngestJobManager.from_config(self.config, self.rag_retriever)
+                                if self.config.INGEST_JOBS_ENABLED else None)
+            self.document_service = DocumentService(self.rag_retriever, jobs=self.ingest_jobs)
             langchain_retriever = self.rag_retriever.get_retriever()
         else:
             self.rag_retriever = None
             self.chat_history = None
             self.document_service = None
+            self.ingest_jobs = None
             langchain_retriever = None
 
         # =============================================================================
@@ -31,7 +37,11 @@ class ServiceContainer:
             api_key=self.config.ANTHROPIC_API_KEY,
             model=self.config.ANTHROPIC_MODEL,
             chat_history=self.chat_history,
-            retriever=langchain_retriever
+            retriever=langchain_retriever,
+            owner_resolver=self.user_manager.obtener_propietario,
+            router=ModelRouter.from_config(
+                self.config, self.rag_retriever.embeddings if self.rag_retriever else None
+            ) if self.config.ROUTING_ENABLED else None
         )
 
         # =============================================================================
@@ -40,5 +50,6 @@ class ServiceContainer:
         self.chatbot = Chatbot(
             api_key=self.config.ANTHROPIC_API_KEY,
             model=self.config.ANTHROPIC_MODEL,
-            retriever=self.rag_retriever
+            retriever=self.rag_retriever,
+            user_manager=self.user_manager
         )
\ No newline at end of file
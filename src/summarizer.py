@@ -0,0 +1,54 @@
+# src/summarizer.py
+
+from typing import List, Sequence, Tuple
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+
+SUMMARY_INSTRUCTIONS = (
+    "Eres un asistente que resume conversaciones. Actualiza el resumen existente "
+    "incorporando los nuevos mensajes. Conserva hechos, nombres, preferencias del "
+    "usuario, decisiones y preguntas pendientes; omite saludos y relleno. "
+    "Responde solo con el resumen, en el idioma de la conversación."
+)
+
+
+class ConversationSummarizer:
+    """
+    Compacta conversaciones largas en un resumen acumulativo.
+
+    Cuando el hilo supera `trigger_messages` mensajes, los más antiguos se
+    integran en el resumen y solo se conservan los `keep_messages` más recientes,
+    de modo que el prompt se mantiene casi constante en hilos muy largos.
+    """
+    def __init__(self, llm, trigger_messages: int = 20, keep_messages: int = 6):
+        self.llm = llm
+        self.trigger_messages = trigger_messages
+        self.keep_messages = keep_messages
+
+    def should_compact(self, messages: Sequence[BaseMessage]) -> bool:
+        return len(messages) > self.trigger_messages
+
+    def split(self, messages: Sequence[BaseMessage]) -> Tuple[List[BaseMessage], List[BaseMessage]]:
+        """
+        Separa los mensajes a resumir de los que se conservan.
+
+        El tramo conservado siempre empieza en un mensaje humano para que el
+        prompt resultante siga alternando turnos de usuario y asistente.
+        """
+        cut = max(0, len(messages) - self.keep_messages)
+        while cut < len(messages) and not isinstance(messages[cut], HumanMessage):
+            cut += 1
+        return list(messages[:cut]), list(messages[cut:])
+
+    def summarize(self, previous_summary: str, messages: Sequence[BaseMessage]) -> str:
+        """Genera un nuevo resumen a partir del resumen anterior y los mensajes a plegar."""
+        transcript = "\n".join(
+            f"{'Usuario' if isinstance(msg, HumanMessage) else 'Asistente'}: {msg.content}"
+            for msg in messages
+        )
+        content = (
+            f"Resumen actual:\n{previous_summary or '(vacío)'}\n\n"
+            f"Nuevos mensajes:\n{transcript}"
+        )
+        response = self.llm.invoke([SystemMessage(content=SUMMARY_INSTRUCTIONS), HumanMessage(content=content)])
+        return str(response.content).strip()
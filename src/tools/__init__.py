@@ -0,0 +1 @@
+# Herramientas de línea de comandos (benchmarks y mantenimiento)
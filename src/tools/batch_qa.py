@@ -0,0 +1,287 @@
+# src/tools/batch_qa.py
+"""
+Responde en lote preguntas leídas de un archivo JSONL o CSV.
+
+Cada registro tiene `conversation_id` (o `historial_id`) y `question` (o
+`message`), y opcionalmente un `id` único; sin él se usa el número de línea.
+Las preguntas de una misma conversación se responden en orden y en el mismo
+hilo de LangGraph; las de conversaciones distintas, en paralelo.
+
+Los embeddings y las búsquedas se hacen de una vez por ventana de
+--batch-size preguntas, en un hilo que va hasta --prefetch ventanas por delante
+de las respuestas. Cada pregunta preparada pasa a la cola de su conversación y
+los trabajadores toman conversaciones con preguntas pendientes, sin esperar a
+que termine la ventana: una respuesta lenta solo retrasa a su conversación.
+Cada resultado se añade al JSONL de salida en cuanto termina, así que si el
+proceso se interrumpe basta con volver a ejecutar el mismo comando para
+continuar donde se quedó. El historial de LangGraph vive en memoria: antes de
+continuar una conversación a medias se cargan en su hilo las preguntas y
+respuestas ya registradas, para que las siguientes se respondan con el mismo
+contexto que sin la interrupción.
+
+Uso:
+    python -m src.tools.batch_qa preguntas.jsonl respuestas.jsonl --concurrency 8
+    python -m src.tools.batch_qa preguntas.csv respuestas.jsonl --retry-errors
+"""
+
+import argparse
+import csv
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterator, List, Optional, Set, Tuple
+
+from src.constants import MESSAGES
+from src.rag.retriever import scope_filter
+from src.rag.logging_config import logger
+
+_ERROR_PREFIX = MESSAGES["ERROR"].split("{", 1)[0]
+
+
+def read_records(path: str) -> List[Dict[str, str]]:
+    """Lee los registros de entrada (JSONL o CSV según la extensión)."""
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".csv"):
+            rows: Iterator[Dict[str, Any]] = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        records = []
+        for line, row in enumerate(rows, 1):
+            conversation_id = row.get("conversation_id") or row.get("historial_id")
+            question = row.get("question") or row.get("message")
+            if not conversation_id or not question:
+                raise ValueError(f"Registro {line} de {path} sin conversation_id o question")
+            records.append({"id": str(row.get("id") or line), "conversation_id": str(conversation_id),
+                            "question": question})
+    return records
+
+
+def read_results(output_path: str) -> Dict[str, Dict[str, Any]]:
+    """Último resultado registrado de cada id en la salida."""
+    results: Dict[str, Dict[str, Any]] = {}
+    if not os.path.exists(output_path):
+        return results
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                # Última línea a medio escribir por una interrupción.
+                continue
+            results[result["id"]] = result
+    return results
+
+
+def completed_ids(output_path: str, retry_errors: bool = False) -> Set[str]:
+    """Ids ya presentes en la salida (sin los que fallaron si `retry_errors`)."""
+    return {result_id for result_id, result in read_results(output_path).items()
+            if not (retry_errors and result.get("error"))}
+
+
+class BatchRunner:
+    """
+    Ejecuta preguntas en lote sobre el servicio de LangGraph.
+
+    Args:
+        service: LangGraphService que genera las respuestas.
+        rag_retriever: RAGRetriever para las búsquedas agrupadas (None sin RAG).
+        output_path: JSONL de resultados; se abre en modo append.
+        concurrency: Conversaciones respondiéndose a la vez.
+        batch_size: Preguntas por ventana de embeddings y búsqueda.
+        k: Documentos recuperados por pregunta.
+        prefetch: Ventanas que se preparan por delante de las respuestas.
+    """
+    def __init__(self, service, rag_retriever, output_path: str, concurrency: int = 8,
+                 batch_size: int = 64, k: int = 4, prefetch: int = 2):
+        self.service = service
+        self.rag_retriever = rag_retriever
+        self.output_path = output_path
+        self.concurrency = max(1, concurrency)
+        self.batch_size = max(1, batch_size)
+        self.k = k
+        self.prefetch = max(1, prefetch)
+        self.stats: Dict[str, int] = {}
+
+    def run(self, records: List[Dict[str, str]], retry_errors: bool = False) -> Dict[str, Any]:
+        self.stats = {"done": 0, "errors": 0}
+        results = read_results(self.output_path)
+        done = {result_id for result_id, result in results.items() if not (retry_errors and result.get("error"))}
+        pending = [r for r in records if r["id"] not in done]
+        logger.info("Batch: %s preguntas, %s ya respondidas, %s pendientes",
+                    len(records), len(records) - len(pending), len(pending))
+        start = time.perf_counter()
+        self._restore_histories(records, results, pending)
+        self._terminate_partial_line()
+        with open(self.output_path, "a", encoding="utf-8") as output:
+            self._schedule(pending, output)
+        elapsed = time.perf_counter() - start
+        return {**self.stats, "skipped": len(records) - len(pending), "seconds": elapsed,
+                "per_second": self.stats["done"] / elapsed if elapsed else 0.0}
+
+    def _schedule(self, pending: List[Dict[str, str]], output) -> None:
+        """
+        Un productor prepara las ventanas y encola cada pregunta en su
+        conversación; `concurrency` trabajadores toman conversaciones listas.
+        Una conversación la atiende un solo trabajador a la vez, que responde
+        sus preguntas en orden hasta vaciar su cola.
+        """
+        cond = threading.Condition()
+        queues: Dict[str, Deque[Tuple[Dict[str, str], Optional[list]]]] = {}
+        ready: Deque[str] = deque()
+        active: Set[str] = set()
+        # Preguntas preparadas sin responder: como mucho la ventana en curso y
+        # `prefetch` ventanas más.
+        state = {"prepared": 0, "producing": True, "error": None}
+        limit = (self.prefetch + 1) * self.batch_size
+
+        def produce():
+            try:
+                for i in range(0, len(pending), self.batch_size):
+                    window = pending[i:i + self.batch_size]
+                    with cond:
+                        while state["prepared"] + len(window) > limit and state["error"] is None:
+                            cond.wait()
+                        if state["error"] is not None:
+                            return
+                    contexts = self.retrieve(window)
+                    with cond:
+                        for record, context in zip(window, contexts):
+                            conversation = record["conversation_id"]
+                            queue = queues.setdefault(conversation, deque())
+                            if not queue and conversation not in active:
+                                ready.append(conversation)
+                            queue.append((record, context))
+                        state["prepared"] += len(window)
+                        cond.notify_all()
+            except BaseException as e:
+                with cond:
+                    state["error"] = state["error"] or e
+            finally:
+                with cond:
+                    state["producing"] = False
+                    cond.notify_all()
+
+        def work():
+            while True:
+                with cond:
+                    while not ready and state["producing"] and state["error"] is None:
+                        cond.wait()
+                    if not ready or state["error"] is not None:
+                        return
+                    conversation = ready.popleft()
+                    active.add(conversation)
+                while True:
+                    with cond:
+                        queue = queues[conversation]
+                        if not queue or state["error"] is not None:
+                            active.discard(conversation)
+                            break
+                        record, context = queue.popleft()
+                    try:
+                        self._answer(record, context, output, cond)
+                    except BaseException as e:
+                        with cond:
+                            state["error"] = state["error"] or e
+                            active.discard(conversation)
+                            cond.notify_all()
+                        return
+                    with cond:
+                        state["prepared"] -= 1
+                        cond.notify_all()
+
+        threads = [threading.Thread(target=produce, name="batch-prefetch", daemon=True)]
+        threads += [threading.Thread(target=work, name=f"batch-worker-{i}", daemon=True)
+                    for i in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if state["error"] is not None:
+            raise state["error"]
+
+    def _restore_histories(self, records: List[Dict[str, str]], results: Dict[str, Dict[str, Any]],
+                           pending: List[Dict[str, str]]) -> None:
+        """
+        Carga en el hilo de cada conversación con preguntas pendientes los
+        turnos que ya tienen respuesta en la salida, en el orden de la entrada.
+        Las respuestas con error no se cargan: no forman parte del diálogo.
+        """
+        unfinished = {record["conversation_id"] for record in pending}
+        turns: Dict[str, List[Tuple[str, str]]] = {}
+        for record in records:
+            result = results.get(record["id"])
+            if record["conversation_id"] in unfinished and result and not result.get("error"):
+                turns.setdefault(record["conversation_id"], []).append((record["question"], result["answer"]))
+        restored = sum(self.service.restore_history(conversation_id, history)
+                       for conversation_id, history in turns.items())
+        if restored:
+            logger.info("Batch: historial restaurado en %s conversaciones a medias", restored)
+
+    def retrieve(self, window: List[Dict[str, str]]) -> List[Optional[list]]:
+        """Contexto de cada pregunta de la ventana, con una búsqueda por ámbito de usuario."""
+        if self.rag_retriever is None:
+            return [None] * len(window)
+        groups: Dict[Any, List[int]] = {}
+        for j, record in enumerate(window):
+            groups.setdefault(self.service.resolve_scope(record["conversation_id"]), []).append(j)
+        contexts: List[Optional[list]] = [None] * len(window)
+        for scope, indexes in groups.items():
+            where = scope_filter(*scope) if scope is not None else None
+            docs = self.rag_retriever.search_batch([window[j]["question"] for j in indexes], k=self.k, where=where)
+            for j, found in zip(indexes, docs):
+                contexts[j] = found
+        return contexts
+
+    def _answer(self, record: Dict[str, str], context: Optional[list], output, lock) -> None:
+        start = time.perf_counter()
+        answer = self.service.send_message(record["question"], record["conversation_id"], context_docs=context)
+        error = not answer or answer.startswith(_ERROR_PREFIX)
+        result = {**record, "answer": answer, "error": error,
+                  "latency_s": round(time.perf_counter() - start, 3)}
+        with lock:
+            output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            output.flush()
+            self.stats["done"] += 1
+            self.stats["errors"] += error
+
+    def _terminate_partial_line(self) -> None:
+        """Si la salida acaba a mitad de línea (interrupción), la cierra antes de añadir."""
+        if not os.path.exists(self.output_path) or not os.path.getsize(self.output_path):
+            return
+        with open(self.output_path, "rb+") as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Respuestas en lote")
+    parser.add_argument("input", help="JSONL o CSV con conversation_id y question")
+    parser.add_argument("output", help="JSONL de resultados (se reanuda si existe)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--k", type=int, default=4, help="Documentos recuperados por pregunta")
+    parser.add_argument("--prefetch", type=int, default=2,
+                        help="Ventanas de búsqueda preparadas por delante de las respuestas")
+    parser.add_argument("--retry-errors", action="store_true", help="Repite las preguntas que fallaron")
+    args = parser.parse_args(argv)
+
+    from src.chatbot import Chatbot
+    from src.config import config
+
+    records = read_records(args.input)
+    # El lote va directo al servicio: el control de admisión de los turnos
+    # interactivos no aplica, la concurrencia la fija --concurrency.
+    chatbot = Chatbot(api_key=config.ANTHROPIC_API_KEY)
+    chatbot.wait_until_ready(config.WARMUP_TIMEOUT)
+    runner = BatchRunner(chatbot.langgraph_service, chatbot.rag_retriever, args.output,
+                         args.concurrency, args.batch_size, args.k, args.prefetch)
+    stats = runner.run(records, retry_errors=args.retry_errors)
+    print(f"Respondidas {stats['done']} preguntas ({stats['errors']} con error, {stats['skipped']} ya hechas) "
+          f"en {stats['seconds']:.1f}s: {stats['per_second']:.2f} preguntas/s")
+
+
+if __name__ == "__main__":
+    main()
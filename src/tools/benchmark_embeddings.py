@@ -0,0 +1,84 @@
+# src/tools/benchmark_embeddings.py
+"""
+Compara los backends de inferencia de embeddings en esta máquina.
+
+Para cada backend mide el tiempo de carga (incluida la exportación la primera
+vez), el rendimiento en textos por segundo y la paridad con PyTorch fp32.
+
+Uso:
+    python -m src.tools.benchmark_embeddings --backends torch,torch-int8,onnx,onnx-int8
+"""
+
+import argparse
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from src.config import config
+from src.rag.embedding_backends import EmbeddingBackendLoader, embedding_parity, sample_texts
+
+
+def _loader(name: str, args) -> EmbeddingBackendLoader:
+    backend, _, suffix = name.partition("-")
+    return EmbeddingBackendLoader(
+        model_name=args.model, backend=backend, quantize=suffix == "int8",
+        threads=args.threads, interop_threads=args.interop_threads,
+        artifacts_dir=args.artifacts_dir
+    )
+
+
+def run_benchmark(args) -> List[Dict]:
+    texts = sample_texts(args.texts, words=args.words)
+    results, reference = [], None
+    # La referencia fp32 va siempre primero para poder medir la paridad del resto.
+    names = ["torch"] + [n for n in args.backends.split(",") if n and n != "torch"]
+    for name in names:
+        loader = _loader(name, args)
+        start = time.perf_counter()
+        model = loader.load()
+        load_seconds = time.perf_counter() - start
+        if loader.loaded_backend != name:
+            name = f"{name}->{loader.loaded_backend}"
+
+        model.encode(texts[:args.batch_size], batch_size=args.batch_size)  # calentamiento
+        start = time.perf_counter()
+        embeddings = np.asarray(model.encode(texts, batch_size=args.batch_size, show_progress_bar=False))
+        seconds = time.perf_counter() - start
+
+        if reference is None:
+            reference = embeddings
+        result = {"backend": name, "load_s": load_seconds, "texts_per_s": len(texts) / seconds}
+        result.update(embedding_parity(reference, embeddings))
+        results.append(result)
+    return results
+
+
+def format_results(results: List[Dict]) -> str:
+    baseline = results[0]["texts_per_s"]
+    lines = [f"{'backend':<18}{'carga (s)':>10}{'textos/s':>12}{'speedup':>9}{'cos min':>9}{'cos medio':>11}"]
+    for r in results:
+        lines.append(
+            f"{r['backend']:<18}{r['load_s']:>10.2f}{r['texts_per_s']:>12.1f}"
+            f"{r['texts_per_s'] / baseline:>8.2f}x{r['min_cosine']:>9.4f}{r['mean_cosine']:>11.4f}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de backends de embeddings")
+    parser.add_argument("--model", default=config.EMBEDDING_MODEL)
+    parser.add_argument("--backends", default="torch,torch-int8,onnx,onnx-int8",
+                        help="Lista separada por comas: torch, torch-int8, onnx, onnx-int8, openvino")
+    parser.add_argument("--texts", type=int, default=512)
+    parser.add_argument("--words", type=int, default=40)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=config.EMBEDDING_THREADS)
+    parser.add_argument("--interop-threads", type=int, default=config.EMBEDDING_INTEROP_THREADS)
+    parser.add_argument("--artifacts-dir", default=config.EMBEDDING_ARTIFACTS_DIR)
+    args = parser.parse_args(argv)
+    print(format_results(run_benchmark(args)))
+
+
+if __name__ == "__main__":
+    main()
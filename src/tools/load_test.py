@@ -0,0 +1,424 @@
+# src/tools/load_test.py
+"""
+Generador de carga que reproduce conversaciones multi-turno contra el chatbot.
+
+Las conversaciones se leen de un archivo JSONL (una por línea) o se generan de
+forma sintética. Cada línea tiene la forma:
+
+    {"historial_id": "c1", "turns": [
+        {"type": "upload", "path": "docs/manual.txt"},
+        {"type": "message", "text": "¿Qué dice el manual?", "rag": true},
+        {"type": "message", "text": "gracias", "rag": false}]}
+
+Los turnos de una conversación se envían en orden. Sin --rate las
+conversaciones se reparten entre `concurrency` usuarios virtuales y cada uno
+empieza la siguiente en cuanto termina la anterior (carga cerrada). Con --rate
+las conversaciones llegan según un proceso de Poisson y cada una empieza en su
+instante de llegada, sin límite de conversaciones en curso (carga abierta). La
+latencia de cada turno se mide desde el instante en que debía enviarse, de modo
+que un generador retrasado no oculta la espera (omisión coordinada).
+
+Con --sweep se ejecuta un escalón por nivel de concurrencia y se detecta
+automáticamente el punto de saturación: el primer escalón en el que el
+rendimiento deja de crecer mientras la latencia p95 sí lo hace, o en el que la
+tasa de errores supera el umbral.
+
+Uso:
+    python -m src.tools.load_test --synthetic 50 --stub-llm --sweep 1,2,4,8,16
+    python -m src.tools.load_test --transcripts conversaciones.jsonl --rate 2
+    python -m src.tools.load_test --synthetic 20 --url http://localhost:8000
+"""
+
+import argparse
+import json
+import queue
+import random
+import threading
+import time
+import urllib.request
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from src.constants import MESSAGES
+from src.metrics import metrics
+from src.tools.stats import percentile
+
+_ERROR_PREFIX = MESSAGES["ERROR"].split("{", 1)[0]
+_NO_RESPONSE = "No se pudo obtener una respuesta."
+
+_RAG_QUESTIONS = [
+    "¿Qué dice el documento sobre la política de seguridad?",
+    "Resume los requisitos de acceso descritos en el manual.",
+    "¿Qué pasos indica el procedimiento de soporte?",
+    "¿Qué excepciones se mencionan para los permisos de usuario?",
+]
+_CHAT_MESSAGES = ["hola", "gracias", "¿puedes repetirlo más corto?", "perfecto, sigamos"]
+
+
+class StubChatModel(BaseChatModel):
+    """
+    Modelo de chat simulado con un modelo de latencia sencillo.
+
+    Espera un tiempo hasta el primer token (normal truncada de media `ttft_ms`
+    y desviación `ttft_jitter_ms`) y después emite `output_tokens` tokens a
+    `tokens_per_second`, notificando cada uno a los callbacks como en streaming,
+    de modo que la medida de TTFT del servicio funciona igual que con Anthropic.
+    """
+    ttft_ms: float = 400.0
+    ttft_jitter_ms: float = 100.0
+    tokens_per_second: float = 80.0
+    output_tokens: int = 60
+    error_rate: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        if self.error_rate and random.random() < self.error_rate:
+            raise RuntimeError("Error simulado del LLM")
+        time.sleep(max(0.0, random.gauss(self.ttft_ms, self.ttft_jitter_ms)) / 1000)
+        tokens = []
+        for i in range(self.output_tokens):
+            token = f"tok{i} "
+            if run_manager:
+                run_manager.on_llm_new_token(token)
+            tokens.append(token)
+            time.sleep(1.0 / self.tokens_per_second)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+
+@dataclass
+class TurnResult:
+    kind: str
+    latency: float
+    ok: bool
+    ttft: Optional[float] = None
+    # Retraso entre el instante previsto del turno y su envío (incluido en latency).
+    delay: float = 0.0
+
+
+@dataclass
+class StepReport:
+    concurrency: int
+    rate: Optional[float]
+    duration: float
+    results: List[TurnResult] = field(default_factory=list)
+    llm_ttft: Dict[str, float] = field(default_factory=dict)
+    peak_in_flight: int = 0
+
+    @property
+    def messages(self) -> List[TurnResult]:
+        return [r for r in self.results if r.kind != "upload"]
+
+    @property
+    def throughput(self) -> float:
+        return len([r for r in self.messages if r.ok]) / self.duration if self.duration else 0.0
+
+    @property
+    def error_rate(self) -> float:
+        return sum(not r.ok for r in self.results) / len(self.results) if self.results else 0.0
+
+    def latency(self, q: float) -> float:
+        return percentile([r.latency for r in self.messages if r.ok], q)
+
+    def send_delay(self, q: float) -> float:
+        """Retraso de envío respecto a lo previsto; si crece, el generador no sostiene la tasa."""
+        return percentile([r.delay for r in self.results], q)
+
+    def ttft(self, q: float) -> float:
+        samples = [r.ttft for r in self.messages if r.ok and r.ttft is not None]
+        if samples:
+            return percentile(samples, q)
+        return self.llm_ttft.get(f"p{int(q * 100)}_ms", 0.0) / 1000
+
+
+def load_transcripts(path: str) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def synthetic_transcripts(conversations: int, turns: int = 6, rag_ratio: float = 0.6,
+                          documents: Sequence[str] = (), upload_ratio: float = 0.1,
+                          seed: int = 0) -> List[Dict[str, Any]]:
+    """Genera conversaciones reproducibles con turnos RAG, turnos de charla y subidas de documentos."""
+    rng = random.Random(seed)
+    transcripts = []
+    for c in range(conversations):
+        conversation = []
+        for _ in range(turns):
+            if documents and rng.random() < upload_ratio:
+                conversation.append({"type": "upload", "path": rng.choice(documents)})
+            elif rng.random() < rag_ratio:
+                conversation.append({"type": "message", "text": rng.choice(_RAG_QUESTIONS), "rag": True})
+            else:
+                conversation.append({"type": "message", "text": rng.choice(_CHAT_MESSAGES), "rag": False})
+        transcripts.append({"historial_id": f"conv{c}", "turns": conversation})
+    return transcripts
+
+
+class InProcessTarget:
+    """Envía los turnos directamente a una instancia de Chatbot."""
+
+    def __init__(self, chatbot):
+        self.chatbot = chatbot
+
+    def send(self, message: str, historial_id: str) -> TurnResult:
+        start = time.perf_counter()
+        response = self.chatbot.send_message(message, user_id=historial_id)
+        ok = bool(response) and response != _NO_RESPONSE and not response.startswith(_ERROR_PREFIX)
+        return TurnResult("message", time.perf_counter() - start, ok)
+
+    def upload(self, path: str) -> TurnResult:
+        start = time.perf_counter()
+        response = self.chatbot.add_documents([path])
+        ok = bool(response) and not response.startswith(_ERROR_PREFIX)
+        return TurnResult("upload", time.perf_counter() - start, ok)
+
+
+class HttpTarget:
+    """
+    Envía los turnos a un servidor HTTP:
+
+    - POST {url}/chat con {"message", "user_id"}; el TTFT es el tiempo hasta el
+      primer byte de la respuesta (útil si el servidor responde en streaming).
+    - POST {url}/documents con {"paths": [...]}.
+    """
+
+    def __init__(self, url: str, timeout: float = 120.0):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def _post(self, path: str, payload: Dict[str, Any], kind: str) -> TurnResult:
+        request = urllib.request.Request(
+            f"{self.url}{path}", data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json"}, method="POST"
+        )
+        start = time.perf_counter()
+        ttft = None
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read(1)
+                ttft = time.perf_counter() - start
+                response.read()
+                ok = 200 <= response.status < 300
+        except Exception:
+            ok = False
+        return TurnResult(kind, time.perf_counter() - start, ok, ttft)
+
+    def send(self, message: str, historial_id: str) -> TurnResult:
+        return self._post("/chat", {"message": message, "user_id": historial_id}, "message")
+
+    def upload(self, path: str) -> TurnResult:
+        return self._post("/documents", {"paths": [path]}, "upload")
+
+
+def _arrivals(count: int, rate: Optional[float], rng: random.Random) -> Iterator[float]:
+    """Instantes de llegada (relativos al inicio) de cada conversación."""
+    t = 0.0
+    for _ in range(count):
+        yield t if rate else 0.0
+        if rate:
+            t += rng.expovariate(rate)
+
+
+def run_step(target, transcripts: Sequence[Dict[str, Any]], concurrency: int,
+             rate: Optional[float] = None, think_time: float = 0.0, run_id: str = "lt",
+             seed: int = 0) -> StepReport:
+    """
+    Reproduce las conversaciones y retorna el informe: con `concurrency`
+    usuarios virtuales (carga cerrada) o, con `rate`, cada una en su propio
+    hilo desde su instante de llegada (carga abierta).
+    """
+    rng = random.Random(seed)
+    results: List[TurnResult] = []
+    results_lock = threading.Lock()
+    in_flight = [0, 0]  # en curso, máximo
+    start = time.perf_counter()
+    was_enabled = metrics.enabled
+    metrics.enabled = True
+    metrics.reset()
+
+    def conversation(scheduled: float, index: int, transcript: Dict[str, Any]) -> None:
+        with results_lock:
+            in_flight[0] += 1
+            in_flight[1] = max(in_flight)
+        # Cada ejecución usa hilos nuevos para no mezclarse con ejecuciones anteriores.
+        historial_id = f"{run_id}-{index}-{transcript.get('historial_id', index)}"
+        for turn in transcript["turns"]:
+            delay = max(0.0, time.perf_counter() - scheduled)
+            if turn.get("type") == "upload":
+                result = target.upload(turn["path"])
+            else:
+                result = target.send(turn["text"], historial_id)
+                result.kind = "rag" if turn.get("rag", True) else "chat"
+            # El turno cuenta desde que debía enviarse, no desde que se envió.
+            result.delay = delay
+            result.latency += delay
+            if result.ttft is not None:
+                result.ttft += delay
+            with results_lock:
+                results.append(result)
+            scheduled = time.perf_counter() + think_time
+            if think_time:
+                time.sleep(think_time)
+        with results_lock:
+            in_flight[0] -= 1
+
+    arrivals = list(zip(_arrivals(len(transcripts), rate, rng), transcripts))
+    if rate:
+        threads = []
+        for index, (arrival, transcript) in enumerate(arrivals):
+            wait = start + arrival - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            thread = threading.Thread(target=conversation, args=(start + arrival, index, transcript), daemon=True)
+            thread.start()
+            threads.append(thread)
+    else:
+        pending: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        for index, (_, transcript) in enumerate(arrivals):
+            pending.put((index, transcript))
+
+        def user():
+            while True:
+                item = pending.get()
+                if item is None:
+                    return
+                conversation(time.perf_counter(), *item)
+
+        threads = [threading.Thread(target=user, daemon=True)
+                   for _ in range(max(1, min(concurrency, len(transcripts))))]
+        for thread in threads:
+            pending.put(None)
+            thread.start()
+    for thread in threads:
+        thread.join()
+
+    # llm_ttft lleva la etiqueta del nivel de modelo: se agregan todas sus series.
+    report = StepReport(concurrency, rate, time.perf_counter() - start, results,
+                        metrics.stage_summary("llm_ttft"), peak_in_flight=in_flight[1])
+    metrics.enabled = was_enabled
+    return report
+
+
+def find_saturation(reports: Sequence[StepReport], min_gain: float = 0.1, latency_growth: float = 0.5,
+                    max_error_rate: float = 0.05) -> Optional[int]:
+    """
+    Retorna el índice del primer escalón saturado, o None.
+
+    Un escalón está saturado si su tasa de errores supera `max_error_rate`, o si
+    el rendimiento crece menos de `min_gain` respecto al anterior mientras la
+    latencia p95 crece más de `latency_growth`.
+    """
+    for i, report in enumerate(reports):
+        if report.error_rate > max_error_rate:
+            return i
+        if i == 0:
+            continue
+        previous = reports[i - 1]
+        gain = (report.throughput - previous.throughput) / max(previous.throughput, 1e-9)
+        growth = (report.latency(0.95) - previous.latency(0.95)) / max(previous.latency(0.95), 1e-9)
+        if gain < min_gain and growth > latency_growth:
+            return i
+    return None
+
+
+def format_report(reports: Sequence[StepReport], saturation: Optional[int]) -> str:
+    lines = [
+        f"{'conc':>5}{'rate':>7}{'turnos':>8}{'turnos/s':>10}{'p50':>9}{'p95':>9}{'p99':>9}"
+        f"{'ttft50':>9}{'ttft95':>9}{'ttft99':>9}{'errores':>9}"
+    ]
+    for i, r in enumerate(reports):
+        rate = f"{r.rate:.1f}" if r.rate else "-"
+        lines.append(
+            f"{r.concurrency:>5}{rate:>7}{len(r.messages):>8}{r.throughput:>10.2f}"
+            f"{r.latency(0.50):>8.2f}s{r.latency(0.95):>8.2f}s{r.latency(0.99):>8.2f}s"
+            f"{r.ttft(0.50):>8.2f}s{r.ttft(0.95):>8.2f}s{r.ttft(0.99):>8.2f}s"
+            f"{r.error_rate:>8.1%}" + ("  <- saturación" if i == saturation else "")
+        )
+        kinds = {}
+        for result in r.results:
+            kinds.setdefault(result.kind, []).append(result.latency)
+        lines.append("      " + "  ".join(
+            f"{kind}: n={len(values)} p95={percentile(values, 0.95):.2f}s" for kind, values in sorted(kinds.items())
+        ) + f"  en curso máx={r.peak_in_flight} retraso p95={r.send_delay(0.95):.2f}s")
+    if saturation is None:
+        lines.append("No se detectó saturación en los escalones ejecutados.")
+    elif saturation == 0:
+        lines.append(f"Saturado ya con concurrencia {reports[0].concurrency}: "
+                     f"tasa de errores {reports[0].error_rate:.1%}.")
+    else:
+        lines.append(f"Saturación a partir de concurrencia {reports[saturation].concurrency}; "
+                     f"capacidad sostenible ~{reports[saturation - 1].throughput:.2f} turnos/s.")
+    return "\n".join(lines)
+
+
+def build_in_process_target(args) -> InProcessTarget:
+    from src.chatbot import Chatbot
+    from src.config import config
+
+    chatbot = Chatbot(api_key=config.ANTHROPIC_API_KEY or "stub")
+    if args.stub_llm:
+        stub = StubChatModel(ttft_ms=args.stub_ttft_ms, ttft_jitter_ms=args.stub_ttft_jitter_ms,
+                             tokens_per_second=args.stub_tokens_per_second,
+                             output_tokens=args.stub_output_tokens, error_rate=args.stub_error_rate)
+        # También los clientes de cada nivel: con ROUTING_ENABLED los turnos
+        # enrutados no usan el LLM por defecto.
+        chatbot.langgraph_service.replace_llm(stub)
+    chatbot.wait_until_ready(config.WARMUP_TIMEOUT)
+    return InProcessTarget(chatbot)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de carga del chatbot")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--transcripts", help="Archivo JSONL con conversaciones")
+    source.add_argument("--synthetic", type=int, help="Número de conversaciones sintéticas")
+    parser.add_argument("--turns", type=int, default=6)
+    parser.add_argument("--rag-ratio", type=float, default=0.6)
+    parser.add_argument("--documents", default="", help="Documentos para los turnos de subida (separados por comas)")
+    parser.add_argument("--upload-ratio", type=float, default=0.1)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--sweep", help="Niveles de concurrencia separados por comas, p. ej. 1,2,4,8")
+    parser.add_argument("--rate", type=float,
+                        help="Conversaciones por segundo (Poisson, sin límite de conversaciones en curso); "
+                             "sin él, carga cerrada con --concurrency usuarios")
+    parser.add_argument("--think-time", type=float, default=0.0)
+    parser.add_argument("--url", help="Servidor HTTP; sin él, el chatbot se ejecuta en el proceso")
+    parser.add_argument("--stub-llm", action="store_true", help="Sustituye Anthropic por un LLM simulado")
+    parser.add_argument("--stub-ttft-ms", type=float, default=400.0)
+    parser.add_argument("--stub-ttft-jitter-ms", type=float, default=100.0)
+    parser.add_argument("--stub-tokens-per-second", type=float, default=80.0)
+    parser.add_argument("--stub-output-tokens", type=int, default=60)
+    parser.add_argument("--stub-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    if args.rate and args.sweep:
+        parser.error("--sweep varía la concurrencia de la carga cerrada; no se combina con --rate")
+
+    if args.transcripts:
+        transcripts = load_transcripts(args.transcripts)
+    else:
+        documents = [d for d in args.documents.split(",") if d]
+        transcripts = synthetic_transcripts(args.synthetic, args.turns, args.rag_ratio,
+                                            documents, args.upload_ratio, args.seed)
+    target = HttpTarget(args.url) if args.url else build_in_process_target(args)
+    levels = [int(c) for c in args.sweep.split(",")] if args.sweep else [args.concurrency]
+
+    reports = []
+    for step, concurrency in enumerate(levels):
+        reports.append(run_step(target, transcripts, concurrency, args.rate, args.think_time,
+                                run_id=f"lt{int(time.time())}-{step}", seed=args.seed))
+        print(f"Escalón {step + 1}/{len(levels)} (concurrencia {concurrency}) completado", flush=True)
+    print(format_report(reports, find_saturation(reports)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+# src/tools/mmap_index.py
+"""
+Mantenimiento del índice mmap compartido por los workers.
+
+Uso:
+    python -m src.tools.mmap_index build     # publica la colección de Chroma completa
+    python -m src.tools.mmap_index compact   # fusiona los segmentos en uno
+    python -m src.tools.mmap_index stats
+"""
+
+import argparse
+
+from src.config import config
+from src.rag.mmap_index import MmapVectorIndex
+from src.rag.vector_store import VectorStore
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Índice vectorial mmap")
+    parser.add_argument("command", choices=("build", "compact", "stats"))
+    parser.add_argument("--dir", default=config.MMAP_INDEX_DIR)
+    args = parser.parse_args(argv)
+
+    index = MmapVectorIndex(args.dir, refresh_interval=0, max_segments=config.MMAP_INDEX_MAX_SEGMENTS)
+    if args.command == "build":
+        store = VectorStore(config.model_copy(update={"SNAPSHOT_RESTORE_PATH": ""}), embedding_function=None)
+        index.clear()
+        index.publish_from_collection(store.collection)
+    elif args.command == "compact":
+        index.compact()
+    manifest = index.read_manifest()
+    print(f"Generación {manifest['generation']}: {len(manifest['segments'])} segmentos, {index.count()} vectores, "
+          f"{len(manifest.get('deleted', {}))} eliminados pendientes de compactar")
+
+
+if __name__ == "__main__":
+    main()
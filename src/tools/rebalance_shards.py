@@ -0,0 +1,47 @@
+# src/tools/rebalance_shards.py
+"""
+Rebalanceo de los shards del vector store tras cambiar VECTOR_SHARDS o
+VECTOR_SHARD_ROUTING.
+
+Uso:
+    python -m src.tools.rebalance_shards stats
+    python -m src.tools.rebalance_shards plan       # chunks que se moverían, sin escribir
+    python -m src.tools.rebalance_shards run
+
+Mueve cada chunk (con su vector, sin recalcular embeddings) al shard que le
+corresponde y elimina los shards sobrantes. Se puede interrumpir y volver a
+lanzar: cada lote se escribe en el destino antes de borrarse del origen.
+"""
+
+import argparse
+
+from src.config import config
+from src.rag.vector_store import VectorStore
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebalanceo de shards del vector store")
+    parser.add_argument("command", choices=("stats", "plan", "run"))
+    parser.add_argument("--shards", type=int, default=config.VECTOR_SHARDS, help="Número de shards de destino")
+    parser.add_argument("--routing", choices=("hash", "source"), default=config.VECTOR_SHARD_ROUTING)
+    parser.add_argument("--page-size", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    store = VectorStore(config.model_copy(update={
+        "SNAPSHOT_RESTORE_PATH": "", "VECTOR_SHARDS": args.shards, "VECTOR_SHARD_ROUTING": args.routing
+    }), embedding_function=None)
+    if args.command != "stats":
+        result = store.rebalance(page_size=args.page_size, dry_run=args.command == "plan")
+        verb = "se moverían" if args.command == "plan" else "movidos"
+        for shard, count in result["moved"].items():
+            print(f"Shard {shard}: {count} chunks {verb}")
+        if result["removed"]:
+            print(f"Shards {'a eliminar' if args.command == 'plan' else 'eliminados'}: "
+                  f"{', '.join(map(str, result['removed']))}")
+    stats = store.get_collection_stats()
+    print(f"{stats['num_documents']} chunks en {len(stats['shards'])} shards: "
+          + ", ".join(f"{shard}={count}" for shard, count in stats["shards"].items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+# src/tools/stats.py
+"""Utilidades estadísticas compartidas por las herramientas de medida."""
+
+from typing import Sequence
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Percentil `q` (0-1) por el método del rango más cercano; 0.0 sin valores."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
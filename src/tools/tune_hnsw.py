@@ -0,0 +1,249 @@
+# src/tools/tune_hnsw.py
+"""
+Ajuste de los parámetros del índice HNSW (HNSW_M, HNSW_CONSTRUCTION_EF y
+HNSW_SEARCH_EF) según el recall que se quiere alcanzar.
+
+Toma una muestra de vectores de la colección (o genera vectores sintéticos),
+reserva una parte como consultas y calcula sus vecinos exactos por fuerza
+bruta. Después construye un índice por cada combinación de M y
+construction_ef y, para cada search_ef, mide recall@k frente a la búsqueda
+exacta y la latencia p50/p95 de una consulta. La memoria es el tamaño de los
+archivos del índice HNSW, que Chroma carga completos en memoria (si aún no se
+han escrito, se estima con la disposición de hnswlib).
+
+Recomienda la combinación de menor latencia p95 que alcanza --target-recall
+(con latencias parecidas, la que ocupa menos memoria y usa ef más bajos).
+
+Uso:
+    python -m src.tools.tune_hnsw --target-recall 0.95
+    python -m src.tools.tune_hnsw --synthetic 20000 --dim 384 --m 8,16,32 --search-ef 10,40,160
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+import chromadb
+import numpy as np
+from chromadb.api.client import SharedSystemClient
+
+from src.config import config
+from src.tools.stats import percentile
+
+SPACES = ("l2", "cosine", "ip")
+
+
+@dataclass
+class TrialResult:
+    M: int
+    construction_ef: int
+    search_ef: int
+    recall: float
+    p50: float
+    p95: float
+    build_seconds: float
+    memory_bytes: int
+
+
+def synthetic_vectors(count: int, dim: int, clusters: int = 50, seed: int = 0) -> np.ndarray:
+    """Vectores normalizados agrupados en `clusters` temas, parecidos a embeddings de texto."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    vectors = centers[rng.integers(0, clusters, size=count)] + rng.normal(scale=0.6, size=(count, dim))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def sample_collection(collection, size: int, seed: int = 0, page_size: int = 1000) -> np.ndarray:
+    """Hasta `size` embeddings de la colección, elegidos al azar."""
+    total = collection.count()
+    if not total:
+        raise ValueError("La colección está vacía; usa --synthetic")
+    chosen = set(np.random.default_rng(seed).choice(total, size=min(size, total), replace=False).tolist())
+    rows = []
+    for offset in range(0, total, page_size):
+        page = collection.get(limit=page_size, offset=offset, include=["embeddings"])["embeddings"]
+        rows.extend(vector for i, vector in enumerate(page) if offset + i in chosen)
+    return np.asarray(rows, dtype=np.float32)
+
+
+def split_queries(vectors: np.ndarray, queries: int, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Separa `queries` vectores que no se indexan, para no buscar vectores que están en el índice."""
+    order = np.random.default_rng(seed).permutation(len(vectors))
+    return vectors[order[queries:]], vectors[order[:queries]]
+
+
+def exact_neighbors(corpus: np.ndarray, queries: np.ndarray, k: int, space: str) -> np.ndarray:
+    """Índices de los `k` vecinos exactos de cada consulta con la distancia de `space`."""
+    if space == "l2":
+        distances = (queries ** 2).sum(1)[:, None] - 2 * queries @ corpus.T + (corpus ** 2).sum(1)[None, :]
+    elif space == "cosine":
+        normalized = corpus / np.maximum(np.linalg.norm(corpus, axis=1, keepdims=True), 1e-12)
+        distances = -(queries @ normalized.T) / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+    elif space == "ip":
+        distances = -(queries @ corpus.T)
+    else:
+        raise ValueError(f"Espacio HNSW no soportado: {space}")
+    top = np.argpartition(distances, min(k, corpus.shape[0]) - 1, axis=1)[:, :k]
+    order = np.take_along_axis(distances, top, axis=1).argsort(axis=1)
+    return np.take_along_axis(top, order, axis=1)
+
+
+def recall_at_k(found: Sequence[Sequence[int]], exact: Sequence[Sequence[int]], k: int) -> float:
+    """Fracción media de los `k` vecinos exactos presentes en los resultados aproximados."""
+    if not len(exact):
+        return 0.0
+    return float(np.mean([len(set(f[:k]) & set(e[:k])) / k for f, e in zip(found, exact)]))
+
+
+def estimate_index_bytes(count: int, dim: int, M: int) -> int:
+    """
+    Memoria estimada de un índice hnswlib con `count` vectores: vector, etiqueta y
+    2*M vecinos en el nivel 0, más M vecinos por cada nivel superior
+    (1/(M-1) niveles por elemento en promedio).
+    """
+    level0 = 4 * dim + 8 + (2 * M * 4 + 4)
+    upper = (M * 4 + 4) / max(M - 1, 1)
+    return int(count * (level0 + upper + 12))
+
+
+def index_bytes(directory: str) -> int:
+    """Tamaño en disco de los segmentos HNSW (sin la base SQLite de Chroma)."""
+    total = 0
+    for root, _, files in os.walk(directory):
+        if root != directory:
+            total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total
+
+
+def _open(directory: str, name: str):
+    # Chroma guarda en caché el índice cargado y no aplica un ef_search nuevo
+    # hasta que se vuelve a abrir, así que se descarta el cliente compartido.
+    SharedSystemClient.clear_system_cache()
+    return chromadb.PersistentClient(path=directory).get_collection(name)
+
+
+def run_trials(corpus: np.ndarray, queries: np.ndarray, k: int, space: str, ms: Sequence[int],
+               construction_efs: Sequence[int], search_efs: Sequence[int]) -> List[TrialResult]:
+    """
+    Construye un índice por cada (M, construction_ef) en un directorio
+    temporal y lo mide con cada search_ef.
+    """
+    exact = exact_neighbors(corpus, queries, k, space)
+    ids = [str(i) for i in range(len(corpus))]
+    results = []
+    for M in ms:
+        for construction_ef in construction_efs:
+            with tempfile.TemporaryDirectory(prefix="tune_hnsw_") as directory:
+                collection = chromadb.PersistentClient(path=directory).create_collection("tune_hnsw", metadata={
+                    "hnsw:space": space, "hnsw:M": M, "hnsw:construction_ef": construction_ef
+                })
+                started = time.perf_counter()
+                for start in range(0, len(ids), 5000):
+                    collection.add(ids=ids[start:start + 5000], embeddings=corpus[start:start + 5000].tolist())
+                build_seconds = time.perf_counter() - started
+                memory = None
+                for search_ef in search_efs:
+                    collection.modify(configuration={"hnsw": {"ef_search": search_ef}})
+                    collection = _open(directory, "tune_hnsw")
+                    # La primera consulta carga el índice; no se cuenta en la latencia.
+                    collection.query(query_embeddings=queries[:1].tolist(), n_results=k, include=[])
+                    memory = memory or index_bytes(directory) or estimate_index_bytes(len(corpus), corpus.shape[1], M)
+                    found, latencies = [], []
+                    for query in queries.tolist():
+                        started = time.perf_counter()
+                        result = collection.query(query_embeddings=[query], n_results=k, include=[])
+                        latencies.append(time.perf_counter() - started)
+                        found.append([int(i) for i in result["ids"][0]])
+                    results.append(TrialResult(
+                        M=M, construction_ef=construction_ef, search_ef=search_ef,
+                        recall=recall_at_k(found, exact, k),
+                        p50=percentile(latencies, 0.50), p95=percentile(latencies, 0.95),
+                        build_seconds=build_seconds, memory_bytes=memory,
+                    ))
+                SharedSystemClient.clear_system_cache()
+    return results
+
+
+def recommend(results: Sequence[TrialResult], target_recall: float,
+              latency_tolerance: float = 0.2) -> Optional[TrialResult]:
+    """
+    La combinación más barata que alcanza el recall; None si ninguna lo hace.
+
+    Las latencias a menos de `latency_tolerance` (relativo) de la más rápida se
+    consideran empate, para no decidir por ruido de medida; entre ellas gana la
+    de menos memoria y, después, los ef más bajos.
+    """
+    candidates = [r for r in results if r.recall >= target_recall]
+    if not candidates:
+        return None
+    fastest = min(r.p95 for r in candidates)
+    tied = [r for r in candidates if r.p95 <= fastest * (1 + latency_tolerance)]
+    return min(tied, key=lambda r: (r.memory_bytes, r.search_ef, r.construction_ef))
+
+
+def format_report(results: Sequence[TrialResult], recommended: Optional[TrialResult], target_recall: float,
+                  k: int) -> str:
+    lines = [f"{'M':>4}{'c_ef':>6}{'s_ef':>6}{f'recall@{k}':>11}{'p50':>10}{'p95':>10}{'build':>9}{'memoria':>11}"]
+    for r in results:
+        lines.append(
+            f"{r.M:>4}{r.construction_ef:>6}{r.search_ef:>6}{r.recall:>11.3f}"
+            f"{r.p50 * 1000:>8.2f}ms{r.p95 * 1000:>8.2f}ms{r.build_seconds:>8.1f}s"
+            f"{r.memory_bytes / 2 ** 20:>8.1f}MiB" + ("  <- recomendado" if r is recommended else "")
+        )
+    if recommended is None:
+        best = max(results, key=lambda r: r.recall, default=None)
+        lines.append(f"Ninguna combinación alcanza recall {target_recall:.2f}"
+                     + (f" (máximo {best.recall:.3f}); prueba M o search_ef mayores." if best else "."))
+    else:
+        lines.append(f"Recomendado para recall >= {target_recall:.2f}:")
+        lines.append(f"HNSW_M={recommended.M}")
+        lines.append(f"HNSW_CONSTRUCTION_EF={recommended.construction_ef}")
+        lines.append(f"HNSW_SEARCH_EF={recommended.search_ef}")
+    return "\n".join(lines)
+
+
+def _ints(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ajuste de parámetros HNSW por recall y latencia")
+    parser.add_argument("--synthetic", type=int, help="Número de vectores sintéticos; sin él, se muestrea la colección")
+    parser.add_argument("--dim", type=int, default=384, help="Dimensión de los vectores sintéticos")
+    parser.add_argument("--sample", type=int, default=5000, help="Vectores a muestrear de la colección")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=config.RAG_TOP_K)
+    parser.add_argument("--space", choices=SPACES, default=config.HNSW_SPACE)
+    parser.add_argument("--m", default="8,16,32", help="Valores de M separados por comas")
+    parser.add_argument("--construction-ef", default="100,200")
+    parser.add_argument("--search-ef", default="10,20,40,80,160")
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    parser.add_argument("--latency-tolerance", type=float, default=0.2,
+                        help="Diferencia relativa de p95 que se considera empate")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.synthetic:
+        vectors = synthetic_vectors(args.synthetic + args.queries, args.dim, seed=args.seed)
+    else:
+        from src.rag.vector_store import VectorStore
+
+        store = VectorStore(config.model_copy(update={"SNAPSHOT_RESTORE_PATH": ""}), embedding_function=None)
+        vectors = sample_collection(store.collection, args.sample + args.queries, seed=args.seed)
+    if len(vectors) <= args.queries:
+        raise SystemExit(f"Se necesitan más de {args.queries} vectores (hay {len(vectors)})")
+    corpus, queries = split_queries(vectors, args.queries, seed=args.seed)
+    print(f"{len(corpus)} vectores de dimensión {corpus.shape[1]}, {len(queries)} consultas, espacio {args.space}",
+          flush=True)
+
+    results = run_trials(corpus, queries, args.k, args.space, _ints(args.m), _ints(args.construction_ef),
+                         _ints(args.search_ef))
+    recommended = recommend(results, args.target_recall, args.latency_tolerance)
+    print(format_report(results, recommended, args.target_recall, args.k))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+# src/tools/vector_snapshot.py
+"""
+Exporta o importa la colección de Chroma como snapshot de vectores.
+
+Uso:
+    python -m src.tools.vector_snapshot export snapshot.npz --quantization int8
+    python -m src.tools.vector_snapshot import snapshot.npz
+
+No se carga el modelo de embeddings: los vectores viajan en el snapshot.
+"""
+
+import argparse
+import time
+
+from src.config import config
+from src.rag.snapshot import QUANTIZATIONS
+from src.rag.vector_store import VectorStore
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Snapshots del vector store")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export_parser = sub.add_parser("export", help="Exportar la colección a un snapshot")
+    export_parser.add_argument("path")
+    export_parser.add_argument("--quantization", choices=QUANTIZATIONS, default=config.SNAPSHOT_QUANTIZATION)
+    import_parser = sub.add_parser("import", help="Importar un snapshot en la colección")
+    import_parser.add_argument("path")
+    args = parser.parse_args(argv)
+
+    store = VectorStore(config.model_copy(update={"SNAPSHOT_RESTORE_PATH": ""}), embedding_function=None)
+    start = time.perf_counter()
+    if args.command == "export":
+        manifest = store.export_snapshot(args.path, args.quantization)
+        print(f"Exportados {manifest['count']} vectores ({manifest['quantization']}) "
+              f"en {time.perf_counter() - start:.2f}s")
+    else:
+        count = store.import_snapshot(args.path)
+        print(f"Importados {count} vectores en {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
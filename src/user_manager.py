@@ -1,29 +1,204 @@
+import os
 import json
+import time
+import sqlite3
+from threading import Lock
+from contextlib import contextmanager
+from collections.abc import Mapping
+
+
+class _UsuariosView(Mapping):
+    """Vista de solo lectura {nombre_usuario: historial_id} respaldada por SQLite."""
+    def __init__(self, gestor):
+        self._gestor = gestor
+
+    def __getitem__(self, nombre):
+        historial_id = self._gestor.obtener_historial(nombre)
+        if historial_id is None:
+            raise KeyError(nombre)
+        return historial_id
+
+    def __contains__(self, nombre):
+        return self._gestor.obtener_historial(nombre) is not None
+
+    def __iter__(self):
+        return iter(self._gestor.listar_usuarios())
+
+    def __len__(self):
+        return self._gestor.contar_usuarios()
+
+
+@contextmanager
+def _transaccion_inmediata(conn):
+    """BEGIN IMMEDIATE: toma el lock de escritura antes de leer el contador."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    else:
+        conn.execute("COMMIT")
+
 
 class GestorUsuarios:
-    def __init__(self, archivo='usuarios.json'):
-        self.usuarios = {}  # {nombre_usuario: historial_id}
-        self.contador = 0
+    """
+    Registro de usuarios persistido en SQLite en modo WAL.
+
+    Cada búsqueda y registro es una operación indexada, de modo que el arranque
+    no depende del número de usuarios. Varios procesos pueden compartir la base
+    de datos: las escrituras se serializan con transacciones inmediatas y los
+    historial_id se asignan a partir de un contador transaccional, por lo que
+    nunca colisionan entre workers.
+
+    La primera vez que se abre la base de datos se migran automáticamente los
+    usuarios y el contador del archivo JSON del formato anterior, si existe.
+    """
+    def __init__(self, archivo='usuarios.json', db_path=None):
         self.archivo = archivo
+        self.db_path = db_path or os.path.splitext(archivo)[0] + '.db'
+        self.lock = Lock()
+        self._conn = None
+        self._pid = None
         self.cargar()
-    def registrar_usuario(self, nombre):
-        self.contador += 1
-        self.usuarios[nombre] = f"historial_{self.contador}"
-        self.guardar()
-        return self.usuarios[nombre]
+
+    @property
+    def usuarios(self):
+        return _UsuariosView(self)
+
+    @property
+    def contador(self):
+        with self.lock:
+            return self._leer_contador(self._conexion())
+
+    def registrar_usuario(self, nombre, tenant=None):
+        """
+        Registra un usuario y le asigna un historial_id nuevo.
+
+        Args:
+            nombre: Nombre del usuario.
+            tenant: Tenant al que pertenece (None para el tenant por defecto).
+        """
+        with self.lock:
+            conn = self._conexion()
+            with _transaccion_inmediata(conn):
+                contador = self._leer_contador(conn) + 1
+                conn.execute("UPDATE meta SET valor = ? WHERE clave = 'contador'", (str(contador),))
+                historial_id = f"historial_{contador}"
+                conn.execute(
+                    "INSERT INTO usuarios (nombre, historial_id, creado, tenant) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(nombre) DO UPDATE SET historial_id = excluded.historial_id, "
+                    "tenant = COALESCE(excluded.tenant, usuarios.tenant)",
+                    (nombre, historial_id, time.time(), tenant)
+                )
+        return historial_id
+
+    def obtener_propietario(self, historial_id):
+        """
+        Retorna (nombre, tenant) del usuario dueño de un historial_id, o None.
+
+        Es la consulta que usa la búsqueda para limitar los documentos visibles
+        a los del usuario y su tenant; está indexada por historial_id.
+        """
+        with self.lock:
+            row = self._conexion().execute(
+                "SELECT nombre, tenant FROM usuarios WHERE historial_id = ?", (historial_id,)
+            ).fetchone()
+        return (row[0], row[1]) if row else None
+
     def obtener_historial(self, nombre):
-        return self.usuarios.get(nombre)
-    def listar_usuarios(self):
-        return list(self.usuarios.keys())
-    def guardar(self):
-        with open(self.archivo, 'w', encoding='utf-8') as f:
-            json.dump({'usuarios': self.usuarios, 'contador': self.contador}, f)
+        with self.lock:
+            row = self._conexion().execute(
+                "SELECT historial_id FROM usuarios WHERE nombre = ?", (nombre,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def listar_usuarios(self, limite=None, desde=None):
+        """
+        Lista los nombres de usuario en orden alfabético.
+
+        Args:
+            limite: Número máximo de nombres a devolver (None para todos).
+            desde: Si se indica, solo se devuelven nombres posteriores a este (paginación).
+        """
+        query = "SELECT nombre FROM usuarios"
+        params = []
+        if desde is not None:
+            query += " WHERE nombre > ?"
+            params.append(desde)
+        query += " ORDER BY nombre"
+        if limite is not None:
+            query += " LIMIT ?"
+            params.append(limite)
+        with self.lock:
+            return [row[0] for row in self._conexion().execute(query, params)]
+
+    def contar_usuarios(self):
+        with self.lock:
+            return self._conexion().execute("SELECT COUNT(*) FROM usuarios").fetchone()[0]
+
     def cargar(self):
+        """Abre la base de datos, crea el esquema y migra el JSON anterior si procede."""
+        with self.lock:
+            conn = self._conexion()
+            with _transaccion_inmediata(conn):
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS usuarios ("
+                    "nombre TEXT PRIMARY KEY, historial_id TEXT NOT NULL, creado REAL)"
+                )
+                columnas = {row[1] for row in conn.execute("PRAGMA table_info(usuarios)")}
+                if 'tenant' not in columnas:
+                    conn.execute("ALTER TABLE usuarios ADD COLUMN tenant TEXT")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_usuarios_historial ON usuarios (historial_id)")
+                conn.execute("CREATE TABLE IF NOT EXISTS meta (clave TEXT PRIMARY KEY, valor TEXT)")
+                conn.execute("INSERT OR IGNORE INTO meta (clave, valor) VALUES ('contador', '0')")
+                migrado = conn.execute("SELECT 1 FROM meta WHERE clave = 'migrado'").fetchone()
+                if not migrado:
+                    self._migrar_json(conn)
+                    conn.execute("INSERT INTO meta (clave, valor) VALUES ('migrado', ?)", (self.archivo,))
+
+    def cerrar(self):
+        with self.lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _migrar_json(self, conn):
         try:
             with open(self.archivo, 'r', encoding='utf-8') as f:
                 data = json.load(f)
-                self.usuarios = data.get('usuarios', {})
-                self.contador = data.get('contador', 0)
         except (FileNotFoundError, json.JSONDecodeError):
-            self.usuarios = {}
-            self.contador = 0 
\ No newline at end of file
+            return
+        usuarios = data.get('usuarios', {})
+        contador = int(data.get('contador', 0))
+        # Se garantiza que los ids nuevos no colisionen con los ya asignados.
+        for historial_id in usuarios.values():
+            sufijo = str(historial_id).rsplit('_', 1)[-1]
+            if sufijo.isdigit():
+                contador = max(contador, int(sufijo))
+        ahora = time.time()
+        conn.executemany(
+            "INSERT OR IGNORE INTO usuarios (nombre, historial_id, creado) VALUES (?, ?, ?)",
+            [(nombre, historial_id, ahora) for nombre, historial_id in usuarios.items()]
+        )
+        actual = self._leer_contador(conn)
+        conn.execute("UPDATE meta SET valor = ? WHERE clave = 'contador'", (str(max(actual, contador)),))
+
+    def _conexion(self):
+        # Las conexiones SQLite no deben compartirse tras un fork: cada proceso abre la suya.
+        if self._conn is None or self._pid != os.getpid():
+            directorio = os.path.dirname(self.db_path)
+            if directorio:
+                os.makedirs(directorio, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False,
+                                   isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    @staticmethod
+    def _leer_contador(conn):
+        row = conn.execute("SELECT valor FROM meta WHERE clave = 'contador'").fetchone()
+        return int(row[0]) if row else 0
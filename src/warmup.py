@@ -0,0 +1,78 @@
+# src/warmup.py
+
+import time
+from typing import Dict, List, Optional, Sequence
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from .rag.logging_config import logger
+
+# Consultas representativas: longitudes distintas para que el tokenizador y los
+# kernels de torch preparen las formas habituales de la primera petición real.
+WARMUP_QUERIES: List[str] = [
+    "hola",
+    "¿Qué dice el manual sobre la política de seguridad?",
+    "Resume los puntos principales del documento sobre configuración de acceso, "
+    "permisos de usuario y procedimientos de soporte, indicando las excepciones.",
+]
+
+
+class WarmupRunner:
+    """
+    Ejecuta una vez las operaciones de una consulta real, sin llamar al LLM:
+
+    1. embed: embeddings de consulta y de un lote de documentos (inicializa el
+       tokenizador y los kernels del backend de inferencia).
+    2. search: búsqueda por vector en el índice (carga el HNSW de Chroma o los
+       segmentos del índice mmap).
+    3. prompt: recorte del historial y construcción del prompt.
+    4. llm_clients: cliente HTTP del LLM por defecto y de cada nivel del
+       enrutado (langchain_anthropic lo crea en la primera petición).
+
+    No pasa por la caché de embeddings ni por las métricas de etapa, de modo que
+    el calentamiento no altera las latencias ni los aciertos de caché de los
+    usuarios. Retorna la duración de cada paso en segundos.
+    """
+    def __init__(self, rag_retriever=None, langgraph_service=None,
+                 queries: Optional[Sequence[str]] = None):
+        self.rag_retriever = rag_retriever
+        self.langgraph_service = langgraph_service
+        self.queries = list(queries or WARMUP_QUERIES)
+
+    def run(self) -> Dict[str, float]:
+        timings: Dict[str, float] = {}
+        vector = None
+        embeddings = getattr(self.rag_retriever, "embeddings", None)
+        if embeddings is not None:
+            start = time.perf_counter()
+            model = embeddings.get_model()
+            model.encode(self.queries, show_progress_bar=False)
+            vector = model.encode(self.queries[1], show_progress_bar=False)
+            timings["embed"] = time.perf_counter() - start
+
+        store = getattr(self.rag_retriever, "vector_store_manager", None)
+        mmap_index = getattr(self.rag_retriever, "mmap_index", None)
+        if vector is not None and (store is not None or mmap_index is not None):
+            start = time.perf_counter()
+            if mmap_index is not None:
+                mmap_index.search(vector, k=1)
+            else:
+                store.get_chroma_instance().similarity_search_by_vector(list(map(float, vector)), k=1)
+            timings["search"] = time.perf_counter() - start
+
+        if self.langgraph_service is not None:
+            start = time.perf_counter()
+            history = [HumanMessage(content=q) if i % 2 == 0 else AIMessage(content=q)
+                       for i, q in enumerate(self.queries)]
+            trimmed = self.langgraph_service.trimmer.invoke(history)
+            self.langgraph_service.prompt_builder.build(trimmed, summary=self.queries[0])
+            timings["prompt"] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for llm in self.langgraph_service.llm_clients():
+                getattr(llm, "_client", None)
+            timings["llm_clients"] = time.perf_counter() - start
+
+        logger.info("Calentamiento completado: %s",
+                    ", ".join(f"{step}={seconds * 1000:.0f}ms" for step, seconds in timings.items()))
+        return timings
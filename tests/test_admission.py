@@ -0,0 +1,107 @@
+# tests/test_admission.py
+
+import threading
+import time
+import unittest
+from src.admission import AdmissionController, AdmissionRejected, TokenBucket
+from src.metrics import metrics
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_rafaga_y_recarga(self):
+        bucket = TokenBucket(rate=2.0, burst=2)
+        now = bucket.updated
+        self.assertEqual(bucket.try_acquire(now), 0.0)
+        self.assertEqual(bucket.try_acquire(now), 0.0)
+        self.assertAlmostEqual(bucket.try_acquire(now), 0.5)
+        self.assertEqual(bucket.try_acquire(now + 0.5), 0.0)
+
+
+class TestAdmissionController(unittest.TestCase):
+
+    def setUp(self):
+        metrics.reset()
+
+    def test_limite_por_usuario(self):
+        controller = AdmissionController(max_in_flight=0, user_rate=0.01, user_burst=2)
+        for _ in range(2):
+            with controller.admit("ana"):
+                pass
+        with self.assertRaises(AdmissionRejected) as ctx:
+            with controller.admit("ana"):
+                pass
+        self.assertEqual(ctx.exception.reason, "rate_limited")
+        self.assertGreater(ctx.exception.retry_after, 0)
+        # Otros usuarios no se ven afectados.
+        with controller.admit("luis"):
+            pass
+
+    def test_rechazo_por_capacidad_devuelve_el_token(self):
+        controller = AdmissionController(max_in_flight=1, queue_size=0, user_rate=0.01, user_burst=1)
+        with controller.admit("a"):
+            for _ in range(2):
+                with self.assertRaises(AdmissionRejected) as ctx:
+                    with controller.admit("b"):
+                        pass
+                # El reintento sigue viendo la cola llena, no el límite del usuario.
+                self.assertEqual(ctx.exception.reason, "queue_full")
+        with controller.admit("b"):
+            pass
+
+    def test_cola_fifo_y_cola_llena(self):
+        controller = AdmissionController(max_in_flight=1, queue_size=1, queue_timeout=5)
+        release = threading.Event()
+        order = []
+
+        def turn(name):
+            with controller.admit(name):
+                order.append(name)
+                release.wait(5)
+
+        first = threading.Thread(target=turn, args=("a",))
+        first.start()
+        while controller.in_flight < 1:
+            time.sleep(0.01)
+        second = threading.Thread(target=turn, args=("b",))
+        second.start()
+        while not controller.waiters:
+            time.sleep(0.01)
+
+        with self.assertRaises(AdmissionRejected) as ctx:
+            with controller.admit("c"):
+                pass
+        self.assertEqual(ctx.exception.reason, "queue_full")
+
+        release.set()
+        first.join()
+        second.join()
+        self.assertEqual(order, ["a", "b"])
+        self.assertEqual(controller.in_flight, 0)
+        shed = metrics.snapshot()["counters"]["chatbot_admission_shed_total"]
+        self.assertEqual(shed['{reason="queue_full"}'], 1)
+
+    def test_rechazo_temprano_por_plazo(self):
+        controller = AdmissionController(max_in_flight=1, queue_size=10)
+        controller.service_time = 2.0
+        with controller.admit("a"):
+            start = time.monotonic()
+            with self.assertRaises(AdmissionRejected) as ctx:
+                with controller.admit("b", timeout=0.5):
+                    pass
+            # Se rechaza sin consumir el plazo.
+            self.assertLess(time.monotonic() - start, 0.1)
+        self.assertEqual(ctx.exception.reason, "deadline")
+
+    def test_plazo_vencido_en_cola(self):
+        controller = AdmissionController(max_in_flight=1, queue_size=10)
+        with controller.admit("a"):
+            with self.assertRaises(AdmissionRejected):
+                with controller.admit("b", timeout=0.05):
+                    pass
+            self.assertEqual(len(controller.waiters), 0)
+        self.assertEqual(controller.in_flight, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,166 @@
+# tests/test_batch_qa.py
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from src.tools.batch_qa import BatchRunner, completed_ids, read_records
+
+
+class _Killed(BaseException):
+    """Simula que el proceso muere a mitad de un turno."""
+
+
+class _RecordingLLM(BaseChatModel):
+    """Registra los prompts y responde con el número de llamada; muere en `kill_at`."""
+    prompts: list = []
+    kill_at: int = 0
+
+    @property
+    def _llm_type(self):
+        return "recording"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.prompts.append(messages)
+        if len(self.prompts) == self.kill_at:
+            raise _Killed()
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=f"R{len(self.prompts)}"))])
+
+
+class FakeService:
+    def __init__(self, fail=()):
+        self.calls = []
+        self.fail = set(fail)
+        self.restored = {}
+
+    def resolve_scope(self, conversation_id):
+        return None
+
+    def restore_history(self, historial_id, turns):
+        self.restored[historial_id] = turns
+        return True
+
+    def send_message(self, message, historial_id, context_docs=None):
+        self.calls.append((historial_id, message, context_docs))
+        return "Error: falló" if message in self.fail else f"respuesta a {message}"
+
+
+class TestBatchQA(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.input = os.path.join(self.dir, "preguntas.jsonl")
+        self.output = os.path.join(self.dir, "respuestas.jsonl")
+        with open(self.input, "w", encoding="utf-8") as f:
+            for i in range(10):
+                f.write(json.dumps({"conversation_id": f"c{i % 3}", "question": f"p{i}"}) + "\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_lee_csv(self):
+        path = os.path.join(self.dir, "preguntas.csv")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("id,historial_id,message\nq1,ana,hola\n")
+        self.assertEqual(read_records(path), [{"id": "q1", "conversation_id": "ana", "question": "hola"}])
+
+    def test_busqueda_agrupada_y_orden_por_conversacion(self):
+        retriever = MagicMock()
+        retriever.search_batch.side_effect = lambda queries, k, where: [[q] for q in queries]
+        service = FakeService()
+
+        stats = BatchRunner(service, retriever, self.output, concurrency=3, batch_size=4).run(read_records(self.input))
+
+        self.assertEqual(stats["done"], 10)
+        # Una búsqueda por ventana (10 preguntas en ventanas de 4).
+        self.assertEqual(retriever.search_batch.call_count, 3)
+        for historial_id, message, context_docs in service.calls:
+            self.assertEqual(context_docs, [message])
+        for conversation in ("c0", "c1", "c2"):
+            order = [int(m[1:]) for h, m, _ in service.calls if h == conversation]
+            self.assertEqual(order, sorted(order))
+
+    def test_una_respuesta_lenta_no_frena_las_siguientes_ventanas(self):
+        # c0 se bloquea en su primera pregunta hasta que se responde p8 (de c2),
+        # que está en la última ventana: con ventanas como barrera no llegaría nunca.
+        released = threading.Event()
+
+        class SlowService(FakeService):
+            def send_message(self, message, historial_id, context_docs=None):
+                if message == "p0":
+                    self.waited = released.wait(5)
+                elif message == "p8":
+                    released.set()
+                return super().send_message(message, historial_id, context_docs)
+
+        service = SlowService()
+        stats = BatchRunner(service, None, self.output, concurrency=3, batch_size=2,
+                            prefetch=8).run(read_records(self.input))
+
+        self.assertTrue(service.waited)
+        self.assertEqual(stats["done"], 10)
+        order = [m for h, m, _ in service.calls if h == "c0"]
+        self.assertEqual(order, ["p0", "p3", "p6", "p9"])
+
+    def test_error_en_la_busqueda_se_propaga(self):
+        retriever = MagicMock()
+        retriever.search_batch.side_effect = RuntimeError("índice caído")
+        with self.assertRaises(RuntimeError):
+            BatchRunner(FakeService(), retriever, self.output, batch_size=4).run(read_records(self.input))
+
+    def test_reanuda_tras_interrupcion(self):
+        records = read_records(self.input)
+        BatchRunner(FakeService(fail={"p1"}), None, self.output).run(records[:4])
+        # Simula una línea a medio escribir al interrumpirse el proceso.
+        with open(self.output, "a", encoding="utf-8") as f:
+            f.write('{"id": "5", "answ')
+
+        service = FakeService()
+        stats = BatchRunner(service, None, self.output).run(records)
+        self.assertEqual(stats["skipped"], 4)
+        self.assertEqual(sorted(m for _, m, _ in service.calls), ["p4", "p5", "p6", "p7", "p8", "p9"])
+        self.assertEqual(len(completed_ids(self.output)), 10)
+
+        service = FakeService()
+        BatchRunner(service, None, self.output).run(records, retry_errors=True)
+        self.assertEqual([m for _, m, _ in service.calls], ["p1"])
+        # p1 falló: su conversación se restaura sin ese turno.
+        self.assertEqual(service.restored, {"c1": [("p4", "respuesta a p4"), ("p7", "respuesta a p7")]})
+
+    @patch("src.langgraph_service.ChatAnthropic")
+    def test_conversacion_reanudada_conserva_el_historial(self, _mock_llm):
+        from src.langgraph_service import LangGraphService
+
+        def service(kill_at=0):
+            svc = LangGraphService(api_key="test", model="claude-3-haiku-20240307", chat_history=None,
+                                   retriever=None)
+            svc.summary_enabled = False
+            svc.llm = _RecordingLLM(prompts=[], kill_at=kill_at)
+            return svc
+
+        records = [r for r in read_records(self.input) if r["conversation_id"] == "c0"]
+        first = service(kill_at=3)
+        with self.assertRaises(_Killed):
+            BatchRunner(first, None, self.output, concurrency=1).run(records)
+        self.assertEqual(len(completed_ids(self.output)), 2)
+
+        # Un proceso nuevo no tiene el hilo en memoria: se restaura de la salida.
+        resumed = service()
+        BatchRunner(resumed, None, self.output, concurrency=1).run(records)
+        prompt = "\n".join(str(m.content) for m in resumed.llm.prompts[0])
+        for text in ("p0", "R1", "p3", "R2", "p6"):
+            self.assertIn(text, prompt)
+        uninterrupted = service()
+        BatchRunner(uninterrupted, None, os.path.join(self.dir, "sin_corte.jsonl"), concurrency=1).run(records)
+        self.assertEqual([[type(m).__name__ for m in p] for p in resumed.llm.prompts],
+                         [[type(m).__name__ for m in p] for p in uninterrupted.llm.prompts[2:]])
+
+
+if __name__ == "__main__":
+    unittest.main()
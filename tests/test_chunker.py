@@ -0,0 +1,49 @@
+# tests/test_chunker.py
+
+import unittest
+from langchain_core.documents import Document
+from src.rag.chunker import TokenChunker, approximate_token_counter, content_hash
+from src.prompt_builder import select_context
+
+
+class TestTokenChunker(unittest.TestCase):
+
+    def test_respeta_objetivo_y_metadatos(self):
+        """Ningún chunk supera el objetivo y cada uno lleva tokens y hash."""
+        text = "\n\n".join(f"Párrafo {i}. " + "palabra " * 30 for i in range(20))
+        chunker = TokenChunker(chunk_tokens=100, overlap_tokens=0)
+        chunks = chunker.split_documents([Document(page_content=text, metadata={"source": "a.txt"})])
+
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertLessEqual(chunk.metadata["token_count"], 100)
+            self.assertEqual(chunk.metadata["content_hash"], content_hash(chunk.page_content))
+            self.assertEqual(chunk.metadata["source"], "a.txt")
+
+    def test_encabezados_abren_chunk(self):
+        """Un encabezado Markdown inicia un chunk nuevo y queda como sección."""
+        text = "# Intro\nTexto de introducción.\n\n## Seguridad\nUsa casco siempre."
+        chunks = TokenChunker(chunk_tokens=200).split_documents([Document(page_content=text, metadata={})])
+        self.assertEqual([c.metadata["section"] for c in chunks], ["Intro", "Seguridad"])
+        self.assertTrue(chunks[1].page_content.startswith("## Seguridad"))
+
+    def test_frases_largas_y_paginas(self):
+        """Los párrafos demasiado largos se parten por frases y las páginas se procesan en una pasada."""
+        sentence = "Esta es una frase de prueba bastante larga. "
+        pages = [Document(page_content=sentence * 40, metadata={"source": "m.pdf", "page": p}) for p in range(3)]
+        chunks = TokenChunker(chunk_tokens=120, overlap_tokens=20).split_documents(pages)
+        self.assertTrue(all(c.metadata["token_count"] <= 120 for c in chunks))
+        self.assertTrue(any("page_end" in c.metadata for c in chunks))
+        counted = approximate_token_counter([c.page_content for c in chunks])
+        for chunk, tokens in zip(chunks, counted):
+            self.assertAlmostEqual(chunk.metadata["token_count"], tokens, delta=tokens * 0.1 + 2)
+
+    def test_presupuesto_de_contexto(self):
+        """El contexto se empaqueta sumando el token_count de los metadatos."""
+        docs = [Document(page_content="x", metadata={"token_count": t}) for t in (60, 50, 30)]
+        self.assertEqual(len(select_context(docs, 100)), 2)
+        self.assertEqual(len(select_context(docs, None)), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+# tests/test_dedup.py
+
+import os
+import tempfile
+import unittest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from src.config import GlobalConfig
+from src.rag.dedup import ChunkDeduplicator, bands, hamming, simhash
+from src.rag.document_catalog import DocumentCatalog
+from src.rag.mmap_index import MmapVectorIndex
+from src.rag.retriever import RAGRetriever
+from src.rag.vector_store import VectorStore
+
+TEXTO = ("El sistema de recuperación divide cada documento en fragmentos de tamaño acotado, calcula sus "
+         "embeddings con el modelo configurado y los guarda en la colección de Chroma junto con sus metadatos. "
+         "Las consultas se responden buscando los fragmentos más similares a la pregunta del usuario.")
+
+
+def _chunk(text, source="a.txt", owner="", tenant="default"):
+    return Document(page_content=text, metadata={"source": source, "owner": owner, "tenant": tenant,
+                                                 "doc_type": "txt", "token_count": 10})
+
+
+class TestSimHash(unittest.TestCase):
+
+    def test_textos_casi_iguales_difieren_en_pocos_bits(self):
+        variante = TEXTO.upper().replace(",", ";").replace("  ", " ")
+        self.assertEqual(hamming(simhash(TEXTO), simhash(variante)), 0)
+        otro = "Los usuarios registrados conservan su historial entre sesiones y pueden cambiar de conversación " \
+               "con el comando historial seguido del nombre; las conversaciones temporales no se guardan nunca."
+        self.assertGreater(hamming(simhash(TEXTO), simhash(otro)), 10)
+
+    def test_texto_corto_sin_simhash(self):
+        self.assertIsNone(simhash("hola mundo"))
+
+    def test_firmas_cercanas_comparten_banda(self):
+        a = simhash(TEXTO)
+        b = a ^ 0b101  # distancia 2
+        self.assertTrue(set(enumerate(bands(a, 4))) & set(enumerate(bands(b, 4))))
+
+
+class TestChunkDeduplicator(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.catalog = DocumentCatalog(os.path.join(self.tmp.name, "catalog.db"))
+        self.dedup = ChunkDeduplicator(self.catalog, max_distance=3)
+
+    def tearDown(self):
+        self.catalog.close()
+        self.tmp.cleanup()
+
+    def _store(self, source, chunks, first_id=0):
+        """Simula la ingesta: ids secuenciales para los chunks conservados."""
+        result = self.dedup.filter(chunks)
+        ids = [f"{source}-{first_id + i}" for i in range(len(result.kept))]
+        self.catalog.record(source, ids, result.kept + result.dropped, result.signatures, result.resolve(ids))
+        return result, ids
+
+    def test_duplicados_dentro_del_lote(self):
+        result, ids = self._store("a.txt", [_chunk(TEXTO), _chunk(TEXTO), _chunk(TEXTO.lower() + "!"),
+                                            _chunk("corto"), _chunk("corto")])
+        self.assertEqual(len(result.kept), 2)
+        self.assertEqual((result.exact, result.near), (2, 1))
+        self.assertEqual(result.resolve(ids), [ids[0], ids[0], ids[1]])
+        self.assertEqual(self.catalog.get("a.txt")["duplicate_chunks"], 3)
+
+    def test_duplicados_de_otro_documento_y_borrado(self):
+        self._store("a.txt", [_chunk(TEXTO), _chunk("solo en a")])
+        result, _ = self._store("b.txt", [_chunk(TEXTO.replace(".", " ."))], first_id=10)
+        self.assertEqual((len(result.kept), result.near), (0, 1))
+        # La copia canónica pertenece a ambos documentos: al borrar a.txt se conserva.
+        self.assertEqual(sorted(self.catalog.chunk_ids("b.txt")), ["a.txt-0"])
+        self.assertEqual(self.catalog.exclusive_chunk_ids("a.txt"), ["a.txt-1"])
+        self.catalog.remove("a.txt")
+        self.assertEqual(self.catalog.exclusive_chunk_ids("b.txt"), ["a.txt-0"])
+        self.assertEqual(self.dedup.filter([_chunk(TEXTO)]).exact, 1)
+        self.catalog.remove("b.txt")
+        self.assertEqual(self.dedup.filter([_chunk(TEXTO)]).exact, 0)
+
+    def test_no_deduplica_entre_ambitos(self):
+        self._store("privado.txt", [_chunk(TEXTO, owner="ana", tenant="acme")])
+        # Otro usuario, otro tenant o un documento compartido no reutilizan un chunk privado.
+        self.assertEqual(len(self.dedup.filter([_chunk(TEXTO, owner="luis", tenant="acme")]).kept), 1)
+        self.assertEqual(len(self.dedup.filter([_chunk(TEXTO, owner="ana", tenant="otro")]).kept), 1)
+        self.assertEqual(len(self.dedup.filter([_chunk(TEXTO, tenant="acme")]).kept), 1)
+        # El propio usuario sí. Un chunk compartido tampoco se reutiliza en un
+        # documento privado: sus metadatos no valdrían si se borra el compartido.
+        self.assertEqual(len(self.dedup.filter([_chunk(TEXTO, owner="ana", tenant="acme")]).kept), 0)
+        self._store("comun.txt", [_chunk(TEXTO + " Anexo común.", tenant="acme")])
+        self.assertEqual(self.dedup.filter([_chunk(TEXTO + " Anexo común.", tenant="acme")]).exact, 1)
+        self.assertEqual(self.dedup.filter([_chunk(TEXTO + " Anexo común.", owner="luis", tenant="acme")]).exact, 0)
+
+
+class TestDeleteSharedChunks(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        config = GlobalConfig().model_copy(update={
+            "CHROMA_PERSIST_DIRECTORY": self.tmp.name, "CHROMA_COLLECTION_NAME": "dedup",
+            "SNAPSHOT_RESTORE_PATH": "", "VECTOR_SHARDS": 1
+        })
+        self.retriever = object.__new__(RAGRetriever)
+        self.retriever.config = config
+        self.retriever.mmap_index = None
+        self.retriever.vector_store_manager = VectorStore(config, DeterministicFakeEmbedding(size=8))
+        self.retriever.catalog = DocumentCatalog(os.path.join(self.tmp.name, "catalog.db"))
+        self.retriever.deduplicator = ChunkDeduplicator(self.retriever.catalog)
+
+    def tearDown(self):
+        self.retriever.catalog.close()
+        self.tmp.cleanup()
+
+    def _metadata(self):
+        result = self.retriever.vector_store_manager.collection.get(include=["metadatas"])
+        return {chunk_id: (m["source"], m["owner"], m["tenant"]) for chunk_id, m in zip(result["ids"], result["metadatas"])}
+
+    def test_la_copia_canonica_pasa_al_documento_que_la_conserva(self):
+        self.retriever.add_documents([_chunk(TEXTO, source="a.txt")], tenant="acme")
+        self.retriever.add_documents([_chunk(TEXTO, source="b.txt")], tenant="acme")
+        (chunk_id,) = self._metadata()
+
+        self.assertEqual(self.retriever.delete_document("a.txt", tenant="acme"), 1)
+        self.assertEqual(self._metadata(), {chunk_id: ("b.txt", "", "acme")})
+        self.assertEqual(self.retriever.catalog.chunk_ids("b.txt"), [chunk_id])
+        self.assertEqual(self.retriever.delete_document("b.txt", tenant="acme"), 1)
+        self.assertEqual(self._metadata(), {})
+
+    def test_eliminar_en_modo_mmap_no_republica_la_coleccion(self):
+        index = self.retriever.mmap_index = MmapVectorIndex(os.path.join(self.tmp.name, "mmap"), refresh_interval=0)
+        self.retriever.add_documents([_chunk(TEXTO, source="a.txt")], tenant="acme")
+        self.retriever.add_documents([_chunk(TEXTO, source="b.txt"), _chunk("Otro texto distinto.", source="b.txt")],
+                                     tenant="acme")
+        self.retriever.add_documents([_chunk("Nota aparte.", source="c.txt")], tenant="acme")
+        self.retriever.add_documents([_chunk(text, source="d.txt") for text in (
+            "Calendario de vacaciones del equipo de soporte.", "Inventario de portátiles por oficina.",
+            "Procedimiento para solicitar acceso a la VPN.", "Lista de proveedores homologados en 2024.")],
+            tenant="acme")
+        vector = DeterministicFakeEmbedding(size=8).embed_query(TEXTO)
+        segments = set(index.read_manifest()["segments"])
+
+        self.retriever.delete_document("c.txt", tenant="acme")
+        self.assertEqual(set(index.read_manifest()["segments"]), segments)
+        self.assertEqual(index.count(), 6)
+
+        # La copia canónica heredada por b.txt se republica con sus metadatos y
+        # la anterior queda marcada como eliminada, en la misma generación.
+        self.retriever.delete_document("a.txt", tenant="acme")
+        found = {d.id: d.metadata["source"] for d, _ in index.search(vector, k=10)}
+        self.assertEqual(found, {chunk_id: source for chunk_id, (source, _, _) in self._metadata().items()})
+        self.assertEqual(set(found.values()), {"b.txt", "d.txt"})
+
+
+if __name__ == "__main__":
+    unittest.main()
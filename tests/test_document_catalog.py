@@ -0,0 +1,96 @@
+# tests/test_document_catalog.py
+
+import os
+import sqlite3
+import tempfile
+import unittest
+import chromadb
+from langchain_core.documents import Document
+from src.rag.document_catalog import DocumentCatalog
+
+
+def _chunk(text, source, owner="", tenant="default", tokens=3):
+    return Document(page_content=text, metadata={"source": source, "owner": owner, "tenant": tenant,
+                                                 "doc_type": "txt", "token_count": tokens})
+
+
+class TestDocumentCatalog(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.catalog = DocumentCatalog(os.path.join(self.tmp.name, "catalog.db"))
+
+    def tearDown(self):
+        self.catalog.close()
+        self.tmp.cleanup()
+
+    def test_registra_acumula_y_lista(self):
+        self.catalog.record("a.txt", ["a1", "a2"], [_chunk("hola", "a.txt"), _chunk("mundo", "a.txt")])
+        self.catalog.record("a.txt", ["a3"], [_chunk("ñ", "a.txt")])
+        self.catalog.record("b.txt", ["b1"], [_chunk("privado", "b.txt", owner="ana", tenant="acme")])
+
+        docs = self.catalog.list_documents()
+        self.assertEqual([d["source"] for d in docs], ["a.txt", "b.txt"])
+        self.assertEqual((docs[0]["chunk_count"], docs[0]["bytes"], docs[0]["tokens"]), (3, 11, 9))
+        self.assertEqual(self.catalog.chunk_ids("a.txt"), ["a1", "a2", "a3"])
+        self.assertEqual([d["source"] for d in self.catalog.list_documents(owner="ana", tenant="acme")], ["b.txt"])
+        self.assertEqual([d["source"] for d in self.catalog.list_documents(limit=1, offset=1)], ["b.txt"])
+        self.assertEqual(self.catalog.totals(), {"documents": 2, "chunks": 4, "duplicate_chunks": 0,
+                                                 "bytes": 18, "tokens": 12})
+
+    def test_eliminar_documento(self):
+        self.catalog.record("a.txt", ["a1"], [_chunk("hola", "a.txt")])
+        self.catalog.remove("a.txt")
+        self.assertIsNone(self.catalog.get("a.txt"))
+        self.assertEqual(self.catalog.chunk_ids("a.txt"), [])
+
+    def test_misma_ruta_en_distintos_ambitos(self):
+        self.catalog.record("informe.pdf", ["a1"], [_chunk("de ana", "informe.pdf", owner="ana", tenant="acme")])
+        self.catalog.record("informe.pdf", ["b1", "b2"], [_chunk("de beto", "informe.pdf", owner="beto", tenant="otro")])
+        self.catalog.record("informe.pdf", ["c1"], [_chunk("compartido", "informe.pdf", tenant="acme")])
+
+        self.assertEqual([d["chunk_count"] for d in self.catalog.list_documents(owner="ana", tenant="acme")], [1])
+        self.assertEqual([d["owner"] for d in self.catalog.list_documents(owner="ana", tenant="acme",
+                                                                          include_shared=True)], ["", "ana"])
+        self.assertEqual(self.catalog.list_documents(owner="beto", tenant="acme"), [])
+        self.assertEqual(self.catalog.chunk_ids("informe.pdf", "ana", "acme"), ["a1"])
+
+        self.catalog.remove("informe.pdf", "beto", "otro")
+        self.assertIsNone(self.catalog.get("informe.pdf", "beto", "otro"))
+        self.assertEqual(self.catalog.get("informe.pdf", "ana", "acme")["chunk_count"], 1)
+        self.assertEqual(self.catalog.totals()["documents"], 2)
+
+    def test_migra_catalogo_por_source(self):
+        self.catalog.close()
+        path = os.path.join(self.tmp.name, "antiguo.db")
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE documents (source TEXT PRIMARY KEY, owner TEXT NOT NULL DEFAULT '', "
+                     "tenant TEXT NOT NULL DEFAULT '', doc_type TEXT NOT NULL DEFAULT '', chunk_count INTEGER NOT NULL, "
+                     "bytes INTEGER NOT NULL, tokens INTEGER NOT NULL, ingested REAL NOT NULL)")
+        conn.execute("CREATE TABLE chunks (source TEXT NOT NULL, chunk_id TEXT NOT NULL, "
+                     "PRIMARY KEY (source, chunk_id)) WITHOUT ROWID")
+        conn.execute("CREATE INDEX idx_chunks_id ON chunks (chunk_id)")
+        conn.execute("INSERT INTO documents VALUES ('a.txt', 'ana', 'acme', 'txt', 2, 10, 4, 0)")
+        conn.executemany("INSERT INTO chunks VALUES ('a.txt', ?)", [("a1",), ("a2",)])
+        conn.commit()
+        conn.close()
+
+        self.catalog = DocumentCatalog(path)
+        self.assertEqual(self.catalog.get("a.txt", "ana", "acme")["duplicate_chunks"], 0)
+        self.assertEqual(sorted(self.catalog.chunk_ids("a.txt", "ana", "acme")), ["a1", "a2"])
+        indexes = {row[1] for row in self.catalog.conn.execute("PRAGMA index_list(chunks)")}
+        self.assertIn("idx_chunks_id", indexes)
+
+    def test_reconstruir_desde_coleccion(self):
+        collection = chromadb.EphemeralClient().get_or_create_collection("test_catalogo")
+        chunks = [_chunk("uno", "a.txt"), _chunk("dos", "a.txt"), _chunk("tres", "b.txt")]
+        collection.add(ids=["1", "2", "3"], documents=[c.page_content for c in chunks],
+                       metadatas=[c.metadata for c in chunks], embeddings=[[1.0, 0.0]] * 3)
+
+        self.assertEqual(self.catalog.rebuild(collection, page_size=2), 2)
+        self.assertEqual(self.catalog.get("a.txt")["chunk_count"], 2)
+        self.assertEqual(sorted(self.catalog.chunk_ids("a.txt")), ["1", "2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+# tests/test_document_loader.py
+
+import os
+import tempfile
+import unittest
+from src.config import config
+from src.rag.document_loader import DocumentLoader
+
+
+class TestStreamingIngestion(unittest.TestCase):
+
+    def setUp(self):
+        # DocumentLoader solo acepta rutas relativas (protección contra path traversal).
+        self.tmp = tempfile.TemporaryDirectory(dir=".")
+        self.path = os.path.relpath(os.path.join(self.tmp.name, "registro.txt"))
+        with open(self.path, "w", encoding="utf-8") as f:
+            for i in range(400):
+                f.write(f"Evento {i} registrado correctamente en el sistema.\n\n")
+        self.loader = DocumentLoader(config.model_copy(update={
+            "INGEST_TEXT_BLOCK_CHARS": 2000, "INGEST_BATCH_SIZE": 5,
+            "CHUNK_TOKENS": 64, "CHUNK_OVERLAP_TOKENS": 0, "ALLOWED_FILE_TYPES": ["txt"]
+        }))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_bloques_acotados(self):
+        """El texto se lee en bloques cortados en límites de párrafo."""
+        blocks = list(self.loader.iter_documents(self.path))
+        self.assertGreater(len(blocks), 5)
+        self.assertTrue(all(len(b.page_content) <= 2000 for b in blocks))
+        self.assertTrue(all(b.page_content.rstrip().endswith(".") for b in blocks))
+
+    def test_lotes_de_chunks(self):
+        """Los chunks se emiten en lotes acotados y cubren todo el archivo."""
+        batches = list(self.loader.iter_chunk_batches(self.path))
+        self.assertTrue(all(len(batch) <= 5 for batch in batches))
+        text = "\n".join(chunk.page_content for batch in batches for chunk in batch)
+        self.assertIn("Evento 0 registrado", text)
+        self.assertIn("Evento 399 registrado", text)
+
+    def test_ruta_absoluta_rechazada(self):
+        with self.assertRaises(ValueError):
+            list(self.loader.iter_documents(os.path.abspath(self.path)))
+
+
+if __name__ == "__main__":
+    unittest.main()
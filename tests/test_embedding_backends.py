@@ -0,0 +1,39 @@
+# tests/test_embedding_backends.py
+
+import unittest
+from unittest.mock import patch
+import numpy as np
+from src.rag.embedding_backends import EmbeddingBackendLoader, artifact_path, embedding_parity
+
+
+class TestEmbeddingBackends(unittest.TestCase):
+
+    def test_paridad(self):
+        reference = np.array([[1.0, 0.0], [0.0, 1.0]])
+        self.assertAlmostEqual(embedding_parity(reference, reference)["min_cosine"], 1.0, places=6)
+        parity = embedding_parity(reference, np.array([[1.0, 0.0], [1.0, 1.0]]))
+        self.assertAlmostEqual(parity["min_cosine"], np.sqrt(0.5), places=5)
+        with self.assertRaises(ValueError):
+            embedding_parity(reference, np.zeros((2, 3)))
+
+    def test_backend_no_soportado(self):
+        with self.assertRaises(ValueError):
+            EmbeddingBackendLoader("modelo", backend="tensorrt")
+
+    @patch("src.rag.embedding_backends.SentenceTransformer")
+    def test_fallback_a_torch(self, mock_st):
+        """Si la exportación falla (p. ej. falta optimum), se carga el modelo fp32."""
+        loader = EmbeddingBackendLoader("org/modelo", backend="onnx", quantize=True, artifacts_dir="modelos")
+        with patch.object(loader, "_load_onnx", side_effect=ImportError("optimum")):
+            model = loader.load()
+        self.assertIs(model, mock_st.return_value)
+        mock_st.assert_called_once_with("org/modelo")
+        self.assertEqual(loader.name, "onnx-int8")
+        self.assertEqual(loader.loaded_backend, "torch")
+
+    def test_ruta_de_artefactos(self):
+        self.assertEqual(artifact_path("modelos", "BAAI/bge-small", "onnx").name, "BAAI__bge-small-onnx")
+
+
+if __name__ == "__main__":
+    unittest.main()
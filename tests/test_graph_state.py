@@ -0,0 +1,132 @@
+# tests/test_graph_state.py
+
+import threading
+import time
+import unittest
+from unittest.mock import patch
+from langchain_core.documents import Document
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.runnables import RunnableLambda
+from src.config import config
+from src.metrics import metrics
+
+
+@patch("src.langgraph_service.ChatAnthropic")
+class TestConversationState(unittest.TestCase):
+
+    def _service(self, parallel=True):
+        from src.langgraph_service import LangGraphService
+
+        retriever = RunnableLambda(lambda query: [Document(page_content="CONTEXTO-SECRETO " * 50)])
+        with patch.object(config, "GRAPH_PARALLEL_ENABLED", parallel):
+            service = LangGraphService(api_key="test", model="claude-3-haiku-20240307",
+                                       chat_history=None, retriever=retriever)
+        service.summary_enabled = False
+        service.llm = FakeListChatModel(responses=["respuesta"])
+        return service
+
+    def _stored_bytes(self, service):
+        memory = service.memory
+        data = repr(memory.storage) + repr(memory.writes)
+        return data.encode("utf-8") + b"".join(
+            blob for _, blob in memory.blobs.values() if isinstance(blob, bytes)
+        )
+
+    def test_contexto_fuera_de_los_checkpoints(self, _mock_llm):
+        service = self._service()
+        prompts = []
+        build = service.prompt_builder.build
+        service.prompt_builder.build = lambda *a, **kw: prompts.append(kw["context_docs"]) or build(*a, **kw)
+
+        for i in range(3):
+            self.assertEqual(service.send_message(f"pregunta {i}", "hilo"), "respuesta")
+
+        # El modelo recibió el contexto en cada turno...
+        self.assertTrue(all(len(docs) == 1 for docs in prompts))
+        # ...pero el estado guardado solo contiene el diálogo.
+        state = service.app.get_state({"configurable": {"thread_id": "hilo"}})
+        self.assertEqual(len(state.values["messages"]), 6)
+        self.assertNotIn("context", state.values)
+        self.assertNotIn(b"CONTEXTO-SECRETO", self._stored_bytes(service))
+
+    def test_un_checkpoint_por_turno(self, _mock_llm):
+        service = self._service()
+        for i in range(3):
+            service.send_message(f"pregunta {i}", "hilo")
+        history = list(service.app.get_state_history({"configurable": {"thread_id": "hilo"}}))
+        self.assertEqual(len(history), 3)
+
+    def test_busqueda_y_recorte_en_paralelo(self, _mock_llm):
+        service = self._service()
+        # Cada rama espera a la otra: si se ejecutaran en serie la barrera expiraría.
+        barrier = threading.Barrier(2, timeout=5)
+        trimmer = service.trimmer
+        service.retriever = RunnableLambda(lambda query: barrier.wait() and [] or [Document(page_content="doc")])
+        service.trimmer = RunnableLambda(lambda messages: barrier.wait() and [] or trimmer.invoke(messages))
+        was_enabled = metrics.enabled
+        metrics.enabled = True
+        metrics.reset()
+        try:
+            self.assertEqual(service.send_message("pregunta", "hilo"), "respuesta")
+            stages = metrics.snapshot()["histograms"]["chatbot_stage_duration_seconds"]
+        finally:
+            metrics.enabled = was_enabled
+        for node in ("retrieve", "history", "generate"):
+            self.assertIn(f'{{node="{node}",stage="node"}}', stages)
+
+    def test_turno_en_paralelo_no_mas_lento_que_en_serie(self, _mock_llm):
+        """Con búsqueda y recorte de 100 ms, el turno paralelo tarda ~max y el secuencial ~suma."""
+        def turn_seconds(parallel):
+            service = self._service(parallel)
+            trimmer = service.trimmer
+            service.retriever = RunnableLambda(lambda query: time.sleep(0.1) or [Document(page_content="doc")])
+            service.trimmer = RunnableLambda(lambda messages: time.sleep(0.1) or trimmer.invoke(messages))
+            service.llm = FakeListChatModel(responses=["respuesta"] * 3)
+            was_enabled = metrics.enabled
+            metrics.enabled = True
+            metrics.reset()
+            try:
+                for i in range(3):
+                    service.send_message(f"pregunta {i}", "hilo")
+                return metrics.stage_summary("turn")["p50_ms"] / 1000
+            finally:
+                metrics.enabled = was_enabled
+
+        parallel, sequential = turn_seconds(True), turn_seconds(False)
+        self.assertLess(parallel, sequential)
+        # El ahorro es el de una de las ramas, muy por encima del coste de un paso del grafo.
+        self.assertGreater(sequential - parallel, 0.05)
+
+    def test_modo_secuencial_conserva_contexto_e_historial(self, _mock_llm):
+        service = self._service(parallel=False)
+        prompts = []
+        build = service.prompt_builder.build
+        service.prompt_builder.build = lambda *a, **kw: prompts.append((a[0], kw["context_docs"])) or build(*a, **kw)
+
+        for i in range(2):
+            self.assertEqual(service.send_message(f"pregunta {i}", "hilo"), "respuesta")
+        trimmed, docs = prompts[-1]
+        self.assertEqual([d.page_content[:16] for d in docs], ["CONTEXTO-SECRETO"])
+        self.assertEqual([m.content for m in trimmed], ["pregunta 0", "respuesta", "pregunta 1"])
+        self.assertNotIn(b"CONTEXTO-SECRETO", self._stored_bytes(service))
+
+        service.retriever = None
+        self.assertEqual(service.send_message("otra", "hilo"), "respuesta")
+        self.assertEqual(prompts[-1][1], [])
+
+    def test_sin_busqueda_si_el_contexto_viene_dado(self, _mock_llm):
+        service = self._service()
+        queries, prompts = [], []
+        service.retriever = RunnableLambda(lambda query: queries.append(query) or [])
+        build = service.prompt_builder.build
+        service.prompt_builder.build = lambda *a, **kw: prompts.append(kw["context_docs"]) or build(*a, **kw)
+
+        service.send_message("pregunta", "hilo", context_docs=[Document(page_content="dado")])
+        self.assertEqual(queries, [])
+        self.assertEqual(prompts[0][0].page_content, "dado")
+        service.retriever = None
+        self.assertEqual(service.send_message("otra", "hilo"), "respuesta")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+# tests/test_history_store.py
+
+import os
+import tempfile
+import unittest
+from src.rag.history_store import InMemoryHistoryStore, SQLiteHistoryStore
+
+
+class HistoryStoreContract:
+    """Comportamiento común que deben cumplir todos los almacenes de historial."""
+
+    def make_store(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.store = self.make_store()
+        for i in range(1, 26):
+            self.store.append("conv_a", "human" if i % 2 else "ai", f"mensaje {i}", {"n": i})
+        self.store.append("conv_b", "human", "otra conversación")
+
+    def test_lectura_paginada(self):
+        """Se leen los últimos N mensajes y la página anterior con el cursor `before`."""
+        last = self.store.get_messages("conv_a", limit=3)
+        self.assertEqual([m["seq"] for m in last], [23, 24, 25])
+        self.assertEqual(last[-1]["metadata"], {"n": 25})
+        previous = self.store.get_messages("conv_a", limit=3, before=last[0]["seq"])
+        self.assertEqual([m["content"] for m in previous], ["mensaje 20", "mensaje 21", "mensaje 22"])
+
+    def test_conversaciones_independientes(self):
+        """Cada conversación tiene su propia secuencia y se limpia por separado."""
+        self.assertEqual(self.store.count("conv_a"), 25)
+        self.assertEqual(self.store.get_messages("conv_b")[0]["seq"], 1)
+        self.store.clear("conv_b")
+        self.assertEqual(self.store.count("conv_b"), 0)
+        self.assertEqual(self.store.count("conv_a"), 25)
+
+    def test_iteracion_perezosa(self):
+        """La iteración por páginas recorre todo en ambos sentidos."""
+        forward = [m["seq"] for m in self.store.iter_messages("conv_a", page_size=7)]
+        backward = [m["seq"] for m in self.store.iter_messages("conv_a", page_size=7, reverse=True)]
+        self.assertEqual(forward, list(range(1, 26)))
+        self.assertEqual(backward, list(range(25, 0, -1)))
+
+
+class TestInMemoryHistoryStore(HistoryStoreContract, unittest.TestCase):
+
+    def make_store(self):
+        return InMemoryHistoryStore()
+
+
+class TestSQLiteHistoryStore(HistoryStoreContract, unittest.TestCase):
+
+    def make_store(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        return SQLiteHistoryStore(os.path.join(self.tmp.name, "chat_history.db"))
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+
+if __name__ == "__main__":
+    unittest.main()
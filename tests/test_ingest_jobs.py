@@ -0,0 +1,268 @@
+# tests/test_ingest_jobs.py
+
+import os
+import tempfile
+import threading
+import unittest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from src.config import GlobalConfig
+from src.ingest_jobs import IngestJobManager, IngestJobStore
+from src.rag.document_catalog import DocumentCatalog
+from src.rag.retriever import RAGRetriever
+from src.rag.vector_store import VectorStore
+
+
+class FakeRetriever:
+    """Ingiere `batches` lotes de `batch_size` chunks; cada lote espera a `gate` si se indica."""
+    def __init__(self, batches=5, batch_size=4, gate=None, fail_at=None, existing=()):
+        self.batches = batches
+        self.batch_size = batch_size
+        self.gate = gate
+        self.fail_at = fail_at
+        self.existing = set(existing)
+        self.calls = []
+        self.deleted = []
+        self.document_loader = self
+
+    def has_document(self, path, owner=None, tenant=None):
+        return path in self.existing
+
+    def delete_document(self, path, owner=None, tenant=None):
+        self.deleted.append((path, owner, tenant))
+        return 1
+
+    def validate_path(self, path):
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+
+    def ingest_file(self, path, owner=None, tenant=None, skip=0, progress=None):
+        self.calls.append((path, owner, tenant, skip))
+        processed, added = skip, 0
+        for i in range(skip // self.batch_size, self.batches):
+            if self.gate is not None:
+                self.gate.acquire(timeout=5)
+            if i == self.fail_at:
+                raise RuntimeError("PDF corrupto")
+            processed += self.batch_size
+            added += self.batch_size
+            progress(processed, added)
+        return added
+
+
+def _wait_for_chunks(manager, job_id, count):
+    for _ in range(100):
+        if manager.status(job_id)["chunks_done"] >= count:
+            return
+        manager.wait(job_id, timeout=0.05)
+    raise AssertionError(f"El trabajo {job_id} no llegó a {count} chunks")
+
+
+class TestIngestJobs(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = os.path.join(self.tmp.name, "jobs.db")
+        self.path = os.path.join(self.tmp.name, "doc.txt")
+        with open(self.path, "w") as f:
+            f.write("texto " * 1000)
+        self.managers = []
+
+    def tearDown(self):
+        for manager in self.managers:
+            manager.shutdown()
+            manager.store.close()
+        self.tmp.cleanup()
+
+    def _manager(self, retriever, workers=1):
+        manager = IngestJobManager(retriever, IngestJobStore(self.db), workers=workers)
+        self.managers.append(manager)
+        return manager
+
+    def test_submit_retorna_al_instante_y_registra_el_progreso(self):
+        gate = threading.Semaphore(0)
+        manager = self._manager(FakeRetriever(gate=gate))
+        job_id = manager.submit(self.path, owner="ana", tenant="acme")
+        self.assertIn(manager.status(job_id)["state"], ("queued", "running"))
+        self.assertTrue(manager.status(job_id)["estimated"])
+
+        for _ in range(2):
+            gate.release()
+        _wait_for_chunks(manager, job_id, 8)
+        job = manager.status(job_id)
+        self.assertEqual(job["state"], "running")
+        self.assertGreater(job["progress"], 0)
+
+        for _ in range(3):
+            gate.release()
+        job = manager.wait(job_id, timeout=5)
+        self.assertEqual((job["state"], job["chunks_done"], job["chunks_total"], job["progress"]), ("done", 20, 20, 1.0))
+        self.assertGreater(job["throughput"], 0)
+        self.assertEqual(manager.list_jobs()[0]["id"], job_id)
+
+        with self.assertRaises(FileNotFoundError):
+            manager.submit(os.path.join(self.tmp.name, "no_existe.txt"))
+
+    def test_cancelar_en_curso_y_en_cola(self):
+        gate = threading.Semaphore(0)
+        retriever = FakeRetriever(gate=gate)
+        manager = self._manager(retriever)
+        running = manager.submit(self.path)
+        queued = manager.submit(self.path)
+        gate.release()
+        _wait_for_chunks(manager, running, 4)
+
+        self.assertTrue(manager.cancel(queued))
+        self.assertEqual(manager.status(queued)["state"], "cancelled")
+        self.assertTrue(manager.cancel(running))
+        gate.release()
+        job = manager.wait(running, timeout=5)
+        # Se detiene tras el lote en curso y retira el documento parcial.
+        self.assertEqual((job["state"], job["chunks_done"]), ("cancelled", 8))
+        self.assertFalse(manager.cancel(running))
+        self.assertEqual(len(retriever.calls), 1)
+        self.assertEqual(retriever.deleted, [(self.path, None, None)])
+
+    def test_fallo(self):
+        retriever = FakeRetriever(fail_at=2)
+        manager = self._manager(retriever)
+        job = manager.wait(manager.submit(self.path, owner="ana"), timeout=5)
+        self.assertEqual((job["state"], job["chunks_done"], job["error"]), ("failed", 8, "PDF corrupto"))
+        self.assertEqual(retriever.deleted, [(self.path, "ana", None)])
+
+        # Una nueva subida de un documento que ya existía no lo borra.
+        retriever = FakeRetriever(fail_at=2, existing={self.path})
+        manager = self._manager(retriever)
+        self.assertEqual(manager.wait(manager.submit(self.path), timeout=5)["state"], "failed")
+        self.assertEqual(retriever.deleted, [])
+
+    def test_cancelado_durante_un_reinicio(self):
+        store = IngestJobStore(self.db)
+        job_id = store.create(self.path, "ana", "acme", new_document=True)
+        store.update(job_id, state="running", chunks_done=8, chunks_added=8, started=1.0, cancel_requested=1)
+        store.close()
+
+        retriever = FakeRetriever()
+        job = self._manager(retriever).wait(job_id, timeout=5)
+        self.assertEqual(job["state"], "cancelled")
+        self.assertEqual((retriever.calls, retriever.deleted), ([], [(self.path, "ana", "acme")]))
+
+    def test_reanuda_tras_reinicio(self):
+        store = IngestJobStore(self.db)
+        job_id = store.create(self.path, "ana", "acme")
+        store.update(job_id, state="running", chunks_done=12, chunks_added=12, started=1.0)
+        store.close()
+
+        retriever = FakeRetriever()
+        manager = self._manager(retriever)
+        job = manager.wait(job_id, timeout=5)
+        self.assertEqual(retriever.calls, [(self.path, "ana", "acme", 12)])
+        self.assertEqual((job["state"], job["chunks_done"], job["chunks_added"], job["resumed_from"]),
+                         ("done", 20, 20, 12))
+
+
+class TestCancelRemovesPartialDocument(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        config = GlobalConfig().model_copy(update={
+            "CHROMA_PERSIST_DIRECTORY": self.tmp.name, "CHROMA_COLLECTION_NAME": "jobs",
+            "SNAPSHOT_RESTORE_PATH": "", "VECTOR_SHARDS": 1
+        })
+        self.gate = threading.Semaphore(0)
+        gate = self.gate
+
+        class Loader:
+            def validate_path(self, path):
+                pass
+
+            def iter_chunk_batches(self, path):
+                for start in range(0, 12, 4):
+                    gate.acquire(timeout=5)
+                    yield [Document(page_content=f"Fragmento {i} del informe trimestral", metadata={"source": path})
+                           for i in range(start, start + 4)]
+
+        self.retriever = object.__new__(RAGRetriever)
+        self.retriever.config = config
+        self.retriever.mmap_index = None
+        self.retriever.deduplicator = None
+        self.retriever.document_loader = Loader()
+        self.retriever.vector_store_manager = VectorStore(config, DeterministicFakeEmbedding(size=8))
+        self.retriever.catalog = DocumentCatalog(os.path.join(self.tmp.name, "catalog.db"))
+        self.manager = IngestJobManager(self.retriever, IngestJobStore(os.path.join(self.tmp.name, "jobs.db")))
+
+    def tearDown(self):
+        self.manager.shutdown()
+        self.manager.store.close()
+        self.retriever.catalog.close()
+        self.tmp.cleanup()
+
+    def test_cancelar_a_mitad_no_deja_nada_buscable(self):
+        path = os.path.join(self.tmp.name, "informe.txt")
+        with open(path, "w") as f:
+            f.write("informe")
+        job_id = self.manager.submit(path, owner="ana")
+        self.gate.release()
+        _wait_for_chunks(self.manager, job_id, 4)
+        self.assertEqual(self.retriever.vector_store_manager.collection.count(), 4)
+
+        self.manager.cancel(job_id)
+        self.gate.release()
+        self.assertEqual(self.manager.wait(job_id, timeout=5)["state"], "cancelled")
+        self.assertEqual(self.retriever.vector_store_manager.collection.count(), 0)
+        self.assertEqual(self.retriever.list_documents(), [])
+        self.assertFalse(self.retriever.has_document(path, owner="ana"))
+
+
+class TestIngestFileSkip(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.retriever = object.__new__(RAGRetriever)
+        self.retriever.mmap_index = None
+        self.retriever.catalog = DocumentCatalog(os.path.join(self.tmp.name, "catalog.db"))
+
+        class Loader:
+            def iter_chunk_batches(self, path):
+                for start in range(0, 10, 4):
+                    yield [Document(page_content=f"c{i}", metadata={}) for i in range(start, min(start + 4, 10))]
+
+        self.retriever.document_loader = Loader()
+        self.stored = []
+
+        def store_batch(source, batch):
+            self.stored.extend(c.page_content for c in batch)
+            self.retriever.catalog.record(source, [c.id for c in batch], batch)
+            return [c.id for c in batch], 0
+
+        self.retriever._store_batch = store_batch
+
+    def tearDown(self):
+        self.retriever.catalog.close()
+        self.tmp.cleanup()
+
+    def test_omite_los_chunks_ya_insertados(self):
+        calls = []
+        added = self.retriever.ingest_file("doc.txt", skip=5, progress=lambda done, new: calls.append((done, new)))
+        self.assertEqual(self.stored, ["c5", "c6", "c7", "c8", "c9"])
+        self.assertEqual(added, 5)
+        self.assertEqual(calls, [(8, 3), (10, 5)])
+
+    def test_reintento_sin_progreso_no_duplica(self):
+        """Un lote insertado cuyo progreso no llegó a guardarse no se inserta de nuevo."""
+        def crash(done, new):
+            raise RuntimeError("caída antes de guardar el progreso")
+
+        with self.assertRaises(RuntimeError):
+            self.retriever.ingest_file("doc.txt", progress=crash)
+        published = []
+        self.retriever._publish_segment = published.extend
+        self.assertEqual(self.retriever.ingest_file("doc.txt"), 10)
+        self.assertEqual(self.stored, [f"c{i}" for i in range(10)])
+        self.assertEqual(self.retriever.catalog.get("doc.txt")["chunk_count"], 10)
+        # Se publica el documento completo, incluidos los chunks del intento anterior.
+        self.assertEqual(len(set(published)), 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
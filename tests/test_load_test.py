@@ -0,0 +1,88 @@
+# tests/test_load_test.py
+
+import argparse
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+from src.tools.load_test import (
+    InProcessTarget, StepReport, StubChatModel, TurnResult, build_in_process_target, find_saturation, run_step,
+    synthetic_transcripts
+)
+
+
+def _report(concurrency, throughput, p95, errors=0):
+    results = [TurnResult("rag", p95, True) for _ in range(throughput)]
+    results += [TurnResult("rag", p95, False) for _ in range(errors)]
+    return StepReport(concurrency, None, 1.0, results)
+
+
+class TestLoadTest(unittest.TestCase):
+
+    def test_transcripts_sinteticos_reproducibles(self):
+        first = synthetic_transcripts(5, turns=4, documents=["a.txt"], upload_ratio=0.5, seed=1)
+        self.assertEqual(first, synthetic_transcripts(5, turns=4, documents=["a.txt"], upload_ratio=0.5, seed=1))
+        kinds = {turn["type"] for t in first for turn in t["turns"]}
+        self.assertEqual(kinds, {"message", "upload"})
+
+    @patch("src.langgraph_service.ChatAnthropic")
+    def test_llm_simulado_en_todos_los_niveles(self, anthropic):
+        from src.langgraph_service import LangGraphService
+        from tests.test_model_router import _router
+
+        service = LangGraphService(api_key="stub", model="claude-3-haiku-20240307", chat_history=None,
+                                   retriever=None, router=_router()[0])
+        service.summary_enabled = False
+        args = argparse.Namespace(stub_llm=True, stub_ttft_ms=0, stub_ttft_jitter_ms=0, stub_tokens_per_second=1e6,
+                                  stub_output_tokens=2, stub_error_rate=0)
+        with patch("src.chatbot.Chatbot", return_value=MagicMock(langgraph_service=service)):
+            build_in_process_target(args)
+
+        self.assertTrue(all(isinstance(llm, StubChatModel) for llm in service.llm_clients()))
+        self.assertIsInstance(service.summarizer.llm, StubChatModel)
+        for message in ("hola", "explica y compara los riesgos del informe"):
+            self.assertEqual(service.send_message(message, "hilo"), "tok0 tok1 ")
+        anthropic.return_value.invoke.assert_not_called()
+
+    def test_run_step_reproduce_turnos_en_orden(self):
+        chatbot = MagicMock()
+        chatbot.send_message.side_effect = lambda message, user_id: "Error: x" if message == "falla" else "ok"
+        chatbot.add_documents.return_value = "Documento cargado exitosamente"
+        transcripts = [{"historial_id": "c", "turns": [
+            {"type": "upload", "path": "a.txt"},
+            {"type": "message", "text": "pregunta", "rag": True},
+            {"type": "message", "text": "falla", "rag": False},
+        ]}] * 3
+
+        report = run_step(InProcessTarget(chatbot), transcripts, concurrency=2, run_id="t")
+
+        self.assertEqual(len(report.results), 9)
+        self.assertEqual(len(report.messages), 6)
+        self.assertAlmostEqual(report.error_rate, 3 / 9)
+        # Cada reproducción usa su propio historial.
+        user_ids = {call.kwargs["user_id"] for call in chatbot.send_message.call_args_list}
+        self.assertEqual(len(user_ids), 3)
+
+    def test_carga_abierta_no_limita_las_conversaciones_en_curso(self):
+        class SlowTarget:
+            def send(self, message, historial_id):
+                time.sleep(0.2)
+                return TurnResult("message", 0.2, True)
+
+        transcripts = [{"historial_id": f"c{i}", "turns": [{"type": "message", "text": "hola"}]} for i in range(4)]
+        closed = run_step(SlowTarget(), transcripts, concurrency=1, run_id="t")
+        self.assertEqual(closed.peak_in_flight, 1)
+        opened = run_step(SlowTarget(), transcripts, concurrency=1, rate=1000, run_id="t", seed=1)
+        self.assertGreater(opened.peak_in_flight, 1)
+        self.assertLess(opened.duration, closed.duration)
+        # La latencia incluye el retraso respecto al instante previsto.
+        self.assertTrue(all(r.latency >= 0.2 + r.delay for r in opened.results))
+
+    def test_detecta_saturacion(self):
+        reports = [_report(1, 10, 0.2), _report(2, 19, 0.22), _report(4, 20, 0.5)]
+        self.assertEqual(find_saturation(reports), 2)
+        self.assertIsNone(find_saturation(reports[:2]))
+        self.assertEqual(find_saturation([_report(1, 10, 0.2, errors=5)]), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
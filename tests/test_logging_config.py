@@ -0,0 +1,41 @@
+# tests/test_logging_config.py
+
+import json
+import logging
+import queue
+import unittest
+from src.rag.logging_config import JsonFormatter, RateLimitFilter, NonBlockingQueueHandler
+
+
+def _record(msg, *args, level=logging.INFO):
+    return logging.LogRecord("chatbot", level, __file__, 1, msg, args, None)
+
+
+class TestLoggingPipeline(unittest.TestCase):
+
+    def test_rate_limit_por_plantilla(self):
+        """Los mensajes repetidos se limitan por plantilla y las advertencias nunca."""
+        rate_filter = RateLimitFilter(max_per_interval=2, interval=60)
+        allowed = [rate_filter.filter(_record("Mensaje %s", i)) for i in range(5)]
+        self.assertEqual(allowed, [True, True, False, False, False])
+        self.assertTrue(rate_filter.filter(_record("Otro mensaje")))
+        self.assertTrue(rate_filter.filter(_record("Mensaje %s", 9, level=logging.WARNING)))
+
+    def test_formato_json(self):
+        """El formateador JSON aplica los argumentos de forma perezosa."""
+        line = JsonFormatter().format(_record("Cargado %s", "manual.pdf"))
+        payload = json.loads(line)
+        self.assertEqual(payload["message"], "Cargado manual.pdf")
+        self.assertEqual(payload["level"], "INFO")
+
+    def test_cola_llena_no_bloquea(self):
+        """Con la cola llena los registros se descartan en lugar de bloquear."""
+        handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+        handler.handle(_record("uno"))
+        handler.handle(_record("dos"))
+        self.assertEqual(handler.dropped, 1)
+        self.assertEqual(handler.queue.get_nowait().msg, "uno")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+# tests/test_metrics.py
+
+import unittest
+from src.metrics import MetricsRegistry, STAGE_METRIC
+
+
+class TestMetricsRegistry(unittest.TestCase):
+
+    def test_span_y_contadores(self):
+        """Los spans alimentan el histograma de etapas y los contadores se acumulan."""
+        registry = MetricsRegistry(enabled=True)
+        with registry.span("search"):
+            pass
+        registry.inc("chatbot_cache_hits_total", cache="embedding")
+        registry.inc("chatbot_cache_hits_total", 2, cache="embedding")
+
+        snapshot = registry.snapshot()
+        stage = snapshot["histograms"][STAGE_METRIC]['{stage="search"}']
+        self.assertEqual(stage["count"], 1)
+        self.assertEqual(snapshot["counters"]["chatbot_cache_hits_total"]['{cache="embedding"}'], 3)
+
+    def test_resumen_de_etapa_con_varias_series(self):
+        """stage_summary agrega las series de la etapa con cualquier etiqueta."""
+        registry = MetricsRegistry(enabled=True)
+        registry.record_stage("llm_ttft", 0.1, tier="fast")
+        registry.record_stage("llm_ttft", 0.3, tier="large")
+        registry.record_stage("llm_total", 9.0, tier="large")
+
+        summary = registry.stage_summary("llm_ttft")
+        self.assertEqual(summary["count"], 2)
+        self.assertAlmostEqual(summary["mean_ms"], 200.0)
+        self.assertAlmostEqual(summary["p99_ms"], 300.0)
+        self.assertEqual(registry.stage_summary("search"), {})
+
+    def test_formato_prometheus(self):
+        """La exportación incluye TYPE, buckets acumulados, suma y conteo."""
+        registry = MetricsRegistry(enabled=True, buckets=(0.1, 1.0))
+        registry.record_stage("llm_total", 0.5)
+        registry.record_stage("llm_total", 2.0)
+
+        text = registry.render_prometheus()
+        self.assertIn(f"# TYPE {STAGE_METRIC} histogram", text)
+        self.assertIn(f'{STAGE_METRIC}_bucket{{stage="llm_total",le="0.1"}} 0', text)
+        self.assertIn(f'{STAGE_METRIC}_bucket{{stage="llm_total",le="1"}} 1', text)
+        self.assertIn(f'{STAGE_METRIC}_bucket{{stage="llm_total",le="+Inf"}} 2', text)
+        self.assertIn(f'{STAGE_METRIC}_count{{stage="llm_total"}} 2', text)
+
+    def test_deshabilitado_no_registra(self):
+        """Con las métricas deshabilitadas no se registra nada."""
+        registry = MetricsRegistry(enabled=False)
+        with registry.span("trim"):
+            pass
+        registry.inc("chatbot_turns_total")
+        self.assertEqual(registry.render_prometheus(), "\n")
+        self.assertEqual(registry.format_summary(), "No hay métricas registradas")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,162 @@
+# tests/test_mmap_index.py
+
+import os
+import tempfile
+import unittest
+import chromadb
+import numpy as np
+from src.rag.mmap_index import MmapIndexRetriever, MmapVectorIndex, chroma_distance, matches_filter
+from src.rag.retriever import scope_filter
+from src.rag.sharding import relevance_score_fn
+
+
+class _Embeddings:
+    def embed_query(self, text):
+        return [1.0, 0.0, 0.0]
+
+
+class TestMmapVectorIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.writer = MmapVectorIndex(self.tmp.name, refresh_interval=0, max_segments=8)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _publish(self, prefix, vectors, owner=""):
+        n = len(vectors)
+        return self.writer.publish(
+            [f"{prefix}-{i}" for i in range(n)], [f"{prefix} {i}" for i in range(n)],
+            [{"owner": owner, "tenant": "default"} for _ in range(n)], np.asarray(vectors, dtype=np.float32)
+        )
+
+    def test_busqueda_y_segmentos_mmap(self):
+        self._publish("a", [[1, 0, 0], [0, 1, 0]])
+        results = self.writer.search([2, 0.1, 0], k=1)
+        self.assertEqual(results[0][0].page_content, "a 0")
+        self.assertAlmostEqual(results[0][1], 0.9988, places=3)
+        self.assertIsInstance(self.writer.segments[0].vectors, np.memmap)
+
+    def test_lector_ve_segmentos_nuevos_de_forma_atomica(self):
+        """Otro proceso (aquí otra instancia) recoge la nueva generación al refrescar."""
+        self._publish("a", [[0, 1, 0]])
+        reader = MmapVectorIndex(self.tmp.name, refresh_interval=3600)
+        self.assertEqual(reader.count(), 1)
+        self._publish("b", [[1, 0, 0]])
+        self.assertEqual(reader.count(), 1)
+        self.assertTrue(reader.refresh())
+        self.assertEqual(reader.count(), 2)
+        self.assertEqual(reader.search([1, 0, 0], k=1)[0][0].page_content, "b 0")
+
+    def test_compactacion_conserva_resultados(self):
+        for i in range(3):
+            self._publish(f"s{i}", [[1, i, 0]])
+        reader = MmapVectorIndex(self.tmp.name, refresh_interval=0)
+        before = [d.page_content for d, _ in reader.search([1, 0, 0], k=3)]
+        self.writer.compact()
+        self.assertEqual(len(os.listdir(os.path.join(self.tmp.name, "segments"))), 1)
+        self.assertEqual([d.page_content for d, _ in reader.search([1, 0, 0], k=3)], before)
+
+    def test_chunk_republicado_aparece_una_vez(self):
+        self._publish("a", [[1, 0, 0], [0, 1, 0]])
+        self._publish("a", [[1, 0, 0]])
+        self.assertEqual([d.id for d, _ in self.writer.search([1, 0.2, 0], k=2)], ["a-0", "a-1"])
+        self.writer.compact()
+        self.assertEqual(self.writer.count(), 2)
+
+    def test_eliminar_marca_filas_sin_reescribir_segmentos(self):
+        self._publish("a", [[1, 0, 0], [0.9, 0.1, 0]] + [[0, 0, 1]] * 6)
+        self._publish("b", [[0.8, 0.2, 0]])
+        reader = MmapVectorIndex(self.tmp.name, refresh_interval=0)
+        segments = set(os.listdir(os.path.join(self.tmp.name, "segments")))
+
+        self.writer.delete(["a-0"])
+        self.assertEqual(set(os.listdir(os.path.join(self.tmp.name, "segments"))), segments)
+        self.assertEqual([d.id for d, _ in reader.search([1, 0, 0], k=2)], ["a-1", "b-0"])
+        self.assertEqual([d.id for d, _ in reader.search([1, 0, 0], k=2, where=scope_filter(None, "default"))],
+                         ["a-1", "b-0"])
+        self.assertEqual(reader.count(), 8)
+
+        # Una copia publicada después de eliminarla vuelve a estar visible.
+        self._publish("a", [[1, 0, 0]])
+        self.assertEqual([d.id for d, _ in reader.search([1, 0, 0], k=1)], ["a-0"])
+
+        # La compactación descarta las filas eliminadas y vacía la lista.
+        self.writer.delete(["b-0"])
+        self.writer.compact()
+        self.assertEqual(self.writer.read_manifest()["deleted"], {})
+        self.assertEqual([d.id for d, _ in reader.search([1, 0, 0], k=2)], ["a-0", "a-1"])
+        self.assertEqual(reader.count(), 8)
+
+    def test_muchas_eliminaciones_compactan(self):
+        self._publish("a", [[1, 0, 0], [0, 1, 0], [0, 0, 1], [1, 1, 0]])
+        self.writer.delete(["a-0", "a-1"])
+        self.assertEqual(self.writer.read_manifest()["deleted"], {})
+        self.assertEqual(self.writer.count(), 2)
+
+    def test_mascara_de_alcance_equivale_al_filtro(self):
+        rng = np.random.default_rng(0)
+        metadatas = [{"owner": ["", "ana", "luis"][i % 3], "tenant": ["default", "acme"][i % 2], "page": i % 4}
+                     for i in range(60)]
+        metadatas[5].pop("owner")
+        self.writer.publish([f"c{i}" for i in range(60)], [f"t{i}" for i in range(60)], metadatas,
+                            rng.normal(size=(60, 3)).astype(np.float32))
+        filters = [scope_filter("ana", "acme"), scope_filter(None, "default"), {"owner": {"$ne": "ana"}},
+                   {"$or": [{"owner": "luis"}, {"tenant": "acme"}]}, {"$and": [{"tenant": "acme"}, {"page": 2}]}]
+        for where in filters:
+            expected = [i for i, m in enumerate(metadatas) if matches_filter(m, where)]
+            segment = self.writer.segments[0]
+            mask, exact = segment.mask(where)
+            self.assertTrue(set(expected) <= set(np.flatnonzero(mask)))
+            if exact:
+                self.assertEqual(list(np.flatnonzero(mask)), expected)
+            found = self.writer.search([1, 0, 0], k=60, where=where)
+            self.assertEqual(sorted(int(d.id[1:]) for d, _ in found), expected)
+
+        # Segmentos escritos sin columnas de alcance: se calculan al abrirlos.
+        directory = os.path.join(self.tmp.name, "segments", segment.name)
+        for name in os.listdir(directory):
+            if name.startswith(("owner_", "tenant_")):
+                os.remove(os.path.join(directory, name))
+        reader = MmapVectorIndex(self.tmp.name, refresh_interval=0)
+        found = reader.search([1, 0, 0], k=60, where=scope_filter("ana", "acme"))
+        self.assertEqual(sorted(int(d.id[1:]) for d, _ in found),
+                         [i for i, m in enumerate(metadatas) if matches_filter(m, scope_filter("ana", "acme"))])
+
+    def test_retriever_con_filtro_de_alcance(self):
+        self._publish("ana", [[1, 0, 0]], owner="ana")
+        self._publish("comun", [[0.9, 0.1, 0]])
+        retriever = MmapIndexRetriever(index=self.writer, embeddings=_Embeddings(), k=2)
+        docs = retriever.invoke("consulta", filter=scope_filter("luis", "default"))
+        self.assertEqual([d.page_content for d in docs], ["comun 0"])
+        self.assertTrue(matches_filter({"owner": "ana", "tenant": "default"}, scope_filter("ana", "default")))
+
+    def test_relevancia_igual_que_en_chroma(self):
+        vectors = np.random.default_rng(1).normal(size=(20, 3)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        ids = [f"v{i}" for i in range(20)]
+        self.writer.publish(ids, ids, [{} for _ in ids], vectors)
+        query = vectors[0] * 0.7 + vectors[1] * 0.3
+        query /= np.linalg.norm(query)
+        mmap = {d.id: score for d, score in self.writer.search(query, k=20)}
+        for space in ("l2", "cosine", "ip"):
+            collection = chromadb.EphemeralClient().get_or_create_collection(f"relevancia_{space}",
+                                                                             metadata={"hnsw:space": space})
+            collection.add(ids=ids, embeddings=vectors.tolist())
+            result = collection.query(query_embeddings=[query.tolist()], n_results=20, include=["distances"])
+            relevance = relevance_score_fn(space)
+            for chunk_id, distance in zip(result["ids"][0], result["distances"][0]):
+                self.assertAlmostEqual(relevance(chroma_distance(mmap[chunk_id], space)), relevance(distance),
+                                       places=4)
+
+        # Con l2 (espacio por defecto) un umbral de 0.5 no equivale a similitud 0.5.
+        retriever = MmapIndexRetriever(index=self.writer, embeddings=_Embeddings(), k=20, score_threshold=0.5)
+        similarities = [score for _, score in self.writer.search([1.0, 0.0, 0.0], k=20)]
+        expected = sum(relevance_score_fn("l2")(2 - 2 * s) >= 0.5 for s in similarities)
+        self.assertEqual(len(retriever.invoke("consulta")), expected)
+        self.assertNotEqual(expected, sum(s >= 0.5 for s in similarities))
+
+
+if __name__ == "__main__":
+    unittest.main()
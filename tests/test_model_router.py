@@ -0,0 +1,102 @@
+# tests/test_model_router.py
+
+import unittest
+from unittest.mock import patch
+from langchain_core.documents import Document
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.runnables import RunnableLambda
+from src.metrics import metrics
+from src.model_router import ModelRouter, ModelTier, QueryClassifier
+
+COMPLEJAS = {"compara", "analiza", "explica", "informe", "riesgos", "detallado"}
+
+
+class StubEmbeddings:
+    """Embeddings de dos dimensiones: palabras de consultas complejas frente al resto."""
+    def __init__(self):
+        self.queries = []
+
+    def _vector(self, text):
+        words = text.lower().replace("?", "").replace("¿", "").split()
+        complex_words = sum(w in COMPLEJAS for w in words)
+        return [float(complex_words), float(len(words) - complex_words) + 0.1]
+
+    def embed_documents(self, texts):
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        self.queries.append(text)
+        return self._vector(text)
+
+
+def _router(classifier=True):
+    embeddings = StubEmbeddings()
+    examples = {"fast": ["hola", "gracias"], "large": ["compara y analiza", "informe detallado"]}
+    return ModelRouter(
+        fast=ModelTier("fast", "modelo-rapido", 256), large=ModelTier("large", "modelo-grande", 1024),
+        classifier=QueryClassifier(embeddings, examples) if classifier else None,
+        long_query_tokens=40, deep_conversation=6, threshold=1.5
+    ), embeddings
+
+
+class TestModelRouter(unittest.TestCase):
+
+    def test_consulta_trivial_al_modelo_rapido(self):
+        router, _ = _router()
+        decision = router.route("hola, gracias", [Document(page_content="x")], depth=1)
+        self.assertEqual((decision.tier.name, decision.tier.max_tokens), ("fast", 256))
+
+    def test_consulta_compleja_con_contexto_al_modelo_grande(self):
+        router, embeddings = _router()
+        decision = router.route("compara y analiza los riesgos", [Document(page_content="x")], depth=1)
+        self.assertEqual(decision.tier.name, "large")
+        self.assertGreater(decision.signals["classifier"], 0.9)
+        self.assertEqual(embeddings.queries, ["compara y analiza los riesgos"])
+
+    def test_senales_sin_clasificador(self):
+        router, _ = _router(classifier=False)
+        largo = "necesito saber " + "qué dice el manual sobre las vacaciones " * 5
+        self.assertEqual(router.route(largo, [], depth=1).tier.name, "fast")
+        self.assertEqual(router.route(largo, [Document(page_content="x")], depth=1).tier.name, "large")
+        self.assertEqual(router.route("¿y eso?", [Document(page_content="x")], depth=8).tier.name, "fast")
+
+
+@patch("src.langgraph_service.ChatAnthropic")
+class TestRoutingEnLangGraph(unittest.TestCase):
+
+    def test_cada_turno_usa_el_modelo_elegido(self, _mock_llm):
+        from src.langgraph_service import LangGraphService
+
+        router, _ = _router()
+        retriever = RunnableLambda(lambda query: [Document(page_content="Manual de vacaciones")])
+        service = LangGraphService(api_key="test", model="claude-3-haiku-20240307",
+                                   chat_history=None, retriever=retriever, router=router)
+        service.summary_enabled = False
+        service._tier_llms = {"fast": FakeListChatModel(responses=["rápida"]),
+                              "large": FakeListChatModel(responses=["detallada"])}
+        was_enabled = metrics.enabled
+        metrics.enabled = True
+        metrics.reset()
+        try:
+            self.assertEqual(service.send_message("hola", "hilo"), "rápida")
+            self.assertEqual(service.send_message("explica y compara los riesgos del informe", "hilo"), "detallada")
+            snapshot = metrics.snapshot()
+        finally:
+            metrics.enabled = was_enabled
+        self.assertEqual(snapshot["counters"]["chatbot_route_total"], {'{tier="fast"}': 1, '{tier="large"}': 1})
+        # La latencia del LLM se registra por nivel.
+        stages = snapshot["histograms"]["chatbot_stage_duration_seconds"]
+        self.assertIn('{stage="llm_total",tier="large"}', stages)
+
+    def test_clientes_de_cada_nivel_creados_al_inicio(self, _mock_llm):
+        from src.langgraph_service import LangGraphService
+
+        router, _ = _router()
+        service = LangGraphService(api_key="test", model="claude-3-haiku-20240307",
+                                   chat_history=None, retriever=None, router=router)
+        self.assertEqual(set(service._tier_llms), {"fast", "large"})
+        self.assertEqual(len(service.llm_clients()), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+# tests/test_profiling.py
+
+import os
+import tempfile
+import unittest
+from src.profiling import RequestProfiler
+
+
+class TestRequestProfiler(unittest.TestCase):
+
+    def test_escribe_artefactos_por_peticion(self):
+        """Cada llamada perfilada deja un .prof y un resumen .txt con CPU y memoria."""
+        with tempfile.TemporaryDirectory() as tmp:
+            profiler = RequestProfiler(enabled=True, sample_rate=1.0, output_dir=tmp, memory=True)
+
+            @profiler.profile("trabajo")
+            def trabajo(n):
+                return sum(len(str(i)) for i in range(n))
+
+            self.assertEqual(trabajo(1000), trabajo.__wrapped__(1000))
+            files = sorted(os.listdir(tmp))
+            self.assertEqual(len([f for f in files if f.endswith(".prof")]), 1)
+            summary = [f for f in files if f.endswith(".txt")][0]
+            with open(os.path.join(tmp, summary), encoding="utf-8") as f:
+                content = f.read()
+            self.assertIn("trabajo", content)
+            self.assertIn("Memoria: pico", content)
+
+    def test_muestreo_cero_no_perfila(self):
+        """Con sample_rate=0 la función se ejecuta sin generar artefactos."""
+        with tempfile.TemporaryDirectory() as tmp:
+            profiler = RequestProfiler(enabled=True, sample_rate=0.0, output_dir=tmp)
+
+            @profiler.profile("trabajo")
+            def trabajo():
+                return 42
+
+            self.assertEqual(trabajo(), 42)
+            self.assertEqual(os.listdir(tmp), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+# tests/test_prompt_cache.py
+
+import json
+import os
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.runnables import RunnableLambda
+from src.metrics import metrics
+from src.prompt_builder import PromptBuilder
+
+
+class _MockAnthropicHandler(BaseHTTPRequestHandler):
+    """Simula el endpoint /v1/messages de Anthropic en modo streaming (SSE)."""
+    requests = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        _MockAnthropicHandler.requests.append(body)
+        usage = {"input_tokens": 12, "output_tokens": 1,
+                 "cache_read_input_tokens": 2048, "cache_creation_input_tokens": 512}
+        events = [
+            ("message_start", {"type": "message_start", "message": {
+                "id": "msg_1", "type": "message", "role": "assistant", "model": body["model"],
+                "content": [], "stop_reason": None, "stop_sequence": None, "usage": usage}}),
+            ("content_block_start", {"type": "content_block_start", "index": 0,
+                                     "content_block": {"type": "text", "text": ""}}),
+            ("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                     "delta": {"type": "text_delta", "text": "Respuesta cacheada"}}),
+            ("content_block_stop", {"type": "content_block_stop", "index": 0}),
+            ("message_delta", {"type": "message_delta", "delta": {"stop_reason": "end_turn"},
+                               "usage": {"output_tokens": 3}}),
+            ("message_stop", {"type": "message_stop"}),
+        ]
+        payload = "".join(f"event: {name}\ndata: {json.dumps(data)}\n\n" for name, data in events)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        self.wfile.write(payload.encode("utf-8"))
+
+    def log_message(self, *args):
+        pass
+
+
+class TestPromptBuilder(unittest.TestCase):
+
+    def test_orden_y_puntos_de_cache(self):
+        """El prefijo estable va primero y el contexto, junto a la pregunta actual."""
+        docs = [Document(page_content="B", metadata={"source": "b.txt"}),
+                Document(page_content="A", metadata={"source": "a.txt"})]
+        history = [HumanMessage(content="hola"), AIMessage(content="qué tal"), HumanMessage(content="¿y el manual?")]
+        prompt = PromptBuilder().build(history, summary="resumen", context_docs=docs)
+
+        system = prompt[0]
+        self.assertIsInstance(system, SystemMessage)
+        self.assertEqual(len(system.content), 2)
+        self.assertTrue(all("cache_control" in block for block in system.content))
+        self.assertIn("resumen", system.content[1]["text"])
+        self.assertIn("cache_control", prompt[-2].content[-1])
+        context, question = prompt[-1].content
+        # El contexto se serializa de forma determinista, independiente del ranking.
+        self.assertTrue(context["text"].endswith("A\nB"))
+        self.assertNotIn("cache_control", context)
+        self.assertEqual(question, {"type": "text", "text": "¿y el manual?"})
+        # El historial original no se modifica.
+        self.assertEqual(history[1].content, "qué tal")
+        self.assertEqual(history[2].content, "¿y el manual?")
+
+    def test_contexto_cacheado_solo_si_se_reutiliza(self):
+        builder = PromptBuilder()
+        docs = [Document(page_content="Manual", metadata={"source": "m.txt"})]
+        first = builder.build([HumanMessage(content="¿qué dice?")], context_docs=docs)
+        again = builder.build([HumanMessage(content="¿y el anexo?")], context_docs=docs)
+        other = builder.build([HumanMessage(content="¿y el anexo?")],
+                              context_docs=[Document(page_content="Otro", metadata={"source": "o.txt"})])
+        self.assertNotIn("cache_control", first[-1].content[0])
+        self.assertIn("cache_control", again[-1].content[0])
+        self.assertNotIn("cache_control", other[-1].content[0])
+
+    def test_cache_deshabilitada(self):
+        prompt = PromptBuilder(cache_enabled=False).build([HumanMessage(content="hola")])
+        self.assertNotIn("cache_control", prompt[0].content[0])
+
+
+class TestPromptCacheAgainstMockAPI(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _MockAnthropicHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def test_peticion_cacheable_y_metricas(self):
+        """La petición enviada marca el prefijo y se registran los tokens de caché."""
+        from src.langgraph_service import LangGraphService
+
+        url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        retriever = RunnableLambda(lambda query: [Document(page_content="Política de seguridad")])
+        with patch.dict(os.environ, {"ANTHROPIC_API_URL": url}):
+            service = LangGraphService(api_key="test", model="claude-3-haiku-20240307",
+                                       chat_history=None, retriever=retriever)
+        service.summary_enabled = False
+        was_enabled = metrics.enabled
+        metrics.enabled = True
+        before = metrics.snapshot()["counters"].get("chatbot_llm_tokens_total", {})
+        try:
+            response = service.send_message("¿Qué dice el manual?", "historial_cache")
+        finally:
+            metrics.enabled = was_enabled
+        after = metrics.snapshot()["counters"]["chatbot_llm_tokens_total"]
+
+        self.assertEqual(response, "Respuesta cacheada")
+        request = _MockAnthropicHandler.requests[-1]
+        self.assertEqual(request["system"][0]["cache_control"], {"type": "ephemeral"})
+        self.assertEqual(len(request["system"]), 1)
+        context, question = request["messages"][-1]["content"]
+        self.assertIn("Política de seguridad", context["text"])
+        self.assertEqual(question["text"], "¿Qué dice el manual?")
+        key = '{type="cache_read"}'
+        self.assertEqual(after[key] - before.get(key, 0), 2048)
+        key = '{type="cache_write"}'
+        self.assertEqual(after[key] - before.get(key, 0), 512)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+# tests/test_scoping.py
+
+import os
+import tempfile
+import unittest
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from src.rag.retriever import scope_filter, scope_metadata
+from src.user_manager import GestorUsuarios
+
+
+class _ConstantEmbeddings(Embeddings):
+    """Todos los textos a la misma distancia: el resultado depende solo del filtro."""
+
+    def embed_documents(self, texts):
+        return [[1.0, 0.0, 0.0] for _ in texts]
+
+    def embed_query(self, text):
+        return [1.0, 0.0, 0.0]
+
+
+class TestDocumentScoping(unittest.TestCase):
+
+    def setUp(self):
+        self.store = Chroma(collection_name="test_scoping", embedding_function=_ConstantEmbeddings())
+        docs = [
+            ("privado de ana", "ana", "acme"),
+            ("privado de luis", "luis", "acme"),
+            ("compartido en acme", None, "acme"),
+            ("compartido en otro tenant", None, "globex"),
+        ]
+        self.store.add_documents([
+            Document(page_content=text, metadata={"source": "doc.txt", **scope_metadata("doc.txt", owner, tenant)})
+            for text, owner, tenant in docs
+        ])
+
+    def tearDown(self):
+        self.store.delete_collection()
+
+    def _buscar(self, owner, tenant):
+        retriever = self.store.as_retriever(search_kwargs={"k": 10})
+        return sorted(d.page_content for d in retriever.invoke("consulta", filter=scope_filter(owner, tenant)))
+
+    def test_usuario_ve_lo_suyo_y_lo_compartido(self):
+        self.assertEqual(self._buscar("ana", "acme"), ["compartido en acme", "privado de ana"])
+
+    def test_sin_usuario_solo_compartidos(self):
+        self.assertEqual(self._buscar(None, "acme"), ["compartido en acme"])
+        self.assertEqual(self._buscar(None, "globex"), ["compartido en otro tenant"])
+
+    def test_metadatos_de_ingesta(self):
+        meta = scope_metadata("docs/Manual.PDF", owner=None, tenant="acme")
+        self.assertEqual(meta, {"owner": "", "tenant": "acme", "doc_type": "pdf"})
+
+
+class TestPropietarioHistorial(unittest.TestCase):
+
+    def test_obtener_propietario(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            gestor = GestorUsuarios(os.path.join(tmp, "usuarios.json"))
+            historial_id = gestor.registrar_usuario("ana", tenant="acme")
+            self.assertEqual(gestor.obtener_propietario(historial_id), ("ana", "acme"))
+            self.assertIsNone(gestor.obtener_propietario("historial_inexistente"))
+            gestor.cerrar()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,174 @@
+# tests/test_sharding.py
+
+import os
+import time
+import tempfile
+import unittest
+import chromadb
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from src.config import GlobalConfig
+from src.metrics import metrics
+from src.rag.sharding import ShardedCollection, ShardedRetriever
+from src.rag.vector_store import VectorStore
+
+
+class _SlowCollection:
+    """Colección que tarda en responder a las búsquedas."""
+    def __init__(self, collection, delay):
+        self.collection = collection
+        self.delay = delay
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    def query(self, **kwargs):
+        time.sleep(self.delay)
+        return self.collection.query(**kwargs)
+
+
+def _rows(count, dim=8, seed=0):
+    rng = np.random.default_rng(seed)
+    ids = [f"c{i}" for i in range(count)]
+    metadatas = [{"source": f"doc{i % 5}.txt", "tenant": "default"} for i in range(count)]
+    return ids, rng.normal(size=(count, dim)).tolist(), [f"texto {i}" for i in range(count)], metadatas
+
+
+class TestShardedCollection(unittest.TestCase):
+
+    def setUp(self):
+        self.client = chromadb.EphemeralClient()
+        self.names = [f"shard_test_{i}" for i in range(3)] + ["shard_test_unica"]
+        self.parts = [self.client.get_or_create_collection(n, metadata={"hnsw:space": "l2"}) for n in self.names[:3]]
+        self.single = self.client.get_or_create_collection(self.names[3], metadata={"hnsw:space": "l2"})
+        self.ids, self.vectors, self.texts, self.metadatas = _rows(60)
+        self.single.add(ids=self.ids, embeddings=self.vectors, documents=self.texts, metadatas=self.metadatas)
+
+    def tearDown(self):
+        for name in self.names:
+            self.client.delete_collection(name)
+
+    def test_reparte_y_fusiona_como_una_coleccion(self):
+        sharded = ShardedCollection(self.parts)
+        sharded.upsert(ids=self.ids, embeddings=self.vectors, documents=self.texts, metadatas=self.metadatas)
+        self.assertEqual(sharded.count(), 60)
+        self.assertTrue(all(count > 0 for count in sharded.counts()))
+
+        queries = _rows(3, seed=1)[1]
+        expected = self.single.query(query_embeddings=queries, n_results=5, where={"tenant": "default"})
+        merged = sharded.query(query_embeddings=queries, n_results=5, where={"tenant": "default"})
+        self.assertEqual(merged["ids"], expected["ids"])
+        np.testing.assert_allclose(merged["distances"], expected["distances"], rtol=1e-4)
+
+        pages = [sharded.get(limit=25, offset=offset)["ids"] for offset in (0, 25, 50)]
+        self.assertEqual([len(p) for p in pages], [25, 25, 10])
+        self.assertEqual(sorted(sum(pages, [])), sorted(self.ids))
+        self.assertEqual(sorted(sharded.get(ids=["c1", "c2", "c40"])["ids"]), ["c1", "c2", "c40"])
+        sharded.delete(["c1", "c2"])
+        self.assertEqual(sharded.count(), 58)
+
+    def test_reparto_por_documento(self):
+        sharded = ShardedCollection(self.parts, routing="source")
+        sharded.upsert(ids=self.ids, embeddings=self.vectors, documents=self.texts, metadatas=self.metadatas)
+        for collection in self.parts:
+            sources = {m["source"] for m in collection.get(include=["metadatas"])["metadatas"]}
+            for other in self.parts:
+                if other is not collection:
+                    others = {m["source"] for m in other.get(include=["metadatas"])["metadatas"]}
+                    self.assertFalse(sources & others)
+
+    def test_shard_lento_da_resultados_parciales(self):
+        ShardedCollection(self.parts).upsert(ids=self.ids, embeddings=self.vectors, documents=self.texts,
+                                             metadatas=self.metadatas)
+        slow = _SlowCollection(self.parts[1], delay=0.5)
+        sharded = ShardedCollection([self.parts[0], slow, self.parts[2]], timeout=0.1)
+        was_enabled = metrics.enabled
+        metrics.enabled = True
+        metrics.reset()
+        try:
+            result = sharded.query(query_embeddings=_rows(1, seed=2)[1], n_results=60)
+            failures = metrics.snapshot()["counters"]["chatbot_shard_failures_total"]
+        finally:
+            metrics.enabled = was_enabled
+        self.assertEqual(len(result["ids"][0]), self.parts[0].count() + self.parts[2].count())
+        self.assertEqual(failures, {'{reason="timeout",shard="1"}': 1})
+
+        with self.assertRaises(TimeoutError):
+            ShardedCollection([slow], timeout=0.1).query(query_embeddings=_rows(1)[1], n_results=1)
+
+    def test_shard_ocupado_se_omite_sin_agotar_el_pool(self):
+        ShardedCollection(self.parts).upsert(ids=self.ids, embeddings=self.vectors, documents=self.texts,
+                                             metadatas=self.metadatas)
+        slow = _SlowCollection(self.parts[1], delay=0.5)
+        sharded = ShardedCollection([self.parts[0], slow, self.parts[2]], timeout=0.05, max_inflight=1)
+        was_enabled = metrics.enabled
+        metrics.enabled = True
+        metrics.reset()
+        try:
+            query = _rows(1, seed=2)[1]
+            sharded.query(query_embeddings=query, n_results=60)
+            # La búsqueda anterior sigue en curso en el shard lento: no se lanza otra.
+            started = time.perf_counter()
+            result = sharded.query(query_embeddings=query, n_results=60)
+            elapsed = time.perf_counter() - started
+            failures = metrics.snapshot()["counters"]["chatbot_shard_failures_total"]
+        finally:
+            metrics.enabled = was_enabled
+        self.assertLess(elapsed, 0.4)
+        self.assertEqual(len(result["ids"][0]), self.parts[0].count() + self.parts[2].count())
+        self.assertEqual(failures, {'{reason="timeout",shard="1"}': 1, '{reason="busy",shard="1"}': 1})
+
+    def test_paginar_con_filtro(self):
+        sharded = ShardedCollection(self.parts)
+        sharded.upsert(ids=self.ids, embeddings=self.vectors, documents=self.texts, metadatas=self.metadatas)
+        where = {"source": "doc1.txt"}
+        pages = [sharded.get(where=where, limit=5, offset=offset, include=[])["ids"] for offset in (0, 5, 10)]
+        self.assertEqual([len(p) for p in pages], [5, 5, 2])
+        self.assertEqual(sorted(sum(pages, [])), sorted(self.single.get(where=where, include=[])["ids"]))
+
+
+class TestVectorStoreShards(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.embeddings = DeterministicFakeEmbedding(size=8)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _store(self, shards):
+        config = GlobalConfig().model_copy(update={
+            "CHROMA_PERSIST_DIRECTORY": self.tmp.name, "CHROMA_COLLECTION_NAME": "shards",
+            "SNAPSHOT_RESTORE_PATH": "", "VECTOR_SHARDS": shards
+        })
+        return VectorStore(config, self.embeddings)
+
+    def test_reducir_shards_y_rebalancear(self):
+        store = self._store(3)
+        docs = [Document(page_content=f"fragmento número {i}", metadata={"source": f"d{i}.txt"}) for i in range(30)]
+        ids = store.add_documents(docs)
+        self.assertEqual(sum(store.get_collection_stats()["shards"].values()), 30)
+
+        # Con menos shards los sobrantes se siguen leyendo hasta rebalancear.
+        store = self._store(2)
+        self.assertEqual(store.shard_ids, [0, 1, 2])
+        retriever = ShardedRetriever(collection=store.collection, embeddings=self.embeddings, k=1)
+        self.assertEqual(retriever.invoke("fragmento número 7")[0].page_content, "fragmento número 7")
+
+        plan = store.rebalance(dry_run=True)
+        self.assertEqual(store.collection.count(), 30)
+        result = store.rebalance(page_size=7)
+        self.assertEqual(result["moved"], plan["moved"])
+        self.assertEqual(result["removed"], [2])
+        self.assertFalse(os.path.exists(os.path.join(self.tmp.name, "shard-2")))
+        self.assertEqual(store.rebalance()["moved"], {0: 0, 1: 0})
+        self.assertEqual(sorted(store.collection.get(include=[])["ids"]), sorted(ids))
+
+        store = self._store(2)
+        self.assertEqual(store.shard_ids, [0, 1])
+        self.assertEqual(store.collection.count(), 30)
+
+
+if __name__ == "__main__":
+    unittest.main()
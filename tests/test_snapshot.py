@@ -0,0 +1,68 @@
+# tests/test_snapshot.py
+
+import os
+import tempfile
+import unittest
+import chromadb
+import numpy as np
+from src.rag.snapshot import export_snapshot, import_snapshot, read_snapshot
+
+
+class TestVectorSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.client = chromadb.EphemeralClient()
+        self.source = self.client.get_or_create_collection("snapshot_origen")
+        rng = np.random.default_rng(0)
+        self.vectors = rng.normal(size=(50, 16)).astype(np.float32)
+        self.source.add(
+            ids=[f"id-{i}" for i in range(50)],
+            embeddings=self.vectors,
+            documents=[f"texto número {i} con ñ" for i in range(50)],
+            metadatas=[{"source": "a.txt", "page": i, "owner": ""} for i in range(50)],
+        )
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "snapshot.npz")
+
+    def tearDown(self):
+        for name in ("snapshot_origen", "snapshot_destino"):
+            try:
+                self.client.delete_collection(name)
+            except Exception:
+                pass
+        self.tmp.cleanup()
+
+    def _roundtrip(self, quantization):
+        manifest = export_snapshot(self.source, self.path, quantization=quantization,
+                                   embedding_model="modelo", page_size=20)
+        self.assertEqual((manifest["count"], manifest["dimension"]), (50, 16))
+        target = self.client.get_or_create_collection("snapshot_destino")
+        self.assertEqual(import_snapshot(target, self.path, expected_model="modelo", batch_size=7), 50)
+        restored = target.get(ids=["id-3"], include=["embeddings", "documents", "metadatas"])
+        self.assertEqual(restored["documents"], ["texto número 3 con ñ"])
+        self.assertEqual(restored["metadatas"][0]["page"], 3)
+        return np.asarray(restored["embeddings"][0])
+
+    def test_roundtrip_sin_perdida(self):
+        np.testing.assert_allclose(self._roundtrip("none"), self.vectors[3], rtol=1e-6)
+
+    def test_roundtrip_int8(self):
+        vector = self._roundtrip("int8")
+        cosine = vector @ self.vectors[3] / (np.linalg.norm(vector) * np.linalg.norm(self.vectors[3]))
+        self.assertGreater(cosine, 0.999)
+
+    def test_checksum_y_modelo(self):
+        export_snapshot(self.source, self.path, embedding_model="modelo")
+        with self.assertRaises(ValueError):
+            read_snapshot(self.path, expected_model="otro-modelo")
+
+        with np.load(self.path) as data:
+            arrays = {name: data[name].copy() for name in data.files}
+        arrays["texts"][0] ^= 1
+        np.savez(self.path, **arrays)
+        with self.assertRaisesRegex(ValueError, "texts"):
+            read_snapshot(self.path)
+
+
+if __name__ == "__main__":
+    unittest.main()
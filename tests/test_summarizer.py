@@ -0,0 +1,46 @@
+# tests/test_summarizer.py
+
+import unittest
+from unittest.mock import MagicMock
+from langchain_core.messages import HumanMessage, AIMessage
+from src.summarizer import ConversationSummarizer
+
+
+def _conversation(turns):
+    messages = []
+    for i in range(turns):
+        messages.append(HumanMessage(content=f"pregunta {i}"))
+        messages.append(AIMessage(content=f"respuesta {i}"))
+    return messages
+
+
+class TestConversationSummarizer(unittest.TestCase):
+
+    def test_umbral_y_division(self):
+        """Se compacta al superar el umbral y lo conservado empieza en un turno humano."""
+        summarizer = ConversationSummarizer(MagicMock(), trigger_messages=6, keep_messages=3)
+        messages = _conversation(4)
+        self.assertTrue(summarizer.should_compact(messages))
+        self.assertFalse(summarizer.should_compact(messages[:6]))
+
+        to_fold, kept = summarizer.split(messages)
+        self.assertEqual(len(to_fold) + len(kept), len(messages))
+        self.assertIsInstance(kept[0], HumanMessage)
+        self.assertLessEqual(len(kept), 3)
+
+    def test_resumen_acumulativo(self):
+        """El nuevo resumen se construye a partir del resumen previo y los mensajes plegados."""
+        llm = MagicMock()
+        llm.invoke.return_value = AIMessage(content="  resumen nuevo  ")
+        summarizer = ConversationSummarizer(llm)
+
+        summary = summarizer.summarize("resumen previo", _conversation(1))
+        self.assertEqual(summary, "resumen nuevo")
+        prompt = llm.invoke.call_args[0][0][-1].content
+        self.assertIn("resumen previo", prompt)
+        self.assertIn("Usuario: pregunta 0", prompt)
+        self.assertIn("Asistente: respuesta 0", prompt)
+
+
+if __name__ == "__main__":
+    unittest.main()
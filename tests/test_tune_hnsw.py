@@ -0,0 +1,103 @@
+# tests/test_tune_hnsw.py
+
+import tempfile
+import unittest
+import numpy as np
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from src.config import GlobalConfig
+from src.rag.sharding import ShardedCollection, ShardedRetriever
+from src.rag.vector_store import VectorStore
+from src.tools.tune_hnsw import (
+    TrialResult, exact_neighbors, recall_at_k, recommend, run_trials, split_queries, synthetic_vectors
+)
+
+
+class _FixedQuery:
+    def embed_query(self, text):
+        return [1.0, 0.1] + [0.0] * 6
+
+
+def _trial(M, search_ef, recall, p95, memory=None):
+    return TrialResult(M=M, construction_ef=100, search_ef=search_ef, recall=recall, p50=p95 / 2, p95=p95,
+                       build_seconds=1.0, memory_bytes=memory or M * 1000)
+
+
+class TestTuneHnsw(unittest.TestCase):
+
+    def test_vecinos_exactos_por_espacio(self):
+        corpus = np.array([[1.0, 0.0], [10.0, 1.0], [0.0, 2.0]], dtype=np.float32)
+        query = np.array([[1.0, 0.2]], dtype=np.float32)
+        self.assertEqual(exact_neighbors(corpus, query, 2, "l2").tolist(), [[0, 2]])
+        self.assertEqual(exact_neighbors(corpus, query, 2, "cosine").tolist(), [[1, 0]])
+        self.assertEqual(exact_neighbors(corpus, query, 3, "ip").tolist(), [[1, 0, 2]])
+        with self.assertRaises(ValueError):
+            exact_neighbors(corpus, query, 1, "manhattan")
+
+    def test_recall_at_k(self):
+        self.assertEqual(recall_at_k([[1, 2, 3, 4], [5, 6, 7, 8]], [[1, 2, 3, 9], [5, 6, 7, 8]], 4), 0.875)
+        self.assertEqual(recall_at_k([], [], 4), 0.0)
+
+    def test_recomienda_la_combinacion_mas_barata_que_alcanza_el_recall(self):
+        results = [_trial(8, 10, 0.80, 0.0010), _trial(8, 40, 0.96, 0.0012), _trial(16, 40, 0.99, 0.0011),
+                   _trial(16, 160, 1.00, 0.0020)]
+        # 8/40 y 16/40 empatan en latencia (<20%): gana la de menos memoria.
+        self.assertEqual((recommend(results, 0.95).M, recommend(results, 0.95).search_ef), (8, 40))
+        self.assertEqual(recommend(results, 0.95, latency_tolerance=0.0).M, 16)
+        self.assertEqual(recommend(results, 0.995).search_ef, 160)
+        self.assertIsNone(recommend(results, 1.01))
+
+    def test_search_ef_mayor_mejora_el_recall(self):
+        corpus, queries = split_queries(synthetic_vectors(3000, 32, clusters=5), 100)
+        results = run_trials(corpus, queries, k=10, space="cosine", ms=[4], construction_efs=[10],
+                             search_efs=[10, 400])
+        self.assertEqual([r.search_ef for r in results], [10, 400])
+        self.assertLess(results[0].recall, results[1].recall)
+        self.assertTrue(all(r.memory_bytes > 0 and r.p95 > 0 for r in results))
+
+
+class TestHnswConfig(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.embeddings = DeterministicFakeEmbedding(size=8)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _store(self, **hnsw):
+        config = GlobalConfig().model_copy(update={
+            "CHROMA_PERSIST_DIRECTORY": self.tmp.name, "CHROMA_COLLECTION_NAME": "hnsw",
+            "SNAPSHOT_RESTORE_PATH": "", "VECTOR_SHARDS": 1, **hnsw
+        })
+        return VectorStore(config, self.embeddings)
+
+    def test_parametros_de_construccion_y_search_ef(self):
+        store = self._store(HNSW_SPACE="cosine", HNSW_M=8, HNSW_CONSTRUCTION_EF=50, HNSW_SEARCH_EF=20)
+        hnsw = store.collection.configuration["hnsw"]
+        self.assertEqual((hnsw["space"], hnsw["max_neighbors"], hnsw["ef_construction"], hnsw["ef_search"]),
+                         ("cosine", 8, 50, 20))
+
+        # En una colección existente solo cambia search_ef; el resto se avisa.
+        with self.assertLogs("chatbot", level="WARNING") as logs:
+            store = self._store(HNSW_SPACE="cosine", HNSW_M=32, HNSW_CONSTRUCTION_EF=50, HNSW_SEARCH_EF=80)
+        hnsw = store.collection.configuration["hnsw"]
+        self.assertEqual((hnsw["max_neighbors"], hnsw["ef_search"]), (8, 80))
+        self.assertIn("solo se aplica a colecciones nuevas", logs.output[0])
+
+    def test_umbral_de_relevancia_en_shards(self):
+        store = self._store(HNSW_SPACE="cosine")
+        collection = ShardedCollection([store.collection])
+        collection.upsert(ids=["a", "b"], embeddings=[[1.0] + [0.0] * 7, [0.0] * 7 + [1.0]],
+                          documents=["cerca", "lejos"], metadatas=[{"source": "a"}, {"source": "b"}])
+        retriever = ShardedRetriever(collection=collection, embeddings=_FixedQuery(), k=2,
+                                     relevance_score_fn=lambda distance: 1.0 - distance)
+        self.assertEqual(len(retriever.invoke("x")), 2)
+        retriever.score_threshold = 0.5
+        self.assertEqual([d.page_content for d in retriever.invoke("x")], ["cerca"])
+        # Sin función explícita se usa la de Chroma para el espacio de la colección.
+        retriever.relevance_score_fn = None
+        self.assertEqual([d.page_content for d in retriever.invoke("x")], ["cerca"])
+
+
+if __name__ == "__main__":
+    unittest.main()
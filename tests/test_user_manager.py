@@ -0,0 +1,55 @@
+# tests/test_user_manager.py
+
+import json
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from src.user_manager import GestorUsuarios
+
+
+class TestGestorUsuarios(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.archivo = os.path.join(self.tmp.name, "usuarios.json")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_migracion_desde_json(self):
+        """Los usuarios del JSON anterior se migran y los ids nuevos no colisionan."""
+        with open(self.archivo, "w", encoding="utf-8") as f:
+            json.dump({"usuarios": {"ana": "historial_3", "luis": "historial_4"}, "contador": 4}, f)
+
+        gestor = GestorUsuarios(self.archivo)
+        self.assertEqual(gestor.obtener_historial("ana"), "historial_3")
+        self.assertEqual(len(gestor.usuarios), 2)
+        self.assertEqual(gestor.registrar_usuario("eva"), "historial_5")
+        gestor.cerrar()
+
+        # Reabrir no vuelve a migrar ni pierde registros.
+        gestor = GestorUsuarios(self.archivo)
+        self.assertEqual(gestor.listar_usuarios(), ["ana", "eva", "luis"])
+        self.assertEqual(gestor.listar_usuarios(limite=1, desde="ana"), ["eva"])
+        gestor.cerrar()
+
+    def test_ids_unicos_entre_instancias(self):
+        """Dos gestores sobre la misma base de datos (como dos workers) no repiten ids."""
+        gestor_a = GestorUsuarios(self.archivo)
+        gestor_b = GestorUsuarios(self.archivo)
+        nombres = [f"usuario{i}" for i in range(40)]
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            ids = list(pool.map(
+                lambda par: (gestor_a if par[0] % 2 else gestor_b).registrar_usuario(par[1]),
+                enumerate(nombres)
+            ))
+        self.assertEqual(len(set(ids)), len(nombres))
+        self.assertEqual(len(gestor_a.usuarios), len(nombres))
+        self.assertIn("usuario7", gestor_b.usuarios)
+        gestor_a.cerrar()
+        gestor_b.cerrar()
+
+
+if __name__ == "__main__":
+    unittest.main()
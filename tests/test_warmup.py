@@ -0,0 +1,60 @@
+# tests/test_warmup.py
+
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+import numpy as np
+from src.chatbot import Chatbot
+from src.warmup import WarmupRunner
+
+
+class TestWarmupRunner(unittest.TestCase):
+
+    def test_ejecuta_embed_search_y_prompt(self):
+        retriever = MagicMock(mmap_index=None)
+        retriever.embeddings.get_model.return_value.encode.return_value = np.ones(3, dtype=np.float32)
+        service = MagicMock()
+        service.trimmer.invoke.side_effect = lambda messages: messages
+        fast, large = MagicMock(), MagicMock()
+        service.llm_clients.return_value = [fast, large]
+
+        timings = WarmupRunner(retriever, service).run()
+
+        self.assertEqual(set(timings), {"embed", "search", "prompt", "llm_clients"})
+        search = retriever.vector_store_manager.get_chroma_instance.return_value.similarity_search_by_vector
+        search.assert_called_once_with([1.0, 1.0, 1.0], k=1)
+        # El calentamiento no pasa por la caché de embeddings.
+        retriever.embeddings.embed_query.assert_not_called()
+        service.prompt_builder.build.assert_called_once()
+
+
+@patch("src.langgraph_service.ChatAnthropic")
+class TestChatbotReadiness(unittest.TestCase):
+
+    def test_init_a_ready(self, _mock_llm):
+        started, release = threading.Event(), threading.Event()
+
+        def slow_run(self):
+            started.set()
+            release.wait(5)
+            return {}
+
+        with patch.object(WarmupRunner, "run", slow_run):
+            chatbot = Chatbot(api_key="test", retriever=MagicMock())
+            started.wait(5)
+            self.assertEqual(chatbot.state, "INIT")
+            self.assertFalse(chatbot.wait_until_ready(timeout=0.01))
+            release.set()
+            self.assertTrue(chatbot.wait_until_ready(timeout=5))
+        self.assertEqual(chatbot.state, "READY")
+        self.assertEqual(chatbot.state_description, "Listo")
+
+    def test_error_en_calentamiento(self, _mock_llm):
+        with patch.object(WarmupRunner, "run", side_effect=RuntimeError("índice corrupto")):
+            chatbot = Chatbot(api_key="test", retriever=MagicMock())
+            self.assertFalse(chatbot.wait_until_ready(timeout=5))
+        self.assertEqual(chatbot.state, "ERROR")
+
+
+if __name__ == "__main__":
+    unittest.main()